@@ -2,35 +2,135 @@
 # -*- coding: utf-8 -*-
 
 # 导入所需的标准库和第三方库
+import hashlib
+import hmac
+import json
 import os
 import logging
 import threading
 import time
 import re  # 导入正则表达式库
-import requests  # 用于后端代理视频流
-from flask import Flask, render_template, send_from_directory, request, jsonify, Response, redirect, url_for
-from werkzeug.utils import secure_filename
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlparse as urllib_parse
+from flask import Flask, render_template, send_from_directory, request, jsonify, Response, redirect, url_for, g, current_app, has_app_context
 
-# 从 ass_player 模块导入 Bilibili 解析器
-from ass_player.bilibili import BiliBiliParser
+# 注意：Bilibili 解析器（依赖 requests/urllib3）不在导入时加载，而是在首次需要时由 get_parser() 创建，
+# 以缩短冷启动（Zeabur 缩容到零后的首个请求）时间
+from ass_player import metrics
+from ass_player.admission import AdmissionLimiter, Overloaded
+from ass_player.bandwidth import DEFAULT_QN, QUALITY_IDS, BandwidthEstimator, client_bucket, parse_qn
+from ass_player.hotkeys import HotKeys
 from config import get_config
 
+if TYPE_CHECKING:
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+
 # 配置日志记录器
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 # 获取当前文件所在目录的绝对路径
 base_dir = os.path.dirname(os.path.abspath(__file__))
-# 初始化 Flask 应用，并指定模板和静态文件目录
-app = Flask(__name__, template_folder=os.path.join(base_dir, 'templates'), static_folder=os.path.join(base_dir, 'static'))
 
-# 创建一个共享的 BiliBiliParser 实例，以便在多个请求之间复用 HTTP 会话，提高效率
-_parser = BiliBiliParser()
+# 保护共享解析器的延迟创建（多个请求线程可能同时触发首次创建）
+_parser_lock = threading.Lock()
+
+
+def get_parser(flask_app: Optional[Flask] = None) -> 'BiliBiliParser':
+    """
+    返回应用共享的 BiliBiliParser 实例（在多个请求之间复用 HTTP 会话）。
+
+    解析器在第一次调用时才创建：此时才导入 requests 并建立会话，若配置了 `DISK_CACHE_PATH`
+    也在此时打开 SQLite 磁盘缓存。实例挂在 `flask_app._parser` 上，/api/report-cdn、
+    run.py 的 CDN 探测等均通过这里访问同一个解析器。
+    """
+    if flask_app is None:
+        flask_app = current_app._get_current_object() if has_app_context() else app
+    parser = getattr(flask_app, '_parser', None)
+    if parser is not None:
+        return parser
+    with _parser_lock:
+        parser = getattr(flask_app, '_parser', None)
+        if parser is None:
+            from ass_player.bilibili import BiliBiliParser
+            from ass_player.ratelimit import configure_upstream_bucket
+            from ass_player.scheduler import ResolveScheduler
+            cfg = get_config()
+            # 进程内所有解析器共用一个 B 站 API 令牌桶，被限流时统一降速
+            configure_upstream_bucket(cfg.UPSTREAM_RATE, cfg.UPSTREAM_BURST, cfg.UPSTREAM_RATE_MIN)
+            conn = _open_storage(flask_app)
+            parser = BiliBiliParser(timeout=cfg.PARSER_TIMEOUT, retries=cfg.PARSER_RETRIES,
+                                    playurl_strategies=cfg.PLAYURL_STRATEGIES,
+                                    api_base=flask_app.config.get('BILIBILI_API_BASE'), disk_cache_conn=conn,
+                                    shared_cache=_shared_cache(),
+                                    scheduler=ResolveScheduler(cfg.RESOLVE_MAX_CONCURRENCY, cfg.RESOLVE_INTERACTIVE_RESERVED))
+            if conn is not None:
+                # 连接由应用负责关闭（见 close_storage），解析器不持有所有权
+                parser._owns_disk_conn = False
+            # 解析结果可重新解析得到，但每条都省去两次上游调用，淘汰优先级高于静态资源
+            parser.on_cache_grow = _register_memory('resolve', parser, priority=30)
+            # 合集元数据很小，但每条都省去同一合集后续分集的 view 调用，与解析结果同级
+            parser.seasons.on_grow = _register_memory('seasons', parser.seasons, priority=30)
+            # 字幕 / 弹幕文本体积大、重新获取只需一次上游调用，先于解析结果淘汰
+            parser.subtitles.on_grow = _register_memory('subtitles', parser.subtitles, priority=20)
+            parser.danmaku.on_grow = _register_memory('danmaku', parser.danmaku, priority=20)
+            parser.on_cache_grow()
+            flask_app._parser = parser
+    return parser
+
+
+def _register_memory(name: str, cache, priority: int):
+    """把进程内缓存登记到全局内存预算（cache_manager.MemoryBudget），返回增长后的检查函数。"""
+    from cache_manager import get_memory_budget
+
+    return get_memory_budget().register(name, cache.memory_usage, cache.evict_bytes, priority=priority)
+
+
+def _shared_cache():
+    """返回跨进程共享的缓存（SQLite / Redis 后端）；进程内后端与解析器自身的缓存重复，不使用。"""
+    from cache_manager import get_cache
+
+    cache = get_cache()
+    return cache if cache.enabled and cache.backend.shared else None
+
+
+def _open_storage(flask_app: Flask):
+    """按 `DISK_CACHE_PATH` 配置打开磁盘缓存；未配置时返回 None（仅使用内存统计）。"""
+    db_path = flask_app.config.get('DISK_CACHE_PATH')
+    if not db_path:
+        return None
+    try:
+        from ass_player.storage import open_disk_cache
+        flask_app._disk_cache_conn = open_disk_cache(db_path)
+    except Exception:
+        logger.exception('打开本地 SQLite 缓存失败，将仅使用内存统计')
+        flask_app._disk_cache_conn = None
+    return flask_app._disk_cache_conn
+
+
+def close_storage(flask_app: Flask) -> None:
+    """关闭由应用打开的磁盘缓存连接（如果曾经打开过）。"""
+    conn = getattr(flask_app, '_disk_cache_conn', None)
+    if conn is None:
+        return
+    try:
+        conn.close()
+        logger.info('已关闭本地 SQLite 缓存连接')
+    except Exception:
+        logger.exception('关闭 SQLite 连接时发生异常')
+    flask_app._disk_cache_conn = None
+
+
+def __getattr__(name):
+    # 兼容旧代码的 `from app import _parser`：访问时才创建解析器
+    if name == '_parser':
+        return get_parser(app)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # 之前实现过基于内存的速率限制（已移除）——保留注释以便审计
 
 # 定义根路由，用于渲染主页面
-@app.route('/')
 def index():
     """渲染播放器主页面"""
     cfg = get_config()
@@ -61,7 +161,6 @@ def index():
     return render_template('index.html', ASS_PLAYER_CONFIG=public_cfg)
 
 
-@app.route('/mobile')
 def mobile():
     """渲染移动端优化页面（面向手机浏览器）。"""
     cfg = get_config()
@@ -76,7 +175,6 @@ def mobile():
     return render_template('index_mobile.html', ASS_PLAYER_CONFIG=public_cfg)
 
 
-@app.route('/config.json')
 def config_json():
     """提供前端需要的公开配置，避免在模板中使用 inline script 注入，便于满足 CSP。
 
@@ -99,25 +197,50 @@ def config_json():
     return jsonify({'ASS_PLAYER_CONFIG': public_cfg, 'CANVAS_RENDER_OPTIONS': canvas_opts})
 
 # 定义使用说明页面的路由
-@app.route('/instructions')
 def instructions():
     """渲染使用说明页面"""
     return render_template('instructions.html')
 
 # 定义代理配置页面的路由
-@app.route('/proxy-setup')
 def proxy_setup():
     """渲染代理配置说明页面"""
     return render_template('proxy-setup.html')
 
 # 定义静态文件服务的路由
-@app.route('/static/<path:filename>')
 def static_files(filename):
     """提供静态文件（如 CSS, JavaScript）的访问"""
-    return send_from_directory(app.static_folder, filename)
+    # 生产模式下已预加载（preload_assets）的文件直接从内存返回预压缩版本
+    cache = getattr(current_app, '_static_assets', None)
+    asset = cache.get(filename) if cache is not None else None
+    if asset is not None:
+        return _asset_response(asset)
+    return send_from_directory(current_app.static_folder, filename)
+
+
+def _asset_response(asset):
+    """从内存返回预压缩资源：支持 gzip 的客户端返回压缩版本，并支持 ETag 条件请求（304）。"""
+    use_gzip = 'gzip' in (request.headers.get('Accept-Encoding') or '').lower()
+    response = Response(asset.gzipped if use_gzip else asset.raw, mimetype=asset.mimetype)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    # 压缩与未压缩版本内容不同，使用不同的 ETag
+    response.set_etag(asset.etag + ('-gz' if use_gzip else ''))
+    return response.make_conditional(request)
+
+
+def _list_ass_files(ass_dir: str) -> set:
+    """列出字幕目录中的实际文件名；预加载过的目录索引在目录未变化时直接复用。"""
+    index = getattr(current_app, '_ass_index', None)
+    if index is not None:
+        try:
+            if os.stat(ass_dir).st_mtime_ns == index[0]:
+                return index[1]
+        except OSError:
+            pass
+    return set(os.listdir(ass_dir))
 
 # 提供示例字幕文件访问（用于在线 Demo 默认加载）
-@app.route('/ass_files/<path:filename>')
 def ass_files(filename):
     """提供本地 ass_files 目录下的字幕文件访问"""
     ass_dir = os.path.join(base_dir, 'ass_files')
@@ -138,7 +261,7 @@ def ass_files(filename):
 
     # 列出目录中的实际文件名，确保匹配真实文件（避免 secure_filename 改名问题）
     try:
-        available = set(os.listdir(ass_dir))
+        available = _list_ass_files(ass_dir)
     except Exception:
         return ('', 500)
 
@@ -146,17 +269,24 @@ def ass_files(filename):
         # 未找到精确匹配：返回 404 而非尝试替换文件名
         return ('', 404)
 
+    # 预加载或启动预热过的字幕直接从内存返回（支持 gzip 的客户端使用预压缩版本）
+    cache = getattr(current_app, '_ass_assets', None)
+    warmer = getattr(current_app, '_warmer', None)
+    asset = cache.get(safe_basename) if cache is not None else None
+    if asset is None and warmer is not None:
+        asset = warmer.get_asset(safe_basename)
+    if asset is not None:
+        return _asset_response(asset)
+
     return send_from_directory(ass_dir, safe_basename)
 
 # 定义网站图标的路由
-@app.route('/favicon.ico')
 def favicon():
     """提供网站图标 favicon.ico"""
-    return send_from_directory(app.static_folder, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
+    return send_from_directory(current_app.static_folder, 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
 
 # 微信/域名安全验证：返回特定的 TXT 文件内容（用于申请恢复/验证）
-@app.route('/ec9072a1ff2112829688a44ce183b240.txt')
 def wechat_verify():
     """Serve the verification TXT required by 微信 / 验证服务."""
     try:
@@ -165,7 +295,126 @@ def wechat_verify():
         return ('', 404)
 
 
-@app.after_request
+def start_request_timer():
+    """记录请求开始时间，供 after_request 计算路由耗时。"""
+    g._metrics_start = time.perf_counter()
+
+
+def record_request_metrics(response):
+    """按路由模板（而非原始路径，避免标签基数膨胀）记录请求次数与耗时。"""
+    try:
+        start = g.pop('_metrics_start', None)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+        if start is not None:
+            metrics.HTTP_LATENCY.labels(route).observe(time.perf_counter() - start)
+    except Exception:
+        logger.debug('记录请求指标时发生异常')
+    return response
+
+
+def healthz():
+    """健康检查与就绪状态：启用启动预热时，首轮预热完成前返回 503。"""
+    warmer = getattr(current_app, '_warmer', None)
+    body = {'status': 'ok', 'ready': True}
+    if warmer is not None:
+        body['ready'] = warmer.ready
+        body['warmup'] = warmer.health()
+    return jsonify(body), (200 if body['ready'] else 503)
+
+
+def metrics_endpoint():
+    """以 Prometheus 文本格式导出进程内指标（无需外部服务）。"""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def admin_hotkeys():
+    """当前热点 key（估算访问次数最高的 top-K）及其预热状态；需要管理令牌（见 _admin_allowed）。"""
+    if not _admin_allowed():
+        return jsonify({'success': False, 'error': 'forbidden'}), 403
+    hotkeys = current_app._hotkeys
+    if hotkeys is None:
+        return jsonify({'enabled': False, 'top': []})
+    warmer = current_app._hotkey_warmer
+    warm_status = warmer.status() if warmer is not None else {}
+    top = [{'key': key, 'count': count, 'warm': warm_status.get(key)} for key, count in hotkeys.top()]
+    return jsonify({'enabled': True, 'warming': warmer is not None, 'top': top, **hotkeys.stats()})
+
+
+def _admin_allowed() -> bool:
+    """
+    配置了 ADMIN_TOKEN 时校验 Authorization: Bearer 令牌；未配置时管理接口关闭，
+    除非显式开启 ADMIN_ALLOW_LOCAL（此时只允许本机访问，反向代理之后不应开启）。
+    """
+    token = current_app.config.get('ADMIN_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        return supplied.startswith('Bearer ') and hmac.compare_digest(supplied[len('Bearer '):].strip(), token)
+    return bool(current_app.config.get('ADMIN_ALLOW_LOCAL')) and request.remote_addr in ('127.0.0.1', '::1')
+
+
+def _select_qn(flask_app: Flask, requested: Optional[str], remote: Optional[str]):
+    """
+    本次解析请求的清晰度，返回 (qn, 错误)；Flask 路由与 ASGI 入口共用。
+
+    客户端用 ?qn= 指定时以它为准（只接受 QUALITY_LADDER 中的值），否则按该客户端分组的吞吐估算选择
+    （见 ass_player.bandwidth），未启用或没有估算时为 None（默认 720P）。
+    """
+    if requested:
+        qn = parse_qn(requested)
+        if qn is None:
+            allowed = ' / '.join(str(q) for q in QUALITY_IDS)
+            return None, ({'success': False, 'error': f'qn 只能是 {allowed}'}, 400)
+        return qn, None
+    if flask_app._bandwidth is None:
+        return None, None
+    return flask_app._bandwidth.select_qn(client_bucket(remote)), None
+
+
+def _client_address(flask_app: Flask, remote: Optional[str], forwarded_for: Optional[str]) -> Optional[str]:
+    """
+    吞吐估算分组使用的客户端地址；Flask 路由与 ASGI 入口共用。
+
+    TRUSTED_PROXY_HOPS 为 N（> 0）时取 X-Forwarded-For 从右数第 N 个地址：每层可信代理在末尾追加
+    它看到的对端地址，更靠左的部分可由客户端伪造。未配置、没有该头或层数不足时使用连接的对端地址。
+    """
+    hops = flask_app.config.get('TRUSTED_PROXY_HOPS') or 0
+    if hops <= 0 or not forwarded_for:
+        return remote
+    addresses = [part.strip() for part in forwarded_for.split(',') if part.strip()]
+    return addresses[-hops] if len(addresses) >= hops else remote
+
+
+def _record_hotkey(flask_app: Flask, key: str) -> None:
+    """把一次解析请求计入热点统计（未启用时忽略）；Flask 路由与 ASGI 入口共用。"""
+    if flask_app._hotkeys is not None:
+        flask_app._hotkeys.record(key)
+
+
+# 推荐的安全 HTTP 头（Flask 钩子与 ASGI 入口共用）
+# 尽量保持策略保守，可根据实际需要放宽
+# 为调试/兼容性短期放宽 CSP：允许内联脚本执行（'unsafe-inline'），并同时允许
+# 媒体资源使用 blob: 与 data:。请仅在受控环境或调试阶段使用此放宽策略。
+# 允许受信任的 HTTPS 媒体源以支持来自外部 CDN 的视频直链（例如 B站的 upos-* 域）。
+# 注意：这会允许任何 HTTPS 源作为媒体来源；如果需要更严格控制，可替换为指定的域名列表。
+SECURITY_HEADERS = (
+    ('Content-Security-Policy', (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline'; "
+        "style-src 'self' 'unsafe-inline'; "
+        "img-src 'self' data:; "
+        "connect-src 'self'; "
+        "media-src 'self' blob: data: https:;"
+    )),
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'DENY'),
+    ('Referrer-Policy', 'no-referrer-when-downgrade'),
+    ('Permissions-Policy', 'geolocation=(), microphone=()'),
+    # 仅在通过 HTTPS 部署时启用 HSTS，保守设置为 2 年
+    ('Strict-Transport-Security', 'max-age=63072000; includeSubDomains; preload'),
+)
+
+
 def set_security_headers(response):
     """设置一组推荐的安全 HTTP 头，减小 XSS / 点击劫持等风险。
 
@@ -176,40 +425,171 @@ def set_security_headers(response):
     - Permissions-Policy: 关闭敏感 API
     - Strict-Transport-Security: 强制 HTTPS（仅当部署为 HTTPS 时有效）
     """
-    # 尽量保持策略保守，可根据实际需要放宽
-    # 为调试/兼容性短期放宽 CSP：允许内联脚本执行（'unsafe-inline'），并同时允许
-    # 媒体资源使用 blob: 与 data:。请仅在受控环境或调试阶段使用此放宽策略。
-    # 允许受信任的 HTTPS 媒体源以支持来自外部 CDN 的视频直链（例如 B站的 upos-* 域）。
-    # 注意：这会允许任何 HTTPS 源作为媒体来源；如果需要更严格控制，可替换为指定的域名列表。
-    csp = (
-        "default-src 'self'; "
-        "script-src 'self' 'unsafe-inline'; "
-        "style-src 'self' 'unsafe-inline'; "
-        "img-src 'self' data:; "
-        "connect-src 'self'; "
-        "media-src 'self' blob: data: https:;"
-    )
-    response.headers['Content-Security-Policy'] = csp
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['Referrer-Policy'] = 'no-referrer-when-downgrade'
-    response.headers['Permissions-Policy'] = 'geolocation=(), microphone=()'
-    # 仅在通过 HTTPS 部署时启用 HSTS，保守设置为 2 年
-    response.headers['Strict-Transport-Security'] = 'max-age=63072000; includeSubDomains; preload'
+    for name, value in SECURITY_HEADERS:
+        response.headers[name] = value
     return response
 
 # 定义 API 路由，用于自动解析 Bilibili 视频链接
-@app.route('/api/auto-parse')
 def auto_parse():
     """
     接收来自客户端的 Bilibili 视频 URL，解析后返回真实的视频播放地址。
     此接口包含域名白名单和请求速率限制。
     """
-    # 从请求参数中获取 'url'
-    bilibili_url = request.args.get('url')
+    # 从请求参数中获取 'url' 并做校验（与 ASGI 入口共用）
+    bilibili_url, error = _validate_parse_url(request.args.get('url'))
+    if error is not None:
+        return jsonify(error[0]), error[1]
+
+    # 速率限制已移除：允许客户端多次请求而不返回 429（如需限流可在外部代理/网关实现）
+
+    qn, error = _select_qn(current_app, request.args.get('qn'),
+                           _client_address(current_app, request.remote_addr, request.headers.get('X-Forwarded-For')))
+    if error is not None:
+        return jsonify(error[0]), error[1]
+
+    _record_hotkey(current_app, bilibili_url)
+    want_timings_json = request.args.get('timings') == '1'
+    ctx = _new_resolve_context(want_timings_json, request.headers.get('X-Timeout-Ms'),
+                               subtitles=request.args.get('with_subtitles') == '1', qn=qn)
+
+    try:
+        remote = request.remote_addr or 'unknown'
+        logger.info('正在为 %s 解析 URL: %s', remote, bilibili_url)
+        # 准入控制：并发已满时排队等待空位，队列已满或等待超时则直接返回 503，避免慢上游占满全部线程
+        with current_app._parse_limiter.admit():
+            # 调用解析器获取真实的视频播放地址，同时通过上下文收集可供故障切换的候选直链
+            parser = get_parser()
+            parse_start = time.perf_counter()
+            video_url = parser.get_real_url(bilibili_url, ctx=ctx)
+            if video_url and ctx.want_subtitles and ctx.subtitles is None:
+                # 解析结果缓存命中时没有经过 playurl，字幕列表单独获取（通常也已按 cid 缓存）
+                ctx.subtitles = parser.get_subtitles(bilibili_url, ctx)
+        payload, status = _parse_result(bilibili_url, video_url, ctx, parser, parse_start)
+        return _timed_response(payload, status, ctx, want_timings_json)
+    except Overloaded as ex:
+        payload, status = _overloaded_result(ex)
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Retry-After'] = str(ex.retry_after)
+        return response
+    except Exception as e:
+        logger.exception('解析 URL 时发生错误')
+        return jsonify({'success': False, 'error': f'解析失败: {str(e)}', 'message': '解析过程中出现错误'}), 500
+
+
+def subtitle_file(bvid, cid, lan, fmt):
+    """返回转换为 ASS / VTT 的 B 站 CC 字幕（地址由 /api/auto-parse?with_subtitles=1 给出），按 cid 缓存。"""
+    if not re.fullmatch(r'BV[a-zA-Z0-9]{10}', bvid):
+        return jsonify({'success': False, 'error': '无效的 BV 号'}), 400
+    try:
+        text = get_parser().get_subtitle_text(bvid, cid, lan, fmt,
+                                              _new_resolve_context(False, request.headers.get('X-Timeout-Ms')))
+    except Exception as ex:
+        logger.warning('获取字幕 %s/%s/%s 失败: %s', bvid, cid, lan, ex)
+        return jsonify({'success': False, 'error': f'获取字幕失败: {ex}'}), 502
+    if text is None:
+        return jsonify({'success': False, 'error': '没有该语言的字幕（或 cid 不属于该视频）'}), 404
+    mimetype = 'text/vtt' if fmt == 'vtt' else 'text/x-ssa'
+    response = Response(text, content_type=f'{mimetype}; charset=utf-8')
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def danmaku_file(bvid, cid=None):
+    """返回转换为 ASS 的 B 站弹幕（/api/danmaku/<bvid>.ass 取第一 P，分 P 视频用 /api/danmaku/<bvid>/<cid>.ass），按 cid 缓存。"""
+    if not re.fullmatch(r'BV[a-zA-Z0-9]{10}', bvid):
+        return jsonify({'success': False, 'error': '无效的 BV 号'}), 400
+    try:
+        text = get_parser().get_danmaku_ass(bvid, cid, _new_resolve_context(False, request.headers.get('X-Timeout-Ms')))
+    except Exception as ex:
+        logger.warning('获取弹幕 %s/%s 失败: %s', bvid, cid, ex)
+        return jsonify({'success': False, 'error': f'获取弹幕失败: {ex}'}), 502
+    if text is None:
+        return jsonify({'success': False, 'error': '找不到该视频'}), 404
+    response = Response(text, content_type='text/x-ssa; charset=utf-8')
+    # 弹幕持续增加，客户端缓存时间与服务端缓存（DanmakuCache.ttl）一致
+    response.headers['Cache-Control'] = 'public, max-age=600'
+    return response
+
+
+# /api/season 单次最多解析的分集数
+SEASON_PREFETCH_MAX = 10
+
+
+def api_season():
+    """
+    合集（ugc_season）：传入合集中任意一集的 BV 号或 URL，返回按顺序排列的分集列表。
+
+    从该集开始的 prefetch 集（默认 SEASON_PREFETCH）并行解析并带上 video_url，其余为 null；
+    用户播放到后面的分集时照常调用 /api/auto-parse，合集元数据已缓存，只需一次 playurl 调用。
+    """
+    bilibili_url, error = _validate_parse_url(request.args.get('url'))
+    if error is not None:
+        return jsonify(error[0]), error[1]
+    bvid_match = re.search(r'BV[a-zA-Z0-9]{10}', bilibili_url)
+    if not bvid_match:
+        return jsonify({'success': False, 'error': '无法从 URL 中提取 BV 号'}), 400
+    try:
+        prefetch = int(request.args.get('prefetch', get_config().SEASON_PREFETCH))
+    except ValueError:
+        prefetch = get_config().SEASON_PREFETCH
+    prefetch = min(SEASON_PREFETCH_MAX, max(0, prefetch))
+    ctx = _new_resolve_context(False, request.headers.get('X-Timeout-Ms'))
+
+    try:
+        with current_app._parse_limiter.admit():
+            parser = get_parser()
+            season = parser.get_season(bilibili_url, ctx=ctx)
+            if season is None:
+                return jsonify({'success': False, 'error': '该视频不属于合集'}), 404
+            current = season.index_of(bvid_match.group(0))
+            resolved = parser.resolve_episodes(season, current, prefetch, ctx.deadline)
+    except Overloaded as ex:
+        payload, status = _overloaded_result(ex)
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Retry-After'] = str(ex.retry_after)
+        return response
+    except Exception as ex:
+        return _season_error(ex)
+
+    episodes = [dict(ep.to_dict(), index=i, video_url=resolved.get(ep.bvid)) for i, ep in enumerate(season.episodes)]
+    return jsonify({
+        'success': True,
+        'season': {'id': season.id, 'title': season.title, 'episode_count': len(episodes)},
+        'current': current,
+        'episodes': episodes,
+        'prefetched': sum(1 for url in resolved.values() if url),
+    })
+
+
+def _season_error(ex: Exception):
+    """获取合集信息失败时的响应：熔断 503 + Retry-After，超出预算 504，其余 502。"""
+    from ass_player.circuit import CircuitOpenError
+    from ass_player.deadline import DeadlineExceeded
+    from ass_player.scheduler import SchedulerTimeout
+
+    if isinstance(ex, CircuitOpenError):
+        retry_after = max(1, int(ex.retry_after + 0.999))
+        response = jsonify({'success': False, 'error': 'B 站接口暂时不可用', 'retry_after': retry_after})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    if isinstance(ex, (DeadlineExceeded, SchedulerTimeout)):
+        return jsonify({'success': False, 'error': '获取合集信息超时'}), 504
+    logger.warning('获取合集信息失败: %s', ex)
+    return jsonify({'success': False, 'error': f'获取合集信息失败: {ex}'}), 502
+
+
+def _validate_parse_url(bilibili_url: Optional[str]):
+    """
+    校验 /api/auto-parse 的 url 参数，返回 (规范化后的 URL, None) 或 (None, (错误 JSON, 状态码))。
+
+    Flask 路由与 ASGI 入口（asgi.py）共用，保证两种服务模式的接口契约一致。
+    """
     if not bilibili_url:
         # 如果缺少 URL 参数，返回 400 错误
-        return jsonify({'error': '缺少B站URL参数'}), 400
+        return None, ({'error': '缺少B站URL参数'}, 400)
 
     # 检查传入的是否是独立的 BV 号，如果是，则自动转换为完整的 URL
     # 这样做可以确保后续的域名白名单检查能够正确工作
@@ -221,82 +601,435 @@ def auto_parse():
 
     # 简单的域名白名单检查，确保只处理来自 bilibili.com 的链接
     if 'bilibili.com' not in bilibili_url:
-        return jsonify({'success': False, 'error': '仅支持 bilibili.com 域名'}), 400
+        return None, ({'success': False, 'error': '仅支持 bilibili.com 域名'}, 400)
+    return bilibili_url, None
 
-    # 速率限制已移除：允许客户端多次请求而不返回 429（如需限流可在外部代理/网关实现）
 
-    # 检测访问来源
-    host_header = request.host or ''
-    is_local = host_header.startswith('127.0.0.1') or host_header.startswith('localhost')
+def _overloaded_result(ex: Overloaded):
+    """准入被拒绝时的 (响应 JSON, 状态码)；Retry-After 头由调用方按 ex.retry_after 设置。"""
+    logger.warning('解析请求过多，已拒绝（%s），建议 %d 秒后重试', ex.reason, ex.retry_after)
+    return {'success': False, 'error': '服务繁忙，请稍后重试', 'message': f'解析请求过多，请 {ex.retry_after} 秒后重试'}, 503
+
 
+def _new_resolve_context(want_timings_json: bool, timeout_hint: Optional[str] = None,
+                         subtitles: bool = False, qn: Optional[int] = None) -> 'ResolveContext':
+    """
+    创建解析上下文。
+
+    分阶段计时：默认通过 Server-Timing 头输出（ASS_SERVER_TIMING 控制），?timings=1 时同时写入 JSON。
+    截止时间：从请求到达时开始计算（含准入排队），取 RESOLVE_DEADLINE 与客户端 X-Timeout-Ms 中较小者。
+    字幕：?with_subtitles=1 时与 playurl 并发获取 CC 字幕列表，结果写入响应的 subtitles 字段。
+    清晰度：qn 见 _select_qn，None 表示默认的 720P。
+    """
+    from ass_player.bilibili import ResolveContext
+    from ass_player.deadline import Deadline
+    cfg = get_config()
+    budget = _resolve_budget(getattr(cfg, 'RESOLVE_DEADLINE', 0), timeout_hint)
+    return ResolveContext(timings=want_timings_json or getattr(cfg, 'SERVER_TIMING_ENABLED', True),
+                          deadline=Deadline(budget) if budget else None, subtitles=subtitles, qn=qn)
+
+
+def _resolve_budget(configured: float, timeout_hint: Optional[str]) -> Optional[float]:
+    """解析预算（秒）：客户端提示只能缩短配置的预算；无效的提示被忽略，都未设置时返回 None（不限）。"""
+    budget = configured if configured and configured > 0 else None
     try:
-        remote = request.remote_addr or 'unknown'
-        logger.info('正在为 %s 解析 URL: %s', remote, bilibili_url)
-        # 调用解析器获取真实的视频播放地址
-        video_url = _parser.get_real_url(bilibili_url)
-        if video_url:
-            quality = _parser._detect_actual_quality(video_url) if hasattr(_parser, '_detect_actual_quality') else '未知'
-            logger.info('解析成功: %s (清晰度: %s)', video_url, quality)
-            # 无论本地还是域名访问，都返回 download_url（便于前端直接触发下载或展示链接）
-            # 注意：不再尝试获取或返回远端文件大小（Content-Length），以免在本地解析时阻塞。
-            resp = {
-                'success': True,
-                'video_url': video_url,
-                'quality': quality,
-                'download_url': video_url,
-                'message': f'解析成功 ({quality})'
-            }
-            return jsonify(resp)
-        else:
-            logger.warning('无法为 %s 获取视频直链', bilibili_url)
-            return jsonify({'success': False, 'error': '无法获取视频直链', 'message': '请检查视频链接是否正确，或尝试其他视频'}), 502
-    except Exception as e:
-        logger.exception('解析 URL 时发生错误')
-        return jsonify({'success': False, 'error': f'解析失败: {str(e)}', 'message': '解析过程中出现错误'}), 500
+        hinted = int(timeout_hint) / 1000.0 if timeout_hint else None
+    except ValueError:
+        hinted = None
+    if hinted is not None and hinted > 0 and (budget is None or hinted < budget):
+        budget = hinted
+    return budget
+
+
+def _parse_result(bilibili_url: str, video_url: Optional[str], ctx: 'ResolveContext', parser, parse_start: float):
+    """根据解析结果构造 (响应 JSON, 状态码)，并记录总耗时。"""
+    if ctx.timings is not None:
+        ctx.timings.add('total', (time.perf_counter() - parse_start) * 1000.0)
+    if not video_url and ctx.retry_after is not None:
+        # 上游熔断中且没有可用缓存：立即失败，提示客户端稍后重试（Retry-After 头见 _resolve_headers）
+        return {'success': False, 'error': 'B 站接口暂时不可用',
+                'message': f'B 站接口暂时不可用，请 {ctx.retry_after} 秒后重试', 'retry_after': ctx.retry_after}, 503
+    if not video_url and ctx.deadline is not None and ctx.deadline.expired:
+        logger.warning('解析 %s 超出 %.1f 秒预算', bilibili_url, ctx.deadline.budget)
+        return {'success': False, 'error': '解析超时', 'message': f'解析未能在 {ctx.deadline.budget:g} 秒内完成，请稍后重试'}, 504
+    if not video_url:
+        logger.warning('无法为 %s 获取视频直链', bilibili_url)
+        return {'success': False, 'error': '无法获取视频直链', 'message': '请检查视频链接是否正确，或尝试其他视频'}, 502
+
+    quality = parser._detect_actual_quality(video_url) if hasattr(parser, '_detect_actual_quality') else '未知'
+    logger.info('解析成功: %s (清晰度: %s)', video_url, quality)
+    # 候选列表已按 CDN 统计排序且逐一做过 SSRF 检查；解析器未提供时至少包含主直链
+    candidates = ctx.candidates or [{'url': video_url, 'host': (urllib_parse(video_url).hostname or '').lower(), 'source': 'primary'}]
+    # 无论本地还是域名访问，都返回 download_url（便于前端直接触发下载或展示链接）
+    # 注意：不再尝试获取或返回远端文件大小（Content-Length），以免在本地解析时阻塞。
+    payload = {
+        'success': True,
+        'video_url': video_url,
+        'quality': quality,
+        'download_url': video_url,
+        'candidates': candidates,
+        # 请求的清晰度（客户端指定或按吞吐估算选择）；实际清晰度见 quality，上游可能降级
+        'qn': ctx.qn or DEFAULT_QN,
+        'message': f'解析成功 ({quality})'
+    }
+    if ctx.want_subtitles:
+        # CC 字幕：[{lan, lan_doc, ass_url, vtt_url}]，没有字幕或获取失败时为空列表
+        payload['subtitles'] = ctx.subtitles or []
+    return payload, 200
+
+
+def _server_timing(payload: dict, ctx: 'ResolveContext', include_json: bool) -> Optional[str]:
+    """启用计时时返回 Server-Timing 头的值，并按需把 `timings` 字段写入 JSON。"""
+    if ctx.timings is None:
+        return None
+    if include_json:
+        payload['timings'] = ctx.timings.as_dict()
+    return ctx.timings.to_server_timing() or None
+
+
+def _resolve_headers(payload: dict, status: int, ctx: 'ResolveContext', include_json: bool) -> list:
+    """解析响应的附加头：缓存相关头（见 _client_cache_headers）、启用计时时的 Server-Timing、上游熔断时的 Retry-After。"""
+    headers = _client_cache_headers(payload, status)
+    timing = _server_timing(payload, ctx, include_json)
+    if timing:
+        headers.append(('Server-Timing', timing))
+    if ctx.retry_after is not None:
+        headers.append(('Retry-After', str(ctx.retry_after)))
+    return headers
+
+
+def _client_cache_headers(payload: dict, status: int) -> list:
+    """
+    成功的解析结果允许浏览器复用到直链签名 deadline 之前 CLIENT_CACHE_MARGIN 秒（private，并带 ETag
+    供条件请求返回 304）；失败结果与即将过期的结果不缓存。
+    """
+    max_age = _payload_max_age(payload) if status == 200 else 0
+    if max_age <= 0:
+        return [('Cache-Control', 'no-store')]
+    return [('Cache-Control', f'private, max-age={max_age}'), ('ETag', _payload_etag(payload))]
+
+
+def _payload_max_age(payload: dict) -> int:
+    """返回直链与各候选直链中最早的签名 deadline 减去安全余量后的剩余秒数（没有 deadline 时为 0）。"""
+    from ass_player.bilibili import _url_deadline
+    urls = [payload.get('video_url')] + [c.get('url') for c in payload.get('candidates') or ()]
+    deadlines = [d for d in (_url_deadline(u) for u in urls if u) if d is not None]
+    if not deadlines:
+        return 0
+    margin = getattr(get_config(), 'CLIENT_CACHE_MARGIN', 600)
+    return max(0, int(min(deadlines) - time.time() - margin))
+
+
+def _payload_etag(payload: dict) -> str:
+    """按响应内容（不含每次都不同的 timings 字段）计算弱 ETag。"""
+    stable = {k: v for k, v in payload.items() if k != 'timings'}
+    digest = hashlib.sha1(json.dumps(stable, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否与 ETag 匹配（弱比较，支持逗号分隔的列表与 *）。"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == opaque:
+            return True
+    return False
+
+
+def _timed_response(payload: dict, status: int, ctx: 'ResolveContext', include_json: bool):
+    """
+    构造 JSON 响应，并附加 _resolve_headers 给出的头（以及可选的 `timings` 字段）；
+    If-None-Match 与 ETag 匹配时返回不带正文的 304。
+    """
+    headers = _resolve_headers(payload, status, ctx, include_json)
+    response = jsonify(payload)
+    response.status_code = status
+    for name, value in headers:
+        response.headers[name] = value
+    if status == 200 and _etag_matches(request.headers.get('If-None-Match'), response.headers.get('ETag', '')):
+        response.status_code = 304
+        response.set_data(b'')
+        del response.headers['Content-Type']
+        del response.headers['Content-Length']
+    return response
 
 
-@app.route('/api/report-cdn', methods=['POST'])
 def report_cdn():
     """前端上报 CDN 加载耗时（由前端测量并上报）。
 
-    接受 JSON: { hostname: str, load_ms: int, is_china?: bool }
+    接受 JSON: { hostname: str, load_ms: int, is_china?: bool, bytes?: int, duration_ms?: number }
+    """
+    flask_app = current_app._get_current_object()
+    remote = _client_address(flask_app, request.remote_addr, request.headers.get('X-Forwarded-For'))
+    payload, status = _handle_cdn_report(request.get_json(silent=True) or {}, lambda: get_parser(flask_app),
+                                         flask_app._bandwidth, remote)
+    return jsonify(payload), status
+
+
+# 单个吞吐样本的字节数上限（一次下载不超过 2GB）
+MAX_REPORT_SAMPLE_BYTES = 2 * 1024 ** 3
+
+
+def _handle_cdn_report(data, parser_factory, bandwidth: Optional[BandwidthEstimator] = None,
+                       remote: Optional[str] = None):
+    """
+    处理一次 CDN 上报，返回 (响应 JSON, 状态码)。Flask 路由与 ASGI 入口共用。
+
+    :param data: 已解析的请求 JSON（非 dict 时按无效负载处理）。
+    :param parser_factory: 返回共享解析器的函数；仅在负载有效时才调用，避免无效请求触发解析器创建。
+    :param bandwidth: 吞吐估算；上报带有 bytes 与 duration_ms（一次视频下载的字节数与耗时）时计入客户端所在分组。
+    :param remote: 客户端地址（见 _client_address，用于 client_bucket 分组）。
     """
     try:
-        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            data = {}
         hostname = data.get('hostname')
         load_ms = data.get('load_ms')
         is_china = data.get('is_china', None)
+        # 可选：前端回传的服务端分阶段耗时（来自 /api/auto-parse 的 timings 字段），便于把
+        # 服务端各阶段与客户端实际加载耗时关联到同一条日志中排查“解析慢”的问题
+        server_timings = data.get('server_timings')
 
         if not hostname or load_ms is None:
-            return jsonify({'success': False, 'error': 'invalid payload'}), 400
+            metrics.CDN_REPORTS.labels('rejected').inc()
+            return {'success': False, 'error': 'invalid payload'}, 400
 
         # 简单范围校验
         try:
             load_val = float(load_ms)
         except Exception:
-            return jsonify({'success': False, 'error': 'load_ms must be numeric'}), 400
+            metrics.CDN_REPORTS.labels('rejected').inc()
+            return {'success': False, 'error': 'load_ms must be numeric'}, 400
         if load_val < 0 or load_val > 60000:
-            return jsonify({'success': False, 'error': 'load_ms out of range'}), 400
+            metrics.CDN_REPORTS.labels('rejected').inc()
+            return {'success': False, 'error': 'load_ms out of range'}, 400
+
+        # 可选的吞吐样本：两个字段需同时给出
+        sample = None
+        if data.get('bytes') is not None or data.get('duration_ms') is not None:
+            try:
+                sample = (int(data.get('bytes')), float(data.get('duration_ms')))
+            except (TypeError, ValueError):
+                metrics.CDN_REPORTS.labels('rejected').inc()
+                return {'success': False, 'error': 'bytes and duration_ms must be numeric'}, 400
+            if not (0 <= sample[0] <= MAX_REPORT_SAMPLE_BYTES and 0 < sample[1] <= 600000):
+                metrics.CDN_REPORTS.labels('rejected').inc()
+                return {'success': False, 'error': 'bytes or duration_ms out of range'}, 400
+
+        # 只接受 B 站视频 CDN 主机：上报的主机会进入 CDN 探测名单（探测请求带有签名直链）
+        from ass_player.bilibili import is_bilibili_cdn_host
+        if not isinstance(hostname, str) or not is_bilibili_cdn_host(hostname):
+            metrics.CDN_REPORTS.labels('rejected').inc()
+            return {'success': False, 'error': 'hostname is not a Bilibili CDN host'}, 400
 
         # 如果解析器存在，则更新其 CDN 缓存统计
         try:
-            if hasattr(app, '_parser') and app._parser is not None:
+            parser = parser_factory()
+            if parser is not None:
                 if is_china is not None:
                     try:
-                        app._parser.mark_cdn_hostname(hostname, bool(is_china))
+                        parser.mark_cdn_hostname(hostname, bool(is_china))
                     except Exception:
                         logger.debug('标记 CDN 主机时发生异常')
                 try:
-                    app._parser.record_cdn_load(hostname, float(load_val))
+                    parser.record_cdn_load(hostname, float(load_val))
                 except Exception:
                     logger.debug('记录 CDN 加载耗时时发生异常')
         except Exception:
             logger.exception('在处理 CDN 上报时解析器调用失败')
 
-        return jsonify({'success': True}), 200
+        if sample is not None and bandwidth is not None:
+            bandwidth.record(client_bucket(remote), *sample)
+
+        if isinstance(server_timings, dict):
+            logger.info('CDN 上报: host=%s load_ms=%.0f server_timings=%s', hostname, load_val, server_timings)
+
+        metrics.CDN_REPORTS.labels('accepted').inc()
+        return {'success': True}, 200
     except Exception:
         logger.exception('处理 /api/report-cdn 请求时发生异常')
-        return jsonify({'success': False, 'error': 'internal error'}), 500
+        metrics.CDN_REPORTS.labels('error').inc()
+        return {'success': False, 'error': 'internal error'}, 500
+
+
+# 路由表：(规则, 视图函数, 方法)。端点名沿用视图函数名，模板中的 url_for('instructions') 等保持不变
+_ROUTES = (
+    ('/', index, None),
+    ('/mobile', mobile, None),
+    ('/config.json', config_json, None),
+    ('/instructions', instructions, None),
+    ('/proxy-setup', proxy_setup, None),
+    ('/static/<path:filename>', static_files, None),
+    ('/ass_files/<path:filename>', ass_files, None),
+    ('/favicon.ico', favicon, None),
+    ('/ec9072a1ff2112829688a44ce183b240.txt', wechat_verify, None),
+    ('/healthz', healthz, None),
+    ('/metrics', metrics_endpoint, None),
+    ('/admin/hotkeys', admin_hotkeys, None),
+    ('/api/auto-parse', auto_parse, None),
+    ('/api/season', api_season, None),
+    ('/api/subtitle/<bvid>/<int:cid>/<lan>.<any(ass, vtt):fmt>', subtitle_file, None),
+    ('/api/danmaku/<bvid>.ass', danmaku_file, None),
+    ('/api/danmaku/<bvid>/<int:cid>.ass', danmaku_file, None),
+    ('/api/report-cdn', report_cdn, ['POST']),
+)
+
+
+def create_app(config_name: Optional[str] = None) -> Flask:
+    """
+    应用工厂：创建并配置 Flask 应用。
+
+    工厂本身只注册路由与钩子，不创建解析器、不打开数据库；这些在首次需要时由 get_parser() 完成，
+    因此 `import app` 与首个页面请求都不需要等待网络会话或磁盘初始化。
+
+    :param config_name: 配置名（'development' / 'production' / 'testing'），默认读取 ASS_ENV。
+    """
+    cfg = get_config(config_name)
+    # 初始化 Flask 应用，并指定模板和静态文件目录
+    flask_app = Flask(__name__, template_folder=os.path.join(base_dir, 'templates'), static_folder=os.path.join(base_dir, 'static'))
+    flask_app.config['BILIBILI_API_BASE'] = getattr(cfg, 'BILIBILI_API_BASE', None)
+    # 磁盘缓存路径默认不启用，由 run.py / start.py 设置（见 ass_player.storage.DEFAULT_DB_PATH）
+    flask_app.config['DISK_CACHE_PATH'] = None
+    flask_app._parser = None
+    flask_app._disk_cache_conn = None
+    # 启动预热器（ass_player.warmup.Warmer），由 start_background_tasks() 按配置启动
+    flask_app._warmer = None
+    flask_app.config['ADMIN_TOKEN'] = getattr(cfg, 'ADMIN_TOKEN', '')
+    flask_app.config['ADMIN_ALLOW_LOCAL'] = getattr(cfg, 'ADMIN_ALLOW_LOCAL', False)
+    flask_app.config['TRUSTED_PROXY_HOPS'] = getattr(cfg, 'TRUSTED_PROXY_HOPS', 0)
+    # 热点 key 统计（固定内存，随每次解析请求更新）与热点预热器（由 start_background_tasks() 按配置启动）
+    flask_app._hotkeys = _new_hotkeys(cfg)
+    flask_app._hotkey_warmer = None
+    # 按客户端分组的吞吐估算（由 /api/report-cdn 的吞吐样本更新），/api/auto-parse 据此选择清晰度
+    flask_app._bandwidth = _new_bandwidth(cfg)
+    # 只读资源的预加载结果（见 preload_assets），未预加载时路由按需读取磁盘
+    flask_app._static_assets = None
+    flask_app._ass_assets = None
+    flask_app._ass_index = None
+    # /api/auto-parse 的准入控制（见 configure_parse_limiter）
+    configure_parse_limiter(flask_app, cfg.PARSE_MAX_IN_FLIGHT, cfg.PARSE_QUEUE_SIZE, cfg.PARSE_QUEUE_TIMEOUT)
+
+    for rule, view_func, methods in _ROUTES:
+        flask_app.add_url_rule(rule, view_func=view_func, methods=methods)
+    # Flask 内置的 static 端点与上面的 /static 规则相同且优先匹配，统一交给 static_files 处理
+    flask_app.view_functions['static'] = static_files
+    flask_app.before_request(start_request_timer)
+    # after_request 按注册的逆序执行：先设置安全头，再记录指标（与原装饰器顺序一致）
+    flask_app.after_request(record_request_metrics)
+    flask_app.after_request(set_security_headers)
+    return flask_app
+
+
+def _new_bandwidth(cfg) -> Optional[BandwidthEstimator]:
+    if not getattr(cfg, 'ADAPTIVE_QN_ENABLED', False):
+        return None
+    return BandwidthEstimator(safety=cfg.ADAPTIVE_QN_SAFETY, max_qn=cfg.ADAPTIVE_QN_MAX)
+
+
+def _new_hotkeys(cfg) -> Optional[HotKeys]:
+    if not getattr(cfg, 'HOTKEYS_ENABLED', False):
+        return None
+    return HotKeys(top_k=cfg.HOTKEYS_TOP_K, width=cfg.HOTKEYS_SKETCH_WIDTH, depth=cfg.HOTKEYS_SKETCH_DEPTH,
+                   decay_every=cfg.HOTKEYS_DECAY_EVERY)
+
+
+def configure_parse_limiter(flask_app: Flask, max_in_flight: int, max_queue: int, queue_timeout: float) -> AdmissionLimiter:
+    """
+    设置解析路由的准入控制：最多 max_in_flight 个解析同时进行，另有 max_queue 个最多排队 queue_timeout 秒。
+
+    排队中的请求同样占用一个服务线程，线程数固定的服务模式（gunicorn gthread）应保证两者之和
+    小于线程数，给页面与静态文件留出线程（见 wsgi.py）。
+    """
+    flask_app._parse_limiter = AdmissionLimiter('parse', max_in_flight, max_queue, queue_timeout)
+    return flask_app._parse_limiter
+
+
+def preload_assets(flask_app: Flask) -> dict:
+    """
+    预加载只读资源：编译全部模板、建立字幕目录索引、读入并预压缩静态文件与字幕。
+
+    生产模式（wsgi.py）在 fork 之前调用，各 worker 以写时复制方式共享这些数据。返回各类资源的数量。
+    """
+    from ass_player.assets import AssetCache
+
+    templates = flask_app.jinja_env.list_templates()
+    for name in templates:
+        flask_app.jinja_env.get_template(name)
+
+    ass_dir = os.path.join(base_dir, 'ass_files')
+    static_assets = AssetCache()
+    static_assets.preload_dir(flask_app.static_folder)
+    ass_assets = AssetCache()
+    if os.path.isdir(ass_dir):
+        ass_assets.preload_dir(ass_dir, extensions=('.ass',))
+        flask_app._ass_index = (os.stat(ass_dir).st_mtime_ns, set(os.listdir(ass_dir)))
+    flask_app._static_assets = static_assets
+    flask_app._ass_assets = ass_assets
+    # 内存副本被淘汰后路由回退到直接读文件，代价最低，最先淘汰
+    static_assets.on_grow = _register_memory('static_assets', static_assets, priority=10)
+    ass_assets.on_grow = _register_memory('ass_assets', ass_assets, priority=10)
+    static_assets.on_grow()
+    summary = {'templates': len(templates), 'static': len(static_assets), 'ass_files': len(ass_assets)}
+    logger.info('已预加载只读资源: %s', summary)
+    return summary
+
+
+def start_background_tasks(flask_app: Flask, cfg) -> None:
+    """按配置启动后台任务（CDN 主动探测、启动预热、热点预热）；仅在启用时才提前创建解析器。"""
+    # 可选：启动后台 CDN 主动探测（由 ASS_CDN_PROBE_ENABLED 控制）
+    if getattr(cfg, 'CDN_PROBE_ENABLED', False):
+        try:
+            from ass_player.cdn_probe import start_from_config as start_cdn_probe
+            start_cdn_probe(get_parser(flask_app), cfg)
+        except Exception:
+            logger.exception('启动 CDN 探测时发生错误')
+
+    # 可选：启动预热默认示例视频与字幕（由 ASS_WARMUP_ENABLED 控制），就绪状态见 /healthz
+    if getattr(cfg, 'WARMUP_ENABLED', False):
+        try:
+            from ass_player.warmup import start_from_config as start_warmup
+            flask_app._warmer = start_warmup(get_parser(flask_app), cfg, os.path.join(base_dir, 'ass_files'))
+            if flask_app._warmer is not None:
+                # 与预加载的字幕同级：被淘汰后路由回退为读取磁盘文件。预热线程可能已写入，登记后检查一次
+                assets = flask_app._warmer.assets
+                assets.on_grow = _register_memory('warmup_assets', assets, priority=10)
+                assets.on_grow()
+        except Exception:
+            logger.exception('启动预热时发生错误')
+
+    # 可选：后台保持热点 key 已解析（由 ASS_HOTKEYS_WARM_ENABLED 控制），状态见 /admin/hotkeys
+    if getattr(cfg, 'HOTKEYS_WARM_ENABLED', False) and flask_app._hotkeys is not None:
+        try:
+            from ass_player.hotkeys import start_from_config as start_hotkey_warmer
+            flask_app._hotkey_warmer = start_hotkey_warmer(get_parser(flask_app), flask_app._hotkeys, cfg)
+        except Exception:
+            logger.exception('启动热点预热时发生错误')
+
+
+def reinit_after_fork(flask_app: Flask) -> None:
+    """
+    在 fork 出的子进程中丢弃继承自父进程的可变状态。
+
+    HTTP 会话的连接池、SQLite 连接与后台线程都不能跨进程共享：这里只丢弃引用（不关闭，
+    以免影响父进程），各 worker 在首次需要时由 get_parser() 重新创建自己的解析器与连接。
+    """
+    global _parser_lock
+    # fork 时若有线程持有该锁，子进程中的副本将永远无法释放
+    _parser_lock = threading.Lock()
+    flask_app._parser = None
+    flask_app._disk_cache_conn = None
+    flask_app._warmer = None
+    # 热点统计的锁同样可能在 fork 时被持有；主进程不处理解析请求，计数从零开始即可
+    flask_app._hotkeys = _new_hotkeys(get_config())
+    flask_app._hotkey_warmer = None
+    flask_app._bandwidth = _new_bandwidth(get_config())
+
+
+# 模块级应用实例（供 run.py / start.py / 测试直接导入）
+app = create_app()
 
 
 # 当该脚本作为主程序直接运行时，执行以下代码
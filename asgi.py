@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASGI 入口：
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+/api/auto-parse 与 /api/report-cdn 实现为异步路由：解析使用异步解析器（httpx），等待上游期间
+不占用线程，单进程即可承载上千个同时进行中的慢请求。页面、静态文件等其余路由（以及异步路由
+不接受的请求方法）通过 WSGI 桥接交给 app.py 中的 Flask 应用处理，接口契约与 Flask 模式一致。
+"""
+import json
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+from app import (app as flask_app, get_parser, close_storage, start_background_tasks, SECURITY_HEADERS,
+                 _validate_parse_url, _new_resolve_context, _parse_result, _overloaded_result, _resolve_headers, _etag_matches,
+                 _client_address, _handle_cdn_report, _record_hotkey, _select_qn)
+from ass_player import metrics
+from ass_player.admission import AsyncAdmissionLimiter, Overloaded
+from ass_player.storage import DEFAULT_DB_PATH
+from ass_player.wsgi_bridge import WsgiBridge, read_body
+from cache_manager import setup_cache
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# report-cdn 请求体上限（正常负载只有几十字节）
+MAX_REPORT_BYTES = 64 * 1024
+
+
+class AssPlayerAsgi:
+    """异步路由 + Flask 桥接的 ASGI 应用。"""
+
+    def __init__(self, wsgi_app, wsgi_threads: int = 16, upstream_connections: int = 512,
+                 parse_limiter: Optional[AsyncAdmissionLimiter] = None):
+        self.flask_app = wsgi_app
+        self.bridge = WsgiBridge(wsgi_app, max_workers=wsgi_threads)
+        self.upstream_connections = upstream_connections
+        # 异步解析路由的准入控制（与 Flask 路由的 _parse_limiter 语义一致）
+        self.parse_limiter = parse_limiter or AsyncAdmissionLimiter()
+        self._async_parser = None
+        # 路径 -> (方法, 处理函数)；方法不匹配的请求交给 Flask，由其返回一致的 405
+        self.routes = {
+            '/api/auto-parse': ('GET', self.auto_parse),
+            '/api/report-cdn': ('POST', self.report_cdn),
+        }
+
+    def get_async_parser(self):
+        """首次调用时创建异步解析器；它与 Flask 路由共享同一个同步解析器的状态。"""
+        if self._async_parser is None:
+            from ass_player.bilibili_async import AsyncBiliBiliParser
+            parser = get_parser(self.flask_app)
+            # 异步解析等待上游不占线程：调度器的总并发放宽到与异步路由的准入上限一致，交互预留不变
+            parser.scheduler.configure(max(parser.scheduler.max_concurrency, self.parse_limiter.max_in_flight),
+                                       parser.scheduler.interactive_reserved)
+            self._async_parser = AsyncBiliBiliParser(parser, max_connections=self.upstream_connections)
+        return self._async_parser
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        route = self.routes.get(scope['path'])
+        if route is None or route[0] != scope['method']:
+            return await self.bridge(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+        try:
+            status = await route[1](scope, receive, send)
+        finally:
+            metrics.HTTP_REQUESTS.labels(scope['path'], scope['method'], status).inc()
+            metrics.HTTP_LATENCY.labels(scope['path']).observe(time.perf_counter() - start)
+
+    async def auto_parse(self, scope, receive, send) -> int:
+        """异步版本的 /api/auto-parse，校验与响应构造与 Flask 路由共用。"""
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        bilibili_url, error = _validate_parse_url((query.get('url') or [None])[0])
+        if error is not None:
+            return await _send_json(send, error[0], error[1])
+
+        remote = (scope.get('client') or ('unknown',))[0]
+        qn, error = _select_qn(self.flask_app, (query.get('qn') or [None])[0],
+                               _client_address(self.flask_app, remote, _header(scope, b'x-forwarded-for')))
+        if error is not None:
+            return await _send_json(send, error[0], error[1])
+
+        _record_hotkey(self.flask_app, bilibili_url)
+        want_timings_json = (query.get('timings') or [None])[0] == '1'
+        ctx = _new_resolve_context(want_timings_json, _header(scope, b'x-timeout-ms'),
+                                   subtitles=(query.get('with_subtitles') or [None])[0] == '1', qn=qn)
+        try:
+            logger.info('正在为 %s 解析 URL: %s', remote, bilibili_url)
+            async with self.parse_limiter.admit():
+                parser = self.get_async_parser()
+                parse_start = time.perf_counter()
+                video_url = await parser.get_real_url(bilibili_url, ctx=ctx)
+                if video_url and ctx.want_subtitles and ctx.subtitles is None:
+                    ctx.subtitles = await parser.get_subtitles(bilibili_url, ctx)
+            payload, status = _parse_result(bilibili_url, video_url, ctx, parser.parser, parse_start)
+            headers = _resolve_headers(payload, status, ctx, want_timings_json)
+            etag = next((v for k, v in headers if k == 'ETag'), '')
+            if status == 200 and _etag_matches(_header(scope, b'if-none-match'), etag):
+                return await _send_not_modified(send, headers)
+            return await _send_json(send, payload, status, headers)
+        except Overloaded as ex:
+            payload, status = _overloaded_result(ex)
+            return await _send_json(send, payload, status, [('retry-after', str(ex.retry_after))])
+        except Exception as e:
+            logger.exception('解析 URL 时发生错误')
+            return await _send_json(send, {'success': False, 'error': f'解析失败: {str(e)}', 'message': '解析过程中出现错误'}, 500)
+
+    async def report_cdn(self, scope, receive, send) -> int:
+        """异步版本的 /api/report-cdn；统计更新只涉及内存与 SQLite 单行写入，直接在事件循环中完成。"""
+        body = await read_body(receive, MAX_REPORT_BYTES)
+        if body is None:
+            return await _send_json(send, {'success': False, 'error': 'payload too large'}, 413)
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            data = {}
+        remote = _client_address(self.flask_app, (scope.get('client') or (None,))[0],
+                                 _header(scope, b'x-forwarded-for'))
+        payload, status = _handle_cdn_report(data, lambda: get_parser(self.flask_app), self.flask_app._bandwidth, remote)
+        return await _send_json(send, payload, status)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # 与 run.py 一致：配置缓存后端、登记磁盘缓存路径并按配置启动后台任务
+                cfg = get_config()
+                setup_cache(enabled=cfg.CACHE_ENABLED, ttl=cfg.CACHE_TTL, backend=cfg.CACHE_BACKEND,
+                            memory_budget_bytes=cfg.MEMORY_BUDGET_MB * 1024 * 1024)
+                if not self.flask_app.config.get('DISK_CACHE_PATH'):
+                    self.flask_app.config['DISK_CACHE_PATH'] = DEFAULT_DB_PATH
+                start_background_tasks(self.flask_app, cfg)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._async_parser is not None:
+                    await self._async_parser.aclose()
+                self.bridge.shutdown()
+                close_storage(self.flask_app)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    """读取请求头（name 为小写字节串），不存在时返回 None。"""
+    for key, value in scope.get('headers') or ():
+        if key.lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _send_json(send, payload: dict, status: int, extra_headers=None) -> int:
+    """发送与 Flask jsonify 格式一致的 JSON 响应（附带相同的安全头），返回状态码。"""
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('ascii'))]
+    headers.extend((k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in SECURITY_HEADERS)
+    for name, value in extra_headers or ():
+        headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+async def _send_not_modified(send, extra_headers) -> int:
+    """条件请求命中时发送不带正文的 304（保留安全头与缓存相关头）。"""
+    headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in SECURITY_HEADERS]
+    headers.extend((name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in extra_headers)
+    await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b''})
+    return 304
+
+
+_cfg = get_config()
+app = AssPlayerAsgi(flask_app, wsgi_threads=_cfg.ASGI_WSGI_THREADS, upstream_connections=_cfg.ASGI_UPSTREAM_CONNECTIONS,
+                    parse_limiter=AsyncAdmissionLimiter('parse_async', _cfg.ASGI_PARSE_MAX_IN_FLIGHT, _cfg.PARSE_QUEUE_SIZE,
+                                                        _cfg.PARSE_QUEUE_TIMEOUT))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', _cfg.PORT))
+    uvicorn.run('asgi:app', host=os.environ.get('ASS_PLAYER_HOST', '0.0.0.0'), port=port, log_level=_cfg.LOG_LEVEL.lower())
@@ -0,0 +1,206 @@
+"""
+解析路由的准入控制（并发上限 + 有界等待队列）。
+
+上游变慢时，线程模式下的解析请求会一直占着线程等待 `session.get`，最终连首页与静态文件也
+分不到线程。准入控制限制同时进行中的解析数：超出上限的请求进入有界队列等待空位，队列已满
+或等待超时时立即返回 503 并附带 `Retry-After`，把线程留给其余路由。
+
+`AdmissionLimiter` 供 Flask（线程）路由使用，`AsyncAdmissionLimiter` 供 ASGI 入口的异步路由
+使用，两者的参数、统计与 Retry-After 估算一致。
+"""
+import asyncio
+import collections
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from ass_player import metrics
+
+# Retry-After 的取值范围（秒）
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+# 单次解析占用时长的指数滑动平均系数
+HOLD_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """解析并发已满且无法排队（队列已满或等待超时）。"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f'准入被拒绝: {reason}')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _LimiterBase:
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        """
+        :param name: 指标标签中的限流器名称。
+        :param max_in_flight: 同时进行中的最大请求数。
+        :param max_queue: 等待空位的最大请求数，0 表示不排队。
+        :param queue_timeout: 排队等待的最长时间（秒）。
+        """
+        self.name = name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = max(0.0, float(queue_timeout))
+        self.in_flight = 0
+        self.rejected = {'queue_full': 0, 'timeout': 0}
+        # 单次占用时长的滑动平均（秒），用于估算 Retry-After；初值取 1 秒
+        self._avg_hold = 1.0
+        metrics.ADMISSION_IN_FLIGHT.labels(name).set_function(lambda: self.in_flight)
+        metrics.ADMISSION_QUEUED.labels(name).set_function(lambda: self.waiting)
+
+    @property
+    def waiting(self) -> int:
+        raise NotImplementedError
+
+    def retry_after(self) -> int:
+        """按平均占用时长估算排在当前队尾之后需要等待的秒数。"""
+        estimate = self._avg_hold * (self.waiting + 1) / self.max_in_flight
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.labels(self.name, reason).inc()
+        return Overloaded(reason, self.retry_after())
+
+    def _record_hold(self, held: float):
+        self._avg_hold += HOLD_EWMA_ALPHA * (held - self._avg_hold)
+
+    def stats(self) -> dict:
+        return {
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'queue_timeout': self.queue_timeout,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'rejected': dict(self.rejected),
+        }
+
+
+class AdmissionLimiter(_LimiterBase):
+    """
+    线程模式的准入控制。
+
+    使用示例:
+        limiter = AdmissionLimiter('parse', max_in_flight=16, max_queue=16, queue_timeout=2.0)
+        try:
+            with limiter.admit():
+                ...  # 调用上游
+        except Overloaded as ex:
+            ...  # 返回 503，Retry-After: ex.retry_after
+    """
+
+    def __init__(self, name: str = 'parse', max_in_flight: int = 32, max_queue: int = 64, queue_timeout: float = 2.0):
+        self._cond = threading.Condition()
+        self._waiting = 0
+        super().__init__(name, max_in_flight, max_queue, queue_timeout)
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def acquire(self):
+        """占用一个空位；无法准入时抛出 Overloaded。"""
+        with self._cond:
+            # 已有请求在排队时新请求不插队
+            if self.in_flight < self.max_in_flight and self._waiting == 0:
+                self.in_flight += 1
+                return
+            if self._waiting >= self.max_queue:
+                raise self._reject('queue_full')
+            deadline = time.monotonic() + self.queue_timeout
+            self._waiting += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject('timeout')
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self._waiting -= 1
+
+    def release(self, held: Optional[float] = None):
+        with self._cond:
+            self.in_flight -= 1
+            if held is not None:
+                self._record_hold(held)
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+
+class AsyncAdmissionLimiter(_LimiterBase):
+    """
+    事件循环内的准入控制（只能在同一个事件循环中使用）。
+
+    空位释放时直接移交给队首的等待者，in_flight 不变，新请求无法插队。
+    """
+
+    def __init__(self, name: str = 'parse_async', max_in_flight: int = 1024, max_queue: int = 64,
+                 queue_timeout: float = 2.0):
+        self._waiters = collections.deque()
+        super().__init__(name, max_in_flight, max_queue, queue_timeout)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject('queue_full')
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            # 超时与移交同时发生时，空位已经属于本请求
+            if waiter.done() and not waiter.cancelled():
+                return
+            waiter.cancel()
+            raise self._reject('timeout')
+        except BaseException:
+            # 请求被取消（如客户端断开）时，已移交的空位要还回去
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, held: Optional[float] = None):
+        if held is not None:
+            self._record_hold(held)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
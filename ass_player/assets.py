@@ -0,0 +1,117 @@
+"""
+只读静态资源的内存缓存。
+
+文件在读入时即预先 gzip 压缩，路由直接从内存返回原文或压缩版本。生产模式（wsgi.py）在 fork
+之前预加载，所有 worker 以写时复制的方式共享同一份数据；文件在磁盘上被修改后自动失效，
+回退到直接读文件。
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 预加载的默认扩展名与单个文件大小上限（超过上限的文件仍由 send_from_directory 按需读取）
+DEFAULT_EXTENSIONS = ('.js', '.css', '.html', '.json', '.svg', '.ass', '.txt')
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+
+class PrecompressedAsset:
+    """已读入内存并预先 gzip 压缩的静态文件。"""
+
+    def __init__(self, path: str):
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            self.raw = f.read()
+        self.gzipped = gzip.compress(self.raw, compresslevel=9, mtime=0)
+        self.path = path
+        self.mtime = st.st_mtime
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.etag = hashlib.md5(self.raw).hexdigest()
+
+    @property
+    def nbytes(self) -> int:
+        """原文与压缩版本占用的字节数。"""
+        return len(self.raw) + len(self.gzipped)
+
+    def is_fresh(self) -> bool:
+        """文件在磁盘上被修改或删除后返回 False，调用方应回退到直接读文件。"""
+        try:
+            return os.stat(self.path).st_mtime == self.mtime
+        except OSError:
+            return False
+
+
+class AssetCache:
+    """按相对路径索引的 PrecompressedAsset 集合。"""
+
+    def __init__(self):
+        self._assets: Dict[str, PrecompressedAsset] = {}
+        self._bytes = 0
+        # 新增资源后的回调（由应用注册为内存预算检查）
+        self.on_grow = None
+
+    def __len__(self):
+        return len(self._assets)
+
+    def add(self, key: str, path: str) -> Optional[PrecompressedAsset]:
+        try:
+            asset = PrecompressedAsset(path)
+        except OSError as ex:
+            logger.warning('预加载静态资源失败: %s (%s)', path, ex)
+            return None
+        self._discard(key)
+        self._assets[key] = asset
+        self._bytes += asset.nbytes
+        if self.on_grow is not None:
+            self.on_grow()
+        return asset
+
+    def _discard(self, key: str):
+        asset = self._assets.pop(key, None)
+        if asset is not None:
+            self._bytes -= asset.nbytes
+
+    def preload_dir(self, root: str, extensions: Iterable[str] = DEFAULT_EXTENSIONS,
+                    max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+        """递归预加载目录下指定扩展名的文件，键为以 '/' 分隔的相对路径；返回加载的文件数。"""
+        extensions = tuple(e.lower() for e in extensions)
+        count = 0
+        for dirpath, _dirs, files in os.walk(root):
+            for name in files:
+                if not name.lower().endswith(extensions):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getsize(path) > max_bytes:
+                        continue
+                except OSError:
+                    continue
+                key = os.path.relpath(path, root).replace(os.sep, '/')
+                if self.add(key, path) is not None:
+                    count += 1
+        return count
+
+    def get(self, key: str) -> Optional[PrecompressedAsset]:
+        """返回仍与磁盘一致的资源；文件已变化时丢弃内存副本并返回 None。"""
+        asset = self._assets.get(key)
+        if asset is not None and not asset.is_fresh():
+            self._discard(key)
+            return None
+        return asset
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """从最大的资源开始丢弃内存副本（之后由路由回退到直接读文件），返回释放的字节数。"""
+        freed = 0
+        for key, asset in sorted(self._assets.items(), key=lambda item: item[1].nbytes, reverse=True):
+            if freed >= target:
+                break
+            self._discard(key)
+            freed += asset.nbytes
+        return freed
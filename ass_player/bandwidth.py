@@ -0,0 +1,156 @@
+"""
+按客户端分组的下载吞吐估算与清晰度（qn）选择。
+
+/api/auto-parse 原先总是请求 qn=64（720P），不管客户端的链路能否流畅播放。前端在 /api/report-cdn
+中附带一次视频下载的字节数与耗时，服务端按客户端分组（见 client_bucket）维护吞吐估算：
+
+- 每组两条按下载时长加权的 EWMA（快、慢两个半衰期），估算值取两者中较小者：带宽下降时快速
+  反应，短暂的突发高速不会立刻抬高估算；
+- 样本的权重是下载耗时而不是到达时间，估算只取决于样本序列本身，测试注入相同样本得到相同结果；
+- 过小的下载（主要是请求延迟）不计入；累计字节数不足时视为没有估算，使用默认清晰度。
+
+`select_qn` 在 QUALITY_LADDER 中选择码率乘以安全系数后仍不超过估算吞吐的最高清晰度。
+"""
+import collections
+import ipaddress
+import math
+import threading
+from typing import Optional
+
+# (qn, 名称, 典型码率 kbps)：B 站 durl 单文件 MP4 各清晰度的典型码率，按清晰度从低到高排列
+QUALITY_LADDER = (
+    (16, '360P', 500),
+    (32, '480P', 900),
+    (64, '720P', 1800),
+    (80, '1080P', 3000),
+)
+QUALITY_IDS = tuple(qn for qn, _, _ in QUALITY_LADDER)
+# 没有吞吐估算（或未启用）时使用的清晰度
+DEFAULT_QN = 64
+
+
+class _Ewma:
+    """按样本权重（秒）衰减的指数加权平均；get() 对初始的零值偏差做了修正。"""
+
+    __slots__ = ('_alpha', '_estimate', '_total_weight')
+
+    def __init__(self, half_life: float):
+        self._alpha = math.exp(math.log(0.5) / half_life)
+        self._estimate = 0.0
+        self._total_weight = 0.0
+
+    def sample(self, weight: float, value: float):
+        adjusted = self._alpha ** weight
+        self._estimate = value * (1 - adjusted) + adjusted * self._estimate
+        self._total_weight += weight
+
+    def get(self) -> float:
+        return self._estimate / (1 - self._alpha ** self._total_weight)
+
+
+class _Bucket:
+    __slots__ = ('fast', 'slow', 'bytes', 'samples')
+
+    def __init__(self, fast_half_life: float, slow_half_life: float):
+        self.fast = _Ewma(fast_half_life)
+        self.slow = _Ewma(slow_half_life)
+        self.bytes = 0
+        self.samples = 0
+
+
+class BandwidthEstimator:
+    """
+    按客户端分组的吞吐估算（LRU，最多 max_buckets 组）。
+
+    使用示例:
+        estimator = BandwidthEstimator()
+        estimator.record('203.0.113.0/24', 3_000_000, 4000)   # 4 秒下载了 3MB
+        estimator.estimate_kbps('203.0.113.0/24')            # 约 6000
+        estimator.select_qn('203.0.113.0/24')                # 80（3000 kbps × 1.5 ≤ 6000）
+
+    :param fast_half_life: / slow_half_life: 两条 EWMA 的半衰期（秒，按样本的下载耗时计）。
+    :param min_sample_bytes: 小于该字节数的样本不计入（耗时主要是请求延迟而非传输）。
+    :param min_total_bytes: 累计计入的字节数达到该值后才给出估算。
+    :param safety: 选择清晰度时要求的吞吐与码率之比（留出余量避免卡顿）。
+    :param max_qn: 自动选择时的最高清晰度。
+    :param max_buckets: 最多保留的客户端分组数。
+    """
+
+    def __init__(self, fast_half_life: float = 2.0, slow_half_life: float = 5.0, min_sample_bytes: int = 16 * 1024,
+                 min_total_bytes: int = 128 * 1024, safety: float = 1.5, max_qn: int = 80, max_buckets: int = 4096):
+        self.fast_half_life = fast_half_life
+        self.slow_half_life = slow_half_life
+        self.min_sample_bytes = min_sample_bytes
+        self.min_total_bytes = min_total_bytes
+        self.safety = max(1.0, float(safety))
+        self.max_qn = max_qn
+        self.max_buckets = max(1, max_buckets)
+        self._lock = threading.Lock()
+        self._buckets = collections.OrderedDict()
+
+    def record(self, bucket: str, nbytes: int, duration_ms: float) -> bool:
+        """计入一次下载（nbytes 字节，耗时 duration_ms 毫秒）；样本过小或无效时返回 False。"""
+        if nbytes < self.min_sample_bytes or duration_ms <= 0:
+            return False
+        seconds = duration_ms / 1000.0
+        kbps = nbytes * 8 / 1000.0 / seconds
+        with self._lock:
+            entry = self._buckets.get(bucket)
+            if entry is None:
+                entry = self._buckets[bucket] = _Bucket(self.fast_half_life, self.slow_half_life)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(bucket)
+            entry.fast.sample(seconds, kbps)
+            entry.slow.sample(seconds, kbps)
+            entry.bytes += nbytes
+            entry.samples += 1
+        return True
+
+    def estimate_kbps(self, bucket: str) -> Optional[float]:
+        """该分组的吞吐估算（kbps）；样本不足时返回 None。"""
+        with self._lock:
+            entry = self._buckets.get(bucket)
+            if entry is None or entry.bytes < self.min_total_bytes:
+                return None
+            return min(entry.fast.get(), entry.slow.get())
+
+    def select_qn(self, bucket: str, default: int = DEFAULT_QN) -> int:
+        """按吞吐估算选择清晰度；没有估算时返回 default，连最低清晰度都不满足时返回最低清晰度。"""
+        kbps = self.estimate_kbps(bucket)
+        if kbps is None:
+            return default
+        chosen = QUALITY_LADDER[0][0]
+        for qn, _, bitrate in QUALITY_LADDER:
+            if qn <= self.max_qn and bitrate * self.safety <= kbps:
+                chosen = qn
+        return chosen
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def client_bucket(address: Optional[str]) -> str:
+    """
+    客户端分组：IPv4 按 /24、IPv6 按 /48 归组（同一网络的客户端链路条件相近，也不必保存完整地址）。
+
+    无法解析的地址归入 'unknown'。
+    """
+    try:
+        ip = ipaddress.ip_address((address or '').strip())
+    except ValueError:
+        return 'unknown'
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f'{ip}/{prefix}', strict=False))
+
+
+def parse_qn(value) -> Optional[int]:
+    """解析客户端指定的清晰度（?qn=），只接受 QUALITY_LADDER 中的值，否则返回 None。"""
+    try:
+        qn = int(value)
+    except (TypeError, ValueError):
+        return None
+    return qn if qn in QUALITY_IDS else None
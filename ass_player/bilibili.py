@@ -11,7 +11,12 @@ import json
 import logging
 import ipaddress
 import socket
-from typing import Optional
+import collections
+import io
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from typing import Dict, List, Optional, Sequence
 from urllib.parse import urlparse as urllib_parse  # 使用 urllib.parse 进行 URL 解析，减少对重型库的依赖
 from urllib.parse import parse_qsl, urlencode, urlunparse
 import time
@@ -21,6 +26,19 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from ass_player import metrics
+from ass_player.bandwidth import DEFAULT_QN
+from ass_player.circuit import CircuitBreaker, CircuitOpenError
+from ass_player.danmaku import DanmakuCache, danmaku_to_ass, iter_danmaku
+from ass_player.deadline import AdaptiveTimeout, Deadline, DeadlineExceeded
+from ass_player.ratelimit import THROTTLE_STATUSES, AdaptiveTokenBucket, UpstreamRateLimited, get_upstream_bucket
+from ass_player.scheduler import BACKGROUND, INTERACTIVE, ResolveScheduler, SchedulerTimeout
+from ass_player.seasons import Season, SeasonCache, parse_ugc_season
+from ass_player.subtitles import (MAX_SUBTITLE_BYTES, SubtitleCache, bcc_to_ass, bcc_to_vtt, is_subtitle_url_allowed,
+                                  parse_subtitle_list, subtitle_links)
+from ass_player.strategies import PlayurlStrategies, PlayurlStrategy, WbiKeys, wbi_keys_from_nav
+from ass_player.timing import StageTimings, stage
+
 # 初始化日志记录器
 logger = logging.getLogger(__name__)
 
@@ -32,6 +50,7 @@ def _is_private_host(hostname: str) -> bool:
     :param hostname: 需要检查的主机名。
     :return: 如果主机名解析为私有地址，则返回 True，否则返回 False。
     """
+    start = time.perf_counter()
     try:
         # 解析主机名到 IP 地址列表（一个主机名可能对应多个 IP）
         for res in socket.getaddrinfo(hostname, None):
@@ -44,8 +63,92 @@ def _is_private_host(hostname: str) -> bool:
     except Exception:
         # 如果 DNS 解析失败，我们假设它不是私有地址，以避免误报
         logger.debug("主机名 %s 的 DNS 解析失败", hostname)
+    finally:
+        metrics.DNS_CHECK_LATENCY.observe(time.perf_counter() - start)
     return False
 
+# B 站视频 CDN 的域名后缀；upos-* 主机也会出现在 Akamai 的 akamaized.net 下
+BILIBILI_CDN_SUFFIXES = ('.bilivideo.com', '.bilivideo.cn')
+AKAMAI_CDN_SUFFIX = '.akamaized.net'
+
+
+def is_bilibili_cdn_host(hostname: str) -> bool:
+    """
+    主机名是否属于 B 站视频 CDN。
+
+    前端上报与后台探测都只接受这些主机：探测会把最近的签名直链发往已知主机，
+    不能让客户端上报的任意 upos-* 主机名（如 upos-x.attacker.example）进入统计。
+    """
+    host = (hostname or '').strip().lower().rstrip('.')
+    if not host or '/' in host or ':' in host:
+        return False
+    if host.endswith(BILIBILI_CDN_SUFFIXES):
+        return True
+    return host.startswith('upos-') and host.endswith(AKAMAI_CDN_SUFFIX)
+
+
+def _url_deadline(url: str) -> Optional[float]:
+    """读取 B 站直链签名中的 `deadline=`（Unix 秒）；不存在或无法解析时返回 None。"""
+    try:
+        for key, value in parse_qsl(urllib_parse(url).query):
+            if key == 'deadline':
+                return float(value)
+    except Exception:
+        logger.debug('解析直链 deadline 失败: %s', url)
+    return None
+
+
+class ResolveContext:
+    """
+    单次解析的上下文。
+
+    由调用方创建并传给 `BiliBiliParser.get_real_url(url, ctx=ctx)`，用于在不改变返回值的前提下
+    收集解析过程中的附加信息（例如可供客户端故障切换的候选直链列表）。
+    """
+
+    def __init__(self, timings: bool = False, deadline: Optional[Deadline] = None, subtitles: bool = False,
+                 qn: Optional[int] = None):
+        """
+        :param timings: 是否记录分阶段耗时（view / playurl / ssrf / cdn）；关闭时几乎没有额外开销。
+        :param deadline: 本次解析的截止时间（见 ass_player.deadline）；调度排队、上游调用与重试都不会超过它。
+        :param subtitles: 是否与 playurl 并发获取 CC 字幕列表（结果见 `subtitles`）。
+        :param qn: 请求的清晰度（见 ass_player.bandwidth.QUALITY_LADDER），None 表示策略默认的 720P。
+        """
+        # 已排序的候选直链：[{ 'url': str, 'host': str, 'source': 'cdn_rewrite'|'primary'|'backup' }]
+        self.candidates = []
+        # playurl 返回的 durl[0].backup_url 原始列表（未经安全检查）
+        self.backup_urls = []
+        # 分阶段耗时记录；为 None 表示未启用计时
+        self.timings = StageTimings() if timings else None
+        # 上游熔断导致解析失败时，建议客户端多少秒后重试（见 BiliBiliParser 的熔断器）
+        self.retry_after = None
+        self.deadline = deadline
+        self.want_subtitles = subtitles
+        # CC 字幕列表（见 ass_player.subtitles.subtitle_links）；未请求或尚未获取时为 None
+        self.subtitles = None
+        self.qn = qn
+
+
+class _PlayurlAnswer:
+    """一个 playurl 策略的尝试结果（见 BiliBiliParser._race_playurl）。"""
+
+    __slots__ = ('strategy', 'timings', 'video_url', 'backup_urls', 'error')
+
+    def __init__(self, strategy: PlayurlStrategy, timings: Optional[StageTimings]):
+        self.strategy = strategy
+        # 该次尝试自己的分阶段计时（playurl / queue / ssrf），胜出时合并到解析上下文
+        self.timings = timings
+        self.video_url = None
+        self.backup_urls = []
+        self.error = None
+
+    @property
+    def result(self) -> str:
+        if self.video_url:
+            return 'valid'
+        return 'error' if self.error is not None else 'invalid'
+
+
 class BiliBiliParser:
     """
     Bilibili 视频解析器。
@@ -58,32 +161,100 @@ class BiliBiliParser:
         video_url = parser.get_real_url("https://www.bilibili.com/video/BV1...")
     """
 
-    def __init__(self, session: Optional[requests.Session] = None, timeout: int = 10, cache_path: Optional[str] = None, disk_cache_conn: Optional[object] = None):
+    # B 站 API 的默认地址；压测或测试时可通过构造参数 api_base 指向本地桩服务
+    DEFAULT_API_BASE = 'https://api.bilibili.com'
+    # 解析结果缓存：最多保留的条目数，以及距签名 deadline 不足多少秒即视为过期
+    RESOLVE_CACHE_MAX = 256
+    RESOLVE_CACHE_MARGIN = 120
+    # 磁盘解析结果表（cache）：过期行的清理间隔（秒）与每批删除的行数
+    DISK_COMPACT_INTERVAL = 600
+    DISK_COMPACT_BATCH = 500
+    # 被上游限流（429 / 412）后经令牌桶重试的次数
+    THROTTLE_RETRIES = 1
+    # 按端点（/view、/playurl）的熔断器：连续失败次数阈值与打开后进入 half-open 的秒数
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RESET_TIMEOUT = 30.0
+    # 上游 5xx 与连接错误的重试：退避 0.5s 起按 2 倍递增（剩余预算不足以退避时不再重试）
+    BACKOFF_FACTOR = 0.5
+    RETRY_STATUSES = (502, 503, 504)
+    # 自适应超时的下限（秒）；上限为构造参数 timeout
+    ADAPTIVE_TIMEOUT_FLOOR = 1.0
+    # 错峰发起 playurl 策略所用的线程数（每个解析器）
+    STRATEGY_WORKERS = 32
+    # 并行预解析合集分集所用的线程数（每个解析器）
+    SEASON_WORKERS = 8
+
+    def __init__(self, session: Optional[requests.Session] = None, timeout: int = 10, cache_path: Optional[str] = None, disk_cache_conn: Optional[object] = None,
+                 api_base: Optional[str] = None, shared_cache: Optional[object] = None,
+                 rate_limiter: Optional[AdaptiveTokenBucket] = None, scheduler: Optional[ResolveScheduler] = None,
+                 retries: int = 3, playurl_strategies: Optional[Sequence[str]] = None):
         """
         初始化 BiliBiliParser。
 
         :param session: 可选的 requests.Session 对象。如果未提供，将创建一个新的会话。
-        :param timeout: 网络请求的默认超时时间（秒）。
+        :param timeout: 单次上游请求的超时上限（秒）；积累足够样本后按端点的实际耗时自适应缩短。
         :param cache_path: 本地磁盘缓存文件路径（如 None 则默认 'bilibili_cache.db'）。
+        :param api_base: B 站 API 地址（默认 https://api.bilibili.com），不含末尾斜杠。
+        :param shared_cache: 可选的跨进程共享缓存（cache_manager.CacheManager），作为解析结果的二级缓存，
+            多个 worker / 实例之间共享已解析的直链。
+        :param rate_limiter: 上游 API 请求的令牌桶，默认使用进程内共用的令牌桶（ratelimit.get_upstream_bucket）。
+        :param scheduler: 交互 / 后台两条通道的解析调度器（见 ass_player.scheduler），默认按默认参数创建。
+        :param retries: 上游 5xx 或连接错误时的最多重试次数（受 ctx.deadline 剩余预算限制）。
+        :param playurl_strategies: 启用的 playurl 请求策略名（见 ass_player.strategies），默认全部已登记策略。
         """
         if session is None:
             # 如果没有提供 session，则创建一个新的
             session = requests.Session()
-            # 配置重试逻辑：总共重试 3 次，退避因子为 0.5，对特定状态码进行重试
-            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504))
-            adapter = HTTPAdapter(max_retries=retries)
+            # 重试不交给 urllib3：由 _api_get 按解析的剩余预算决定是否重试（见 ass_player.deadline），
+            # 429 也不在此重试，限流由共用令牌桶统一降速，避免各线程同时退避、同时重试
+            adapter = HTTPAdapter(max_retries=Retry(total=0, read=False, status_forcelist=()))
             # 为 HTTP 和 HTTPS 协议挂载适配器
             session.mount("https://", adapter)
             session.mount("http://", adapter)
         
         self.session = session
         self.timeout = timeout
+        self.retries = max(0, int(retries))
+        self.api_base = (api_base or self.DEFAULT_API_BASE).rstrip('/')
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_upstream_bucket()
+        self.scheduler = scheduler if scheduler is not None else ResolveScheduler()
+        # 按端点创建的熔断器：{ '/view': CircuitBreaker, '/playurl': CircuitBreaker }
+        self.breakers = {}
+        self._breakers_lock = threading.Lock()
+        # 按端点的自适应超时：{ '/view': AdaptiveTimeout, ... }，与熔断器共用锁创建
+        self.adaptive_timeouts = {}
+        # playurl 策略表及其统计；WBI 签名密钥缓存；错峰发起策略的线程池（首次需要时创建）
+        self.playurl_strategies = PlayurlStrategies(playurl_strategies)
+        self.wbi_keys = WbiKeys()
+        self._strategy_pool = None
+        self._strategy_pool_lock = threading.Lock()
+        # 合集（ugc_season）分集列表缓存：view 响应中顺带记录，之后同一合集的分集无需再调用 view
+        self.seasons = SeasonCache()
+        self._season_pool = None
+        # CC 字幕列表与转换结果，按 cid 缓存
+        self.subtitles = SubtitleCache()
+        # 转换为 ASS 的弹幕，按 cid 缓存
+        self.danmaku = DanmakuCache()
         # 内存 CDN 统计缓存：
         # 格式: { hostname: { 'is_china': bool|None, 'count': int, 'avg_load': float } }
         # 由运行时记录加载成功的时间来更新 `avg_load`，并由 `_get_best_china_host` 返回最快的国内 CDN
         self._cdn_stats = {}
         # 全局最优国内 CDN hostname（基于历史平均加载时间）
         self._best_china_host = None
+        # CDN 统计可能被请求线程与后台探测线程同时更新，使用可重入锁保护内存统计与磁盘写入
+        self._cdn_lock = threading.RLock()
+        # 最近一次解析成功的直链，供后台 CDN 探测复用其路径与签名参数
+        self._recent_video_url = None
+        # 解析结果缓存：{ 视频页 URL: { 'url': 最终直链, 'candidates': [...], 'expires_at': float } }
+        # 仅缓存带 `deadline=` 签名的直链，过期时间由签名决定（启动预热也写入这里）
+        self._resolve_cache = {}
+        self._resolve_lock = threading.Lock()
+        # 解析结果缓存的估算字节数（供全局内存预算使用，见 cache_manager.MemoryBudget）
+        self._resolve_bytes = 0
+        # 缓存增长后的回调（由应用注册为内存预算检查），在释放锁之后调用
+        self.on_cache_grow = None
+        self.shared_cache = shared_cache
+        self._last_disk_compaction = 0.0
         # 如果外部注入了磁盘缓存连接，则保存引用并初始化磁盘表/加载数据
         self._disk_cache_conn = disk_cache_conn
         try:
@@ -107,42 +278,48 @@ class BiliBiliParser:
             'Accept-Language': 'zh-CN,zh;q=0.9',
         })
 
-    def get_real_url(self, url: str) -> Optional[str]:
+    def get_real_url(self, url: str, ctx: Optional[ResolveContext] = None, use_cache: bool = True,
+                     lane: str = INTERACTIVE) -> Optional[str]:
         """
         获取 Bilibili 视频的真实播放链接。
 
         这是解析器的主入口方法，它会按顺序尝试多种策略来获取视频链接。
         :param url: Bilibili 视频页面的 URL 或 BV 号。
+        :param ctx: 可选的解析上下文；提供时会填充按 CDN 统计排序的候选直链 `ctx.candidates`。
+        :param use_cache: 为 False 时跳过解析结果缓存强制重新解析（结果仍会写回缓存，用于预热刷新）。
+        :param lane: 调度通道：用户请求为 'interactive'（默认），预热等后台任务为 'background'。
         :return: 成功时返回视频的真实 URL，否则返回 None。
         """
         url_for_log = url
         try:
             logger.info("开始解析 Bilibili URL 或 BV 号（仅使用官方 API）: %s", url_for_log)
-
-            # 如果输入的是 BV 号，先转换为完整的 URL
-            bvid_match = re.fullmatch(r'BV[a-zA-Z0-9]{10}', url_for_log)
-            if bvid_match:
-                bvid = bvid_match.group(0)
-                url = f"https://www.bilibili.com/video/{bvid}"
-                url_for_log = url
-                logger.info("检测到 BV 号，已转换为 URL: %s", url_for_log)
-
-            # 对 URL 进行基本验证
-            if not url or 'bilibili.com' not in url:
-                logger.warning("输入内容不是有效的 Bilibili URL 或 BV 号: %s", url_for_log)
+            url = self._normalize_url(url)
+            if url is None:
                 return None
+            url_for_log = url
+
+            key = self._resolution_key(url, ctx)
+            if use_cache:
+                cached = self._get_cached_resolution(key, ctx)
+                if cached is not None:
+                    return cached
 
             # 解析流程：仅使用官方 API 获取 720P MP4 链接
             try:
-                mp4_url = self._get_720p_mp4(url)
+                # 缓存未命中才需要调用上游：按通道排队，交互请求优先于后台任务
+                with self.scheduler.slot(lane, timeout=self._schedule_timeout(ctx)) as waited:
+                    self._record_schedule_wait(ctx, waited)
+                    mp4_url = self._get_720p_mp4(url) if ctx is None else self._get_720p_mp4(url, ctx=ctx)
                 if mp4_url:
-                    # 优化：仅使用官方 API 得到的直链，并对某些镜像域名做无阻塞的主机替换（不发起网络验证）
-                    final_url = self._try_convert_cdn_url(mp4_url)
-                    # 不再缓存解析结果，直接返回最终 URL
-                    return final_url
+                    return self._finish_resolution(key, mp4_url, ctx)
                 else:
                     logger.warning("官方 API 未返回有效的 720P MP4 链接: %s", url)
                     return None
+            except SchedulerTimeout as ex:
+                logger.warning("解析 %s 时等待调度超时: %s", url_for_log, ex)
+                return None
+            except CircuitOpenError as ex:
+                return self._resolve_while_open(key, ctx, ex)
             except Exception as ex:
                 logger.exception("通过官方 API 解析 %s 时发生异常: %s", url_for_log, ex)
                 return None
@@ -154,70 +331,815 @@ class BiliBiliParser:
                 logger.exception("解析时发生未知异常（无法记录 URL）")
             return None
 
+    @staticmethod
+    def _resolution_key(url: str, ctx: Optional[ResolveContext] = None) -> str:
+        """
+        解析结果缓存的 key：默认清晰度沿用视频 URL（与预热、热点统计一致），其他清晰度追加 #qn=。
+
+        预热器只保持默认清晰度的 key：自适应选择其他清晰度的请求不命中预热结果，每个 (URL, qn)
+        首次请求时冷解析一次，之后按各自的 key 缓存。
+        """
+        qn = ctx.qn if ctx is not None else None
+        return url if qn is None or qn == DEFAULT_QN else f'{url}#qn={qn}'
+
+    def _resolve_while_open(self, url: str, ctx: Optional[ResolveContext], ex: CircuitOpenError) -> Optional[str]:
+        """熔断期间：返回签名尚未过期的缓存直链（即使已临近过期），否则立即失败并在 ctx 中给出重试时间。"""
+        cached = self._get_cached_resolution(url, ctx, stale_ok=True)
+        if cached is not None:
+            logger.warning("%s，使用缓存的直链: %s", ex, url)
+            return cached
+        logger.warning("%s，放弃解析: %s", ex, url)
+        if ctx is not None:
+            ctx.retry_after = max(1, int(ex.retry_after + 0.999))
+        return None
+
+    def _schedule_timeout(self, ctx: Optional[ResolveContext]) -> float:
+        """调度排队最多等待 timeout 秒，且不超过本次解析的剩余预算。"""
+        deadline = ctx.deadline if ctx is not None else None
+        return deadline.cap(self.timeout) if deadline is not None else self.timeout
+
+    @staticmethod
+    def _record_schedule_wait(ctx: Optional[ResolveContext], waited: float):
+        """把调度器中的排队时间计入 `schedule` 阶段（未排队时不输出该阶段）。"""
+        if ctx is not None and ctx.timings is not None and waited > 0:
+            ctx.timings.add('schedule', waited * 1000.0)
+
+    def _normalize_url(self, url: str) -> Optional[str]:
+        """把 BV 号转换为完整的视频页 URL，并做基本的域名校验；无效输入返回 None。"""
+        # 如果输入的是 BV 号，先转换为完整的 URL
+        bvid_match = re.fullmatch(r'BV[a-zA-Z0-9]{10}', url or '')
+        if bvid_match:
+            url = f"https://www.bilibili.com/video/{bvid_match.group(0)}"
+            logger.info("检测到 BV 号，已转换为 URL: %s", url)
+
+        # 对 URL 进行基本验证
+        if not url or 'bilibili.com' not in url:
+            logger.warning("输入内容不是有效的 Bilibili URL 或 BV 号: %s", url)
+            return None
+        return url
+
+    def _finish_resolution(self, url: str, mp4_url: str, ctx: Optional[ResolveContext] = None) -> str:
+        """
+        官方 API 返回直链之后的处理：CDN 主机替换、候选排序与写入解析结果缓存。
+
+        候选排序包含逐个候选的 SSRF DNS 检查，属于阻塞操作；异步解析器在线程中调用本方法。
+        """
+        # 优化：仅使用官方 API 得到的直链，并对某些镜像域名做无阻塞的主机替换（不发起网络验证）
+        timings = ctx.timings if ctx is not None else None
+        with stage(timings, 'cdn'):
+            final_url = self._try_convert_cdn_url(mp4_url)
+        # 记录最近一次真实直链（仅内存引用，供 CDN 探测使用）
+        self._recent_video_url = mp4_url
+        if ctx is not None:
+            with stage(timings, 'candidates'):
+                ctx.candidates = self._rank_candidates(final_url, mp4_url, ctx.backup_urls)
+        self._store_resolution(url, final_url, ctx.candidates if ctx is not None else None)
+        return final_url
+
+    def get_season(self, url: str, ctx: Optional[ResolveContext] = None, lane: str = INTERACTIVE) -> Optional[Season]:
+        """
+        返回视频所属的合集（分集按播放顺序排列）；视频不属于合集时返回 None。
+
+        合集已缓存时不访问上游，否则调用一次 view 接口。上游失败（包括熔断、调度超时与超出预算）
+        时抛出异常，由调用方区分“不属于合集”与“暂时无法获取”。
+        """
+        url = self._normalize_url(url)
+        bvid = self._extract_bvid(url) if url else None
+        if not bvid:
+            raise ValueError('无法从 URL 中提取 BV 号')
+        season = self.seasons.season_for(bvid)
+        if season is not None:
+            return season
+        deadline = ctx.deadline if ctx is not None else None
+        timings = ctx.timings if ctx is not None else None
+        with self.scheduler.slot(lane, timeout=self._schedule_timeout(ctx)) as waited:
+            self._record_schedule_wait(ctx, waited)
+            api_url, params = self._view_request(bvid)
+            with stage(timings, 'view'):
+                data = self._api_get('/view', api_url, params, timings, deadline).json()
+        if self._parse_view(data) is None:
+            raise ValueError(f"view 接口返回错误: {data.get('message')}")
+        return self.seasons.season_for(bvid)
+
+    def resolve_episodes(self, season: Season, start: int, count: int,
+                         deadline: Optional[Deadline] = None) -> Dict[str, Optional[str]]:
+        """
+        并行解析合集中从 start 开始的 count 集，返回 {bvid: 直链或 None}。
+
+        第 start 集（用户正要观看的一集）走交互通道并受 deadline 限制；其余预解析走后台通道，不受本次
+        请求的预算限制。最多等待到 deadline，届时仍未完成的分集返回 None，但解析会在后台继续并写入
+        解析结果缓存，用户播放到时直接命中。
+        """
+        episodes = season.episodes[max(0, start):max(0, start) + max(0, count)]
+        pool = self._season_executor()
+        futures = {}
+        for i, ep in enumerate(episodes):
+            ctx, lane = (ResolveContext(deadline=deadline), INTERACTIVE) if i == 0 else (ResolveContext(), BACKGROUND)
+            futures[pool.submit(self.get_real_url, f"https://www.bilibili.com/video/{ep.bvid}", ctx, True, lane)] = ep.bvid
+        done, _ = wait_futures(futures, timeout=deadline.remaining() if deadline is not None else None)
+        return {bvid: (future.result() if future in done else None) for future, bvid in futures.items()}
+
+    def get_subtitles(self, url: str, ctx: Optional[ResolveContext] = None) -> List[dict]:
+        """
+        返回视频的 CC 字幕列表（见 subtitle_links）；解析结果缓存命中、没有经过 _get_720p_mp4 时使用。
+
+        cid 依次取自字幕缓存、合集缓存，都没有时调用一次 view。获取失败时返回空列表，不影响视频解析结果。
+        """
+        deadline = ctx.deadline if ctx is not None else None
+        try:
+            url = self._normalize_url(url)
+            bvid = self._extract_bvid(url) if url else None
+            if not bvid:
+                return []
+            cid = self._lookup_cid(bvid, ctx)
+            if cid is None:
+                return []
+            return subtitle_links(bvid, cid, self._subtitle_tracks(bvid, cid, deadline))
+        except Exception as ex:
+            logger.warning("获取 %s 的字幕列表失败: %s", url, ex)
+            return []
+
+    def get_danmaku_ass(self, bvid: str, cid=None, ctx: Optional[ResolveContext] = None) -> Optional[str]:
+        """
+        返回转换为 ASS 的弹幕（见 ass_player.danmaku），按 cid 缓存；未给出 cid 时按 _lookup_cid 查找（分 P 视频为第一 P）。
+
+        客户端给出的 cid 与字幕接口一样校验归属：未缓存时先确认属于该视频（见 _cid_belongs_to），
+        已缓存时要求与缓存中的 bvid 一致（ASS 标题含 bvid）。找不到 cid 或 cid 不属于 bvid 时返回 None，
+        上游失败时抛出异常。响应体与全部弹幕在转换期间驻留内存，上界见 ass_player.danmaku 的模块说明。
+        """
+        if cid is None:
+            cid = self._lookup_cid(bvid, ctx)
+            if cid is None:
+                return None
+            verified = True
+        else:
+            verified = False
+        cached_bvid = self.danmaku.bvid_for(cid)
+        if cached_bvid is not None and cached_bvid != bvid:
+            return None
+        text = self.danmaku.get(cid)
+        if text is not None:
+            return text
+        if not verified and not self._cid_belongs_to(bvid, cid, ctx):
+            return None
+        api_url, params = self._danmaku_request(cid)
+        with self.scheduler.slot(INTERACTIVE, timeout=self._schedule_timeout(ctx)):
+            r = self._api_get('/dm/list', api_url, params, None, ctx.deadline if ctx is not None else None)
+        r.raise_for_status()
+        # 响应体（已解压的 XML 字节）交给 iterparse 增量解析，不构建 DOM 树
+        text = danmaku_to_ass(iter_danmaku(io.BytesIO(r.content)), title=f'{bvid} 弹幕')
+        self.danmaku.put(cid, text, bvid)
+        return text
+
+    def get_subtitle_text(self, bvid: str, cid, lan: str, fmt: str, ctx: Optional[ResolveContext] = None) -> Optional[str]:
+        """
+        返回转换为 fmt（'ass' / 'vtt'）的字幕文本；该 cid 没有这种语言的字幕或不属于 bvid 时返回 None。
+
+        bvid 与 cid 来自客户端：字幕列表尚未缓存时先用 view 确认 cid 属于该视频（见 _cid_belongs_to），
+        已缓存时要求与缓存中的 bvid 一致，避免任意组合写入缓存。首次请求时下载 BCC 正文并转换，
+        下载与其他上游请求一样经过调度器、熔断器、令牌桶与截止时间；结果按 cid 缓存，上游失败时抛出异常。
+        """
+        deadline = ctx.deadline if ctx is not None else None
+        cached_bvid = self.subtitles.bvid_for(cid)
+        if cached_bvid is not None and cached_bvid != bvid:
+            return None
+        text = self.subtitles.text(cid, lan, fmt)
+        if text is not None:
+            return text
+        tracks = self.subtitles.tracks(cid)
+        if tracks is None:
+            if not self._cid_belongs_to(bvid, cid, ctx):
+                return None
+            tracks = self._subtitle_tracks(bvid, cid, deadline)
+        track = next((t for t in tracks if t['lan'] == lan), None)
+        if track is None:
+            return None
+        if not is_subtitle_url_allowed(track['url']):
+            raise ValueError(f"字幕地址不在允许的主机上: {track['url']}")
+        with self.scheduler.slot(INTERACTIVE, timeout=self._schedule_timeout(ctx)):
+            r = self._api_get('/subtitle', track['url'], {}, None, deadline)
+        r.raise_for_status()
+        if len(r.content) > MAX_SUBTITLE_BYTES:
+            raise ValueError('字幕正文过大')
+        bcc = r.json()
+        text = bcc_to_ass(bcc, title=f"{bvid} {track['lan_doc']}") if fmt == 'ass' else bcc_to_vtt(bcc)
+        self.subtitles.put_text(cid, lan, fmt, text)
+        return text
+
+    def _cid_belongs_to(self, bvid: str, cid, ctx: Optional[ResolveContext] = None) -> bool:
+        """cid 是否为该视频的分 P（或合集缓存中该集的 cid）；不在缓存中时调用一次 view 确认。"""
+        if self.seasons.cid_for(bvid) == cid:
+            return True
+        with self.scheduler.slot(INTERACTIVE, timeout=self._schedule_timeout(ctx)):
+            api_url, params = self._view_request(bvid)
+            data = self._api_get('/view', api_url, params, None, ctx.deadline if ctx is not None else None).json()
+        if self._parse_view(data) is None:
+            return False
+        view = data.get('data') or {}
+        cids = {view.get('cid')} | {page.get('cid') for page in view.get('pages') or ()}
+        return cid in cids
+
+    def _lookup_cid(self, bvid: str, ctx: Optional[ResolveContext] = None):
+        """bvid 对应的 cid：依次取自字幕缓存、合集缓存，都没有时调用一次 view；失败时返回 None。"""
+        cid = self.subtitles.cid_for(bvid) or self.seasons.cid_for(bvid)
+        if cid is None:
+            with self.scheduler.slot(INTERACTIVE, timeout=self._schedule_timeout(ctx)):
+                api_url, params = self._view_request(bvid)
+                cid = self._parse_view(self._api_get('/view', api_url, params, None,
+                                                     ctx.deadline if ctx is not None else None).json())
+        return cid
+
+    def _danmaku_request(self, cid):
+        """弹幕列表接口（XML，deflate 压缩由 requests 解开）的地址与参数。"""
+        return f"{self.api_base}/x/v1/dm/list.so", {"oid": cid}
+
+    def _subtitle_list_request(self, bvid: str, cid):
+        """player/v2 接口（字幕列表）的地址与参数（同步与异步解析器共用）。"""
+        return f"{self.api_base}/x/player/v2", {"bvid": bvid, "cid": cid}
+
+    def _subtitle_tracks(self, bvid: str, cid, deadline: Optional[Deadline] = None) -> List[dict]:
+        """该 cid 的字幕列表（含上游正文地址），优先使用缓存。"""
+        tracks = self.subtitles.tracks(cid)
+        if tracks is None:
+            api_url, params = self._subtitle_list_request(bvid, cid)
+            tracks = parse_subtitle_list(self._api_get('/player/v2', api_url, params, None, deadline).json())
+            self.subtitles.put_tracks(bvid, cid, tracks)
+        return tracks
+
+    def _collect_subtitles(self, future, bvid: str, cid, deadline: Optional[Deadline]) -> List[dict]:
+        """等待并发获取的字幕列表（最多等到 deadline）；失败或超时时返回空列表。"""
+        try:
+            tracks = future.result(timeout=deadline.remaining() if deadline is not None else self.timeout)
+        except Exception as ex:
+            logger.warning("获取字幕列表失败（不影响视频解析）: %s", ex)
+            return []
+        return subtitle_links(bvid, cid, tracks)
+
+    def _season_executor(self) -> ThreadPoolExecutor:
+        if self._season_pool is None:
+            with self._strategy_pool_lock:
+                if self._season_pool is None:
+                    self._season_pool = ThreadPoolExecutor(self.SEASON_WORKERS, thread_name_prefix='season')
+        return self._season_pool
+
+    def _extract_bvid(self, url: str) -> Optional[str]:
+        """从 URL 中提取 BV 号。"""
+        bvid_match = re.search(r'BV[a-zA-Z0-9]{10}', url)
+        if not bvid_match:
+            return None
+        logger.debug("从 URL 中提取到 BV 号: %s", bvid_match.group(0))
+        return bvid_match.group(0)
+
+    def _view_request(self, bvid: str):
+        """view 接口的地址与参数（同步与异步解析器共用）。"""
+        return f"{self.api_base}/x/web-interface/view", {"bvid": bvid}
+
+    def _playurl_request(self, bvid: str, cid, strategy: PlayurlStrategy, wbi_keys=None, qn: Optional[int] = None):
+        """按策略构造 playurl 接口的地址与参数（同步与异步解析器共用）。"""
+        return strategy.request(self.api_base, bvid, cid, wbi_keys, qn)
+
+    def _nav_request(self):
+        """nav 接口（提供 WBI 签名密钥）的地址与参数。"""
+        return f"{self.api_base}/x/web-interface/nav", {}
+
+    def _store_wbi_keys(self, data: dict):
+        keys = wbi_keys_from_nav(data)
+        if keys is None:
+            raise ValueError('nav 响应中没有 wbi_img，无法进行 WBI 签名')
+        self.wbi_keys.set(keys)
+        return keys
+
+    def _parse_view(self, data: dict):
+        """从 view 响应中取出 cid（视频属于合集时顺带缓存合集的分集列表）；失败时返回 None。"""
+        if data.get('code') != 0:
+            logger.warning("API /view 请求失败: %s", data.get('message'))
+            return None
+        season = parse_ugc_season(data)
+        if season is not None:
+            self.seasons.put(season)
+        cid = (data.get('data') or {}).get('cid')
+        if cid is None:
+            logger.warning("在 /view 响应中未找到 cid")
+        return cid
+
+    def _parse_playurl(self, data: dict):
+        """从 playurl 响应中取出 durl[0] 的直链与 backup_url 列表；没有有效 durl 时返回 (None, [])。"""
+        if data.get('code') == 0:
+            data2 = data.get('data', {})
+            if 'durl' in data2 and data2['durl']:
+                first = data2['durl'][0]
+                return first.get('url'), list(first.get('backup_url') or [])
+        return None, []
+
     def __del__(self):
         # 不再使用磁盘缓存或持有外部连接，因此无需在析构时关闭任何缓存连接
         return
 
 
-    def _get_720p_mp4(self, url: str) -> Optional[str]:
+    def _get_cached_resolution(self, url: str, ctx: Optional[ResolveContext] = None, stale_ok: bool = False,
+                               local: bool = True, shared: bool = True) -> Optional[str]:
+        """
+        查询解析结果缓存；命中时同时把缓存的候选直链填入 ctx。
+
+        距签名 deadline 不足 RESOLVE_CACHE_MARGIN 秒的条目正常情况下视为未命中（需要重新解析），
+        但在 deadline 之前仍保留，stale_ok=True（上游熔断期间）时照常返回。
+
+        local / shared 分别控制是否查询本进程缓存与共享缓存。共享缓存（SQLite / Redis）是阻塞 I/O：
+        异步解析器先在事件循环中以 shared=False 查本进程缓存，未命中时再在线程中以 local=False 查共享缓存。
+        """
+        start = time.perf_counter()
+        entry = None
+        if local:
+            now = time.time()
+            with self._resolve_lock:
+                entry = self._resolve_cache.get(url)
+                if entry is not None:
+                    if entry['expires_at'] + self.RESOLVE_CACHE_MARGIN <= now:
+                        self._resolve_pop_locked(url)
+                        entry = None
+                    elif entry['expires_at'] <= now and not stale_ok:
+                        entry = None
+            metrics.record_cache_lookup('resolve', entry is not None)
+        if entry is None and shared:
+            entry = self._get_shared_resolution(url)
+        if entry is None:
+            return None
+        if ctx is not None:
+            ctx.candidates = list(entry['candidates'] or [])
+            if ctx.timings is not None:
+                ctx.timings.add('cache', (time.perf_counter() - start) * 1000.0)
+        return entry['url']
+
+    def _store_resolution(self, url: str, final_url: str, candidates: Optional[list] = None) -> Optional[float]:
+        """把解析结果写入缓存，返回缓存过期时间；直链不带 deadline 签名时不缓存并返回 None。"""
+        deadline = _url_deadline(final_url)
+        if deadline is None:
+            return None
+        expires_at = deadline - self.RESOLVE_CACHE_MARGIN
+        if expires_at <= time.time():
+            return None
+        with self._resolve_lock:
+            self._resolve_put_locked(url, {'url': final_url, 'candidates': candidates, 'expires_at': expires_at})
+        self._notify_cache_grow()
+        self._persist_resolution(url, final_url, candidates, expires_at)
+        if self.shared_cache is not None:
+            try:
+                self.shared_cache.set(url, {'url': final_url, 'candidates': candidates, 'expires_at': expires_at},
+                                      ttl=expires_at - time.time(), namespace='resolve_shared')
+            except Exception:
+                logger.exception('写入共享解析缓存失败')
+        return expires_at
+
+    def _persist_resolution(self, url: str, final_url: str, candidates: Optional[list], expires_at: float):
+        """把解析结果写入磁盘 cache 表（重启后由 _load_disk_resolutions 恢复），并按间隔清理过期行。"""
+        conn = getattr(self, '_disk_cache_conn', None)
+        if conn is None:
+            return
+        now = time.time()
+        try:
+            with self._cdn_lock:
+                conn.execute("INSERT OR REPLACE INTO cache (key, url, ts, expires_at, candidates) VALUES (?, ?, ?, ?, ?)",
+                             (url, final_url, now, expires_at,
+                              json.dumps(candidates, separators=(',', ':')) if candidates is not None else None))
+                conn.commit()
+        except Exception:
+            logger.exception('将解析结果写入磁盘时发生异常: %s', url)
+            return
+        if now - self._last_disk_compaction >= self.DISK_COMPACT_INTERVAL:
+            self.compact_disk_cache()
+
+    def compact_disk_cache(self) -> int:
+        """分批删除磁盘 cache 表中已过期的行（每批单独提交，避免长时间占用写锁），返回删除行数。"""
+        conn = getattr(self, '_disk_cache_conn', None)
+        if conn is None:
+            return 0
+        self._last_disk_compaction = now = time.time()
+        removed = 0
+        try:
+            while True:
+                with self._cdn_lock:
+                    cur = conn.execute("DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE expires_at IS NULL OR expires_at <= ? LIMIT ?)",
+                                       (now, self.DISK_COMPACT_BATCH))
+                    conn.commit()
+                removed += cur.rowcount
+                if cur.rowcount < self.DISK_COMPACT_BATCH:
+                    break
+        except Exception:
+            logger.exception('清理磁盘解析结果时发生异常')
+        if removed:
+            logger.info('已清理 %d 条过期的磁盘解析结果', removed)
+        return removed
+
+    def _load_disk_resolutions(self, cur) -> int:
+        """一次查询加载磁盘中未过期的解析结果（最多 RESOLVE_CACHE_MAX 条，优先保留过期最晚的）。"""
+        cur.execute("SELECT key, url, candidates, expires_at FROM cache WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                    (time.time(), self.RESOLVE_CACHE_MAX))
+        rows = cur.fetchall()
+        with self._resolve_lock:
+            # 按过期时间升序插入，容量淘汰时先淘汰最早过期的条目
+            for key, final_url, candidates, expires_at in reversed(rows):
+                try:
+                    self._resolve_put_locked(key, {'url': final_url, 'candidates': json.loads(candidates) if candidates else [],
+                                                   'expires_at': expires_at})
+                except ValueError:
+                    logger.debug('跳过无法解析的磁盘解析结果: %s', key)
+        self._notify_cache_grow()
+        if rows:
+            logger.info('已从磁盘恢复 %d 条解析结果', len(rows))
+        return len(rows)
+
+    def _get_shared_resolution(self, url: str) -> Optional[dict]:
+        """查询共享缓存（其他 worker / 实例写入的解析结果），命中时回填本进程缓存。"""
+        if self.shared_cache is None:
+            return None
+        try:
+            entry = self.shared_cache.get(url, namespace='resolve_shared')
+        except Exception:
+            logger.exception('读取共享解析缓存失败')
+            return None
+        if not isinstance(entry, dict) or not entry.get('url') or entry.get('expires_at', 0) <= time.time():
+            return None
+        with self._resolve_lock:
+            self._resolve_put_locked(url, entry)
+        self._notify_cache_grow()
+        return entry
+
+    @staticmethod
+    def _resolve_entry_bytes(key: str, entry: dict) -> int:
+        """估算一条解析结果占用的内存：字符串长度加上 dict / list 的固定开销。"""
+        size = 300 + len(key) + len(entry.get('url') or '')
+        for cand in entry.get('candidates') or ():
+            size += 250 + len(cand.get('url') or '') + len(cand.get('host') or '')
+        return size
+
+    def _resolve_put_locked(self, key: str, entry: dict):
+        """写入解析结果缓存（调用方持有 _resolve_lock）；超出上限时按插入顺序淘汰最旧的条目。"""
+        self._resolve_pop_locked(key)
+        entry['_bytes'] = self._resolve_entry_bytes(key, entry)
+        self._resolve_cache[key] = entry
+        self._resolve_bytes += entry['_bytes']
+        while len(self._resolve_cache) > self.RESOLVE_CACHE_MAX:
+            self._resolve_pop_locked(next(iter(self._resolve_cache)))
+
+    def _resolve_pop_locked(self, key: str):
+        entry = self._resolve_cache.pop(key, None)
+        if entry is not None:
+            self._resolve_bytes -= entry.get('_bytes', 0)
+
+    def _notify_cache_grow(self):
+        hook = self.on_cache_grow
+        if hook is not None:
+            try:
+                hook()
+            except Exception:
+                logger.exception('内存预算检查失败')
+
+    def memory_usage(self) -> int:
+        """解析结果缓存的估算字节数。"""
+        return self._resolve_bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """按插入顺序淘汰解析结果，直到释放至少 target 字节或缓存为空；返回实际释放的字节数。"""
+        freed = 0
+        with self._resolve_lock:
+            while freed < target and self._resolve_cache:
+                before = self._resolve_bytes
+                self._resolve_pop_locked(next(iter(self._resolve_cache)))
+                freed += before - self._resolve_bytes
+        return freed
+
+    def _get_720p_mp4(self, url: str, ctx: Optional[ResolveContext] = None) -> Optional[str]:
         """
         策略 1: 尝试通过 Bilibili 官方 API 获取 720P MP4 视频链接。
 
         :param url: Bilibili 视频页面的 URL。
+        :param ctx: 可选的解析上下文；提供时会记录 durl[0] 中的 backup_url 列表。
         :return: 成功时返回 720P MP4 链接，否则返回 None。
         """
+        timings = ctx.timings if ctx is not None else None
+        deadline = ctx.deadline if ctx is not None else None
         try:
             # 从 URL 中提取 BV 号
-            bvid_match = re.search(r'BV[a-zA-Z0-9]{10}', url)
-            if not bvid_match:
-                return None
-            bvid = bvid_match.group(0)
-            logger.debug("从 URL 中提取到 BV 号: %s", bvid)
-
-            # 第一步：调用 view 接口获取视频信息，主要是 cid
-            api_url = "https://api.bilibili.com/x/web-interface/view"
-            params = {"bvid": bvid}
-            # 为 API 请求添加 Referer 头，模拟从 Bilibili 页面发出的请求
-            headers = {'Referer': 'https://www.bilibili.com/'}
-            r = self.session.get(api_url, params=params, headers=headers, timeout=self.timeout)
-            data = r.json()
-            if data.get('code') != 0:
-                logger.warning("API /view 请求失败: %s", data.get('message'))
+            bvid = self._extract_bvid(url)
+            if not bvid:
                 return None
 
-            video_data = data['data']
-            cid = video_data.get('cid')
+            # 第一步：调用 view 接口获取视频信息，主要是 cid（已缓存所属合集时直接使用合集中的 cid）
+            cid = self.seasons.cid_for(bvid)
+            if cid is None:
+                api_url, params = self._view_request(bvid)
+                with stage(timings, 'view'):
+                    r = self._api_get('/view', api_url, params, timings, deadline)
+                    data = r.json()
+                cid = self._parse_view(data)
             if cid is None:
-                logger.warning("在 /view 响应中未找到 cid")
                 return None
 
-            # 第二步：调用 playurl 接口获取播放链接
-            play_url = "https://api.bilibili.com/x/player/playurl"
-            params = {
-                'bvid': bvid,
-                'cid': cid,
-                'qn': 64,      # qn=64 代表 720P 清晰度
-                'fnval': 0,    # fnval=0 表示需要 MP4 格式
-                'platform': 'html5'
-            }
-            # 为 API 请求添加 Referer 头
-            headers = {'Referer': 'https://www.bilibili.com/'}
-            r2 = self.session.get(play_url, params=params, headers=headers, timeout=self.timeout)
-            play_data = r2.json()
-            if play_data.get('code') == 0:
-                data2 = play_data.get('data', {})
-                if 'durl' in data2 and data2['durl']:
-                    video_url = data2['durl'][0].get('url')
-                    # 对获取到的 URL 进行安全检查
-                    if video_url and self._is_url_allowed(video_url):
-                        logger.info("通过 API 成功获取到 720P MP4 链接: %s", video_url)
-                        return video_url
+            # 需要字幕时，字幕列表与 playurl 并发获取
+            subtitle_future = None
+            if ctx is not None and ctx.want_subtitles:
+                subtitle_future = self._strategy_executor().submit(self._subtitle_tracks, bvid, cid, deadline)
+
+            # 第二步：按策略表错峰调用 playurl 接口，第一个通过安全检查的直链胜出
+            answer = self._race_playurl(bvid, cid, timings, deadline, ctx.qn if ctx is not None else None)
+            if subtitle_future is not None:
+                ctx.subtitles = self._collect_subtitles(subtitle_future, bvid, cid, deadline)
+            if answer is not None:
+                logger.info("通过 API（策略 %s）成功获取到 720P MP4 链接: %s", answer.strategy.name, answer.video_url)
+                if ctx is not None:
+                    ctx.backup_urls = answer.backup_urls
+                return answer.video_url
             logger.warning("API /playurl 请求未返回有效的 durl 链接")
             return None
+        except CircuitOpenError:
+            raise
         except Exception:
             logger.exception("通过 API 获取 720P MP4 链接时发生异常")
             return None
 
+    def _race_playurl(self, bvid: str, cid, timings: Optional[StageTimings] = None,
+                      deadline: Optional[Deadline] = None, qn: Optional[int] = None) -> Optional[_PlayurlAnswer]:
+        """
+        按 playurl_strategies.order() 的顺序错峰尝试各策略，返回第一个有效结果（都无效时返回 None）。
+
+        先发排在最前的策略；它在 stagger() 秒内没有结果时再发下一个（错峰请求不在令牌桶中排队，
+        拿不到令牌就放弃），已失败时立即发下一个。落后的请求不会被中断，完成后照常计入统计。
+        所有策略都因熔断未能发出时抛出 CircuitOpenError。
+        """
+        results = queue.SimpleQueue()
+        pending = collections.deque(self.playurl_strategies.order())
+        running = 0
+        next_at = 0.0
+        errors = []
+        while pending or running:
+            now = time.monotonic()
+            if pending and (running == 0 or now >= next_at):
+                strategy = pending.popleft()
+                hedge = running > 0
+                if running == 0 and not pending:
+                    # 只剩这一个策略且没有进行中的请求：直接在当前线程执行
+                    results.put(self._try_playurl_strategy(strategy, bvid, cid, timings is not None, deadline, hedge, qn))
+                else:
+                    self._strategy_executor().submit(
+                        lambda s=strategy, h=hedge: results.put(
+                            self._try_playurl_strategy(s, bvid, cid, timings is not None, deadline, h, qn)))
+                running += 1
+                next_at = now + self.playurl_strategies.stagger(strategy)
+                continue
+            wait = next_at - now if pending else None
+            if deadline is not None:
+                wait = deadline.cap(wait)
+            try:
+                answer = results.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and deadline.expired:
+                    break
+                continue
+            running -= 1
+            if answer.video_url:
+                return self._accept_playurl(answer, timings)
+            errors.append(answer.error)
+        self._raise_if_all_open(errors)
+        return None
+
+    def _accept_playurl(self, answer: _PlayurlAnswer, timings: Optional[StageTimings]) -> _PlayurlAnswer:
+        self.playurl_strategies.record_win(answer.strategy.name)
+        if timings is not None and answer.timings is not None:
+            for name, ms in answer.timings.as_dict().items():
+                timings.add(name, ms)
+        return answer
+
+    @staticmethod
+    def _raise_if_all_open(errors: list):
+        """所有策略都因熔断未能发出时抛出该 CircuitOpenError（交给 get_real_url 返回缓存或 503）。"""
+        if errors and all(isinstance(e, CircuitOpenError) for e in errors):
+            raise errors[0]
+
+    def _try_playurl_strategy(self, strategy: PlayurlStrategy, bvid: str, cid, want_timings: bool,
+                              deadline: Optional[Deadline], hedge: bool, qn: Optional[int] = None) -> _PlayurlAnswer:
+        """执行一个策略：请求 playurl、取出 durl 并做 SSRF 检查；异常记录在结果中而不抛出。"""
+        answer = _PlayurlAnswer(strategy, StageTimings() if want_timings else None)
+        start = time.perf_counter()
+        try:
+            wbi_keys = self._wbi_keys(deadline) if strategy.wbi else None
+            play_url, params = self._playurl_request(bvid, cid, strategy, wbi_keys, qn)
+            with stage(answer.timings, 'playurl'):
+                r = self._api_get('/playurl', play_url, params, answer.timings, deadline, max_queue_wait=0 if hedge else None)
+                data = r.json()
+            video_url, backup_urls = self._parse_playurl(data)
+            if video_url:
+                # 对获取到的 URL 进行安全检查
+                with stage(answer.timings, 'ssrf'):
+                    allowed = self._is_url_allowed(video_url)
+                if allowed:
+                    answer.video_url, answer.backup_urls = video_url, backup_urls
+        except Exception as ex:
+            answer.error = ex
+        self._record_strategy(answer, start)
+        return answer
+
+    def _record_strategy(self, answer: _PlayurlAnswer, start: float):
+        if isinstance(answer.error, (CircuitOpenError, UpstreamRateLimited)):
+            # 请求没有发出（熔断或本地限流），不代表该策略的好坏
+            return
+        if answer.error is not None:
+            logger.warning("playurl 策略 %s 失败: %s", answer.strategy.name, answer.error)
+        self.playurl_strategies.record(answer.strategy.name, time.perf_counter() - start, answer.result)
+
+    def _strategy_executor(self) -> ThreadPoolExecutor:
+        if self._strategy_pool is None:
+            with self._strategy_pool_lock:
+                if self._strategy_pool is None:
+                    self._strategy_pool = ThreadPoolExecutor(self.STRATEGY_WORKERS, thread_name_prefix='playurl')
+        return self._strategy_pool
+
+    def _wbi_keys(self, deadline: Optional[Deadline] = None):
+        """返回 WBI 签名密钥 (img_key, sub_key)，缓存过期时经 nav 接口重新获取。"""
+        keys = self.wbi_keys.get()
+        if keys is None:
+            api_url, params = self._nav_request()
+            keys = self._store_wbi_keys(self._api_get('/nav', api_url, params, None, deadline).json())
+        return keys
+
+    def _api_get(self, endpoint: str, api_url: str, params: dict, timings: Optional[StageTimings] = None,
+                 deadline: Optional[Deadline] = None, max_queue_wait: Optional[float] = None) -> requests.Response:
+        """
+        向 B 站 API 发起 GET 请求，并按端点记录上游耗时指标。
+
+        请求先经过该端点的熔断器（打开时立即抛出 CircuitOpenError），再经过进程内共用的令牌桶
+        （见 ass_player.ratelimit），排队时间记入指标与 `queue` 阶段；被限流（429 / 412）时令牌桶
+        降速，并经令牌桶重试 THROTTLE_RETRIES 次。5xx 与连接错误最多重试 self.retries 次。
+
+        每次尝试的超时取该端点的自适应超时与剩余预算中较小者；预算用完（或不够再退避一次）时
+        不再重试，预算在请求发出前已耗尽或请求因预算截断而超时则抛出 DeadlineExceeded。
+
+        :param endpoint: 用于指标标签的端点名（如 '/view'、'/playurl'）。
+        :param api_url: 完整的 API 地址。
+        :param params: 查询参数。
+        :param timings: 可选的分阶段计时，排队时间累加到 `queue` 阶段。
+        :param deadline: 可选的解析截止时间。
+        :param max_queue_wait: 在令牌桶中最多排队的秒数（错峰的备用请求为 0：拿不到令牌就放弃）。
+        """
+        breaker = self._breaker(endpoint)
+        breaker.before_call()
+        adaptive = self._adaptive_timeout(endpoint)
+        # 为 API 请求添加 Referer 头，模拟从 Bilibili 页面发出的请求
+        headers = {'Referer': 'https://www.bilibili.com/'}
+        start = time.perf_counter()
+        throttle_retries = self.THROTTLE_RETRIES
+        try:
+            attempt = 0
+            while True:
+                self._record_queue_wait(endpoint, self.rate_limiter.acquire(self._queue_budget(deadline, max_queue_wait)), timings)
+                timeout, truncated = self._attempt_timeout(endpoint, adaptive, deadline)
+                last = attempt >= self.retries
+                error = None
+                sent = time.perf_counter()
+                try:
+                    response = self.session.get(api_url, params=params, headers=headers, timeout=timeout)
+                except (requests.ConnectionError, requests.Timeout) as ex:
+                    if isinstance(ex, requests.Timeout):
+                        if truncated:
+                            raise DeadlineExceeded(endpoint) from ex
+                        adaptive.observe_timeout(timeout)
+                    if last:
+                        raise
+                    error = ex
+                else:
+                    adaptive.observe(time.perf_counter() - sent)
+                    if self._check_throttled(endpoint, response.status_code):
+                        if throttle_retries <= 0:
+                            break
+                        throttle_retries -= 1
+                        continue
+                    if response.status_code not in self.RETRY_STATUSES or last:
+                        break
+                backoff = self.BACKOFF_FACTOR * (2 ** attempt)
+                if deadline is not None and deadline.remaining() <= backoff:
+                    # 剩余预算不够退避后再试一次：返回最后一次的响应（或抛出最后一次的错误）
+                    if error is not None:
+                        raise error
+                    break
+                time.sleep(backoff)
+                attempt += 1
+        except (UpstreamRateLimited, DeadlineExceeded) as ex:
+            # 没有等到上游的结论（本地排队过久或预算用完），不计为上游失败
+            breaker.abandon()
+            metrics.UPSTREAM_ERRORS.labels(endpoint).inc()
+            if isinstance(ex, DeadlineExceeded):
+                metrics.DEADLINE_EXCEEDED.labels(endpoint).inc()
+            raise
+        except Exception:
+            breaker.record_failure()
+            metrics.UPSTREAM_ERRORS.labels(endpoint).inc()
+            raise
+        finally:
+            metrics.UPSTREAM_LATENCY.labels(endpoint).observe(time.perf_counter() - start)
+        self._record_breaker_result(breaker, response.status_code)
+        return response
+
+    @staticmethod
+    def _queue_budget(deadline: Optional[Deadline], max_queue_wait: Optional[float]) -> Optional[float]:
+        """令牌桶排队的上限：剩余预算与 max_queue_wait 中较小者（都没有时为 None）。"""
+        return deadline.cap(max_queue_wait) if deadline is not None else max_queue_wait
+
+    @staticmethod
+    def _attempt_timeout(endpoint: str, adaptive: AdaptiveTimeout, deadline: Optional[Deadline]):
+        """
+        本次尝试的超时：自适应超时与剩余预算中较小者。
+
+        :return: (超时秒数, 是否被剩余预算截断)；预算已耗尽时抛出 DeadlineExceeded。
+        """
+        timeout = adaptive.current()
+        if deadline is None:
+            return timeout, False
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(endpoint)
+        return (remaining, True) if remaining < timeout else (timeout, False)
+
+    def _adaptive_timeout(self, endpoint: str) -> AdaptiveTimeout:
+        adaptive = self.adaptive_timeouts.get(endpoint)
+        if adaptive is None:
+            with self._breakers_lock:
+                adaptive = self.adaptive_timeouts.get(endpoint)
+                if adaptive is None:
+                    adaptive = AdaptiveTimeout(self.timeout, floor=self.ADAPTIVE_TIMEOUT_FLOOR)
+                    metrics.UPSTREAM_TIMEOUT.labels(endpoint).set_function(adaptive.current)
+                    self.adaptive_timeouts[endpoint] = adaptive
+        return adaptive
+
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            with self._breakers_lock:
+                breaker = self.breakers.get(endpoint)
+                if breaker is None:
+                    breaker = CircuitBreaker(endpoint, self.BREAKER_FAILURE_THRESHOLD, self.BREAKER_RESET_TIMEOUT)
+                    self.breakers[endpoint] = breaker
+        return breaker
+
+    @staticmethod
+    def _record_breaker_result(breaker: CircuitBreaker, status: int):
+        """5xx 与 412（B 站屏蔽出口 IP 时的表现）计为失败；其余响应（含业务错误码）说明上游可用。"""
+        if status >= 500 or status == 412:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    @staticmethod
+    def _record_queue_wait(endpoint: str, waited: float, timings: Optional[StageTimings]):
+        metrics.UPSTREAM_QUEUE_WAIT.labels(endpoint).observe(waited)
+        if timings is not None and waited > 0:
+            timings.add('queue', waited * 1000.0)
+
+    def _check_throttled(self, endpoint: str, status: int) -> bool:
+        """按上游状态码调整令牌桶速率，返回本次响应是否为限流。"""
+        if status in THROTTLE_STATUSES:
+            metrics.UPSTREAM_THROTTLED.labels(endpoint, status).inc()
+            self.rate_limiter.on_throttled()
+            return True
+        self.rate_limiter.on_success()
+        return False
+
+    def _rank_candidates(self, final_url: str, primary_url: str, backup_urls: List[str]) -> List[dict]:
+        """
+        构造供客户端故障切换的候选直链列表，并按 CDN 统计排序。
+
+        候选依次为：CDN 替换后的直链（即 get_real_url 的返回值）、原始主链接、各个 backup_url
+        及其 CDN 替换版本。去重后逐一做 SSRF 检查，再按主机的历史平均加载时间升序排序；
+        没有统计数据的主机排在有数据的主机之后，并保持原有相对顺序。
+
+        :return: [{ 'url': str, 'host': str, 'source': str }]
+        """
+        raw = [(final_url, 'cdn_rewrite' if final_url != primary_url else 'primary'), (primary_url, 'primary')]
+        for b in backup_urls:
+            if not isinstance(b, str) or not b:
+                continue
+            raw.append((b, 'backup'))
+            raw.append((self._try_convert_cdn_url(b), 'cdn_rewrite'))
+
+        seen = set()
+        allowed = []
+        for cand_url, source in raw:
+            if cand_url in seen:
+                continue
+            seen.add(cand_url)
+            # 主链接已在 _get_720p_mp4 中检查过，其余候选逐一检查
+            if cand_url != primary_url and not self._is_url_allowed(cand_url):
+                continue
+            allowed.append((cand_url, source))
+
+        def sort_key(item):
+            idx, (cand_url, _source) = item
+            host = (urllib_parse(cand_url).hostname or '').lower()
+            with self._cdn_lock:
+                avg = (self._cdn_stats.get(host) or {}).get('avg_load')
+            return (avg is None, avg or 0.0, idx)
+
+        ranked = sorted(enumerate(allowed), key=sort_key)
+        return [{'url': u, 'host': (urllib_parse(u).hostname or '').lower(), 'source': src} for _, (u, src) in ranked]
+
     def _is_url_allowed(self, url: str) -> bool:
         """
         对给定的 URL 进行安全检查，以防止 SSRF 攻击。
@@ -291,9 +1213,9 @@ class BiliBiliParser:
             is_china = any(k in hostname for k in china_keywords)
 
             # 记录首次见到的 host 信息（不覆盖已有的 is_china 判断，除非为 True）
-            entry = self._cdn_stats.get(hostname)
-            if entry is None:
-                self._cdn_stats[hostname] = {'is_china': True if is_china else (False if is_foreign else None), 'count': 0, 'avg_load': None}
+            with self._cdn_lock:
+                if hostname not in self._cdn_stats:
+                    self._cdn_stats[hostname] = {'is_china': True if is_china else (False if is_foreign else None), 'count': 0, 'avg_load': None}
 
             # 如果该 host 被判定为国内，则无需替换
             if is_china:
@@ -321,7 +1243,7 @@ class BiliBiliParser:
             return url
 
     def _ensure_disk_cache(self):
-        """确保磁盘中的 CDN 统计表存在并加载已有数据到内存缓存。"""
+        """确保磁盘中的 CDN 统计表与解析结果表存在，并加载已有数据到内存缓存。"""
         conn = getattr(self, '_disk_cache_conn', None)
         if conn is None:
             return
@@ -351,6 +1273,31 @@ class BiliBiliParser:
                 logger.debug('从磁盘加载 CDN 统计数据失败')
         except Exception:
             logger.exception('创建或初始化 cdn_stats 表时失败')
+        try:
+            cur = conn.cursor()
+            self._ensure_resolve_table(cur)
+            conn.commit()
+            self._load_disk_resolutions(cur)
+            self.compact_disk_cache()
+        except Exception:
+            logger.exception('初始化或加载磁盘解析结果时失败')
+
+    @staticmethod
+    def _ensure_resolve_table(cur):
+        """创建 cache 表；旧版本只有 (key, url, ts) 三列，缺少的列在此补齐。"""
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            url TEXT,
+            ts REAL,
+            expires_at REAL,
+            candidates TEXT
+        )""")
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(cache)").fetchall()}
+        for name, decl in (('expires_at', 'REAL'), ('candidates', 'TEXT')):
+            if name not in columns:
+                cur.execute(f"ALTER TABLE cache ADD COLUMN {name} {decl}")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache (expires_at)")
 
     def _save_cdn_entry(self, hostname: str):
         """将内存中单条 CDN 统计写入磁盘（INSERT OR REPLACE）。"""
@@ -374,18 +1321,19 @@ class BiliBiliParser:
         if not hostname:
             return
         h = hostname.lower()
-        entry = self._cdn_stats.get(h)
-        if entry is None:
-            self._cdn_stats[h] = {'is_china': is_china, 'count': 0, 'avg_load': None}
-        else:
-            # 只有在尚未明确或为 False 时更新为 True，避免误覆盖
-            if entry.get('is_china') is None or (not entry.get('is_china') and is_china):
-                entry['is_china'] = is_china
-        # 持久化到磁盘（若可用）
-        try:
-            self._save_cdn_entry(hostname)
-        except Exception:
-            logger.debug('持久化 CDN 主机标记时发生异常')
+        with self._cdn_lock:
+            entry = self._cdn_stats.get(h)
+            if entry is None:
+                self._cdn_stats[h] = {'is_china': is_china, 'count': 0, 'avg_load': None}
+            else:
+                # 只有在尚未明确或为 False 时更新为 True，避免误覆盖
+                if entry.get('is_china') is None or (not entry.get('is_china') and is_china):
+                    entry['is_china'] = is_china
+            # 持久化到磁盘（若可用）
+            try:
+                self._save_cdn_entry(hostname)
+            except Exception:
+                logger.debug('持久化 CDN 主机标记时发生异常')
 
     def record_cdn_load(self, hostname: str, load_time: float):
         """记录一次 CDN 加载成功的耗时，更新运行平均值并刷新 `_best_china_host`。
@@ -396,49 +1344,57 @@ class BiliBiliParser:
         if not hostname or load_time is None:
             return
         h = hostname.lower()
-        entry = self._cdn_stats.get(h)
-        if entry is None:
-            entry = {'is_china': None, 'count': 0, 'avg_load': None}
-            self._cdn_stats[h] = entry
+        with self._cdn_lock:
+            entry = self._cdn_stats.get(h)
+            if entry is None:
+                entry = {'is_china': None, 'count': 0, 'avg_load': None}
+                self._cdn_stats[h] = entry
 
-        # 更新运行平均值
-        try:
-            cnt = entry.get('count', 0) + 1
-            prev_avg = entry.get('avg_load')
-            if prev_avg is None:
-                new_avg = float(load_time)
-            else:
-                # 在线平均计算，权重均一
-                new_avg = prev_avg + (float(load_time) - prev_avg) / cnt
-            entry['count'] = cnt
-            entry['avg_load'] = new_avg
-        except Exception:
-            logger.debug('更新 CDN 统计时发生异常 for %s', hostname)
+            # 更新运行平均值
+            try:
+                cnt = entry.get('count', 0) + 1
+                prev_avg = entry.get('avg_load')
+                if prev_avg is None:
+                    new_avg = float(load_time)
+                else:
+                    # 在线平均计算，权重均一
+                    new_avg = prev_avg + (float(load_time) - prev_avg) / cnt
+                entry['count'] = cnt
+                entry['avg_load'] = new_avg
+            except Exception:
+                logger.debug('更新 CDN 统计时发生异常 for %s', hostname)
 
-        # 如果该 host 已被标注为国内，则可能影响最佳 host
-        if entry.get('is_china'):
-            self._best_china_host = self._get_best_china_host()
-        # 持久化更新
-        try:
-            self._save_cdn_entry(hostname)
-        except Exception:
-            logger.debug('持久化 CDN 统计时发生异常')
+            # 如果该 host 已被标注为国内，则可能影响最佳 host
+            if entry.get('is_china'):
+                self._best_china_host = self._get_best_china_host()
+            # 持久化更新
+            try:
+                self._save_cdn_entry(hostname)
+            except Exception:
+                logger.debug('持久化 CDN 统计时发生异常')
+
+    def get_china_hosts(self) -> List[str]:
+        """返回当前已知的国内 CDN host 列表（按名称排序，便于调用方得到稳定顺序）。"""
+        with self._cdn_lock:
+            return sorted(h for h, e in self._cdn_stats.items() if e and e.get('is_china'))
 
     def _get_best_china_host(self) -> Optional[str]:
         """返回缓存中平均加载时间最小的国内 CDN host（如果存在）。"""
         best = None
         best_time = None
-        for h, e in self._cdn_stats.items():
-            if not e:
-                continue
-            if not e.get('is_china'):
-                continue
-            avg = e.get('avg_load')
-            if avg is None:
-                continue
-            if best_time is None or avg < best_time:
-                best_time = avg
-                best = h
+        # 与上报线程并发时遍历字典会抛出 RuntimeError，持锁遍历（RLock，可在已持锁时调用）
+        with self._cdn_lock:
+            for h, e in self._cdn_stats.items():
+                if not e:
+                    continue
+                if not e.get('is_china'):
+                    continue
+                avg = e.get('avg_load')
+                if avg is None:
+                    continue
+                if best_time is None or avg < best_time:
+                    best_time = avg
+                    best = h
         return best
 
     def _get_quality_name(self, quality_id: int) -> str:
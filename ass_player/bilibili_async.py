@@ -0,0 +1,322 @@
+"""
+异步 Bilibili 解析器（供 ASGI 入口 asgi.py 使用）。
+
+同步解析器在等待上游时占用一个线程，线程数就是并发上限。异步版本使用 httpx.AsyncClient 发起
+view / playurl 请求，等待期间不占线程；URL 规范化、响应解析、CDN 统计、候选排序与解析结果缓存
+全部复用同一个 BiliBiliParser 实例，两种服务模式共享同一份状态。
+
+SSRF 检查与候选排序包含阻塞的 DNS 查询，通过 asyncio.to_thread 在线程中执行。
+
+httpcore 连接池为每个等待中的请求扫描全部连接，分配开销随“进行中请求数 × 连接数”增长：
+上千个并发请求共用一个 512 连接的池时，池管理本身就会吃满 CPU。因此把连接预算拆分到多个
+小客户端，按轮询分发请求。
+"""
+import asyncio
+import collections
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+import httpx
+
+from ass_player import metrics
+from ass_player.bilibili import BiliBiliParser, ResolveContext, _PlayurlAnswer
+from ass_player.circuit import CircuitOpenError
+from ass_player.deadline import Deadline, DeadlineExceeded
+from ass_player.ratelimit import UpstreamRateLimited
+from ass_player.scheduler import INTERACTIVE, SchedulerTimeout
+from ass_player.strategies import PlayurlStrategy
+from ass_player.subtitles import parse_subtitle_list, subtitle_links
+from ass_player.timing import StageTimings, stage
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBiliBiliParser:
+    """
+    BiliBiliParser 的异步外壳。
+
+    使用示例:
+        aparser = AsyncBiliBiliParser(BiliBiliParser())
+        video_url = await aparser.get_real_url("BV1...")
+        await aparser.aclose()
+    """
+
+    # 与同步解析器的重试策略一致：最多重试 parser.retries 次，退避 0.5s 起按 2 倍递增，剩余预算不足时不再重试；
+    # 429 / 412 不在此退避重试，而是与同步解析器一样交给共用令牌桶降速
+    BACKOFF_FACTOR = BiliBiliParser.BACKOFF_FACTOR
+    RETRY_STATUSES = BiliBiliParser.RETRY_STATUSES
+    # 每个连接池分片的连接数
+    POOL_SHARD_SIZE = 4
+
+    def __init__(self, parser: BiliBiliParser, client: Optional[httpx.AsyncClient] = None, max_connections: int = 512):
+        """
+        :param parser: 同步解析器，提供配置（api_base / timeout / 请求头）与共享状态。
+        :param client: 可选的 httpx.AsyncClient（便于测试注入）；传入时不做分片。
+        :param max_connections: 到上游的最大并发连接数（所有分片合计）。
+        """
+        self.parser = parser
+        if client is not None:
+            self.clients = [client]
+        else:
+            shards = max(1, -(-max_connections // self.POOL_SHARD_SIZE))
+            per_shard = -(-max_connections // shards)
+            # 各分片共用一个 SSL 上下文（加载 CA 证书约需数十毫秒）
+            ssl_context = httpx.create_ssl_context()
+            self.clients = [
+                httpx.AsyncClient(
+                    headers=dict(parser.session.headers),
+                    verify=ssl_context,
+                    timeout=parser.timeout,
+                    limits=httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard),
+                )
+                for _ in range(shards)
+            ]
+        self._next_client = itertools.cycle(self.clients)
+        # 已有策略胜出后仍在进行的 playurl 尝试（保留引用直到完成，完成后照常计入策略统计）
+        self._stragglers = set()
+
+    async def get_real_url(self, url: str, ctx: Optional[ResolveContext] = None, use_cache: bool = True) -> Optional[str]:
+        """异步版本的 `BiliBiliParser.get_real_url`，参数与返回值语义相同。"""
+        url_for_log = url
+        try:
+            logger.info("开始异步解析 Bilibili URL 或 BV 号: %s", url_for_log)
+            url = self.parser._normalize_url(url)
+            if url is None:
+                return None
+            url_for_log = url
+
+            key = self.parser._resolution_key(url, ctx)
+            if use_cache:
+                # 本进程缓存只是加锁查 dict，直接在事件循环中查询；共享缓存是阻塞 I/O，放到线程中
+                cached = self.parser._get_cached_resolution(key, ctx, shared=False)
+                if cached is None and self.parser.shared_cache is not None:
+                    cached = await asyncio.to_thread(self.parser._get_cached_resolution, key, ctx, local=False)
+                if cached is not None:
+                    return cached
+
+            try:
+                async with self.parser.scheduler.slot(INTERACTIVE, timeout=self.parser._schedule_timeout(ctx)) as waited:
+                    self.parser._record_schedule_wait(ctx, waited)
+                    mp4_url = await self._get_720p_mp4(url, ctx)
+            except SchedulerTimeout as ex:
+                logger.warning("异步解析 %s 时等待调度超时: %s", url_for_log, ex)
+                return None
+            except CircuitOpenError as ex:
+                # 可能查询共享缓存（阻塞 I/O），与 _finish_resolution 一样在线程中执行
+                return await asyncio.to_thread(self.parser._resolve_while_open, key, ctx, ex)
+            if not mp4_url:
+                logger.warning("官方 API 未返回有效的 720P MP4 链接: %s", url)
+                return None
+            return await asyncio.to_thread(self.parser._finish_resolution, key, mp4_url, ctx)
+        except Exception as ex:
+            logger.exception("异步解析 %s 时发生异常: %s", url_for_log, ex)
+            return None
+
+    async def _get_720p_mp4(self, url: str, ctx: Optional[ResolveContext] = None) -> Optional[str]:
+        timings = ctx.timings if ctx is not None else None
+        deadline = ctx.deadline if ctx is not None else None
+        parser = self.parser
+        try:
+            bvid = parser._extract_bvid(url)
+            if not bvid:
+                return None
+
+            cid = parser.seasons.cid_for(bvid)
+            if cid is None:
+                api_url, params = parser._view_request(bvid)
+                with stage(timings, 'view'):
+                    r = await self._api_get('/view', api_url, params, timings, deadline)
+                    data = r.json()
+                cid = parser._parse_view(data)
+            if cid is None:
+                return None
+
+            subtitle_task = None
+            if ctx is not None and ctx.want_subtitles:
+                subtitle_task = asyncio.create_task(self._subtitle_tracks(bvid, cid, deadline))
+
+            try:
+                answer = await self._race_playurl(bvid, cid, timings, deadline, ctx.qn if ctx is not None else None)
+            except BaseException:
+                if subtitle_task is not None:
+                    subtitle_task.cancel()
+                raise
+            if subtitle_task is not None:
+                ctx.subtitles = await self._collect_subtitles(subtitle_task, bvid, cid, deadline)
+            if answer is not None:
+                logger.info("通过 API（策略 %s）成功获取到 720P MP4 链接: %s", answer.strategy.name, answer.video_url)
+                if ctx is not None:
+                    ctx.backup_urls = answer.backup_urls
+                return answer.video_url
+            logger.warning("API /playurl 请求未返回有效的 durl 链接")
+            return None
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logger.exception("通过 API 异步获取 720P MP4 链接时发生异常")
+            return None
+
+    async def get_subtitles(self, url: str, ctx: Optional[ResolveContext] = None) -> List[dict]:
+        """异步版本的 `BiliBiliParser.get_subtitles`（解析结果缓存命中时使用），在线程中执行。"""
+        return await asyncio.to_thread(self.parser.get_subtitles, url, ctx)
+
+    async def _subtitle_tracks(self, bvid: str, cid, deadline: Optional[Deadline] = None) -> List[dict]:
+        parser = self.parser
+        tracks = parser.subtitles.tracks(cid)
+        if tracks is None:
+            api_url, params = parser._subtitle_list_request(bvid, cid)
+            tracks = parse_subtitle_list((await self._api_get('/player/v2', api_url, params, None, deadline)).json())
+            parser.subtitles.put_tracks(bvid, cid, tracks)
+        return tracks
+
+    async def _collect_subtitles(self, task: asyncio.Task, bvid: str, cid, deadline: Optional[Deadline]) -> List[dict]:
+        """等待并发获取的字幕列表（最多等到 deadline）；失败或超时时返回空列表。"""
+        try:
+            tracks = await asyncio.wait_for(task, deadline.remaining() if deadline is not None else self.parser.timeout)
+        except Exception as ex:
+            logger.warning("获取字幕列表失败（不影响视频解析）: %s", ex)
+            return []
+        return subtitle_links(bvid, cid, tracks)
+
+    async def _race_playurl(self, bvid: str, cid, timings: Optional[StageTimings] = None,
+                            deadline: Optional[Deadline] = None, qn: Optional[int] = None) -> Optional[_PlayurlAnswer]:
+        """异步版本的 `BiliBiliParser._race_playurl`，错峰与胜出规则相同。"""
+        parser = self.parser
+        loop = asyncio.get_running_loop()
+        pending = collections.deque(parser.playurl_strategies.order())
+        running = set()
+        next_at = 0.0
+        errors = []
+        try:
+            while pending or running:
+                now = loop.time()
+                if pending and (not running or now >= next_at):
+                    strategy = pending.popleft()
+                    running.add(asyncio.ensure_future(
+                        self._try_playurl_strategy(strategy, bvid, cid, timings is not None, deadline, bool(running), qn)))
+                    next_at = now + parser.playurl_strategies.stagger(strategy)
+                    continue
+                wait = next_at - now if pending else None
+                if deadline is not None:
+                    wait = deadline.cap(wait)
+                done, running = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done and deadline is not None and deadline.expired:
+                    break
+                for task in done:
+                    answer = task.result()
+                    if answer.video_url:
+                        return parser._accept_playurl(answer, timings)
+                    errors.append(answer.error)
+        finally:
+            # 落后的尝试不取消：让它们完成并计入统计（取消会使慢策略永远没有耗时样本）
+            for task in running:
+                self._stragglers.add(task)
+                task.add_done_callback(self._stragglers.discard)
+        parser._raise_if_all_open(errors)
+        return None
+
+    async def _try_playurl_strategy(self, strategy: PlayurlStrategy, bvid: str, cid, want_timings: bool,
+                                    deadline: Optional[Deadline], hedge: bool, qn: Optional[int] = None) -> _PlayurlAnswer:
+        parser = self.parser
+        answer = _PlayurlAnswer(strategy, StageTimings() if want_timings else None)
+        start = time.perf_counter()
+        try:
+            wbi_keys = await self._wbi_keys(deadline) if strategy.wbi else None
+            play_url, params = parser._playurl_request(bvid, cid, strategy, wbi_keys, qn)
+            with stage(answer.timings, 'playurl'):
+                r = await self._api_get('/playurl', play_url, params, answer.timings, deadline,
+                                        max_queue_wait=0 if hedge else None)
+                data = r.json()
+            video_url, backup_urls = parser._parse_playurl(data)
+            if video_url:
+                with stage(answer.timings, 'ssrf'):
+                    allowed = await asyncio.to_thread(parser._is_url_allowed, video_url)
+                if allowed:
+                    answer.video_url, answer.backup_urls = video_url, backup_urls
+        except Exception as ex:
+            answer.error = ex
+        parser._record_strategy(answer, start)
+        return answer
+
+    async def _wbi_keys(self, deadline: Optional[Deadline] = None):
+        keys = self.parser.wbi_keys.get()
+        if keys is None:
+            api_url, params = self.parser._nav_request()
+            r = await self._api_get('/nav', api_url, params, None, deadline)
+            keys = self.parser._store_wbi_keys(r.json())
+        return keys
+
+    async def _api_get(self, endpoint: str, api_url: str, params: dict,
+                       timings: Optional[StageTimings] = None, deadline: Optional[Deadline] = None,
+                       max_queue_wait: Optional[float] = None) -> httpx.Response:
+        """
+        向 B 站 API 发起 GET 请求（经熔断器与共用令牌桶，带重试），并按端点记录上游耗时指标。
+
+        超时与重试的预算规则与 `BiliBiliParser._api_get` 相同。
+        """
+        parser = self.parser
+        breaker = parser._breaker(endpoint)
+        breaker.before_call()
+        adaptive = parser._adaptive_timeout(endpoint)
+        headers = {'Referer': 'https://www.bilibili.com/'}
+        start = time.perf_counter()
+        throttle_retries = parser.THROTTLE_RETRIES
+        try:
+            attempt = 0
+            while True:
+                max_wait = parser._queue_budget(deadline, max_queue_wait)
+                parser._record_queue_wait(endpoint, await parser.rate_limiter.acquire_async(max_wait), timings)
+                timeout, truncated = parser._attempt_timeout(endpoint, adaptive, deadline)
+                last = attempt >= parser.retries
+                error = None
+                sent = time.perf_counter()
+                try:
+                    response = await next(self._next_client).get(api_url, params=params, headers=headers, timeout=timeout)
+                except httpx.TransportError as ex:
+                    if isinstance(ex, httpx.TimeoutException):
+                        if truncated:
+                            raise DeadlineExceeded(endpoint) from ex
+                        adaptive.observe_timeout(timeout)
+                    if last:
+                        raise
+                    error = ex
+                else:
+                    adaptive.observe(time.perf_counter() - sent)
+                    if parser._check_throttled(endpoint, response.status_code):
+                        if throttle_retries <= 0:
+                            break
+                        throttle_retries -= 1
+                        continue
+                    if response.status_code not in self.RETRY_STATUSES or last:
+                        break
+                backoff = self.BACKOFF_FACTOR * (2 ** attempt)
+                if deadline is not None and deadline.remaining() <= backoff:
+                    if error is not None:
+                        raise error
+                    break
+                await asyncio.sleep(backoff)
+                attempt += 1
+        except (UpstreamRateLimited, DeadlineExceeded) as ex:
+            breaker.abandon()
+            metrics.UPSTREAM_ERRORS.labels(endpoint).inc()
+            if isinstance(ex, DeadlineExceeded):
+                metrics.DEADLINE_EXCEEDED.labels(endpoint).inc()
+            raise
+        except asyncio.CancelledError:
+            # 请求被取消（客户端断开）不代表上游失败，但 half-open 的探测名额要还回去
+            breaker.abandon()
+            raise
+        except Exception:
+            breaker.record_failure()
+            metrics.UPSTREAM_ERRORS.labels(endpoint).inc()
+            raise
+        finally:
+            metrics.UPSTREAM_LATENCY.labels(endpoint).observe(time.perf_counter() - start)
+        parser._record_breaker_result(breaker, response.status_code)
+        return response
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
@@ -0,0 +1,501 @@
+"""
+缓存后端（供 cache_manager.CacheManager 使用）。
+
+- MemoryBackend：进程内 LRU，单进程部署的默认后端；
+- SQLiteBackend：本地 SQLite 文件，同一台机器上的多个 worker 进程共享；
+- RedisBackend：基于 RESP 协议的最小 Redis 客户端（仅用到 GET/SET/DEL/SCAN），多实例部署共享。
+
+所有后端存储的都是 `encode_value` 编码后的字节：紧凑 JSON，较大的值再经 zlib 压缩，
+首字节标记编码方式。值带 TTL，过期后视为未命中。SQLite / Redis 连接在 fork 后
+（gunicorn 预加载模式）按进程号自动重建。
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# 编码后超过该字节数才尝试压缩（小值压缩后往往更大）
+COMPRESS_THRESHOLD = 512
+
+
+def encode_value(value: Any) -> bytes:
+    """把可 JSON 序列化的值编码为紧凑字节串。"""
+    data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(data) >= COMPRESS_THRESHOLD:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return b'z' + packed
+    return b'j' + data
+
+
+def decode_value(raw: bytes) -> Any:
+    """`encode_value` 的逆操作。"""
+    kind, body = raw[:1], raw[1:]
+    if kind == b'z':
+        body = zlib.decompress(body)
+    elif kind != b'j':
+        raise ValueError(f'未知的缓存值编码: {kind!r}')
+    return json.loads(body.decode('utf-8'))
+
+
+class CacheBackend:
+    """缓存后端基类：子类实现 _get_raw / _set_raw / _delete / _clear / _size 即可。"""
+
+    name = 'base'
+    # 是否在进程之间共享（解析器只把共享后端用作解析结果的二级缓存）
+    shared = False
+
+    def __init__(self):
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'evictions': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._get_raw(key)
+            value = decode_value(raw) if raw is not None else None
+        except Exception:
+            logger.exception('读取缓存 %s 失败（%s）', key, self.name)
+            self._count('errors')
+            raw = value = None
+        self._count('hits' if raw is not None else 'misses')
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """写入缓存；ttl 为 None 时不过期。写入失败时返回 False（缓存不可用不影响主流程）。"""
+        expires_at = time.time() + ttl if ttl is not None else None
+        try:
+            self._set_raw(key, encode_value(value), expires_at)
+        except Exception:
+            logger.exception('写入缓存 %s 失败（%s）', key, self.name)
+            self._count('errors')
+            return False
+        self._count('sets')
+        return True
+
+    def delete(self, key: str) -> bool:
+        try:
+            removed = self._delete(key)
+        except Exception:
+            logger.exception('删除缓存 %s 失败（%s）', key, self.name)
+            self._count('errors')
+            return False
+        if removed:
+            self._count('deletes')
+        return removed
+
+    def clear(self, prefix: str = '') -> int:
+        """删除以 prefix 开头的全部键，返回删除数量。"""
+        try:
+            return self._clear(prefix)
+        except Exception:
+            logger.exception('清空缓存失败（%s）', self.name)
+            self._count('errors')
+            return 0
+
+    def size(self, prefix: str = '') -> int:
+        """以 prefix 开头且未过期的键数量。"""
+        try:
+            return self._size(prefix)
+        except Exception:
+            self._count('errors')
+            return 0
+
+    def stats(self, prefix: str = '') -> Dict[str, Any]:
+        size = self.size(prefix)
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['backend'] = self.name
+        stats['size'] = size
+        return stats
+
+    def close(self):
+        pass
+
+    def _get_raw(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _set_raw(self, key: str, raw: bytes, expires_at: Optional[float]):
+        raise NotImplementedError
+
+    def _delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _clear(self, prefix: str) -> int:
+        raise NotImplementedError
+
+    def _size(self, prefix: str) -> int:
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """进程内 LRU 缓存。"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1024):
+        super().__init__()
+        self.max_entries = max(1, int(max_entries))
+        self._data: 'OrderedDict[str, Tuple[bytes, Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # 写入后的回调（由 cache_manager 注册为内存预算检查），在释放锁之后调用
+        self.on_grow = None
+
+    @staticmethod
+    def _entry_bytes(key: str, raw: bytes) -> int:
+        # 键与值的长度加上元组 / bytes / OrderedDict 节点的固定开销
+        return len(key) + len(raw) + 200
+
+    def _pop_locked(self, key: str) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= self._entry_bytes(key, entry[0])
+        return True
+
+    def _get_raw(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                self._pop_locked(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def _set_raw(self, key, raw, expires_at):
+        evicted = 0
+        with self._lock:
+            self._pop_locked(key)
+            self._data[key] = (raw, expires_at)
+            self._bytes += self._entry_bytes(key, raw)
+            while len(self._data) > self.max_entries:
+                self._pop_locked(next(iter(self._data)))
+                evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def _delete(self, key):
+        with self._lock:
+            return self._pop_locked(key)
+
+    def _clear(self, prefix):
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                self._pop_locked(k)
+        return len(keys)
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """按 LRU 顺序淘汰，直到释放至少 target 字节；返回实际释放的字节数。"""
+        freed = evicted = 0
+        with self._lock:
+            while freed < target and self._data:
+                before = self._bytes
+                self._pop_locked(next(iter(self._data)))
+                freed += before - self._bytes
+                evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+        return freed
+
+    def _size(self, prefix):
+        now = time.time()
+        with self._lock:
+            return sum(1 for k, (_, exp) in self._data.items()
+                       if k.startswith(prefix) and (exp is None or exp > now))
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    本地 SQLite 文件缓存，多个 worker 进程通过同一个文件共享（WAL 模式）。
+
+    过期的行只有被读到时才会删除，从不再读的键会一直留在文件里；因此每写入 purge_every 次
+    顺带执行一次 purge_expired（0 表示不自动清理）。
+    """
+
+    name = 'sqlite'
+    shared = True
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000, purge_every: int = 1000):
+        super().__init__()
+        self.path = path
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.purge_every = max(0, int(purge_every))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._writes = 0
+
+    def _connection(self):
+        """返回本进程的连接；fork 后继承的连接不可复用，按进程号重新打开。"""
+        if self._conn is None or self._pid != os.getpid():
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""CREATE TABLE IF NOT EXISTS kv_cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL
+            )""")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _get_raw(self, key):
+        with self._lock:
+            row = self._connection().execute('SELECT value, expires_at FROM kv_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            self._delete(key)
+            return None
+        return bytes(row[0])
+
+    def _set_raw(self, key, raw, expires_at):
+        purged = 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO kv_cache (key, value, expires_at) VALUES (?, ?, ?)', (key, raw, expires_at))
+            self._writes += 1
+            if self.purge_every and self._writes >= self.purge_every:
+                self._writes = 0
+                purged = self._purge_locked(conn)
+            conn.commit()
+        if purged:
+            self._count('evictions', purged)
+
+    def _delete(self, key):
+        with self._lock:
+            conn = self._connection()
+            cur = conn.execute('DELETE FROM kv_cache WHERE key = ?', (key,))
+            conn.commit()
+        return cur.rowcount > 0
+
+    def _clear(self, prefix):
+        with self._lock:
+            conn = self._connection()
+            cur = conn.execute('DELETE FROM kv_cache WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+            conn.commit()
+        return cur.rowcount
+
+    def _size(self, prefix):
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT COUNT(*) FROM kv_cache WHERE substr(key, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (len(prefix), prefix, time.time())).fetchone()
+        return row[0]
+
+    def purge_expired(self) -> int:
+        """删除已过期的行，返回删除数量。"""
+        with self._lock:
+            conn = self._connection()
+            purged = self._purge_locked(conn)
+            conn.commit()
+        if purged:
+            self._count('evictions', purged)
+        return purged
+
+    @staticmethod
+    def _purge_locked(conn) -> int:
+        cur = conn.execute('DELETE FROM kv_cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class RedisError(Exception):
+    """Redis 返回的错误回复。"""
+
+
+class RedisBackend(CacheBackend):
+    """
+    最小 Redis 客户端（RESP2），单连接 + 锁；连接断开时自动重连一次。
+
+    过期由 Redis 的 PX 参数负责，因此多个实例看到的过期时间一致。
+    """
+
+    name = 'redis'
+    shared = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, password: Optional[str] = None,
+                 socket_timeout: float = 1.0):
+        super().__init__()
+        self.host = host
+        self.port = int(port)
+        self.db = int(db)
+        self.password = password
+        self.socket_timeout = float(socket_timeout)
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+        self._pid = None
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._file = sock.makefile('rb')
+        self._pid = os.getpid()
+        if self.password:
+            self._roundtrip('AUTH', self.password)
+        if self.db:
+            self._roundtrip('SELECT', self.db)
+
+    def _disconnect(self):
+        for obj in (self._file, self._sock):
+            try:
+                if obj is not None:
+                    obj.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    @staticmethod
+    def _pack(args) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Redis 连接已关闭')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(body.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError('Redis 连接已关闭')
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f'无法识别的 Redis 回复: {line!r}')
+
+    def _roundtrip(self, *args):
+        self._sock.sendall(self._pack(args))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """执行一条命令并返回解析后的回复；连接失效时重连重试一次。"""
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._sock is None or self._pid != os.getpid():
+                        self._connect()
+                    return self._roundtrip(*args)
+                except (OSError, ConnectionError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def _get_raw(self, key):
+        return self.execute('GET', key)
+
+    def _set_raw(self, key, raw, expires_at):
+        if expires_at is None:
+            self.execute('SET', key, raw)
+            return
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms <= 0:
+            self.execute('DEL', key)
+            return
+        self.execute('SET', key, raw, 'PX', ttl_ms)
+
+    def _delete(self, key):
+        return self.execute('DEL', key) > 0
+
+    def _scan(self, prefix):
+        cursor = b'0'
+        pattern = ''.join('\\' + c if c in '*?[]\\' else c for c in prefix) + '*'
+        while True:
+            cursor, keys = self.execute('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+            yield keys
+            if cursor in (b'0', '0'):
+                return
+
+    def _clear(self, prefix):
+        removed = 0
+        for keys in self._scan(prefix):
+            if keys:
+                removed += self.execute('DEL', *keys)
+        return removed
+
+    def _size(self, prefix):
+        return sum(len(keys) for keys in self._scan(prefix))
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def create_backend(spec: Optional[str] = None, max_entries: int = 1024) -> CacheBackend:
+    """
+    按 URL 形式的配置创建后端：
+
+    - `memory`（默认）或 `memory://?max_entries=条目数`
+    - `sqlite:///绝对路径.db` 或 `sqlite://相对路径.db`，可加 `?purge_every=写入次数`（0 关闭自动清理过期行）
+    - `redis://[:密码@]主机[:端口][/库号][?timeout=秒]`
+    """
+    parsed = urlparse(spec or 'memory')
+    if not parsed.scheme or parsed.scheme == 'memory':
+        query = parse_qs(parsed.query)
+        return MemoryBackend(max_entries=int(query.get('max_entries', [max_entries])[0]))
+    if parsed.scheme == 'sqlite':
+        path = (parsed.netloc + parsed.path) if parsed.netloc else parsed.path
+        if not path:
+            raise ValueError(f'SQLite 缓存缺少文件路径: {spec}')
+        query = parse_qs(parsed.query)
+        return SQLiteBackend(unquote(path), purge_every=int(query.get('purge_every', ['1000'])[0]))
+    if parsed.scheme == 'redis':
+        query = parse_qs(parsed.query)
+        db = parsed.path.lstrip('/') or '0'
+        return RedisBackend(
+            host=parsed.hostname or '127.0.0.1',
+            port=parsed.port or 6379,
+            db=int(db),
+            password=unquote(parsed.password) if parsed.password else None,
+            socket_timeout=float(query.get('timeout', ['1.0'])[0]),
+        )
+    raise ValueError(f'不支持的缓存后端: {spec}')
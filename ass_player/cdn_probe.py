@@ -0,0 +1,175 @@
+"""
+CDN 主动探测模块。
+
+CDN 延迟数据原本全部来自前端被动上报，新的或恢复的主机在有用户恰好命中之前没有任何数据。
+该模块提供一个可选的后台调度线程：定期使用最近一次解析得到的真实直链路径，
+向每个已知的国内 upos 主机发送一个小范围的 Range GET，并把耗时写入解析器的
+`record_cdn_load`，与前端上报共用同一套统计。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse, urlunparse
+
+import requests
+
+from ass_player.bilibili import _is_private_host, is_bilibili_cdn_host
+
+logger = logging.getLogger(__name__)
+
+
+def _is_upos_host(hostname: str) -> bool:
+    """默认的主机过滤：仅探测 B 站视频 CDN 域名下 upos-* 形式的主机。"""
+    return (hostname or '').lower().startswith('upos-') and is_bilibili_cdn_host(hostname)
+
+
+class CdnProber:
+    """
+    后台 CDN 探测器。
+
+    使用示例:
+        prober = CdnProber(parser, interval=300, concurrency=4, max_bytes=65536)
+        prober.start()
+        ...
+        prober.stop()
+    """
+
+    def __init__(self, parser, interval: float = 300, concurrency: int = 4, max_bytes: int = 65536,
+                 timeout: float = 5, session: Optional[requests.Session] = None, scheme: str = 'https',
+                 host_filter: Optional[Callable[[str], bool]] = None):
+        """
+        :param parser: BiliBiliParser 实例，提供已知主机、最近直链与 `record_cdn_load`。
+        :param interval: 两轮探测之间的间隔（秒）。
+        :param concurrency: 单轮探测的最大并发数。
+        :param max_bytes: 每个主机最多读取的字节数（Range 上限）。
+        :param timeout: 单次探测超时（秒）；超时按该值计入统计，与前端超时上报语义一致。
+        :param session: 可选的 requests.Session（便于测试注入）。
+        :param scheme: 探测使用的协议，生产环境为 https，测试可使用 http 指向本地桩服务。
+        :param host_filter: 主机过滤函数，默认仅探测 upos-* 主机。
+        """
+        self.parser = parser
+        self.interval = max(1.0, float(interval))
+        self.concurrency = max(1, int(concurrency))
+        self.max_bytes = max(1, int(max_bytes))
+        self.timeout = float(timeout)
+        self.session = session or requests.Session()
+        self.scheme = scheme
+        self.host_filter = host_filter or _is_upos_host
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _build_probe_url(self, template_url: str, host: str) -> str:
+        """把最近直链的主机替换为目标主机，保留路径与签名查询参数。"""
+        parsed = urlparse(template_url)
+        return urlunparse(parsed._replace(scheme=self.scheme, netloc=host))
+
+    def probe_host(self, host: str, template_url: str) -> Optional[float]:
+        """
+        对单个主机执行一次探测并写入统计。
+
+        :return: 计入统计的耗时（毫秒）；若本次结果不计入统计（如 4xx 签名失效、私有地址）则返回 None。
+        """
+        hostname = urlparse(f'//{host}').hostname or host
+        if _is_private_host(hostname):
+            logger.warning('CDN 探测跳过私有地址主机: %s', host)
+            return None
+
+        url = self._build_probe_url(template_url, host)
+        headers = {
+            'Range': f'bytes=0-{self.max_bytes - 1}',
+            'Referer': 'https://www.bilibili.com/',
+        }
+        start = time.monotonic()
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as resp:
+                if resp.status_code >= 400:
+                    # 4xx 多为签名/过期问题，不是主机本身慢，不计入统计；5xx 视为不可用
+                    if resp.status_code < 500:
+                        logger.debug('CDN 探测 %s 返回 %s，忽略本次结果', host, resp.status_code)
+                        return None
+                    raise requests.HTTPError(f'status {resp.status_code}')
+                received = 0
+                for chunk in resp.iter_content(chunk_size=16384):
+                    received += len(chunk)
+                    if received >= self.max_bytes:
+                        break
+            load_ms = (time.monotonic() - start) * 1000.0
+        except Exception as ex:
+            # 超时或连接失败：按超时值计入，反映主机不可用或较差
+            logger.debug('CDN 探测 %s 失败: %s', host, ex)
+            load_ms = self.timeout * 1000.0
+
+        try:
+            self.parser.record_cdn_load(host, load_ms)
+        except Exception:
+            logger.debug('写入 CDN 探测结果时发生异常: %s', host)
+        return load_ms
+
+    def probe_once(self) -> Dict[str, float]:
+        """
+        执行一轮探测：对所有已知国内 upos 主机并发探测。
+
+        :return: { host: load_ms }，仅包含计入统计的结果。
+        """
+        template_url = getattr(self.parser, '_recent_video_url', None)
+        if not template_url:
+            logger.debug('尚无最近解析的直链，跳过本轮 CDN 探测')
+            return {}
+        hosts = [h for h in self.parser.get_china_hosts() if self.host_filter(h)]
+        if not hosts:
+            return {}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(hosts))) as pool:
+            futures = {h: pool.submit(self.probe_host, h, template_url) for h in hosts}
+            for h, fut in futures.items():
+                try:
+                    value = fut.result()
+                except Exception:
+                    logger.exception('CDN 探测任务异常: %s', h)
+                    continue
+                if value is not None:
+                    results[h] = value
+        logger.info('完成一轮 CDN 探测，共 %d 个主机', len(results))
+        return results
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_once()
+            except Exception:
+                logger.exception('CDN 探测轮次发生异常')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """启动后台探测线程（守护线程，重复调用无副作用）。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cdn-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台探测线程。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def start_from_config(parser, cfg) -> Optional[CdnProber]:
+    """按配置启动 CDN 探测器；未启用时返回 None。"""
+    if not getattr(cfg, 'CDN_PROBE_ENABLED', False):
+        return None
+    prober = CdnProber(
+        parser,
+        interval=getattr(cfg, 'CDN_PROBE_INTERVAL', 300),
+        concurrency=getattr(cfg, 'CDN_PROBE_CONCURRENCY', 4),
+        max_bytes=getattr(cfg, 'CDN_PROBE_BYTES', 65536),
+        timeout=getattr(cfg, 'CDN_PROBE_TIMEOUT', 5),
+    )
+    prober.start()
+    logger.info('已启动 CDN 主动探测（间隔 %ss，并发 %s）', prober.interval, prober.concurrency)
+    return prober
@@ -0,0 +1,120 @@
+"""
+B 站 API 调用的熔断器（按端点区分 /view 与 /playurl）。
+
+api.bilibili.com 宕机或屏蔽本机出口 IP 时，每个解析请求都要等满超时与重试（约 30 秒）才失败。
+熔断器在连续失败达到阈值后进入 open 状态：之后的调用在本地立即失败（CircuitOpenError），
+不再占用线程等待上游；reset_timeout 秒后进入 half-open，只放行少量探测请求，探测成功则
+恢复 closed，失败则重新 open。
+"""
+import threading
+import time
+
+from ass_player import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# 导出到指标时的取值
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于 open 状态（或 half-open 的探测名额已满），本次调用未发出。"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'B 站接口 {name} 暂不可用（熔断中），约 {retry_after:.0f} 秒后重试')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    三态熔断器。
+
+    使用示例:
+        breaker = CircuitBreaker('/view')
+        breaker.before_call()            # open 时抛出 CircuitOpenError
+        try:
+            resp = session.get(...)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+
+    :param name: 端点名，同时用作指标标签。
+    :param failure_threshold: 连续失败多少次后打开。
+    :param reset_timeout: 打开后经过多少秒进入 half-open。
+    :param half_open_max_calls: half-open 状态下同时放行的探测请求数。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        metrics.CIRCUIT_STATE.labels(name).set_function(lambda: STATE_VALUES[self.state])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open_locked(time.monotonic())
+            return self._state
+
+    def retry_after(self) -> float:
+        """距离下一次允许探测的秒数（closed 时为 0）。"""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def _transition_locked(self, state: str):
+        if state != self._state:
+            self._state = state
+            metrics.CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+    def _maybe_half_open_locked(self, now: float):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._transition_locked(HALF_OPEN)
+            self._probes = 0
+
+    def before_call(self):
+        """调用上游之前检查；不允许调用时立即抛出 CircuitOpenError。"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open_locked(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return
+            metrics.CIRCUIT_REJECTED.labels(self.name).inc()
+            retry_after = max(0.0, self._opened_at + self.reset_timeout - now)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._transition_locked(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition_locked(OPEN)
+
+    def abandon(self):
+        """已通过 before_call 但最终没有发出请求（例如本地排队超时）：归还 half-open 的探测名额。"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def stats(self) -> dict:
+        state = self.state
+        return {'state': state, 'failures': self._failures, 'retry_after': round(self.retry_after(), 3)}
@@ -0,0 +1,311 @@
+"""
+B 站弹幕（XML）转 ASS。
+
+热门视频的弹幕有 10 万条量级，逐条与所有已放置弹幕比较碰撞（O(n²)）太慢。该模块：
+
+- `iter_danmaku`：用 iterparse 流式解析弹幕 XML，每处理完一条 <d> 就清空已解析的节点，
+  解析过程的内存与弹幕条数无关（不构建整棵 DOM 树）；
+- `DanmakuLayout`：按轨道分配位置。每条轨道只记录最后一条弹幕的两个时间点（完全进入屏幕、
+  离开屏幕），空闲轨道放在按编号排序的堆中，占用中的轨道按释放时间放在另一个堆中，
+  每条弹幕的放置代价为 O(log 轨道数)；放不下的弹幕丢弃（与 B 站播放器的防挡策略一致）；
+- `danmaku_to_ass`：生成 ASS（[Script Info] / [V4+ Styles] / [Events]，PlayRes 1920x1080），
+  每条弹幕只用 {\\move}/{\\pos}、{\\fs} 与单独的 {\\c&HBBGGRR&} 标签块——前端播放器
+  （static/js/subtitle-renderer.js）支持的覆写标签仅限这几种，不要引入其他标签；
+- `DanmakuCache`：按 cid 缓存转换结果，按总长度淘汰。
+
+内存上界：解析本身是流式的，但布局要求按出现时间排序，danmaku_to_ass 会把全部弹幕读入列表，
+调用方（BiliBiliParser.get_danmaku_ass）还持有整个响应体，因此峰值内存与弹幕条数成正比。
+B 站弹幕列表接口按视频时长返回有上限的条数（XML 中的 maxlimit，通常为数千条），实际峰值为几 MB 量级。
+"""
+import collections
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from ass_player.subtitles import _ass_time
+
+# 弹幕模式：1~3 滚动，4 底部，5 顶部，6 逆向滚动（按普通滚动处理）；7 高级、8 代码、9 BAS 弹幕不支持
+SCROLL_MODES = (1, 2, 3, 6)
+BOTTOM_MODE = 4
+TOP_MODE = 5
+# B 站的标准字号，对应 DanmakuLayout.font_size
+STANDARD_SIZE = 25
+WHITE = 0xFFFFFF
+
+
+class Danmaku(NamedTuple):
+    """一条弹幕：出现时间（秒）、模式、字号、颜色（0xRRGGBB）与文本。"""
+    time: float
+    mode: int
+    size: int
+    color: int
+    text: str
+
+
+def _parse_attrs(p: Optional[str], text: Optional[str]) -> Optional[Danmaku]:
+    # p 属性: 出现时间,模式,字号,颜色,发送时间戳,弹幕池,用户哈希,弹幕 id
+    if not p or not text:
+        return None
+    parts = p.split(',')
+    if len(parts) < 4:
+        return None
+    try:
+        mode = int(parts[1])
+        if mode not in SCROLL_MODES and mode not in (BOTTOM_MODE, TOP_MODE):
+            return None
+        text = text.strip()
+        if not text:
+            return None
+        return Danmaku(max(0.0, float(parts[0])), mode, int(parts[2]), int(parts[3]) & WHITE, text)
+    except ValueError:
+        return None
+
+
+def iter_danmaku(source) -> Iterator[Danmaku]:
+    """
+    流式解析弹幕 XML（文件路径或二进制文件对象），依次产出可显示的弹幕；无效条目与不支持的模式跳过。
+
+    按文档顺序产出（B 站返回的弹幕不保证按时间排序）。
+    """
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag != 'd':
+            continue
+        item = _parse_attrs(elem.get('p'), elem.text)
+        # <d> 没有子节点，清空根节点即可释放已处理的全部兄弟节点
+        root.clear()
+        if item is not None:
+            yield item
+
+
+def text_width(text: str, font_size: float) -> float:
+    """估算单行文本的宽度：全角字符按一个字号，其余按半个字号多一点。"""
+    units = 0.0
+    for ch in text:
+        units += 1.0 if unicodedata.east_asian_width(ch) in ('W', 'F') else 0.55
+    return units * font_size
+
+
+class _TrackIndex:
+    """
+    一组轨道的占用区间索引。
+
+    每条轨道记录最后一条弹幕 [出现, entered_at) 与 [出现, exit_at) 两个区间：entered_at 之前轨道
+    入口被占用，exit_at 之前屏幕上仍有这条弹幕。空闲轨道在 `_free`（按编号的最小堆，优先放在
+    靠近边缘的轨道），入口仍被占用的轨道在 `_busy`（按 entered_at 的最小堆）。
+    """
+
+    def __init__(self, rows: int):
+        self._free = list(range(rows))
+        self._busy: List[Tuple[float, int]] = []
+        self._exit_at = [0.0] * rows
+
+    def acquire(self, start: float, catch_up_at: float, entered_at: float, exit_at: float) -> Optional[int]:
+        """
+        为 start 时刻出现的弹幕分配编号最小的可用轨道，没有时返回 None。
+
+        :param catch_up_at: 新弹幕追上轨道中前一条弹幕的最早时刻；前一条的 exit_at 不晚于它才不会重叠。
+        """
+        busy, free = self._busy, self._free
+        while busy and busy[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        skipped = []
+        track = None
+        while free:
+            candidate = heapq.heappop(free)
+            if self._exit_at[candidate] <= catch_up_at:
+                track = candidate
+                break
+            skipped.append(candidate)
+        for candidate in skipped:
+            heapq.heappush(free, candidate)
+        if track is not None:
+            self._exit_at[track] = exit_at
+            heapq.heappush(busy, (entered_at, track))
+        return track
+
+
+class DanmakuLayout:
+    """
+    弹幕轨道布局与 ASS 事件生成（调用方需按出现时间顺序调用 place）。
+
+    :param width: / height: 画布尺寸，与 ASS 的 PlayResX / PlayResY 一致。
+    :param font_size: 标准字号（25）弹幕在画布上的字号，也是轨道高度。
+    :param scroll_duration: 滚动弹幕从右边缘移动到完全离开左边缘的时间（秒）。
+    :param fixed_duration: 顶部 / 底部弹幕的显示时间（秒）。
+    :param area: 滚动弹幕可使用的屏幕高度比例（0~1）。
+    """
+
+    def __init__(self, width: int = 1920, height: int = 1080, font_size: int = 50, scroll_duration: float = 8.0,
+                 fixed_duration: float = 4.0, area: float = 1.0):
+        self.width = width
+        self.height = height
+        self.font_size = font_size
+        self.scroll_duration = scroll_duration
+        self.fixed_duration = fixed_duration
+        rows = max(1, int(height // font_size))
+        self._scroll = _TrackIndex(max(1, int(rows * min(1.0, max(0.0, area)))))
+        self._top = _TrackIndex(rows)
+        self._bottom = _TrackIndex(rows)
+        self.stats = {'scroll': 0, 'top': 0, 'bottom': 0, 'dropped': 0}
+
+    def place(self, item: Danmaku) -> Optional[str]:
+        """为一条弹幕分配轨道并返回 Dialogue 行；没有可用轨道时返回 None（计入 stats['dropped']）。"""
+        size = round(item.size * self.font_size / STANDARD_SIZE) if item.size > 0 else self.font_size
+        start = item.time
+        if item.mode in SCROLL_MODES:
+            width = min(text_width(item.text, size), float(self.width))
+            speed = (self.width + width) / self.scroll_duration
+            end = start + self.scroll_duration
+            track = self._scroll.acquire(start, start + self.width / speed, start + width / speed, end)
+            if track is None:
+                self.stats['dropped'] += 1
+                return None
+            self.stats['scroll'] += 1
+            y = track * self.font_size
+            tags = f'\\move({self.width},{y},{-round(width)},{y})'
+            style = 'DanmakuScroll'
+        else:
+            end = start + self.fixed_duration
+            tracks = self._top if item.mode == TOP_MODE else self._bottom
+            track = tracks.acquire(start, start, end, end)
+            if track is None:
+                self.stats['dropped'] += 1
+                return None
+            if item.mode == TOP_MODE:
+                self.stats['top'] += 1
+                tags = f'\\pos({self.width // 2},{track * self.font_size})'
+                style = 'DanmakuTop'
+            else:
+                self.stats['bottom'] += 1
+                tags = f'\\pos({self.width // 2},{self.height - track * self.font_size})'
+                style = 'DanmakuBottom'
+        if size != self.font_size:
+            tags += f'\\fs{size}'
+        # 前端渲染器只识别单独成块的 {\c&H...&} 颜色标签
+        color = ''
+        if item.color != WHITE:
+            color = f'{{\\c&H{item.color & 0xFF:02X}{(item.color >> 8) & 0xFF:02X}{item.color >> 16:02X}&}}'
+        text = item.text.replace('{', '｛').replace('}', '｝').replace('\r', '').replace('\n', r'\N')
+        return f'Dialogue: 2,{_ass_time(start)},{_ass_time(end)},{style},,0,0,0,,{{{tags}}}{color}{text}\n'
+
+
+DANMAKU_ASS_HEADER = """[Script Info]
+; 由 B 站弹幕转换
+Title: {title}
+ScriptType: v4.00+
+ScaledBorderAndShadow: Yes
+PlayResX: {width}
+PlayResY: {height}
+WrapStyle: 2
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: DanmakuScroll,Microsoft YaHei,{font_size},&H33FFFFFF,&H33FFFFFF,&H33000000,&H00000000,0,0,0,0,100,100,0,0,1,1.5,0,7,0,0,0,1
+Style: DanmakuTop,Microsoft YaHei,{font_size},&H33FFFFFF,&H33FFFFFF,&H33000000,&H00000000,0,0,0,0,100,100,0,0,1,1.5,0,8,0,0,0,1
+Style: DanmakuBottom,Microsoft YaHei,{font_size},&H33FFFFFF,&H33FFFFFF,&H33000000,&H00000000,0,0,0,0,100,100,0,0,1,1.5,0,2,0,0,0,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def danmaku_to_ass(comments: Iterable[Danmaku], title: str = '', layout: Optional[DanmakuLayout] = None) -> str:
+    """
+    把弹幕按出现时间排序后布局并生成 ASS 文本；布局统计见 layout.stats。
+
+    排序需要先把 comments 全部读入列表，内存与弹幕条数成正比（见模块说明）。
+    """
+    layout = layout or DanmakuLayout()
+    lines = [DANMAKU_ASS_HEADER.format(title=title.replace('\n', ' ') or 'Bilibili 弹幕', width=layout.width,
+                                       height=layout.height, font_size=layout.font_size)]
+    for item in sorted(comments, key=lambda c: c.time):
+        line = layout.place(item)
+        if line is not None:
+            lines.append(line)
+    return ''.join(lines)
+
+
+class DanmakuCache:
+    """
+    按 cid 缓存的弹幕 ASS 文本（LRU，每条保留 ttl 秒，总长度不超过 max_chars 个字符）。
+
+    弹幕会持续增加，ttl 比字幕短；单条超过 max_chars 的结果不缓存。ASS 标题含 bvid，
+    写入时记录 bvid，供 bvid_for 校验请求中的 bvid 与 cid 是否匹配。memory_usage / evict_bytes
+    供全局内存预算（cache_manager.MemoryBudget）使用，写入后调用 on_grow。
+    """
+
+    def __init__(self, ttl: float = 600.0, max_chars: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        # cid -> (文本, 过期时间, bvid)
+        self._entries = collections.OrderedDict()
+        self._chars = 0
+        self._bytes = 0
+        # 写入后的回调（由应用注册为内存预算检查），在释放锁之后调用
+        self.on_grow = None
+
+    @staticmethod
+    def _entry_bytes(text: str) -> int:
+        # str 对象本身的大小（含中文时每字符 2 字节）加上元组与 OrderedDict 节点的固定开销
+        return sys.getsizeof(text) + 200
+
+    def get(self, cid) -> Optional[str]:
+        with self._lock:
+            entry = self._entry_locked(cid)
+            if entry is None:
+                return None
+            self._entries.move_to_end(cid)
+            return entry[0]
+
+    def bvid_for(self, cid) -> Optional[str]:
+        """缓存该 cid 弹幕时对应的 bvid（未缓存时为 None）。"""
+        with self._lock:
+            entry = self._entry_locked(cid)
+            return entry[2] if entry is not None else None
+
+    def _entry_locked(self, cid):
+        entry = self._entries.get(cid)
+        if entry is not None and entry[1] <= time.monotonic():
+            self._pop_locked(cid)
+            return None
+        return entry
+
+    def put(self, cid, text: str, bvid: Optional[str] = None):
+        size = len(text)
+        with self._lock:
+            self._pop_locked(cid)
+            if size > self.max_chars:
+                return
+            self._entries[cid] = (text, time.monotonic() + self.ttl, bvid)
+            self._chars += size
+            self._bytes += self._entry_bytes(text)
+            while self._chars > self.max_chars:
+                self._pop_locked(next(iter(self._entries)))
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """按 LRU 顺序淘汰，直到释放至少 target 字节；返回实际释放的字节数。"""
+        freed = 0
+        with self._lock:
+            while freed < target and self._entries:
+                before = self._bytes
+                self._pop_locked(next(iter(self._entries)))
+                freed += before - self._bytes
+        return freed
+
+    def _pop_locked(self, cid):
+        entry = self._entries.pop(cid, None)
+        if entry is not None:
+            self._chars -= len(entry[0])
+            self._bytes -= self._entry_bytes(entry[0])
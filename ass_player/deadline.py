@@ -0,0 +1,112 @@
+"""
+单次解析的截止时间与按端点自适应的上游超时。
+
+原先每次上游调用固定 10 秒超时，再叠加 urllib3 的 3 次重试与退避，一次 /api/auto-parse
+的总耗时对调用方来说没有上限。现在：
+
+- `Deadline`：每个解析请求的总预算（来自配置或客户端提示），随 ResolveContext 传到
+  `_get_720p_mp4` 与 `_api_get`；调度排队、令牌桶排队、每次尝试与重试退避都从中扣除，
+  预算不足时不再重试；
+- `AdaptiveTimeout`：按端点统计最近若干次上游响应耗时，单次尝试的超时取
+  “高分位耗时 × 倍数”（限制在 [floor, ceiling] 内），上游正常时比固定 10 秒更快放弃卡住的连接。
+
+单次尝试的实际超时为二者中较小者。
+"""
+import collections
+import threading
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """解析预算已用完，放弃本次上游调用（或不再重试）。"""
+
+    def __init__(self, what: str = ''):
+        super().__init__(f'解析超出截止时间{"：" + what if what else ""}')
+        self.what = what
+
+
+class Deadline:
+    """
+    单调时钟上的截止时间。
+
+    使用示例:
+        deadline = Deadline(8.0)
+        timeout = min(10.0, deadline.remaining())
+    """
+
+    __slots__ = ('budget', '_expires_at')
+
+    def __init__(self, seconds: float):
+        self.budget = float(seconds)
+        self._expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        """剩余秒数（已过期时为 0）。"""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    def cap(self, timeout: Optional[float]) -> Optional[float]:
+        """把等待时间限制在剩余预算内（timeout 为 None 表示不限时）。"""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+class AdaptiveTimeout:
+    """
+    根据最近的上游耗时估算单次请求超时。
+
+    样本不足 min_samples 时使用 ceiling（即原来的固定超时）；之后每 refresh_every 个新样本
+    重新计算一次分位数，避免每次请求都排序。
+
+    :param ceiling: 超时上限（秒），也是样本不足时的取值。
+    :param floor: 超时下限（秒），避免上游很快时把偶发抖动也判为超时。
+    :param percentile: 参考的耗时分位数（0~1）。
+    :param multiplier: 在分位数耗时上乘的倍数。
+    :param window: 保留的最近样本数。
+    :param timeout_backoff: 请求超时（见 observe_timeout）时当前超时乘的倍数。
+    """
+
+    def __init__(self, ceiling: float, floor: float = 1.0, percentile: float = 0.99, multiplier: float = 2.0,
+                 window: int = 256, min_samples: int = 20, refresh_every: int = 16, timeout_backoff: float = 2.0):
+        self.ceiling = float(ceiling)
+        self.floor = min(float(floor), self.ceiling)
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.refresh_every = max(1, refresh_every)
+        self.timeout_backoff = max(1.0, float(timeout_backoff))
+        self._samples = collections.deque(maxlen=max(window, min_samples))
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._current = self.ceiling
+
+    def observe(self, seconds: float):
+        """记录一次已收到响应的上游调用耗时。"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._pending += 1
+            if self._pending >= self.refresh_every and len(self._samples) >= self.min_samples:
+                self._pending = 0
+                ordered = sorted(self._samples)
+                index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+                self._current = min(self.ceiling, max(self.floor, ordered[index] * self.multiplier))
+
+    def observe_timeout(self, timeout: float):
+        """
+        记录一次因超时（而不是截止时间）放弃的上游调用。
+
+        超时的请求没有耗时样本：上游稳定变慢到超过当前超时后，只记录响应会让超时永远停在原值，
+        每次尝试都超时。这里把超时值作为样本（实际耗时的下界）计入，并立即把当前超时乘以
+        timeout_backoff（不超过 ceiling），下一次尝试就能等到变慢后的响应。
+        """
+        with self._lock:
+            self._samples.append(timeout)
+            self._current = min(self.ceiling, max(self._current, timeout) * self.timeout_backoff)
+
+    def current(self) -> float:
+        """当前建议的单次请求超时（秒）。"""
+        return self._current
@@ -0,0 +1,245 @@
+"""
+热点 key 统计与预热。
+
+预热原先只覆盖手工配置的默认视频，真正热门的 BV 号只能靠人工维护列表。该模块在每次
+/api/auto-parse 时记录解析的 key（规范化后的视频 URL，与解析结果缓存的 key 一致）：
+
+- `CountMinSketch`：固定宽度 × 深度的计数矩阵，估算每个 key 的出现次数，内存与不同 key 的
+  数量无关；每累计 decay_every 次计数整体减半，使统计偏向近期流量；
+- `HotKeys`：在 sketch 之上维护估算次数最高的 top_k 个 key，只有这 top_k 个 key 的字符串常驻内存；
+- `HotKeyWarmer`：可选的后台线程，定期把当前 top-K 以后台通道解析进缓存，并在直链签名
+  `deadline=` 到期前重新解析。
+
+当前 top-K 与预热状态由 /admin/hotkeys 对外报告。
+"""
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from ass_player import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch：每个 key 在 depth 行中各映射到一个计数器，估算值取其中最小者（只会高估）。
+
+    采用保守更新：只增加等于当前最小值的计数器，显著降低哈希冲突带来的高估。
+
+    :param width: 每行计数器个数，越大冲突越少。
+    :param depth: 行数（独立哈希个数）。
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = max(16, int(width))
+        self.depth = max(1, int(depth))
+        self._rows = [array('L', [0]) * self.width for _ in range(self.depth)]
+
+    def _indexes(self, key: str) -> List[int]:
+        # 双重哈希：由一次 blake2b 摘要派生 depth 个下标
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """计数并返回该 key 更新后的估算次数。"""
+        indexes = self._indexes(key)
+        estimate = min(row[i] for row, i in zip(self._rows, indexes)) + count
+        for row, i in zip(self._rows, indexes):
+            if row[i] < estimate:
+                row[i] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key)))
+
+    def halve(self):
+        """全部计数器减半（老化）。"""
+        for row in self._rows:
+            for i, value in enumerate(row):
+                if value:
+                    row[i] = value >> 1
+
+    def memory_usage(self) -> int:
+        """计数矩阵占用的字节数（固定值）。"""
+        return sum(row.itemsize * len(row) for row in self._rows)
+
+
+class HotKeys:
+    """
+    近期访问最多的 top_k 个 key。
+
+    使用示例:
+        hotkeys = HotKeys(top_k=32)
+        hotkeys.record('https://www.bilibili.com/video/BV1xx411c7mD')
+        hotkeys.top()   # [('https://www.bilibili.com/video/BV1xx411c7mD', 1)]
+
+    :param top_k: 保留的热点 key 个数。
+    :param width: / depth: Count-Min Sketch 的尺寸。
+    :param decay_every: 每累计多少次计数把 sketch 与 top-K 的计数整体减半（0 表示不老化）。
+    :param max_key_length: 超过该长度的 key 不计入统计，避免 top-K 保存任意长的字符串。
+    """
+
+    def __init__(self, top_k: int = 32, width: int = 2048, depth: int = 4, decay_every: int = 100000,
+                 max_key_length: int = 256):
+        self.top_k = max(1, int(top_k))
+        self.decay_every = max(0, int(decay_every))
+        self.max_key_length = max_key_length
+        self.sketch = CountMinSketch(width, depth)
+        self._lock = threading.Lock()
+        # key -> 估算次数；只保存 top_k 个，_floor 为其中最小计数的下界（过期偏低时在下一次比较中修正）
+        self._top: Dict[str, int] = {}
+        self._floor = 0
+        self._since_decay = 0
+        self.total = 0
+
+    def record(self, key: str) -> int:
+        """记录一次访问，返回该 key 的估算次数（不计入时为 0）。"""
+        if not key or len(key) > self.max_key_length:
+            return 0
+        with self._lock:
+            count = self.sketch.add(key)
+            self.total += 1
+            if key in self._top or len(self._top) < self.top_k:
+                self._top[key] = count
+            elif count > self._floor:
+                coldest = min(self._top, key=self._top.get)
+                if count > self._top[coldest]:
+                    del self._top[coldest]
+                    self._top[key] = count
+                self._floor = min(self._top.values())
+            self._since_decay += 1
+            if self.decay_every and self._since_decay >= self.decay_every:
+                self._decay_locked()
+            return count
+
+    def _decay_locked(self):
+        self._since_decay = 0
+        self.sketch.halve()
+        self._top = {k: c >> 1 for k, c in self._top.items() if c >> 1}
+        self._floor = 0
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """按估算次数从高到低返回 (key, 次数)。"""
+        with self._lock:
+            ranked = sorted(self._top.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if n is None else ranked[:n]
+
+    def stats(self) -> dict:
+        return {
+            'top_k': self.top_k,
+            'tracked': len(self._top),
+            'total': self.total,
+            'sketch': {'width': self.sketch.width, 'depth': self.sketch.depth, 'bytes': self.sketch.memory_usage()},
+            'decay_every': self.decay_every,
+        }
+
+
+class HotKeyWarmer:
+    """
+    后台保持 top-K 热点 key 已解析且未过期。
+
+    每隔 interval 秒检查一次当前 top-K：新进入 top-K 的 key 先按普通方式解析（缓存命中时不访问上游），
+    之后在距直链 deadline 还剩 refresh_margin 秒时强制重新解析；掉出 top-K 的 key 不再刷新。
+    所有解析都走调度器的后台通道，不与用户请求争抢预留的并发。
+
+    :param parser: BiliBiliParser 实例，解析结果写入其解析结果缓存。
+    :param hotkeys: HotKeys 实例。
+    :param interval: 两轮检查之间的间隔（秒）。
+    :param min_count: 估算次数低于该值的 key 不预热，避免低流量时预热一次性访问。
+    :param refresh_margin: 距直链 deadline 还剩多少秒时重新解析。
+    :param retry_interval: 解析失败后的首次重试间隔（秒），之后按指数退避直到 max_retry_interval。
+    :param fallback_refresh: 直链不带 deadline 时的刷新间隔（秒）。
+    """
+
+    def __init__(self, parser, hotkeys: HotKeys, interval: float = 30, min_count: int = 2, refresh_margin: float = 300,
+                 retry_interval: float = 30, max_retry_interval: float = 600, fallback_refresh: float = 1800):
+        self.parser = parser
+        self.hotkeys = hotkeys
+        self.interval = max(1.0, float(interval))
+        self.min_count = max(1, int(min_count))
+        # HotKeys 随应用工厂创建，本模块不在导入时加载解析器（requests）；预热器只在启用时才创建
+        from ass_player.warmup import RefreshSchedule
+        self.schedule = RefreshSchedule(refresh_margin, retry_interval, max_retry_interval, fallback_refresh)
+        self._lock = threading.Lock()
+        # key -> {'next': 下一次刷新时间, 'failures': 连续失败次数, ...}；只保存当前 top-K 中的 key
+        self._state: Dict[str, dict] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm(self, key: str, refresh: bool) -> dict:
+        """解析一个热点 key（refresh=True 时跳过缓存强制重新解析），返回其新的预热状态。"""
+        previous = self._state.get(key) or {}
+        status = self.schedule.resolve(self.parser, key, use_cache=not refresh, failures=previous.get('failures', 0))
+        delay = status.pop('delay')
+        metrics.HOTKEY_WARMS.labels(status['state']).inc()
+        if status['state'] == 'error':
+            logger.warning('热点预热解析失败（第 %d 次），%.0f 秒后重试: %s', status['failures'], delay, key)
+        return dict(status, next=time.time() + delay)
+
+    def run_once(self, now: Optional[float] = None) -> int:
+        """检查一轮当前 top-K，解析其中到期的 key，返回本轮解析的个数。"""
+        now = time.time() if now is None else now
+        keys = [key for key, count in self.hotkeys.top() if count >= self.min_count]
+        with self._lock:
+            self._state = {key: state for key, state in self._state.items() if key in keys}
+            due = [key for key in keys if key not in self._state or self._state[key]['next'] <= now]
+        resolved = 0
+        for key in due:
+            if self._stop.is_set():
+                break
+            state = self.warm(key, refresh=key in self._state)
+            with self._lock:
+                self._state[key] = state
+            resolved += 1
+        return resolved
+
+    def status(self) -> Dict[str, dict]:
+        """各热点 key 的预热状态（refresh_in 为距下一次刷新的秒数）。"""
+        now = time.time()
+        with self._lock:
+            return {key: dict(state, refresh_in=round(max(0.0, state['next'] - now), 3))
+                    for key, state in self._state.items()}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('热点预热轮次异常')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """启动后台预热线程（守护线程，重复调用无副作用）。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='hotkey-warmup', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台预热线程。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def start_from_config(parser, hotkeys: HotKeys, cfg) -> Optional[HotKeyWarmer]:
+    """按配置启动热点预热；未启用时返回 None。"""
+    if not getattr(cfg, 'HOTKEYS_WARM_ENABLED', False):
+        return None
+    warmer = HotKeyWarmer(
+        parser,
+        hotkeys,
+        interval=getattr(cfg, 'HOTKEYS_WARM_INTERVAL', 30),
+        min_count=getattr(cfg, 'HOTKEYS_WARM_MIN_COUNT', 2),
+        refresh_margin=getattr(cfg, 'WARMUP_REFRESH_MARGIN', 300),
+    )
+    warmer.start()
+    logger.info('已启动热点预热（top %d，每 %.0f 秒检查一次）', hotkeys.top_k, warmer.interval)
+    return warmer
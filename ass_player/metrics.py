@@ -0,0 +1,310 @@
+"""
+进程内指标模块（Prometheus 文本格式）。
+
+提供 Counter / Gauge / Histogram 三种指标与一个全局注册表 `REGISTRY`，由 `/metrics` 路由调用
+`REGISTRY.render()` 输出 Prometheus text exposition format（0.0.4），无需外部服务或第三方依赖。
+
+采集路径尽量轻量：带标签的子指标在首次使用时创建（仅创建时加锁），之后每次更新只持有
+该子指标自己的小锁完成几次整数加法，不同路由/端点之间互不竞争。
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认直方图分桶（秒），覆盖本地调用的毫秒级到上游超时的十秒级
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label(value: str) -> str:
+    """按 exposition format 规范转义标签值。"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape_label(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签指标的公共部分：维护 labels 元组到子指标的映射。"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """返回指定标签值对应的子指标（首次访问时创建）。"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际传入 {key}')
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(self._samples())
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(c.get())}'
+                for k, c in list(self._children.items())]
+
+
+class _GaugeChild:
+    __slots__ = ('_value', '_fn', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._fn = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        """改为在导出时调用 `fn()` 取值，适合比值等派生指标。"""
+        self._fn = fn
+
+    def get(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return float('nan')
+        return self._value
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值。"""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(c.get())}'
+                for k, c in list(self._children.items())]
+
+
+class _Timer:
+    """`with histogram.time():` 形式的计时上下文。"""
+
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('_upper', '_counts', '_sum', '_count', '_lock')
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper = upper_bounds
+        # 每个桶存放非累计计数，最后一个桶对应 +Inf；导出时再做累加
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self._upper, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+class Histogram(_Metric):
+    """固定分桶直方图。"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self):
+        lines = []
+        for key, child in list(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for upper, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", _format_value(upper)))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    """指标注册表：同名指标只注册一次，`render()` 输出完整的文本格式。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames=(), **kwargs):
+        metric = self._metrics.get(name)
+        if metric is not None:
+            if not isinstance(metric, cls):
+                raise ValueError(f'指标 {name} 已以其他类型注册')
+            return metric
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表与本项目使用的指标定义
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter('ass_http_requests_total', 'Flask 路由请求总数', ('route', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('ass_http_request_duration_seconds', 'Flask 路由请求耗时（秒）', ('route',))
+UPSTREAM_LATENCY = REGISTRY.histogram('ass_upstream_request_duration_seconds', 'B 站上游 API 调用耗时（秒）', ('endpoint',))
+UPSTREAM_ERRORS = REGISTRY.counter('ass_upstream_errors_total', 'B 站上游 API 调用异常次数', ('endpoint',))
+UPSTREAM_QUEUE_WAIT = REGISTRY.histogram('ass_upstream_queue_wait_seconds', 'B 站上游 API 请求在令牌桶中的排队时间（秒）', ('endpoint',))
+UPSTREAM_THROTTLED = REGISTRY.counter('ass_upstream_throttled_total', 'B 站上游 API 返回限流状态码（429 / 412）的次数', ('endpoint', 'status'))
+UPSTREAM_RATE = REGISTRY.gauge('ass_upstream_rate_limit', '共用令牌桶当前允许的上游请求速率（请求/秒）')
+UPSTREAM_TIMEOUT = REGISTRY.gauge('ass_upstream_timeout_seconds', '按端点自适应的单次上游请求超时（秒）', ('endpoint',))
+DEADLINE_EXCEEDED = REGISTRY.counter('ass_deadline_exceeded_total', '因解析预算用完而放弃的上游调用数', ('endpoint',))
+RESOLVE_QUEUE_WAIT = REGISTRY.histogram('ass_resolve_queue_wait_seconds', '解析调度器中按通道统计的排队时间（秒）', ('lane',))
+RESOLVE_IN_FLIGHT = REGISTRY.gauge('ass_resolve_in_flight', '解析调度器中按通道统计的进行中请求数', ('lane',))
+RESOLVE_QUEUED = REGISTRY.gauge('ass_resolve_queued', '解析调度器中按通道统计的排队请求数', ('lane',))
+CIRCUIT_STATE = REGISTRY.gauge('ass_circuit_state', 'B 站 API 熔断器状态（0=closed，1=open，2=half_open）', ('endpoint',))
+CIRCUIT_TRANSITIONS = REGISTRY.counter('ass_circuit_transitions_total', 'B 站 API 熔断器状态切换次数（按切换后的状态）', ('endpoint', 'state'))
+CIRCUIT_REJECTED = REGISTRY.counter('ass_circuit_rejected_total', '熔断期间在本地直接拒绝的 B 站 API 调用数', ('endpoint',))
+PLAYURL_STRATEGY_ATTEMPTS = REGISTRY.counter('ass_playurl_strategy_attempts_total', '各 playurl 策略已完成的尝试次数（按结果）', ('strategy', 'result'))
+PLAYURL_STRATEGY_WINS = REGISTRY.counter('ass_playurl_strategy_wins_total', '各 playurl 策略率先给出有效直链的次数', ('strategy',))
+PLAYURL_STRATEGY_LATENCY = REGISTRY.histogram('ass_playurl_strategy_duration_seconds', '各 playurl 策略单次尝试耗时（秒）', ('strategy',))
+DNS_CHECK_LATENCY = REGISTRY.histogram('ass_ssrf_dns_check_duration_seconds', '_is_private_host 中 DNS 解析与地址检查耗时（秒）',
+                                       buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+CACHE_REQUESTS = REGISTRY.counter('ass_cache_requests_total', '缓存查询次数（按命中/未命中）', ('cache', 'result'))
+CACHE_HIT_RATIO = REGISTRY.gauge('ass_cache_hit_ratio', '缓存命中率（命中 / 总查询）', ('cache',))
+CACHE_MEMORY_BYTES = REGISTRY.gauge('ass_cache_memory_bytes', '进程内缓存的估算内存占用（字节）', ('cache',))
+CACHE_BUDGET_EVICTED = REGISTRY.counter('ass_cache_budget_evicted_bytes_total', '因超出全局内存预算而淘汰的字节数', ('cache',))
+ADMISSION_IN_FLIGHT = REGISTRY.gauge('ass_admission_in_flight', '准入控制下进行中的请求数', ('limiter',))
+ADMISSION_QUEUED = REGISTRY.gauge('ass_admission_queued', '准入控制下排队等待的请求数', ('limiter',))
+ADMISSION_REJECTED = REGISTRY.counter('ass_admission_rejected_total', '准入控制拒绝（返回 503）的请求数', ('limiter', 'reason'))
+CDN_REPORTS = REGISTRY.counter('ass_cdn_reports_total', '/api/report-cdn 上报次数（按处理结果）', ('outcome',))
+HOTKEY_WARMS = REGISTRY.counter('ass_hotkey_warms_total', '热点 key 后台预热解析次数（按结果）', ('result',))
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """记录一次缓存查询；首次出现的缓存名会同时注册其命中率派生指标。"""
+    hits = CACHE_REQUESTS.labels(cache, 'hit')
+    misses = CACHE_REQUESTS.labels(cache, 'miss')
+    (hits if hit else misses).inc()
+    ratio = CACHE_HIT_RATIO.labels(cache)
+    if ratio._fn is None:
+        def _ratio():
+            total = hits.get() + misses.get()
+            return hits.get() / total if total else 0.0
+        ratio.set_function(_ratio)
@@ -0,0 +1,159 @@
+"""
+B 站 API 请求的进程级自适应令牌桶。
+
+会话上的 urllib3 Retry 对每个 429 各自退避重试：负载高时所有线程几乎同时退避、同时重试，
+反而加剧限流。这里改为进程内所有解析器共用一个令牌桶：每个上游请求先取令牌，收到 429 / 412
+时速率乘性下降，之后每个成功响应按加性方式逐步恢复（AIMD），直到配置的上限。
+
+令牌允许透支：取令牌时立即登记，返回需要等待的秒数，请求按到达顺序依次放行；这段等待即
+该请求的排队时间，由调用方计入指标与 Server-Timing。
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from ass_player import metrics
+
+# 视为“被限流”的上游状态码：429 Too Many Requests 与 B 站风控的 412
+THROTTLE_STATUSES = (412, 429)
+
+
+class UpstreamRateLimited(Exception):
+    """取令牌需要等待的时间超过上限（上游持续限流），放弃本次请求。"""
+
+    def __init__(self, wait: float):
+        super().__init__(f'上游限流，需等待 {wait:.1f} 秒')
+        self.wait = wait
+
+
+class AdaptiveTokenBucket:
+    """
+    AIMD 令牌桶。
+
+    使用示例:
+        bucket = AdaptiveTokenBucket(rate=20)
+        waited = bucket.acquire()          # 阻塞到轮到本请求，返回排队秒数
+        resp = session.get(...)
+        if resp.status_code in THROTTLE_STATUSES:
+            bucket.on_throttled()
+        else:
+            bucket.on_success()
+
+    :param rate: 速率上限（请求/秒），同时是初始速率；<= 0 表示不限速。
+    :param burst: 桶容量（允许的突发请求数），默认为 2 倍速率。
+    :param min_rate: 乘性下降的下限。
+    :param decrease: 每次被限流时速率乘以的系数。
+    :param increase: 加性恢复的步长：约每秒（按当前速率折算的成功请求数）恢复这么多请求/秒。
+    :param cooldown: 两次下降之间的最短间隔（秒），避免同一轮限流的多个响应把速率连续压到底。
+    :param max_wait: 单个请求最多排队的秒数，超过时抛出 UpstreamRateLimited。
+    """
+
+    def __init__(self, rate: float = 20.0, burst: Optional[float] = None, min_rate: float = 1.0, decrease: float = 0.5,
+                 increase: float = 1.0, cooldown: float = 1.0, max_wait: float = 5.0):
+        self._lock = threading.Lock()
+        self.configure(rate, burst, min_rate)
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.throttled = 0
+
+    def configure(self, rate: float, burst: Optional[float] = None, min_rate: Optional[float] = None):
+        """重新设置速率上限与桶容量（当前速率与令牌一并重置）。"""
+        with self._lock:
+            self.max_rate = max(0.0, float(rate))
+            self.rate = self.max_rate
+            self.burst = float(burst) if burst else max(1.0, self.max_rate * 2)
+            if min_rate is not None:
+                self.min_rate = min(float(min_rate), self.max_rate) if self.max_rate else float(min_rate)
+            self._tokens = self.burst
+            self._last = time.monotonic()
+            self._last_decrease = float('-inf')
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill_locked(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> float:
+        """
+        取一个令牌并返回需要等待的秒数（0 表示立即放行）。
+
+        :param max_wait: 本次最多排队的秒数（例如解析剩余的预算），不超过构造时的 max_wait。
+        """
+        if not self.enabled:
+            return 0.0
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            wait = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else 0.0
+            if wait > limit:
+                raise UpstreamRateLimited(wait)
+            self._tokens -= 1.0
+            return wait
+
+    def acquire(self, max_wait: Optional[float] = None) -> float:
+        """阻塞到本请求可以发出，返回排队秒数。"""
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, max_wait: Optional[float] = None) -> float:
+        """acquire 的异步版本：排队期间不占用线程。"""
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_throttled(self):
+        """上游返回 429 / 412：速率乘性下降，并清空积攒的令牌。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._refill_locked(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self._last_decrease = now
+
+    def on_success(self):
+        """上游正常响应：速率加性恢复，直到上限。"""
+        if not self.enabled or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def stats(self) -> dict:
+        return {'rate': self.rate, 'max_rate': self.max_rate, 'burst': self.burst, 'throttled': self.throttled}
+
+
+_upstream_bucket: Optional[AdaptiveTokenBucket] = None
+_bucket_lock = threading.Lock()
+
+
+def get_upstream_bucket() -> AdaptiveTokenBucket:
+    """返回进程内所有解析器共用的 B 站 API 令牌桶（首次调用时按默认参数创建）。"""
+    global _upstream_bucket
+    if _upstream_bucket is None:
+        with _bucket_lock:
+            if _upstream_bucket is None:
+                bucket = AdaptiveTokenBucket()
+                metrics.UPSTREAM_RATE.labels().set_function(lambda: bucket.rate)
+                _upstream_bucket = bucket
+    return _upstream_bucket
+
+
+def configure_upstream_bucket(rate: float, burst: Optional[float] = None, min_rate: Optional[float] = None) -> AdaptiveTokenBucket:
+    """按配置设置共用令牌桶（UPSTREAM_RATE 等），返回该令牌桶。"""
+    bucket = get_upstream_bucket()
+    bucket.configure(rate, burst, min_rate)
+    return bucket
@@ -0,0 +1,196 @@
+"""
+解析任务的优先级调度（交互 / 后台两条通道）。
+
+启动预热等后台解析与正在等待“解析”按钮的用户争用同一份上游预算与线程。调度器位于
+BiliBiliParser 的上游调用之前（缓存命中不经过调度器），按通道分配并发：
+
+- 总并发上限为 max_concurrency，其中 interactive_reserved 个只留给交互请求，后台任务
+  最多同时占用其余部分；
+- 有空位时先放行排队中的交互请求，交互请求总是排在已排队的后台任务之前；已经开始的
+  后台请求不会被中断；
+- 每个请求的排队时间按通道记入指标。
+
+线程与协程可以在同一个调度器上等待：空位在释放时直接移交给下一个等待者。
+"""
+import asyncio
+import collections
+import threading
+import time
+from typing import Dict, Optional
+
+from ass_player import metrics
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+# 放行顺序即优先级顺序
+LANES = (INTERACTIVE, BACKGROUND)
+
+
+class SchedulerTimeout(Exception):
+    """在等待时间内没有分到空位。"""
+
+
+class _Waiter:
+    __slots__ = ('granted', '_event', '_loop', '_future')
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self._loop = loop
+        self._event = None if loop is not None else threading.Event()
+        self._future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class ResolveScheduler:
+    """
+    两条通道的并发调度器。
+
+    使用示例:
+        scheduler = ResolveScheduler(max_concurrency=32, interactive_reserved=8)
+        with scheduler.slot(BACKGROUND):
+            ...  # 调用上游
+    """
+
+    def __init__(self, max_concurrency: int = 32, interactive_reserved: int = 8):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, collections.deque] = {lane: collections.deque() for lane in LANES}
+        self.in_flight: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.configure(max_concurrency, interactive_reserved)
+        for lane in LANES:
+            metrics.RESOLVE_IN_FLIGHT.labels(lane).set_function(lambda lane=lane: self.in_flight[lane])
+            metrics.RESOLVE_QUEUED.labels(lane).set_function(lambda lane=lane: len(self._queues[lane]))
+
+    def configure(self, max_concurrency: int, interactive_reserved: int):
+        """调整并发上限与交互预留数（调大时立即放行排队中的请求）。"""
+        with self._lock:
+            self.max_concurrency = max(1, int(max_concurrency))
+            self.interactive_reserved = min(max(0, int(interactive_reserved)), self.max_concurrency - 1)
+            self._dispatch_locked()
+
+    @property
+    def background_limit(self) -> int:
+        return self.max_concurrency - self.interactive_reserved
+
+    def _can_start_locked(self, lane: str) -> bool:
+        if sum(self.in_flight.values()) >= self.max_concurrency:
+            return False
+        if lane == BACKGROUND:
+            return self.in_flight[BACKGROUND] < self.background_limit and not self._queues[INTERACTIVE]
+        return True
+
+    def _dispatch_locked(self):
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self._can_start_locked(lane):
+                waiter = queue.popleft()
+                waiter.granted = True
+                self.in_flight[lane] += 1
+                waiter.wake()
+
+    def _try_start(self, lane: str, waiter_factory):
+        """有空位且本通道无人排队时直接占用并返回 None，否则登记等待者并返回它。"""
+        if lane not in self._queues:
+            raise ValueError(f'未知的调度通道: {lane}')
+        with self._lock:
+            if not self._queues[lane] and self._can_start_locked(lane):
+                self.in_flight[lane] += 1
+                return None
+            waiter = waiter_factory()
+            self._queues[lane].append(waiter)
+            return waiter
+
+    def _abandon(self, lane: str, waiter: _Waiter) -> bool:
+        """放弃等待；空位已移交给该等待者时返回 True（由调用方决定使用还是释放）。"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queues[lane].remove(waiter)
+            # 排队的交互请求离开后，被它挡住的后台任务可能已经可以开始
+            self._dispatch_locked()
+            return False
+
+    def acquire(self, lane: str = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """阻塞直到分到空位，返回排队秒数；超过 timeout 仍未分到时抛出 SchedulerTimeout。"""
+        start = time.perf_counter()
+        waiter = self._try_start(lane, _Waiter)
+        if waiter is None:
+            return self._record_wait(lane, None)
+        if not waiter._event.wait(timeout) and not self._abandon(lane, waiter):
+            raise SchedulerTimeout(f'{lane} 通道等待 {timeout} 秒仍无空位')
+        return self._record_wait(lane, start)
+
+    async def acquire_async(self, lane: str = INTERACTIVE, timeout: Optional[float] = None) -> float:
+        """acquire 的异步版本：等待期间不占用线程。"""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        waiter = self._try_start(lane, lambda: _Waiter(loop))
+        if waiter is None:
+            return self._record_wait(lane, None)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter._future), timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(lane, waiter):
+                raise SchedulerTimeout(f'{lane} 通道等待 {timeout} 秒仍无空位')
+        except BaseException:
+            # 被取消时归还已移交的空位
+            if self._abandon(lane, waiter):
+                self.release(lane)
+            raise
+        return self._record_wait(lane, start)
+
+    def release(self, lane: str = INTERACTIVE):
+        with self._lock:
+            self.in_flight[lane] -= 1
+            self._dispatch_locked()
+
+    @staticmethod
+    def _record_wait(lane: str, start: Optional[float]) -> float:
+        """记录排队时间；start 为 None 表示未排队直接放行。"""
+        waited = time.perf_counter() - start if start is not None else 0.0
+        metrics.RESOLVE_QUEUE_WAIT.labels(lane).observe(waited)
+        return waited
+
+    def slot(self, lane: str = INTERACTIVE, timeout: Optional[float] = None):
+        """占用一个空位的上下文管理器，进入时返回排队秒数。"""
+        return _Slot(self, lane, timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'interactive_reserved': self.interactive_reserved,
+                'in_flight': dict(self.in_flight),
+                'queued': {lane: len(q) for lane, q in self._queues.items()},
+            }
+
+
+class _Slot:
+    __slots__ = ('_scheduler', '_lane', '_timeout')
+
+    def __init__(self, scheduler: ResolveScheduler, lane: str, timeout: Optional[float]):
+        self._scheduler = scheduler
+        self._lane = lane
+        self._timeout = timeout
+
+    def __enter__(self) -> float:
+        return self._scheduler.acquire(self._lane, self._timeout)
+
+    def __exit__(self, *exc):
+        self._scheduler.release(self._lane)
+        return False
+
+    async def __aenter__(self) -> float:
+        return await self._scheduler.acquire_async(self._lane, self._timeout)
+
+    async def __aexit__(self, *exc):
+        self._scheduler.release(self._lane)
+        return False
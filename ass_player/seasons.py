@@ -0,0 +1,145 @@
+"""
+合集（ugc_season）元数据缓存。
+
+B 站 view 接口的响应中带有视频所属合集的完整分集列表（每集的 bvid 与 cid）。解析器在每次
+调用 view 时顺便按合集 id 缓存这份列表：之后解析同一合集中的任意一集都可以直接用缓存的 cid
+调用 playurl，省去一次 view 调用；/api/season 也用它返回按顺序排列的分集列表。
+"""
+import collections
+import sys
+import threading
+import time
+from typing import List, Optional
+
+
+class Episode:
+    """合集中的一集。"""
+
+    __slots__ = ('bvid', 'cid', 'aid', 'title', 'duration')
+
+    def __init__(self, bvid: str, cid, aid=None, title: str = '', duration: Optional[int] = None):
+        self.bvid = bvid
+        self.cid = cid
+        self.aid = aid
+        self.title = title
+        self.duration = duration
+
+    def to_dict(self) -> dict:
+        return {'bvid': self.bvid, 'cid': self.cid, 'title': self.title, 'duration': self.duration}
+
+
+class Season:
+    """一个合集：id、标题与按播放顺序排列的分集。"""
+
+    __slots__ = ('id', 'title', 'episodes', '_positions')
+
+    def __init__(self, season_id, title: str, episodes: List[Episode]):
+        self.id = season_id
+        self.title = title
+        self.episodes = episodes
+        self._positions = {ep.bvid: i for i, ep in enumerate(episodes)}
+
+    def index_of(self, bvid: str) -> Optional[int]:
+        return self._positions.get(bvid)
+
+
+def parse_ugc_season(view_data: dict) -> Optional[Season]:
+    """从 view 响应的 data.ugc_season 中取出合集（各小节的分集按顺序拼接）；不属于合集时返回 None。"""
+    season = (view_data.get('data') or {}).get('ugc_season') or {}
+    if season.get('id') is None:
+        return None
+    episodes = []
+    for section in season.get('sections') or []:
+        for ep in section.get('episodes') or []:
+            if not ep.get('bvid') or ep.get('cid') is None:
+                continue
+            arc = ep.get('arc') or {}
+            episodes.append(Episode(ep['bvid'], ep['cid'], ep.get('aid'), ep.get('title') or arc.get('title') or '',
+                                    arc.get('duration')))
+    return Season(season['id'], season.get('title') or '', episodes) if episodes else None
+
+
+def _season_bytes(season: Season) -> int:
+    # Season / Episode 对象、索引字典与字符串的估算大小
+    return 300 + sys.getsizeof(season.title) + sum(
+        400 + sys.getsizeof(ep.bvid) + sys.getsizeof(ep.title) for ep in season.episodes)
+
+
+class SeasonCache:
+    """
+    按合集 id 缓存的分集列表（LRU，最多 max_seasons 个合集，每个保留 ttl 秒），并维护 bvid -> 合集的索引。
+
+    :param ttl: 合集元数据的有效期（秒）；合集更新（新增分集）后最迟 ttl 秒可见。
+    :param max_seasons: 最多缓存的合集数。
+
+    memory_usage / evict_bytes 供全局内存预算使用，写入后调用 on_grow。
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_seasons: int = 256):
+        self.ttl = ttl
+        self.max_seasons = max(1, max_seasons)
+        self._lock = threading.Lock()
+        # 合集 id -> (Season, 过期时间, 估算字节数)
+        self._seasons = collections.OrderedDict()
+        self._by_bvid = {}
+        self._bytes = 0
+        # 写入后的回调（由应用注册为内存预算检查），在释放锁之后调用
+        self.on_grow = None
+
+    def put(self, season: Season):
+        size = _season_bytes(season)
+        with self._lock:
+            self._pop_locked(season.id)
+            self._seasons[season.id] = (season, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            for ep in season.episodes:
+                self._by_bvid[ep.bvid] = season.id
+            while len(self._seasons) > self.max_seasons:
+                self._pop_locked(next(iter(self._seasons)))
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def season_for(self, bvid: str) -> Optional[Season]:
+        """返回包含该 bvid 且未过期的合集。"""
+        with self._lock:
+            season_id = self._by_bvid.get(bvid)
+            if season_id is None:
+                return None
+            season, expires_at, _ = self._seasons[season_id]
+            if expires_at <= time.monotonic():
+                self._pop_locked(season_id)
+                return None
+            self._seasons.move_to_end(season_id)
+            return season
+
+    def cid_for(self, bvid: str):
+        """缓存中该 bvid 的 cid（不在已缓存的合集中时为 None）。"""
+        season = self.season_for(bvid)
+        if season is None:
+            return None
+        return season.episodes[season.index_of(bvid)].cid
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """按 LRU 顺序淘汰合集，直到释放至少 target 字节；返回实际释放的字节数。"""
+        freed = 0
+        with self._lock:
+            while freed < target and self._seasons:
+                before = self._bytes
+                self._pop_locked(next(iter(self._seasons)))
+                freed += before - self._bytes
+        return freed
+
+    def _pop_locked(self, season_id):
+        entry = self._seasons.pop(season_id, None)
+        if entry is None:
+            return
+        self._bytes -= entry[2]
+        for ep in entry[0].episodes:
+            if self._by_bvid.get(ep.bvid) == season_id:
+                del self._by_bvid[ep.bvid]
+
+    def __len__(self):
+        return len(self._seasons)
@@ -0,0 +1,40 @@
+"""
+本地 SQLite 存储初始化。
+
+run.py / start.py 原先各自在启动时打开连接并建表；现在统一由此处创建，且只在应用第一次
+需要解析器时才被调用（见 app.get_parser），冷启动阶段不再导入 sqlite3 或触碰磁盘。
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 默认数据库文件位置（与历史版本一致，位于 ass_player 包目录下）
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bilibili_cache.db')
+
+
+def open_disk_cache(db_path: str = DEFAULT_DB_PATH):
+    """打开（必要时创建）磁盘缓存数据库，并确保 cache / cdn_stats 两张表存在。"""
+    import sqlite3
+
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    cur = conn.cursor()
+    # 解析结果缓存：key 为规范化后的视频页 URL，url 为最终直链，ts 为写入时间，
+    # expires_at 为直链签名 deadline 减去安全余量，candidates 为候选直链 JSON（见 BiliBiliParser._store_resolution）
+    cur.execute("""CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        url TEXT,
+        ts REAL,
+        expires_at REAL,
+        candidates TEXT
+    )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS cdn_stats (
+        hostname TEXT PRIMARY KEY,
+        is_china INTEGER,
+        count INTEGER,
+        avg_load REAL,
+        updated_ts REAL
+    )""")
+    conn.commit()
+    logger.info('已初始化本地 SQLite 缓存：%s', db_path)
+    return conn
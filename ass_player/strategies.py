@@ -0,0 +1,214 @@
+"""
+playurl 请求策略表。
+
+同一个视频的 720P MP4 直链可以用不同形状的 playurl 请求拿到（platform / fnval 参数不同，
+或走需要 WBI 签名的 /x/player/wbi/playurl）。某种形状被风控或变慢时，其余形状往往仍然可用。
+解析器按 `PlayurlStrategies.order()` 给出的顺序错峰发起这些请求：先发排在最前的策略，
+超过 `stagger()` 秒仍没有结果（或它已失败）再发下一个，第一个通过 `_is_url_allowed`
+的直链胜出。
+
+每个策略的耗时与有效率按 EWMA 记录：又慢又常失败的策略排到后面，有效率过低的策略
+默认跳过，只每隔 explore_every 次解析重新尝试一次，以便上游恢复后重新启用。
+新的请求形状通过 `register_strategy` 登记，再在配置 PLAYURL_STRATEGIES 中启用。
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from ass_player import metrics
+
+
+class PlayurlStrategy:
+    """
+    一种 playurl 请求形状。
+
+    :param name: 策略名，同时用作指标标签与配置中的名字。
+    :param path: API 路径（相对 api_base）。
+    :param params: 除 bvid / cid 之外的查询参数。
+    :param wbi: 是否需要 WBI 签名（参数中追加 wts 与 w_rid）。
+    """
+
+    __slots__ = ('name', 'path', 'params', 'wbi')
+
+    def __init__(self, name: str, path: str, params: dict, wbi: bool = False):
+        self.name = name
+        self.path = path
+        self.params = dict(params)
+        self.wbi = wbi
+
+    def request(self, api_base: str, bvid: str, cid, wbi_keys: Optional[Tuple[str, str]] = None,
+                qn: Optional[int] = None):
+        """返回 (完整地址, 查询参数)；WBI 策略需要传入 (img_key, sub_key)，qn 覆盖策略默认的清晰度。"""
+        params = {'bvid': bvid, 'cid': cid, **self.params}
+        if qn is not None:
+            params['qn'] = qn
+        if self.wbi:
+            params = sign_wbi(params, *wbi_keys)
+        return f'{api_base}{self.path}', params
+
+
+# 已登记的策略（按登记顺序，也是没有统计数据时的尝试顺序）
+STRATEGIES: Dict[str, PlayurlStrategy] = {}
+
+
+def register_strategy(strategy: PlayurlStrategy) -> PlayurlStrategy:
+    """登记一种 playurl 请求形状（同名覆盖）。"""
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+# qn=64 代表 720P；fnval=0 / 1 都返回 durl 形式的单文件 MP4
+register_strategy(PlayurlStrategy('html5', '/x/player/playurl', {'qn': 64, 'fnval': 0, 'platform': 'html5'}))
+register_strategy(PlayurlStrategy('pc', '/x/player/playurl', {'qn': 64, 'fnval': 1, 'platform': 'pc'}))
+register_strategy(PlayurlStrategy('wbi', '/x/player/wbi/playurl', {'qn': 64, 'fnval': 0, 'platform': 'html5'}, wbi=True))
+
+
+# WBI 签名：由 nav 接口给出的 img_key + sub_key 按固定顺序重排后取前 32 位作为混淆密钥
+MIXIN_KEY_ENC_TAB = (
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52,
+)
+
+
+def sign_wbi(params: dict, img_key: str, sub_key: str, now: Optional[float] = None) -> dict:
+    """按 WBI 规则为查询参数追加 wts 与 w_rid。"""
+    raw = img_key + sub_key
+    mixin_key = ''.join(raw[i] for i in MIXIN_KEY_ENC_TAB if i < len(raw))[:32]
+    signed = dict(params, wts=int(now if now is not None else time.time()))
+    # 参数按键排序，值中去掉 !'()* 字符
+    signed = {k: ''.join(c for c in str(v) if c not in "!'()*") for k, v in sorted(signed.items())}
+    signed['w_rid'] = hashlib.md5((urlencode(signed) + mixin_key).encode('utf-8')).hexdigest()
+    return signed
+
+
+def wbi_keys_from_nav(data: dict) -> Optional[Tuple[str, str]]:
+    """从 nav 响应的 wbi_img 中取出 (img_key, sub_key)（未登录时 code 为 -101，但仍会返回 wbi_img）。"""
+    wbi_img = (data.get('data') or {}).get('wbi_img') or {}
+    keys = []
+    for field in ('img_url', 'sub_url'):
+        url = wbi_img.get(field) or ''
+        keys.append(url.rsplit('/', 1)[-1].split('.', 1)[0])
+    return tuple(keys) if all(keys) else None
+
+
+class _StrategyStats:
+    __slots__ = ('strategy', 'index', 'attempts', 'wins', 'latency', 'success')
+
+    def __init__(self, strategy: PlayurlStrategy, index: int):
+        self.strategy = strategy
+        self.index = index
+        self.attempts = 0
+        self.wins = 0
+        # 耗时（秒）与有效率的 EWMA；没有样本时耗时为 None
+        self.latency = None
+        self.success = 1.0
+
+    def sort_key(self):
+        # 期望耗时 ≈ 耗时 / 有效率；没有样本的策略按登记顺序排在有样本的之后
+        if self.latency is None:
+            return (1, 0.0, self.index)
+        return (0, self.latency / max(self.success, 0.05), self.index)
+
+
+class PlayurlStrategies:
+    """
+    一个解析器启用的策略及其统计。
+
+    :param names: 启用的策略名（须已登记），默认为全部已登记策略。
+    :param alpha: EWMA 平滑系数。
+    :param min_attempts: 至少尝试多少次后才可能被跳过。
+    :param skip_below: 有效率低于该值的策略默认跳过。
+    :param explore_every: 每隔多少次解析把被跳过的策略重新排到末尾尝试。
+    """
+
+    # 错峰间隔：排在前面的策略耗时 EWMA 的倍数，限制在 [STAGGER_MIN, STAGGER_MAX] 秒；没有样本时为 STAGGER_DEFAULT
+    STAGGER_FACTOR = 2.0
+    STAGGER_MIN = 0.05
+    STAGGER_MAX = 1.0
+    STAGGER_DEFAULT = 0.5
+
+    def __init__(self, names: Optional[Sequence[str]] = None, alpha: float = 0.2, min_attempts: int = 10,
+                 skip_below: float = 0.2, explore_every: int = 20):
+        names = list(names) if names else list(STRATEGIES)
+        unknown = [n for n in names if n not in STRATEGIES]
+        if unknown:
+            raise ValueError(f'未登记的 playurl 策略: {", ".join(unknown)}')
+        self._lock = threading.Lock()
+        self._stats = {n: _StrategyStats(STRATEGIES[n], i) for i, n in enumerate(dict.fromkeys(names))}
+        self.alpha = alpha
+        self.min_attempts = min_attempts
+        self.skip_below = skip_below
+        self.explore_every = max(1, explore_every)
+        self._calls = 0
+
+    def _skipped(self, stats: _StrategyStats) -> bool:
+        return stats.attempts >= self.min_attempts and stats.success < self.skip_below
+
+    def order(self) -> List[PlayurlStrategy]:
+        """本次解析的尝试顺序（被跳过的策略只在探索轮次中排到末尾）。"""
+        with self._lock:
+            self._calls += 1
+            ranked = sorted(self._stats.values(), key=_StrategyStats.sort_key)
+            active = [s for s in ranked if not self._skipped(s)]
+            if not active or self._calls % self.explore_every == 0:
+                active += [s for s in ranked if self._skipped(s)]
+            return [s.strategy for s in active]
+
+    def stagger(self, leader: PlayurlStrategy) -> float:
+        """发出 leader 之后，等待多少秒再发下一个策略。"""
+        latency = self._stats[leader.name].latency
+        if latency is None:
+            return self.STAGGER_DEFAULT
+        return min(self.STAGGER_MAX, max(self.STAGGER_MIN, latency * self.STAGGER_FACTOR))
+
+    def record(self, name: str, latency: float, result: str):
+        """记录一次已完成的尝试：耗时（秒）与结果（valid 有效直链 / invalid 无有效直链 / error 请求异常）。"""
+        valid = result == 'valid'
+        metrics.PLAYURL_STRATEGY_LATENCY.labels(name).observe(latency)
+        metrics.PLAYURL_STRATEGY_ATTEMPTS.labels(name, result).inc()
+        with self._lock:
+            stats = self._stats[name]
+            stats.attempts += 1
+            stats.latency = latency if stats.latency is None else stats.latency + self.alpha * (latency - stats.latency)
+            stats.success += self.alpha * ((1.0 if valid else 0.0) - stats.success)
+
+    def record_win(self, name: str):
+        metrics.PLAYURL_STRATEGY_WINS.labels(name).inc()
+        with self._lock:
+            self._stats[name].wins += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'attempts': s.attempts,
+                    'wins': s.wins,
+                    'win_rate': round(s.wins / s.attempts, 3) if s.attempts else 0.0,
+                    'latency_ms': round(s.latency * 1000.0, 1) if s.latency is not None else None,
+                    'success': round(s.success, 3),
+                    'skipped': self._skipped(s),
+                }
+                for name, s in self._stats.items()
+            }
+
+
+class WbiKeys:
+    """nav 接口给出的 WBI 密钥缓存（B 站每天轮换，默认一小时后重新获取）。"""
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._keys = None
+        self._fetched_at = 0.0
+
+    def get(self) -> Optional[Tuple[str, str]]:
+        if self._keys is not None and time.monotonic() - self._fetched_at < self.ttl:
+            return self._keys
+        return None
+
+    def set(self, keys: Tuple[str, str]):
+        self._keys = keys
+        self._fetched_at = time.monotonic()
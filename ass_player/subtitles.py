@@ -0,0 +1,219 @@
+"""
+B 站 CC 字幕（BCC）的列表解析、格式转换与按 cid 缓存。
+
+/api/auto-parse?with_subtitles=1 时，解析器在拿到 cid 之后与 playurl 并发调用 /x/player/v2
+取得字幕列表；响应中每条字幕给出 /api/subtitle/... 的 ASS 与 VTT 地址。字幕正文（BCC JSON，
+位于 *.hdslb.com）在首次请求这些地址时才下载并转换，列表与转换结果都按 cid 缓存。
+"""
+import collections
+import sys
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import quote, urlparse
+
+# 只从这些主机下载字幕正文（字幕地址来自 B 站 API 响应，仍做一次校验以防 SSRF）
+SUBTITLE_HOST_SUFFIXES = ('.hdslb.com',)
+# 单个字幕正文的大小上限（字节）
+MAX_SUBTITLE_BYTES = 4 * 1024 * 1024
+
+
+def parse_subtitle_list(data: dict) -> List[dict]:
+    """从 /x/player/v2 响应中取出字幕列表 [{'lan', 'lan_doc', 'url'}]；没有正文地址的条目（如未登录时的 AI 字幕）跳过。"""
+    if data.get('code') != 0:
+        raise ValueError(f"player/v2 接口返回错误: {data.get('message')}")
+    subtitle = (data.get('data') or {}).get('subtitle') or {}
+    tracks = []
+    for item in subtitle.get('subtitles') or []:
+        url = item.get('subtitle_url') or ''
+        if not url or not item.get('lan'):
+            continue
+        if url.startswith('//'):
+            url = 'https:' + url
+        tracks.append({'lan': item['lan'], 'lan_doc': item.get('lan_doc') or item['lan'], 'url': url})
+    return tracks
+
+
+def is_subtitle_url_allowed(url: str) -> bool:
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    return parsed.scheme == 'https' and host.endswith(SUBTITLE_HOST_SUFFIXES)
+
+
+def subtitle_links(bvid: str, cid, tracks: List[dict]) -> List[dict]:
+    """返回给客户端的字幕列表：语言与对应的 ASS / VTT 地址（不暴露上游正文地址）。"""
+    links = []
+    for track in tracks:
+        base = f"/api/subtitle/{bvid}/{cid}/{quote(track['lan'], safe='')}"
+        links.append({'lan': track['lan'], 'lan_doc': track['lan_doc'], 'ass_url': base + '.ass', 'vtt_url': base + '.vtt'})
+    return links
+
+
+def _ass_time(seconds: float) -> str:
+    centis = int(round(max(0.0, seconds) * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f'{hours}:{minutes:02d}:{secs:02d}.{centis:02d}'
+
+
+def _vtt_time(seconds: float) -> str:
+    millis = int(round(max(0.0, seconds) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}'
+
+
+def _cues(bcc: dict):
+    for item in bcc.get('body') or []:
+        content = str(item.get('content') or '').strip()
+        if content:
+            yield float(item.get('from') or 0.0), float(item.get('to') or 0.0), int(item.get('location') or 2), content
+
+
+ASS_HEADER = """[Script Info]
+; 由 B 站 CC 字幕转换
+Title: {title}
+ScriptType: v4.00+
+ScaledBorderAndShadow: Yes
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Microsoft YaHei,64,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,3,1,2,40,40,60,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def bcc_to_ass(bcc: dict, title: str = '') -> str:
+    """把 BCC 字幕转换为 ASS；location 不是默认的底部居中（2）时用 \\an 指定位置。"""
+    lines = [ASS_HEADER.format(title=title.replace('\n', ' ') or 'Bilibili CC')]
+    for start, end, location, content in _cues(bcc):
+        # ASS 中花括号表示覆写标签，换行写作 \N
+        text = content.replace('{', '｛').replace('}', '｝').replace('\r', '').replace('\n', r'\N')
+        if location != 2 and 1 <= location <= 9:
+            text = f'{{\\an{location}}}' + text
+        lines.append(f'Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{text}\n')
+    return ''.join(lines)
+
+
+def bcc_to_vtt(bcc: dict) -> str:
+    """把 BCC 字幕转换为 WebVTT；顶部位置（location 7~9）的字幕加 line:0。"""
+    parts = ['WEBVTT\n']
+    for start, end, location, content in _cues(bcc):
+        text = content.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '')
+        settings = ' line:0' if location in (7, 8, 9) else ''
+        parts.append(f'\n{_vtt_time(start)} --> {_vtt_time(end)}{settings}\n{text}\n')
+    return ''.join(parts)
+
+
+def _tracks_bytes(bvid: str, tracks: List[dict]) -> int:
+    # 条目字典、字幕列表与各字符串的估算大小（每条约 500 字节固定开销）
+    return 500 + sys.getsizeof(bvid) + sum(
+        300 + sys.getsizeof(t['lan']) + sys.getsizeof(t['lan_doc']) + sys.getsizeof(t['url']) for t in tracks)
+
+
+class SubtitleCache:
+    """
+    按 cid 缓存的字幕列表与已转换的字幕文本（LRU，最多 max_videos 个 cid，每个保留 ttl 秒）。
+
+    字幕正文地址带签名、会过期，列表与文本一起过期后重新获取。同时维护 bvid -> cid 的索引，
+    解析结果缓存命中（没有调用 view）时也能找到该视频的字幕列表。memory_usage / evict_bytes
+    供全局内存预算使用，写入后调用 on_grow。
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_videos: int = 128):
+        self.ttl = ttl
+        self.max_videos = max(1, max_videos)
+        self._lock = threading.Lock()
+        # cid -> {'bvid': str, 'tracks': [...], 'texts': {(lan, fmt): str}, 'expires_at': float, 'bytes': int}
+        self._entries = collections.OrderedDict()
+        self._cids = {}
+        self._bytes = 0
+        # 写入后的回调（由应用注册为内存预算检查），在释放锁之后调用
+        self.on_grow = None
+
+    def put_tracks(self, bvid: str, cid, tracks: List[dict]):
+        size = _tracks_bytes(bvid, tracks)
+        with self._lock:
+            self._pop_locked(cid)
+            self._entries[cid] = {'bvid': bvid, 'tracks': list(tracks), 'texts': {},
+                                  'expires_at': time.monotonic() + self.ttl, 'bytes': size}
+            self._cids[bvid] = cid
+            self._bytes += size
+            while len(self._entries) > self.max_videos:
+                self._pop_locked(next(iter(self._entries)))
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def _entry_locked(self, cid) -> Optional[dict]:
+        entry = self._entries.get(cid)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= time.monotonic():
+            self._pop_locked(cid)
+            return None
+        self._entries.move_to_end(cid)
+        return entry
+
+    def tracks(self, cid) -> Optional[List[dict]]:
+        """该 cid 的字幕列表（未缓存时为 None，没有字幕时为空列表）。"""
+        with self._lock:
+            entry = self._entry_locked(cid)
+            return list(entry['tracks']) if entry is not None else None
+
+    def cid_for(self, bvid: str):
+        with self._lock:
+            cid = self._cids.get(bvid)
+            return cid if cid is not None and self._entry_locked(cid) is not None else None
+
+    def bvid_for(self, cid) -> Optional[str]:
+        """缓存该 cid 字幕列表时对应的 bvid（未缓存时为 None）。"""
+        with self._lock:
+            entry = self._entry_locked(cid)
+            return entry['bvid'] if entry is not None else None
+
+    def text(self, cid, lan: str, fmt: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entry_locked(cid)
+            return entry['texts'].get((lan, fmt)) if entry is not None else None
+
+    def put_text(self, cid, lan: str, fmt: str, text: str):
+        with self._lock:
+            entry = self._entry_locked(cid)
+            if entry is None:
+                return
+            old = entry['texts'].get((lan, fmt))
+            # 新增文本另计字典项与键元组约 100 字节，替换时只计长度差
+            size = sys.getsizeof(text) - sys.getsizeof(old) if old is not None else sys.getsizeof(text) + 100
+            entry['texts'][(lan, fmt)] = text
+            entry['bytes'] += size
+            self._bytes += size
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def evict_bytes(self, target: int) -> int:
+        """按 LRU 顺序淘汰整个 cid 的列表与文本，直到释放至少 target 字节；返回实际释放的字节数。"""
+        freed = 0
+        with self._lock:
+            while freed < target and self._entries:
+                before = self._bytes
+                self._pop_locked(next(iter(self._entries)))
+                freed += before - self._bytes
+        return freed
+
+    def _pop_locked(self, cid):
+        entry = self._entries.pop(cid, None)
+        if entry is None:
+            return
+        self._bytes -= entry['bytes']
+        if self._cids.get(entry['bvid']) == cid:
+            del self._cids[entry['bvid']]
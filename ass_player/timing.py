@@ -0,0 +1,74 @@
+"""
+解析流程的分阶段计时。
+
+`StageTimings` 记录单次解析中各阶段（view、playurl、ssrf、cdn 等）的单调时钟耗时，
+可导出为 `Server-Timing` 响应头或 JSON。未启用计时时 `stage(None, name)` 返回共享的
+空上下文管理器，不读取时钟也不分配对象，开销可忽略。
+"""
+import time
+from typing import Dict, Optional
+
+
+class _NullStage:
+    """未启用计时时使用的空上下文管理器（全局单例）。"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('_timings', '_name', '_start')
+
+    def __init__(self, timings: 'StageTimings', name: str):
+        self._timings = timings
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._timings.add(self._name, (time.perf_counter() - self._start) * 1000.0)
+        return False
+
+
+class StageTimings:
+    """
+    单次解析的阶段耗时（毫秒）。同名阶段多次进入时累加，保留首次出现的顺序。
+
+    使用示例:
+        timings = StageTimings()
+        with stage(timings, 'view'):
+            ...
+        response.headers['Server-Timing'] = timings.to_server_timing()
+    """
+
+    def __init__(self):
+        self._durations: Dict[str, float] = {}
+
+    def add(self, name: str, ms: float):
+        self._durations[name] = self._durations.get(name, 0.0) + ms
+
+    def as_dict(self) -> Dict[str, float]:
+        """返回 { 阶段名: 毫秒 }，保留三位小数。"""
+        return {k: round(v, 3) for k, v in self._durations.items()}
+
+    def to_server_timing(self) -> str:
+        """格式化为 Server-Timing 头，例如 `view;dur=12.3, playurl;dur=45.6`。"""
+        return ', '.join(f'{k};dur={v:.1f}' for k, v in self._durations.items())
+
+
+def stage(timings: Optional[StageTimings], name: str):
+    """返回记录阶段 `name` 的上下文管理器；`timings` 为 None 时返回空操作。"""
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(timings, name)
@@ -0,0 +1,193 @@
+"""
+启动预热模块。
+
+每个新实例首先服务的几乎都是演示内容（DEFAULT_VIDEO_URL / DEFAULT_ASS_NAME），首位访客原本要
+承担完整的冷解析。该模块提供一个可选的后台线程：
+- 启动后立即解析默认视频并写入解析器的解析结果缓存；
+- 预读默认 ASS 字幕并预先 gzip 压缩，由 /ass_files 路由直接从内存返回；
+- 在直链签名 `deadline=` 到期前重新解析，保持缓存始终可用。
+
+预热状态通过 `/healthz` 对外报告。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from ass_player.assets import AssetCache, PrecompressedAsset
+from ass_player.bilibili import ResolveContext, _url_deadline
+from ass_player.scheduler import BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshSchedule:
+    """
+    预热解析的刷新与退避策略（Warmer 与 hotkeys.HotKeyWarmer 共用）。
+
+    解析成功后在距直链 deadline 还剩 refresh_margin 秒时刷新（直链不带 deadline 时间隔 fallback_refresh 秒）；
+    失败后从 retry_interval 开始指数退避，最长 max_retry_interval 秒。
+    """
+
+    def __init__(self, refresh_margin: float = 300, retry_interval: float = 30, max_retry_interval: float = 600,
+                 fallback_refresh: float = 1800):
+        self.refresh_margin = max(0.0, float(refresh_margin))
+        self.retry_interval = max(1.0, float(retry_interval))
+        self.max_retry_interval = max(self.retry_interval, float(max_retry_interval))
+        self.fallback_refresh = max(1.0, float(fallback_refresh))
+
+    def resolve(self, parser, url: str, use_cache: bool = False, failures: int = 0) -> dict:
+        """
+        以后台通道解析 url 一次，返回状态：state（'ok' / 'error'）、failures（连续失败次数）与
+        delay（距下一次解析的秒数）；成功时另有 resolved_at 与 deadline，失败时另有 last_attempt。
+
+        :param failures: 此前的连续失败次数，用于计算退避间隔。
+        """
+        started = time.time()
+        try:
+            final_url = parser.get_real_url(url, ctx=ResolveContext(), use_cache=use_cache, lane=BACKGROUND)
+        except Exception:
+            logger.exception('预热解析异常: %s', url)
+            final_url = None
+
+        if not final_url:
+            failures += 1
+            delay = min(self.max_retry_interval, self.retry_interval * (2 ** (failures - 1)))
+            return {'state': 'error', 'failures': failures, 'last_attempt': started, 'delay': delay}
+
+        deadline = _url_deadline(final_url)
+        if deadline is None:
+            delay = self.fallback_refresh
+        else:
+            # 至少间隔 retry_interval，避免 deadline 异常接近时陷入紧密循环
+            delay = max(self.retry_interval, deadline - self.refresh_margin - time.time())
+        return {'state': 'ok', 'failures': 0, 'resolved_at': started, 'deadline': deadline, 'delay': delay}
+
+
+class Warmer:
+    """
+    后台预热器。
+
+    使用示例:
+        warmer = Warmer(parser, video_url, ass_dir, ass_name)
+        warmer.start()
+        ...
+        warmer.health()   # {'ready': True, 'video': {...}, 'subtitle': {...}}
+    """
+
+    def __init__(self, parser, video_url: Optional[str], ass_dir: Optional[str] = None, ass_name: Optional[str] = None,
+                 refresh_margin: float = 300, retry_interval: float = 30, max_retry_interval: float = 600,
+                 fallback_refresh: float = 1800):
+        """
+        :param parser: BiliBiliParser 实例，解析结果写入其解析结果缓存。
+        :param video_url: 需要预热的视频地址或 BV 号；为空时跳过视频预热。
+        :param ass_dir: 字幕目录；与 ass_name 同时为空时跳过字幕预热。
+        :param ass_name: 需要预读并预压缩的字幕文件名。
+        :param refresh_margin: 距直链 deadline 还剩多少秒时重新解析。
+        :param retry_interval: 解析失败后的首次重试间隔（秒），之后按指数退避直到 max_retry_interval。
+        :param fallback_refresh: 直链不带 deadline 时的刷新间隔（秒）。
+        """
+        self.parser = parser
+        self.video_url = video_url
+        self.ass_dir = ass_dir
+        self.ass_name = ass_name
+        self.schedule = RefreshSchedule(refresh_margin, retry_interval, max_retry_interval, fallback_refresh)
+        self._assets = AssetCache()
+        self._failures = 0
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._video_status = {'state': 'disabled' if not video_url else 'pending'}
+        self._subtitle_status = {'state': 'disabled' if not ass_name else 'pending'}
+
+    @property
+    def ready(self) -> bool:
+        """首轮预热（无论成功与否）完成后为 True，避免上游不可用时实例永远无法就绪。"""
+        return self._ready.is_set()
+
+    def warm_subtitle(self) -> bool:
+        """预读并预压缩默认字幕。"""
+        if not self.ass_name:
+            return False
+        path = os.path.join(self.ass_dir or '', self.ass_name)
+        asset = self._assets.add(self.ass_name, path)
+        if asset is None:
+            self._subtitle_status = {'state': 'error', 'error': f'无法读取 {self.ass_name}'}
+            return False
+        self._subtitle_status = {'state': 'ok', 'name': self.ass_name, 'bytes': len(asset.raw),
+                                 'gzip_bytes': len(asset.gzipped)}
+        logger.info('已预热字幕 %s（%d -> %d 字节）', self.ass_name, len(asset.raw), len(asset.gzipped))
+        return True
+
+    def warm_video(self) -> float:
+        """强制重新解析默认视频并写入缓存，返回距下一次刷新的秒数。"""
+        status = self.schedule.resolve(self.parser, self.video_url, use_cache=False, failures=self._failures)
+        self._failures = status['failures']
+        delay = status['delay']
+        if status['state'] == 'error':
+            self._video_status = {'state': 'error', 'failures': self._failures, 'last_attempt': status['last_attempt'],
+                                  'retry_in': delay}
+            logger.warning('预热视频解析失败（第 %d 次），%.0f 秒后重试', self._failures, delay)
+        else:
+            self._video_status = {'state': 'ok', 'resolved_at': status['resolved_at'], 'deadline': status['deadline'],
+                                  'refresh_in': round(delay, 3)}
+            logger.info('已预热默认视频，%.0f 秒后刷新', delay)
+        return delay
+
+    @property
+    def assets(self) -> AssetCache:
+        """预热的字幕（供应用登记到全局内存预算）。"""
+        return self._assets
+
+    def get_asset(self, name: str) -> Optional[PrecompressedAsset]:
+        """返回已预热且未过期的字幕；文件已变化时丢弃内存副本。"""
+        return self._assets.get(name)
+
+    def health(self) -> dict:
+        return {'ready': self.ready, 'video': dict(self._video_status), 'subtitle': dict(self._subtitle_status)}
+
+    def run_once(self) -> Optional[float]:
+        """执行一轮预热；返回距下一次视频刷新的秒数（未启用视频预热时为 None）。"""
+        try:
+            if self._subtitle_status['state'] == 'pending':
+                self.warm_subtitle()
+            return self.warm_video() if self.video_url else None
+        finally:
+            self._ready.set()
+
+    def _run(self):
+        delay = self.run_once()
+        while delay is not None and not self._stop.wait(delay):
+            delay = self.warm_video()
+
+    def start(self):
+        """启动后台预热线程（守护线程，重复调用无副作用）。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台预热线程。"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def start_from_config(parser, cfg, ass_dir: str) -> Optional[Warmer]:
+    """按配置启动预热器；未启用时返回 None。"""
+    if not getattr(cfg, 'WARMUP_ENABLED', False):
+        return None
+    warmer = Warmer(
+        parser,
+        getattr(cfg, 'DEFAULT_VIDEO_URL', None),
+        ass_dir=ass_dir,
+        ass_name=getattr(cfg, 'DEFAULT_ASS_NAME', None),
+        refresh_margin=getattr(cfg, 'WARMUP_REFRESH_MARGIN', 300),
+    )
+    warmer.start()
+    logger.info('已启动启动预热（视频: %s，字幕: %s）', warmer.video_url, warmer.ass_name)
+    return warmer
@@ -0,0 +1,119 @@
+"""
+ASGI -> WSGI 桥接。
+
+asgi.py 只把解析与上报接口实现为异步路由，页面、静态文件等其余路由仍由 Flask 应用处理：
+本模块把 ASGI HTTP 请求转换为 WSGI environ，在专用线程池中调用 Flask，再把响应（包括
+send_file 之类的分块响应）逐块发回事件循环。
+"""
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# WSGI 请求体上限：本项目的同步路由只接收很小的 JSON
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """按 PEP 3333 由 ASGI scope 构造 WSGI environ。"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            continue
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive, limit: int = MAX_BODY_BYTES) -> Optional[bytes]:
+    """读取完整请求体；超过上限时返回 None。"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+class WsgiBridge:
+    """把 WSGI 应用包装为 ASGI 应用（仅支持 http scope）。"""
+
+    def __init__(self, wsgi_app, max_workers: int = 16):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi-bridge')
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, body)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        def call_app():
+            result = self.wsgi_app(environ, start_response)
+            return result, iter(result)
+
+        result, iterator = await loop.run_in_executor(self.executor, call_app)
+        sentinel = object()
+        try:
+            # 第一个块在线程中取出：Flask 在迭代开始前已调用 start_response
+            chunk = await loop.run_in_executor(self.executor, next, iterator, sentinel)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not sentinel:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, sentinel)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -1,67 +1,208 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-缓存管理器 - 支持内存缓存和可选的Redis缓存
+缓存管理器 - 支持进程内 LRU、多 worker 共享的本地 SQLite 文件以及 Redis 三种后端
+
+后端由配置 `CACHE_BACKEND`（环境变量 ASS_CACHE_BACKEND）选择，见
+`ass_player.cache_backends.create_backend`。键按命名空间加前缀，不同用途的缓存互不干扰。
+
+另提供全局内存预算 `MemoryBudget`：进程内的各个缓存（解析结果、静态资源、内存后端等）登记
+字节估算与淘汰方法，总量超出预算时从价值最低的缓存开始淘汰。
 """
 
-import time
 import logging
-from typing import Optional, Any, Dict
-import json
+import threading
+from typing import Optional, Any, Callable, Dict, Union
 import hashlib
 
+from ass_player import metrics
+from ass_player.cache_backends import CacheBackend, MemoryBackend, create_backend
+
+# 默认全局内存预算（字节），由配置 MEMORY_BUDGET_MB 覆盖
+DEFAULT_MEMORY_BUDGET = 128 * 1024 * 1024
+
 logger = logging.getLogger(__name__)
 
 
 class CacheManager:
     """缓存管理器"""
-    
-    def __init__(self, enabled: bool = True, ttl: int = 3600):
-        # 缓存已被移除：保留接口但不再存储任何数据
-        # 为保持向后兼容，保留 enabled/ttl 属性，但实现为无操作
-        self.enabled = False
+
+    def __init__(self, enabled: bool = True, ttl: int = 3600, backend: Union[CacheBackend, str, None] = None,
+                 namespace: str = 'ass'):
+        """
+        :param enabled: 为 False 时 get 始终未命中、set 不写入。
+        :param ttl: 默认过期时间（秒）。
+        :param backend: 后端实例或配置字符串（如 'memory'、'sqlite:///tmp/cache.db'、'redis://127.0.0.1:6379/0'）。
+        :param namespace: 键前缀，多个应用共用同一个 Redis 时用于隔离。
+        """
+        self.enabled = bool(enabled)
         self.ttl = ttl
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        
+        self.namespace = namespace
+        self.backend = backend if isinstance(backend, CacheBackend) else create_backend(backend)
+
     def _generate_key(self, url: str) -> str:
         """生成缓存键"""
         return hashlib.md5(url.encode()).hexdigest()
-    
-    def get(self, url: str) -> Optional[Dict[str, Any]]:
+
+    def _full_key(self, url: str, namespace: Optional[str] = None) -> str:
+        return f'{self.namespace}:{namespace or "response"}:{self._generate_key(url)}'
+
+    def get(self, url: str, namespace: Optional[str] = None) -> Optional[Any]:
         """获取缓存数据"""
-        # 缓存已禁用，始终返回 None
-        return None
-    
-    def set(self, url: str, data: Dict[str, Any]) -> None:
-        """设置缓存数据"""
-        # no-op: 不再写入缓存
-        return
-    
+        if not self.enabled:
+            metrics.record_cache_lookup(namespace or 'response', False)
+            return None
+        value = self.backend.get(self._full_key(url, namespace))
+        metrics.record_cache_lookup(namespace or 'response', value is not None)
+        return value
+
+    def set(self, url: str, data: Any, ttl: Optional[float] = None, namespace: Optional[str] = None) -> None:
+        """设置缓存数据（ttl 为空时使用默认过期时间）"""
+        if not self.enabled:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        self.backend.set(self._full_key(url, namespace), data, ttl)
+
+    def delete(self, url: str, namespace: Optional[str] = None) -> bool:
+        """删除缓存数据"""
+        return self.backend.delete(self._full_key(url, namespace))
+
     def clear(self) -> None:
-        """清空缓存"""
-        # 清空无操作缓存（兼容调用）
-        self._cache.clear()
-        logger.info("缓存功能已禁用，已清空（无实际缓存）")
-    
+        """清空缓存（仅本命名空间）"""
+        removed = self.backend.clear(f'{self.namespace}:')
+        logger.info("已清空缓存 %d 条（后端: %s）", removed, self.backend.name)
+
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
+        backend_stats = self.backend.stats(f'{self.namespace}:')
         return {
-            'enabled': False,
-            'size': 0,
-            'ttl': self.ttl
+            'enabled': self.enabled,
+            'size': backend_stats['size'],
+            'ttl': self.ttl,
+            'namespace': self.namespace,
+            'backend': backend_stats,
+            'memory': memory_budget.stats(),
+        }
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+class _BudgetEntry:
+    __slots__ = ('name', 'size_fn', 'evict_fn', 'priority', 'evicted_bytes')
+
+    def __init__(self, name, size_fn, evict_fn, priority):
+        self.name = name
+        self.size_fn = size_fn
+        self.evict_fn = evict_fn
+        self.priority = priority
+        self.evicted_bytes = 0
+
+
+class MemoryBudget:
+    """
+    进程内缓存的全局内存预算。
+
+    使用示例:
+        budget = get_memory_budget()
+        cache.on_grow = budget.register('resolve', cache.memory_usage, cache.evict_bytes, priority=30)
+
+    size_fn() 返回缓存当前的估算字节数（应为 O(1)），evict_fn(n) 淘汰至少 n 字节并返回实际释放量。
+    总量超过 limit_bytes 时按 priority 从低到高依次淘汰，直到回落到 low_water 比例以下，
+    避免每次写入都在预算边缘反复淘汰。
+    """
+
+    def __init__(self, limit_bytes: int = DEFAULT_MEMORY_BUDGET, low_water: float = 0.9):
+        self.limit_bytes = int(limit_bytes)
+        self.low_water = float(low_water)
+        self._entries: Dict[str, _BudgetEntry] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, size_fn: Callable[[], int], evict_fn: Callable[[int], int],
+                 priority: int = 0) -> Callable[[], int]:
+        """登记（同名则替换）一个缓存，返回供缓存在增长后调用的检查函数。"""
+        with self._lock:
+            self._entries[name] = _BudgetEntry(name, size_fn, evict_fn, priority)
+        metrics.CACHE_MEMORY_BYTES.labels(name).set_function(lambda: self._usage_of(name))
+        return self.enforce
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def _usage_of(self, name: str) -> int:
+        entry = self._entries.get(name)
+        return entry.size_fn() if entry is not None else 0
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {e.name: e.size_fn() for e in entries}
+
+    def enforce(self) -> int:
+        """总量超出预算时按优先级淘汰，返回释放的字节数。"""
+        with self._lock:
+            entries = list(self._entries.values())
+            total = sum(e.size_fn() for e in entries)
+            if total <= self.limit_bytes:
+                return 0
+            excess = total - int(self.limit_bytes * self.low_water)
+            freed_total = 0
+            for entry in sorted(entries, key=lambda e: e.priority):
+                if excess <= 0:
+                    break
+                if entry.size_fn() <= 0:
+                    continue
+                try:
+                    freed = entry.evict_fn(excess)
+                except Exception:
+                    logger.exception('淘汰缓存 %s 失败', entry.name)
+                    continue
+                entry.evicted_bytes += freed
+                metrics.CACHE_BUDGET_EVICTED.labels(entry.name).inc(freed)
+                excess -= freed
+                freed_total += freed
+        logger.info('内存预算超出（%d > %d 字节），已淘汰 %d 字节', total, self.limit_bytes, freed_total)
+        return freed_total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+        caches = {e.name: {'bytes': e.size_fn(), 'priority': e.priority, 'evicted_bytes': e.evicted_bytes}
+                  for e in entries}
+        return {
+            'limit_bytes': self.limit_bytes,
+            'used_bytes': sum(c['bytes'] for c in caches.values()),
+            'caches': caches,
         }
 
 
 # 全局缓存实例
 cache_manager = CacheManager()
+memory_budget = MemoryBudget()
 
 
-def setup_cache(enabled: bool = True, ttl: int = 3600):
+def setup_cache(enabled: bool = True, ttl: int = 3600, backend: Union[CacheBackend, str, None] = None,
+                namespace: str = 'ass', memory_budget_bytes: Optional[int] = None):
     """设置缓存配置"""
     global cache_manager
-    cache_manager = CacheManager(enabled=enabled, ttl=ttl)
+    if memory_budget_bytes is not None:
+        memory_budget.limit_bytes = int(memory_budget_bytes)
+    cache_manager = CacheManager(enabled=enabled, ttl=ttl, backend=backend, namespace=namespace)
+    if isinstance(cache_manager.backend, MemoryBackend):
+        cache_manager.backend.on_grow = memory_budget.register(
+            'response', cache_manager.backend.memory_usage, cache_manager.backend.evict_bytes, priority=20)
+    logger.info('缓存后端: %s（%s）', cache_manager.backend.name, '启用' if enabled else '禁用')
+    return cache_manager
 
 
 def get_cache() -> CacheManager:
     """获取缓存实例"""
-    return cache_manager
\ No newline at end of file
+    return cache_manager
+
+
+def get_memory_budget() -> MemoryBudget:
+    """获取全局内存预算"""
+    return memory_budget
@@ -23,13 +23,94 @@ class Config:
     # 解析器配置
     PARSER_TIMEOUT = int(os.environ.get('ASS_PARSER_TIMEOUT', '10'))
     PARSER_RETRIES = int(os.environ.get('ASS_PARSER_RETRIES', '3'))
+    # 单次 /api/auto-parse 的解析预算（秒，0 表示不限）：调度排队、上游调用与重试都不超过它；
+    # 客户端可通过请求头 X-Timeout-Ms 给出更短的预算
+    RESOLVE_DEADLINE = float(os.environ.get('ASS_RESOLVE_DEADLINE', '15'))
+    # 启用的 playurl 请求策略（逗号分隔，见 ass_player/strategies.py）：错峰发起，第一个有效直链胜出
+    PLAYURL_STRATEGIES = [s.strip() for s in os.environ.get('ASS_PLAYURL_STRATEGIES', 'html5,pc,wbi').split(',') if s.strip()]
+    # /api/auto-parse 成功结果允许浏览器缓存到直链签名 deadline 之前多少秒（Cache-Control: private, max-age + ETag）
+    CLIENT_CACHE_MARGIN = int(os.environ.get('ASS_CLIENT_CACHE_MARGIN', '600'))
+    # /api/season 默认从当前集开始并行解析的分集数（其余分集在播放到时再解析，只需一次 playurl 调用）
+    SEASON_PREFETCH = int(os.environ.get('ASS_SEASON_PREFETCH', '3'))
+    # B 站 API 地址（压测时可指向本地桩服务，例如 http://127.0.0.1:9000）
+    BILIBILI_API_BASE = os.environ.get('ASS_BILIBILI_API_BASE', 'https://api.bilibili.com')
     
+    # B 站 API 的进程级令牌桶（AIMD）：速率上限（请求/秒，0 表示不限速）、突发容量（0 表示 2 倍速率）
+    # 与被限流（429 / 412）后乘性下降的速率下限
+    UPSTREAM_RATE = float(os.environ.get('ASS_UPSTREAM_RATE', '20'))
+    UPSTREAM_BURST = float(os.environ.get('ASS_UPSTREAM_BURST', '0'))
+    UPSTREAM_RATE_MIN = float(os.environ.get('ASS_UPSTREAM_RATE_MIN', '1'))
+
     # 缓存配置
     CACHE_ENABLED = os.environ.get('ASS_CACHE_ENABLED', 'true').lower() == 'true'
     CACHE_TTL = int(os.environ.get('ASS_CACHE_TTL', '3600'))  # 1小时
+    # 缓存后端：memory（进程内 LRU）、sqlite:///路径（同机多 worker 共享）、redis://主机:端口/库号（多实例共享）
+    # 使用共享后端时，各 worker / 实例之间共享已解析的直链
+    CACHE_BACKEND = os.environ.get('ASS_CACHE_BACKEND', 'memory')
+    # 进程内缓存（解析结果、静态资源、内存缓存后端）的全局内存预算（MB），超出时按优先级淘汰
+    MEMORY_BUDGET_MB = int(os.environ.get('ASS_MEMORY_BUDGET_MB', '128'))
+    # /api/auto-parse 准入控制：同时进行中的解析数上限、排队上限与排队等待时间（秒）；
+    # 超出时直接返回 503 + Retry-After，避免上游变慢时解析请求占满全部线程
+    PARSE_MAX_IN_FLIGHT = int(os.environ.get('ASS_PARSE_MAX_IN_FLIGHT', '32'))
+    PARSE_QUEUE_SIZE = int(os.environ.get('ASS_PARSE_QUEUE_SIZE', '64'))
+    PARSE_QUEUE_TIMEOUT = float(os.environ.get('ASS_PARSE_QUEUE_TIMEOUT', '2'))
+    # 解析调度（交互 / 后台两条通道）：上游解析的总并发上限，以及其中只留给用户请求的并发数；
+    # 启动预热等后台解析最多使用其余部分，且总是排在已排队的用户请求之后
+    RESOLVE_MAX_CONCURRENCY = int(os.environ.get('ASS_RESOLVE_MAX_CONCURRENCY', '32'))
+    RESOLVE_INTERACTIVE_RESERVED = int(os.environ.get('ASS_RESOLVE_INTERACTIVE_RESERVED', '8'))
     # 前端上报超时阈值（毫秒），默认 3000ms（3秒）
     REPORT_TIMEOUT_MS = int(os.environ.get('ASS_REPORT_TIMEOUT_MS', '3000'))
-    
+
+    # 是否在 /api/auto-parse 响应中输出 Server-Timing 分阶段耗时头（view / playurl / ssrf / cdn）
+    SERVER_TIMING_ENABLED = os.environ.get('ASS_SERVER_TIMING', 'true').lower() == 'true'
+
+    # CDN 主动探测配置（默认关闭）：定期对已知国内 upos 主机发起小范围 Range GET 并计入 CDN 统计
+    CDN_PROBE_ENABLED = os.environ.get('ASS_CDN_PROBE_ENABLED', 'false').lower() == 'true'
+    CDN_PROBE_INTERVAL = int(os.environ.get('ASS_CDN_PROBE_INTERVAL', '300'))  # 秒
+    CDN_PROBE_CONCURRENCY = int(os.environ.get('ASS_CDN_PROBE_CONCURRENCY', '4'))
+    CDN_PROBE_BYTES = int(os.environ.get('ASS_CDN_PROBE_BYTES', '65536'))  # 每次探测最多读取的字节数
+    CDN_PROBE_TIMEOUT = int(os.environ.get('ASS_CDN_PROBE_TIMEOUT', '5'))  # 秒
+
+    # 启动预热（默认关闭）：后台解析默认示例视频并预压缩默认字幕，在直链 deadline 前自动刷新
+    WARMUP_ENABLED = os.environ.get('ASS_WARMUP_ENABLED', 'false').lower() == 'true'
+    WARMUP_REFRESH_MARGIN = int(os.environ.get('ASS_WARMUP_REFRESH_MARGIN', '300'))  # 距 deadline 多少秒时刷新
+
+    # 热点 key 统计：每次 /api/auto-parse 计入固定内存的 Count-Min Sketch，保留估算次数最高的 top-K（见 /admin/hotkeys）
+    HOTKEYS_ENABLED = os.environ.get('ASS_HOTKEYS_ENABLED', 'true').lower() == 'true'
+    HOTKEYS_TOP_K = int(os.environ.get('ASS_HOTKEYS_TOP_K', '32'))
+    HOTKEYS_SKETCH_WIDTH = int(os.environ.get('ASS_HOTKEYS_SKETCH_WIDTH', '2048'))
+    HOTKEYS_SKETCH_DEPTH = int(os.environ.get('ASS_HOTKEYS_SKETCH_DEPTH', '4'))
+    HOTKEYS_DECAY_EVERY = int(os.environ.get('ASS_HOTKEYS_DECAY_EVERY', '100000'))  # 每多少次计数整体减半
+    # 热点预热（默认关闭）：后台保持 top-K 已解析，并在直链 deadline 前刷新（刷新提前量与 WARMUP_REFRESH_MARGIN 共用）
+    HOTKEYS_WARM_ENABLED = os.environ.get('ASS_HOTKEYS_WARM_ENABLED', 'false').lower() == 'true'
+    HOTKEYS_WARM_INTERVAL = int(os.environ.get('ASS_HOTKEYS_WARM_INTERVAL', '30'))  # 秒
+    HOTKEYS_WARM_MIN_COUNT = int(os.environ.get('ASS_HOTKEYS_WARM_MIN_COUNT', '2'))  # 估算次数低于该值不预热
+    # 自适应清晰度：按 /api/report-cdn 上报的吞吐样本（bytes / duration_ms）为每个客户端网段估算吞吐，
+    # /api/auto-parse 未指定 ?qn= 时选择码率 × 安全系数不超过估算值的最高清晰度（不超过 ADAPTIVE_QN_MAX）。
+    # 部署在反向代理之后时需同时设置 TRUSTED_PROXY_HOPS，否则所有客户端落在代理地址的同一个网段
+    ADAPTIVE_QN_ENABLED = os.environ.get('ASS_ADAPTIVE_QN_ENABLED', 'false').lower() == 'true'
+    ADAPTIVE_QN_MAX = int(os.environ.get('ASS_ADAPTIVE_QN_MAX', '80'))
+    ADAPTIVE_QN_SAFETY = float(os.environ.get('ASS_ADAPTIVE_QN_SAFETY', '1.5'))
+    # 前面的可信反向代理层数：大于 0 时客户端地址取 X-Forwarded-For 从右数第 N 个地址
+    # （更靠左的地址可由客户端伪造）；0 表示直接对外服务，使用连接的对端地址
+    TRUSTED_PROXY_HOPS = int(os.environ.get('ASS_TRUSTED_PROXY_HOPS', '0'))
+    # /admin/* 管理接口的访问令牌（请求头 Authorization: Bearer <令牌>）；为空时管理接口关闭
+    ADMIN_TOKEN = os.environ.get('ASS_ADMIN_TOKEN', '')
+    # 未配置令牌时是否允许本机（127.0.0.1 / ::1）访问管理接口。经反向代理或 ASGI 桥接部署时
+    # 所有请求的来源都是本机，只应在直接对外提供服务时开启
+    ADMIN_ALLOW_LOCAL = os.environ.get('ASS_ADMIN_ALLOW_LOCAL', 'false').lower() == 'true'
+
+    # 生产服务（gunicorn.conf.py）：预派生 worker 进程数与每个 worker 的线程数
+    WEB_WORKERS = int(os.environ.get('ASS_WEB_WORKERS', '2'))
+    WEB_THREADS = int(os.environ.get('ASS_WEB_THREADS', '8'))
+    WEB_TIMEOUT = int(os.environ.get('ASS_WEB_TIMEOUT', '60'))  # 秒，超过即重启卡死的 worker
+
+    # ASGI 模式（asgi.py）：桥接到 Flask 的同步路由使用的线程数，以及异步解析器到上游的最大连接数
+    ASGI_WSGI_THREADS = int(os.environ.get('ASS_ASGI_WSGI_THREADS', '16'))
+    ASGI_UPSTREAM_CONNECTIONS = int(os.environ.get('ASS_ASGI_UPSTREAM_CONNECTIONS', '512'))
+    # ASGI 模式下等待上游不占线程，进行中的解析数上限可以远高于线程模式（排队参数与上面共用）
+    ASGI_PARSE_MAX_IN_FLIGHT = int(os.environ.get('ASS_ASGI_PARSE_MAX_IN_FLIGHT', '1024'))
+
     # 日志配置
     LOG_LEVEL = os.environ.get('ASS_LOG_LEVEL', 'INFO')
     
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 配置（生产模式）：gunicorn -c gunicorn.conf.py wsgi:app
+
+worker 数、线程数与超时通过 ASS_WEB_WORKERS / ASS_WEB_THREADS / ASS_WEB_TIMEOUT 配置；
+监听端口优先读取平台注入的 PORT（Zeabur），其次为 ASS_PLAYER_PORT。
+注意：/metrics 指标为进程内统计，多 worker 时每次抓取只反映处理该请求的 worker。
+"""
+import os
+
+from config import get_config
+
+_cfg = get_config()
+
+bind = f"{os.environ.get('ASS_PLAYER_HOST', '0.0.0.0')}:{os.environ.get('PORT', _cfg.PORT)}"
+workers = max(1, _cfg.WEB_WORKERS)
+# gthread：每个 worker 内多线程处理请求，解析时等待上游的 I/O 不会占满进程
+worker_class = 'gthread'
+threads = max(1, _cfg.WEB_THREADS)
+timeout = _cfg.WEB_TIMEOUT
+# 在 master 中导入应用并预加载只读资源，fork 后由各 worker 共享（写时复制）
+preload_app = True
+accesslog = None
+loglevel = _cfg.LOG_LEVEL.lower()
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.post_fork()
@@ -9,17 +9,17 @@ import threading
 import time
 import logging
 
-from app import app
+from app import app, close_storage, start_background_tasks
 from config import get_config
 from cache_manager import setup_cache
-import sqlite3
-import os
+from ass_player.storage import DEFAULT_DB_PATH
 
 # 获取配置
 config = get_config()
 
 # 设置缓存
-setup_cache(enabled=config.CACHE_ENABLED, ttl=config.CACHE_TTL)
+setup_cache(enabled=config.CACHE_ENABLED, ttl=config.CACHE_TTL, backend=config.CACHE_BACKEND,
+            memory_budget_bytes=config.MEMORY_BUDGET_MB * 1024 * 1024)
 logging.basicConfig(level=getattr(logging, config.LOG_LEVEL), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -57,40 +57,16 @@ def main():
     port = config.PORT
     threading.Timer(1.5, open_browser).start()
 
+    # 本地 SQLite 磁盘缓存：仅登记路径，连接在解析器首次创建时才打开（与 run.py 一致）
+    app.config['DISK_CACHE_PATH'] = DEFAULT_DB_PATH
     try:
-        # 在启动时创建并注入 SQLite 连接，供解析器使用（与 run.py 一致）
-        db_path = os.path.join(os.path.dirname(__file__), 'ass_player', 'bilibili_cache.db')
-        conn = None
         try:
-            conn = sqlite3.connect(db_path, check_same_thread=False)
-            cur = conn.cursor()
-            cur.execute("""CREATE TABLE IF NOT EXISTS cache (
-                key TEXT PRIMARY KEY,
-                url TEXT,
-                ts REAL
-            )""")
-            conn.commit()
-            logger.info('已初始化本地 SQLite 缓存（start.py）：%s', db_path)
-            # 注入到全局解析器实例（如果存在）
-            try:
-                from app import _parser as _app_parser
-                if _app_parser is not None:
-                    _app_parser._disk_cache_conn = conn
-                    setattr(_app_parser, '_owns_disk_conn', False)
-                    try:
-                        _app_parser._ensure_disk_cache()
-                    except Exception:
-                        logger.exception('初始化解析器磁盘缓存表时出错')
-            except Exception:
-                logger.exception('注入解析器连接时发生错误')
+            # 可选的后台任务：CDN 主动探测（ASS_CDN_PROBE_ENABLED）与启动预热（ASS_WARMUP_ENABLED）
+            start_background_tasks(app, config)
+
             app.run(host=host, port=port, debug=config.DEBUG, threaded=True, use_reloader=False)
         finally:
-            try:
-                if conn:
-                    conn.close()
-                    logger.info('已关闭本地 SQLite 缓存连接（start.py）')
-            except Exception:
-                logger.exception('关闭 SQLite 连接时发生异常')
+            close_storage(app)
     except KeyboardInterrupt:
         logger.info('服务已停止')
     except Exception:
@@ -122,8 +122,9 @@ export default class FileHandler {
      * 直接使用已解析出的直链加载视频，并在加载失败时提示下载链接（持久显示）。
      * @param {string} videoUrl - 直接播放的直链
      * @param {string} originalUrl - 原始用户输入的 URL（用于更新 UI）
+     * @param {Array} candidates - 后端返回的已排序候选直链（[{url, host, source}]），用于加载失败或卡顿时故障切换
      */
-    loadOnlineVideoWithUrl(videoUrl, originalUrl = '', size = null, parseStartTime = null) {
+    loadOnlineVideoWithUrl(videoUrl, originalUrl = '', size = null, parseStartTime = null, candidates = null) {
         if (!videoUrl) {
             this.player.showStatus('未提供有效的视频直链。', 'error');
             return;
@@ -147,6 +148,13 @@ export default class FileHandler {
             console.debug('将直链设置到播放器时出错：', e);
         }
 
+        // 1.1) 候选直链故障切换：当前直链出错或长时间卡顿时，按后端排序切换到下一个候选，无需重新解析
+        try {
+            this._setupCandidateFailover(videoUrl, candidates);
+        } catch (e) {
+            console.debug('设置候选直链故障切换时出错：', e);
+        }
+
         // 2) 如果前端提供了解析开始时间（parseStartTime），则监听播放成功事件并上报至后端
         try {
             if (parseStartTime && typeof parseStartTime === 'number') {
@@ -167,10 +175,25 @@ export default class FileHandler {
                             const now = (typeof performance !== 'undefined' && performance.now) ? performance.now() : Date.now();
                             elapsed = Math.round(now - parseStartTime);
                         }
-                        // 从 videoUrl 中提取 hostname
+                        // 从当前实际播放的直链中提取 hostname（发生故障切换时为切换后的候选）
+                        const reportUrl = videoEl.currentSrc || videoUrl;
                         let hostname = '';
-                        try { hostname = (new URL(videoUrl)).hostname; } catch (e) { hostname = '' + videoUrl; }
-                        const payload = JSON.stringify({ hostname: hostname, load_ms: elapsed, event: eventName });
+                        try { hostname = (new URL(reportUrl)).hostname; } catch (e) { hostname = '' + reportUrl; }
+                        const body = { hostname: hostname, load_ms: elapsed, event: eventName };
+                        // 附带本次解析的服务端分阶段耗时，便于在后端日志中关联排查
+                        if (this.player.lastServerTimings) body.server_timings = this.player.lastServerTimings;
+                        // 附带一次视频下载的字节数与耗时，后端据此估算吞吐并为后续解析选择清晰度。
+                        // 取自 Resource Timing：跨域且 CDN 未返回 Timing-Allow-Origin 时大小为 0，此时不上报
+                        try {
+                            const entries = (typeof performance !== 'undefined' && performance.getEntriesByName) ?
+                                performance.getEntriesByName(reportUrl) : [];
+                            const entry = entries.length ? entries[entries.length - 1] : null;
+                            if (entry && entry.encodedBodySize > 0 && entry.responseEnd > entry.responseStart) {
+                                body.bytes = entry.encodedBodySize;
+                                body.duration_ms = Math.round(entry.responseEnd - entry.responseStart);
+                            }
+                        } catch (e) { /* 忽略 */ }
+                        const payload = JSON.stringify(body);
                         // 使用 sendBeacon 以在页面卸载时仍尽量发送成功
                         if (navigator && navigator.sendBeacon) {
                             const blob = new Blob([payload], { type: 'application/json' });
@@ -209,4 +232,68 @@ export default class FileHandler {
             this.player.showStatus(`已获取视频直链： ${videoUrl}`, 'info');
         }
     }
+
+    /**
+     * 为当前直链设置候选故障切换：出错或卡顿超过阈值时切换到下一个候选并尽量恢复播放进度。
+     * @param {string} videoUrl - 当前已设置到播放器的直链
+     * @param {Array} candidates - 已排序的候选直链（[{url, host, source}] 或字符串数组）
+     */
+    _setupCandidateFailover(videoUrl, candidates) {
+        // 清理上一次加载遗留的监听，避免旧候选在新视频上触发切换
+        if (this._failoverCleanup) {
+            try { this._failoverCleanup(); } catch (e) {}
+            this._failoverCleanup = null;
+        }
+        const videoEl = this.player.videoPlayer;
+        if (!videoEl || !Array.isArray(candidates)) return;
+        const queue = candidates
+            .map(c => (c && typeof c === 'object') ? c.url : c)
+            .filter(u => typeof u === 'string' && u && u !== videoUrl);
+        if (!queue.length) return;
+
+        // 起播前或播放中缓冲卡顿超过该时长即切换到下一个候选
+        const STALL_FAILOVER_MS = 8000;
+        let stallTimer = null;
+        const clearStall = () => { if (stallTimer) { clearTimeout(stallTimer); stallTimer = null; } };
+        const armStall = () => { clearStall(); stallTimer = setTimeout(failover, STALL_FAILOVER_MS); };
+
+        const cleanup = () => {
+            clearStall();
+            try { videoEl.removeEventListener('error', failover); } catch (e) {}
+            try { videoEl.removeEventListener('waiting', armStall); } catch (e) {}
+            try { videoEl.removeEventListener('playing', clearStall); } catch (e) {}
+            try { videoEl.removeEventListener('canplay', clearStall); } catch (e) {}
+        };
+
+        function failover() {
+            const next = queue.shift();
+            if (!next) {
+                cleanup();
+                return;
+            }
+            console.warn('当前直链加载失败或卡顿，切换到候选直链：', next);
+            const resumeAt = videoEl.currentTime || 0;
+            try {
+                videoEl.src = next;
+                videoEl.load();
+                if (resumeAt > 0) {
+                    videoEl.addEventListener('loadedmetadata', () => {
+                        try { videoEl.currentTime = resumeAt; } catch (e) {}
+                    }, { once: true });
+                }
+                videoEl.play().catch(() => {});
+            } catch (e) {
+                console.debug('切换候选直链时出错：', e);
+            }
+            armStall();
+        }
+
+        videoEl.addEventListener('error', failover);
+        videoEl.addEventListener('waiting', armStall);
+        videoEl.addEventListener('playing', clearStall);
+        // 已可播放（例如自动播放被浏览器阻止）不视为卡顿
+        videoEl.addEventListener('canplay', clearStall);
+        armStall();
+        this._failoverCleanup = cleanup;
+    }
 }
@@ -58,7 +58,8 @@ onReady(function() {
                     // 开始计时：从用户点击“加载/解析”按钮时计时，直到前端播放成功
                     const parseStart = (typeof performance !== 'undefined' && performance.now) ? performance.now() : Date.now();
                     console.log('[诊断] 即将调用 /api/auto-parse，url=', url);
-                    const resp = await fetch(`/api/auto-parse?url=${encodeURIComponent(url)}`);
+                    // timings=1：让后端在 JSON 中附带分阶段耗时，随后随 CDN 上报一起回传
+                    const resp = await fetch(`/api/auto-parse?url=${encodeURIComponent(url)}&timings=1`);
                     console.log('[诊断] /api/auto-parse 返回，HTTP 状态：', resp.status);
                     const status = resp.status;
                     let data = {};
@@ -77,10 +78,14 @@ onReady(function() {
                         return;
                     }
 
+                    // 记录服务端分阶段耗时（view / playurl / ssrf / cdn），由文件处理器在上报 CDN 耗时时附带
+                    window.player.lastServerTimings = (data && data.timings) || null;
+
                     if (resp.ok && data && data.success && data.video_url) {
                         console.log('[诊断] 后端返回视频直链，开始使用直链加载播放器');
-                        // 将解析开始时间传递给文件处理器（作为第四个参数），以便在播放成功时上报加载耗时
-                        window.player.fileHandler.loadOnlineVideoWithUrl(data.video_url, url, null, parseStart);
+                        // 将解析开始时间传递给文件处理器（作为第四个参数），以便在播放成功时上报加载耗时；
+                        // 同时传入后端排序好的候选直链，供加载失败或卡顿时即时切换
+                        window.player.fileHandler.loadOnlineVideoWithUrl(data.video_url, url, null, parseStart, data.candidates);
                     } else if (data && data.success) {
                         const dlUrl = data.download_url || data.video_url;
                         if (dlUrl) {
@@ -438,7 +438,7 @@ export default class SubtitleRenderer {
             
             // 遍历并绘制每个当前字幕到 Canvas 上
             currentSubtitles.forEach(subtitle => {
-                this.drawSubtitle(subtitle.text, subtitle.style);
+                this.drawSubtitle(subtitle.text, subtitle.style, subtitle);
             });
         } else {
             // 如果没有字幕显示，清空预览区域
@@ -453,12 +453,15 @@ export default class SubtitleRenderer {
      * 在 Canvas 上绘制单个字幕文本。
      * @param {string} text - 要绘制的字幕文本
      * @param {string} [styleName='Default'] - 字幕样式名称
+     * @param {Object} [subtitle] - 字幕事件（含 start / end），用于计算 \move 的当前位置
      */
-    drawSubtitle(text, styleName = 'Default') {
+    drawSubtitle(text, styleName = 'Default', subtitle = null) {
         if (!text) return;
         
         // 1. 获取并合并字幕样式：优先使用指定样式，否则使用默认样式
         const style = { ...this.player.defaultStyle, ...this.player.styles[styleName] };
+        // 开头覆写块中带 \pos / \move 的事件（如服务端生成的弹幕 ASS）按指定坐标绘制单行文本
+        const placement = this.parsePlacement(text);
         
     // 2. 计算 Canvas 到 ASS 原始分辨率的水平/垂直缩放比例
     // 注意：字体按垂直比例缩放（更接近视觉感受），而换行宽度/水平间距按水平比例缩放
@@ -470,7 +473,7 @@ export default class SubtitleRenderer {
 
     // 3. 设置 Canvas 绘图上下文的字体样式
     // 字体大小使用垂直缩放（PlayResY -> 视频高度），避免单一 min 导致字体过大
-    const baseFontSize = (style.fontSize || this.player.defaultStyle.fontSize);
+    const baseFontSize = (placement && placement.fontSize) || style.fontSize || this.player.defaultStyle.fontSize;
     // 考虑用户手动缩放系数（player.fontScale），使得用户可以在运行时放大/缩小字幕
     const fontScale = (this.player.fontScale !== undefined && this.player.fontScale !== null) ? this.player.fontScale : 1.0;
     const fontSize = Math.max(baseFontSize * scaleY * fontScale, 8); // 最小字体大小 8px（保证在小画面上仍可读）
@@ -500,6 +503,11 @@ export default class SubtitleRenderer {
         
         // 默认颜色使用样式中的 primaryColor
         const defaultColor = style.primaryColor || this.player.defaultStyle.primaryColor;
+
+        if (placement) {
+            this.drawPositioned(placement, style, defaultColor, subtitle, scaleX, scaleY, this.player.ctx.font);
+            return;
+        }
         
     // 4. 计算字幕的垂直起始位置 (baseY)
     let baseY;
@@ -939,6 +947,79 @@ export default class SubtitleRenderer {
         return /[,.;:!?[\]{}()]/.test(char);
     }
 
+    /**
+     * 解析文本开头覆写块中的 \pos(x,y) / \move(x1,y1,x2,y2) 与 \fs 标签。
+     * @param {string} text - 原始字幕文本
+     * @returns {Object|null} {from, to, fontSize, rest}（坐标为 PlayRes 坐标），没有定位标签时返回 null
+     */
+    parsePlacement(text) {
+        const block = /^\{([^}]*)\}/.exec(text || '');
+        if (!block || block[1].indexOf('\\') === -1) return null;
+        const num = '\\s*(-?[\\d.]+)\\s*';
+        const move = new RegExp(`\\\\move\\(${num},${num},${num},${num}\\)`).exec(block[1]);
+        const pos = move ? null : new RegExp(`\\\\pos\\(${num},${num}\\)`).exec(block[1]);
+        if (!move && !pos) return null;
+        const coords = (move || pos).slice(1).map(Number);
+        const fs = /\\fs([\d.]+)/.exec(block[1]);
+        return {
+            from: [coords[0], coords[1]],
+            to: move ? [coords[2], coords[3]] : [coords[0], coords[1]],
+            fontSize: fs ? Number(fs[1]) : null,
+            rest: text.substring(block[0].length),
+        };
+    }
+
+    /**
+     * 在 \pos / \move 指定的位置绘制单行文本（不自动换行）。
+     * 样式的对齐方式决定坐标对应文本的哪个点（与 ASS 一致）：7 左上、8 中上、2 中下等。
+     * @param {Object} placement - parsePlacement 的结果
+     * @param {Object} style - 当前字幕的样式对象
+     * @param {string} defaultColor - 默认的文本颜色 (CSS 格式)
+     * @param {Object} subtitle - 字幕事件（含 start / end）
+     * @param {number} scaleX - 水平缩放因子
+     * @param {number} scaleY - 垂直缩放因子
+     * @param {string} fontString - 已设置到 ctx.font 的字体
+     */
+    drawPositioned(placement, style, defaultColor, subtitle, scaleX, scaleY, fontString) {
+        const ctx = this.player.ctx;
+        // \move 按事件的起止时间线性插值
+        let progress = 0;
+        if (subtitle && subtitle.end > subtitle.start) {
+            const now = this.player.videoPlayer.currentTime || 0;
+            progress = Math.min(1, Math.max(0, (now - subtitle.start) / (subtitle.end - subtitle.start)));
+        }
+        const x = (placement.from[0] + (placement.to[0] - placement.from[0]) * progress) * scaleX;
+        const y = (placement.from[1] + (placement.to[1] - placement.from[1]) * progress) * scaleY;
+
+        const segments = this.parseColorSegments(placement.rest.replace(/\\N/g, ' '), defaultColor);
+        const widths = segments.map(segment => this.player.measureTextWidth(segment.text, fontString));
+        const totalWidth = widths.reduce((sum, w) => sum + w, 0);
+
+        const alignment = style.alignment || this.player.defaultStyle.alignment;
+        const column = (alignment - 1) % 3; // 0 左、1 中、2 右
+        let currentX = column === 0 ? x : (column === 1 ? x - totalWidth / 2 : x - totalWidth);
+        ctx.textAlign = 'left';
+        ctx.textBaseline = alignment >= 7 ? 'top' : (alignment >= 4 ? 'middle' : 'bottom');
+
+        const outlineWidth = (style.outline || this.player.defaultStyle.outline) * scaleY;
+        const outlineColor = style.outlineColor || this.player.defaultStyle.outlineColor;
+        ctx.lineJoin = 'round';
+        segments.forEach((segment, i) => {
+            if (outlineWidth > 0) {
+                ctx.strokeStyle = outlineColor;
+                ctx.lineWidth = outlineWidth;
+                ctx.strokeText(segment.text, currentX, y);
+            }
+            ctx.fillStyle = segment.color;
+            ctx.fillText(segment.text, currentX, y);
+            currentX += widths[i];
+        });
+
+        // 恢复 drawSubtitle 使用的默认文本对齐
+        ctx.textAlign = 'center';
+        ctx.textBaseline = 'alphabetic';
+    }
+
     /**
      * 解析字幕文本中的 ASS 颜色标签，将文本分割成不同颜色的片段。
      * 例如，"{\c&H0000FF}红色文本{\c}普通文本" 会被解析为两个片段。
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""解析路由准入控制：并发上限、有界队列、503 + Retry-After，以及饱和时其余路由仍可访问"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import create_app, configure_parse_limiter, close_storage
+    from ass_player.admission import AdmissionLimiter, AsyncAdmissionLimiter, Overloaded
+    from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream
+except Exception:
+    create_app = None
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('等待条件超时')
+        time.sleep(0.01)
+
+
+class TestAdmissionLimiter(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+
+    def test_queue_full_rejected_immediately(self):
+        limiter = AdmissionLimiter('t', max_in_flight=1, max_queue=0, queue_timeout=5)
+        limiter.acquire()
+        start = time.monotonic()
+        with self.assertRaises(Overloaded) as cm:
+            limiter.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(cm.exception.reason, 'queue_full')
+        self.assertGreaterEqual(cm.exception.retry_after, 1)
+
+    def test_waiter_admitted_after_release_or_times_out(self):
+        limiter = AdmissionLimiter('t', max_in_flight=1, max_queue=1, queue_timeout=5)
+        limiter.acquire()
+        admitted = threading.Event()
+
+        def waiter():
+            limiter.acquire()
+            admitted.set()
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        _wait_until(lambda: limiter.waiting == 1)
+        limiter.release(0.5)
+        self.assertTrue(admitted.wait(2))
+        t.join()
+        self.assertEqual(limiter.stats()['in_flight'], 1)
+
+        limiter.queue_timeout = 0.1
+        with self.assertRaises(Overloaded) as cm:
+            limiter.acquire()
+        self.assertEqual(cm.exception.reason, 'timeout')
+        self.assertEqual(limiter.stats()['rejected'], {'queue_full': 0, 'timeout': 1})
+
+    def test_async_slot_skips_cancelled_waiter(self):
+        async def scenario():
+            limiter = AsyncAdmissionLimiter('t', max_in_flight=1, max_queue=2, queue_timeout=5)
+            await limiter.acquire()
+            first = asyncio.ensure_future(limiter.acquire())
+            second = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.waiting, 2)
+            # 排队中的 first 被取消（如客户端断开）：释放的空位应移交给 second
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            self.assertEqual(limiter.waiting, 1)
+            limiter.release(0.1)
+            await asyncio.wait_for(second, 1)
+            self.assertEqual(limiter.in_flight, 1)
+            limiter.release(0.1)
+            self.assertEqual(limiter.in_flight, 0)
+
+            limiter.queue_timeout = 0.05
+            await limiter.acquire()
+            with self.assertRaises(Overloaded):
+                await limiter.acquire()
+
+        asyncio.run(scenario())
+
+
+class TestParseLoadShedding(unittest.TestCase):
+    """上游延迟 10 秒时，解析并发打满后快速返回 503，页面与静态文件不受影响"""
+
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.stub = StubBilibiliUpstream(latency=LatencyModel('fixed', 10000)).start()
+        self.app = create_app('testing')
+        self.app.config['BILIBILI_API_BASE'] = self.stub.base_url
+        self.limiter = configure_parse_limiter(self.app, max_in_flight=2, max_queue=1, queue_timeout=5)
+        self.results = {}
+        self.threads = []
+
+    def tearDown(self):
+        self.stub.stop()
+        for t in self.threads:
+            t.join(15)
+        close_storage(self.app)
+
+    def _parse_in_background(self, name, bvid):
+        def run():
+            resp = self.app.test_client().get(f'/api/auto-parse?url={bvid}')
+            self.results[name] = resp.status_code
+
+        t = threading.Thread(target=run)
+        t.start()
+        self.threads.append(t)
+
+    def test_saturated_parse_sheds_load_and_pages_stay_responsive(self):
+        self._parse_in_background('a', 'BV1aa411c7mD')
+        self._parse_in_background('b', 'BV1bb411c7mD')
+        _wait_until(lambda: self.limiter.in_flight == 2)
+        self._parse_in_background('queued', 'BV1cc411c7mD')
+        _wait_until(lambda: self.limiter.waiting == 1)
+
+        client = self.app.test_client()
+        start = time.monotonic()
+        resp = client.get('/api/auto-parse?url=BV1dd411c7mD')
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(resp.status_code, 503)
+        self.assertGreaterEqual(int(resp.headers['Retry-After']), 1)
+        self.assertFalse(resp.get_json()['success'])
+
+        start = time.monotonic()
+        self.assertEqual(client.get('/').status_code, 200)
+        self.assertEqual(client.get('/static/js/main.js').status_code, 200)
+        self.assertEqual(client.get('/healthz').status_code, 200)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+        # 上游恢复后，进行中与排队的请求都能完成
+        self.stub.release.set()
+        for t in self.threads:
+            t.join(15)
+        self.assertEqual(self.results, {'a': 200, 'b': 200, 'queued': 200})
+        self.assertEqual(self.limiter.in_flight, 0)
+        self.assertEqual(self.limiter.stats()['rejected']['queue_full'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
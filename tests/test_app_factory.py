@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""应用工厂与冷启动测试：导入耗时预算、解析器与存储的延迟创建"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+try:
+    import app as app_module
+    from app import create_app, get_parser, close_storage
+except Exception:
+    app_module = None
+
+# `import app` 的累计导入耗时预算（毫秒）。CI 机器较慢时可通过环境变量放宽
+IMPORT_BUDGET_MS = float(os.environ.get('ASS_IMPORT_BUDGET_MS', '1500'))
+# 冷启动阶段不应导入的重型模块（在首次解析时才需要）
+LAZY_MODULES = ('requests', 'urllib3', 'ass_player.bilibili', 'sqlite3')
+
+
+def _importtime(statement):
+    """在独立解释器中以 -X importtime 执行语句，返回 {模块名: 累计耗时微秒}。"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    result = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        result[parts[2].strip()] = int(parts[1])
+    return result
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_app_stays_within_budget(self):
+        times = _importtime('import app')
+        self.assertIn('app', times)
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, times, f'{name} 不应在 import app 时被导入')
+        self.assertLess(times['app'] / 1000.0, IMPORT_BUDGET_MS)
+
+
+class TestAppFactory(unittest.TestCase):
+    def setUp(self):
+        if app_module is None:
+            self.skipTest('app not available')
+
+    def test_first_page_does_not_build_parser(self):
+        flask_app = create_app('testing')
+        self.assertIsNot(flask_app, app_module.app)
+        resp = flask_app.test_client().get('/?desktop=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(flask_app._parser)
+
+    def test_parser_created_once_under_concurrency(self):
+        flask_app = create_app('testing')
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(get_parser(flask_app))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len({id(p) for p in seen}), 1)
+        self.assertIs(flask_app._parser, seen[0])
+
+    def test_disk_cache_opened_lazily(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'cache.db')
+            flask_app = create_app('testing')
+            flask_app.config['DISK_CACHE_PATH'] = db_path
+            self.assertFalse(os.path.exists(db_path))
+            parser = get_parser(flask_app)
+            self.assertIs(parser._disk_cache_conn, flask_app._disk_cache_conn)
+            tables = {r[0] for r in parser._disk_cache_conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            self.assertTrue({'cache', 'cdn_stats'} <= tables)
+            conn = flask_app._disk_cache_conn
+            close_storage(flask_app)
+            self.assertIsNone(flask_app._disk_cache_conn)
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute('SELECT 1')
+
+    def test_module_parser_attribute_is_lazy_alias(self):
+        self.assertIs(app_module._parser, get_parser(app_module.app))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""ASGI 服务模式测试：Flask 路由契约、异步解析器与桥接"""
+import asyncio
+import json
+import os
+import sys
+import unittest
+import unittest.mock as mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import httpx
+    from asgi import AssPlayerAsgi
+    from app import create_app
+    from ass_player.bilibili import BiliBiliParser
+    from ass_player.bilibili_async import AsyncBiliBiliParser
+    from tests import test_app as contract
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    AssPlayerAsgi = None
+
+
+class _Response:
+    """把 httpx 响应包装成与 Flask 测试客户端响应相同的接口。"""
+
+    def __init__(self, resp):
+        self.status_code = resp.status_code
+        self.data = resp.content
+        self.headers = resp.headers
+
+    def get_json(self):
+        return json.loads(self.data)
+
+
+class AsgiTestClient:
+    """同步调用 ASGI 应用的测试客户端（接口与 Flask test_client 的 get/post 一致）。"""
+
+    def __init__(self, asgi_app):
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url='http://localhost')
+
+    def get(self, path, **kwargs):
+        return _Response(self.loop.run_until_complete(self.client.get(path, **kwargs)))
+
+    def post(self, path, json=None, **kwargs):
+        return _Response(self.loop.run_until_complete(self.client.post(path, json=json, **kwargs)))
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+
+if AssPlayerAsgi is not None:
+    class TestAsgiContract(contract.TestFlaskApp):
+        """同一组接口契约测试，改为经由 ASGI 入口发送请求。"""
+
+        def setUp(self):
+            super().setUp()
+            self.asgi = AssPlayerAsgi(contract.app, wsgi_threads=2)
+            self.app = AsgiTestClient(self.asgi)
+
+        def tearDown(self):
+            self.app.close()
+            self.asgi.bridge.shutdown()
+
+        def test_auto_parse_success(self):
+            # 异步路由调用的是 AsyncBiliBiliParser.get_real_url，mock 目标随之改变
+            with mock.patch('ass_player.bilibili_async.AsyncBiliBiliParser.get_real_url',
+                            new=mock.AsyncMock(return_value='https://test.com/video.mp4')):
+                response = self.app.get('/api/auto-parse?url=https://www.bilibili.com/video/BV1xx411c7mD')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'success', response.data)
+            self.assertIn(b'video_url', response.data)
+
+
+class TestAsgiRoutes(unittest.TestCase):
+    def setUp(self):
+        if AssPlayerAsgi is None:
+            self.skipTest('ASGI 依赖不可用')
+        self.flask_app = create_app('testing')
+        self.asgi = AssPlayerAsgi(self.flask_app, wsgi_threads=2)
+        self.client = AsgiTestClient(self.asgi)
+
+    def tearDown(self):
+        self.client.close()
+        self.asgi.bridge.shutdown()
+
+    def test_async_route_sets_security_headers(self):
+        resp = self.client.get('/api/auto-parse')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.headers['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(resp.headers['Content-Type'], 'application/json')
+        self.assertIn('error', resp.get_json())
+
+    def test_bridged_route_matches_flask(self):
+        flask_resp = self.flask_app.test_client().get('/config.json')
+        resp = self.client.get('/config.json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json(), flask_resp.get_json())
+
+    def test_wrong_method_falls_back_to_flask(self):
+        self.assertEqual(self.client.get('/api/report-cdn').status_code, 405)
+
+    def test_report_cdn_updates_shared_parser(self):
+        self.flask_app._parser = BiliBiliParser()
+        resp = self.client.post('/api/report-cdn', json={'hostname': 'upos-sz-mirrorcos.bilivideo.com', 'load_ms': 120})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('upos-sz-mirrorcos.bilivideo.com', self.flask_app._parser._cdn_stats)
+
+    def test_report_cdn_rejects_oversized_body(self):
+        resp = self.client.post('/api/report-cdn', content=b'{' + b' ' * (128 * 1024) + b'}',
+                                headers={'Content-Type': 'application/json'})
+        self.assertEqual(resp.status_code, 413)
+
+    def test_auto_parse_against_stub_upstream(self):
+        with StubBilibiliUpstream() as stub:
+            self.flask_app._parser = BiliBiliParser(api_base=stub.base_url)
+            resp = self.client.get('/api/auto-parse?url=BV1xx411c7mD&timings=1')
+            again = self.client.get('/api/auto-parse?url=BV1xx411c7mD')
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertTrue(body['success'])
+        self.assertIn('bilivideo.com', body['video_url'])
+        self.assertIn('view', body['timings'])
+        self.assertIn('Server-Timing', resp.headers)
+        # 第二次命中同步解析器共享的解析结果缓存
+        self.assertEqual(again.get_json()['video_url'], body['video_url'])
+        self.assertEqual(stub.counts['view'], 1)
+
+
+class TestAsyncParser(unittest.TestCase):
+    def setUp(self):
+        if AssPlayerAsgi is None:
+            self.skipTest('ASGI 依赖不可用')
+
+    def test_retries_retryable_status(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503 if len(calls) == 1 else 200, json={'code': 0})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            aparser = AsyncBiliBiliParser(BiliBiliParser(), client=client)
+            with mock.patch.object(AsyncBiliBiliParser, 'BACKOFF_FACTOR', 0):
+                resp = await aparser._api_get('/view', 'https://api.bilibili.com/x/web-interface/view', {})
+            await aparser.aclose()
+            return resp
+
+        resp = asyncio.run(run())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(calls), 2)
+
+    def test_invalid_url_returns_none(self):
+        async def run():
+            aparser = AsyncBiliBiliParser(BiliBiliParser())
+            try:
+                return await aparser.get_real_url('https://example.com/video')
+            finally:
+                await aparser.aclose()
+
+        self.assertIsNone(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
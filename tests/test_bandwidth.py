@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""自适应清晰度：按客户端分组的吞吐估算、清晰度选择、/api/report-cdn 吞吐样本与 ?qn= 覆盖"""
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.bandwidth import BandwidthEstimator, client_bucket, parse_qn
+
+try:
+    from app import create_app
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.ratelimit import AdaptiveTokenBucket
+except Exception:
+    create_app = None
+
+BUCKET = '198.51.100.0/24'
+MB = 1000 * 1000
+
+
+def _signed_url(qn):
+    return f'https://upos-sz-mirrorcos.bilivideo.com/v-{qn}.mp4?deadline={int(time.time()) + 7200}'
+
+
+class TestEstimator(unittest.TestCase):
+    def test_deterministic_for_same_samples(self):
+        samples = [(2 * MB, 4000), (500 * 1000, 2500), (3 * MB, 3000), (1 * MB, 900)]
+
+        def run():
+            estimator = BandwidthEstimator()
+            for nbytes, ms in samples:
+                estimator.record(BUCKET, nbytes, ms)
+            return estimator.estimate_kbps(BUCKET)
+        self.assertEqual(run(), run())
+
+    def test_needs_enough_bytes_and_ignores_tiny_samples(self):
+        estimator = BandwidthEstimator(min_sample_bytes=16 * 1024, min_total_bytes=128 * 1024)
+        self.assertFalse(estimator.record(BUCKET, 10 * 1024, 5))
+        self.assertFalse(estimator.record(BUCKET, 1 * MB, 0))
+        self.assertTrue(estimator.record(BUCKET, 100 * 1024, 100))
+        self.assertIsNone(estimator.estimate_kbps(BUCKET))
+        self.assertEqual(estimator.select_qn(BUCKET), 64)
+        estimator.record(BUCKET, 100 * 1024, 100)
+        self.assertAlmostEqual(estimator.estimate_kbps(BUCKET), 8192.0)
+
+    def test_drop_in_throughput_lowers_estimate_quickly(self):
+        estimator = BandwidthEstimator()
+        for _ in range(5):
+            estimator.record(BUCKET, 5 * MB, 4000)        # 10 Mbps
+        self.assertEqual(estimator.select_qn(BUCKET), 80)
+        estimator.record(BUCKET, 800 * 1000, 4000)        # 1.6 Mbps
+        # 快速 EWMA（半衰期 2 秒）在一个 4 秒样本后已降到约 3.7 Mbps，取两者中较小者
+        self.assertLess(estimator.estimate_kbps(BUCKET), 3800)
+        self.assertEqual(estimator.select_qn(BUCKET), 64)
+        for _ in range(3):
+            estimator.record(BUCKET, 800 * 1000, 4000)
+        self.assertEqual(estimator.select_qn(BUCKET), 32)
+
+    def test_select_qn_ladder(self):
+        def qn_for(kbps, **kwargs):
+            estimator = BandwidthEstimator(**kwargs)
+            estimator.record(BUCKET, int(kbps * 1000 / 8 * 4), 4000)
+            return estimator.select_qn(BUCKET)
+        self.assertEqual(qn_for(300), 16)
+        self.assertEqual(qn_for(1400), 32)
+        self.assertEqual(qn_for(2800), 64)
+        self.assertEqual(qn_for(4600), 80)
+        self.assertEqual(qn_for(4600, max_qn=64), 64)
+        self.assertEqual(qn_for(4600, safety=2.0), 64)
+
+    def test_buckets_are_bounded(self):
+        estimator = BandwidthEstimator(max_buckets=2)
+        for bucket in ('a', 'b', 'c'):
+            estimator.record(bucket, 1 * MB, 1000)
+        self.assertEqual(len(estimator), 2)
+        self.assertIsNone(estimator.estimate_kbps('a'))
+
+    def test_client_bucket_and_parse_qn(self):
+        self.assertEqual(client_bucket('198.51.100.23'), BUCKET)
+        self.assertEqual(client_bucket('::ffff:198.51.100.23'), BUCKET)
+        self.assertEqual(client_bucket('2001:db8:1:2::5'), '2001:db8:1::/48')
+        self.assertEqual(client_bucket('not-an-ip'), 'unknown')
+        self.assertEqual((parse_qn('80'), parse_qn(32), parse_qn('120'), parse_qn('x')), (80, 32, None, None))
+
+
+class TestAutoParseQuality(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        # 自适应清晰度默认关闭
+        self.assertIsNone(self.app._bandwidth)
+        self.app._bandwidth = BandwidthEstimator()
+        self.client = self.app.test_client()
+        self.requested = []
+
+        def fake_get_real_url(url, ctx=None, use_cache=True, lane='interactive'):
+            self.requested.append(ctx.qn)
+            return _signed_url(ctx.qn or 64)
+        patcher = patch('ass_player.bilibili.BiliBiliParser.get_real_url', side_effect=fake_get_real_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _report(self, remote, forwarded_for=None, **sample):
+        body = dict({'hostname': 'upos-sz-mirrorcos.bilivideo.com', 'load_ms': 800}, **sample)
+        headers = {'X-Forwarded-For': forwarded_for} if forwarded_for else {}
+        return self.client.post('/api/report-cdn', json=body, headers=headers, environ_base={'REMOTE_ADDR': remote})
+
+    def _parse(self, remote, query='', forwarded_for=None):
+        headers = {'X-Forwarded-For': forwarded_for} if forwarded_for else {}
+        return self.client.get(f'/api/auto-parse?url=BV1xx411c7mD{query}', headers=headers,
+                               environ_base={'REMOTE_ADDR': remote})
+
+    def test_reported_throughput_selects_quality_per_network(self):
+        self.assertEqual(self._parse('198.51.100.7').get_json()['qn'], 64)
+        for _ in range(3):
+            self.assertEqual(self._report('198.51.100.7', bytes=5 * MB, duration_ms=4000).status_code, 200)
+        self.assertEqual(self._report('203.0.113.9', bytes=400 * 1000, duration_ms=4000).status_code, 200)
+
+        # 同一 /24 网段的其他客户端共享估算
+        self.assertEqual(self._parse('198.51.100.99').get_json()['qn'], 80)
+        self.assertEqual(self._parse('203.0.113.9').get_json()['qn'], 16)
+        self.assertEqual(self._parse('192.0.2.1').get_json()['qn'], 64)
+        self.assertEqual(self.requested, [64, 80, 16, 64])
+
+    def test_client_address_from_trusted_proxy_hops(self):
+        # 未配置可信代理时忽略 X-Forwarded-For：经代理的客户端都落在代理地址的分组
+        self._report('127.0.0.1', forwarded_for='198.51.100.7', bytes=5 * MB, duration_ms=4000)
+        self.assertEqual(self._parse('127.0.0.1', forwarded_for='203.0.113.9').get_json()['qn'], 80)
+
+        self.app._bandwidth = BandwidthEstimator()
+        self.app.config['TRUSTED_PROXY_HOPS'] = 1
+        for _ in range(3):
+            # 客户端自带的（伪造的）最左侧地址被忽略，取代理追加的最右侧地址
+            self._report('127.0.0.1', forwarded_for='192.0.2.1, 198.51.100.7', bytes=5 * MB, duration_ms=4000)
+        self.assertEqual(self._parse('127.0.0.1', forwarded_for='198.51.100.99').get_json()['qn'], 80)
+        self.assertEqual(self._parse('127.0.0.1', forwarded_for='198.51.100.7, 203.0.113.9').get_json()['qn'], 64)
+        self.assertEqual(self._parse('127.0.0.1').get_json()['qn'], 64)
+
+    def test_override_and_validation(self):
+        self._report('198.51.100.7', bytes=5 * MB, duration_ms=4000)
+        self.assertEqual(self._parse('198.51.100.7', '&qn=32').get_json()['qn'], 32)
+        self.assertEqual(self._parse('198.51.100.7', '&qn=120').status_code, 400)
+        self.assertEqual(self._report('198.51.100.7', bytes='lots', duration_ms=10).status_code, 400)
+        self.assertEqual(self._report('198.51.100.7', bytes=1024, duration_ms=0).status_code, 400)
+        self.assertEqual(self._report('198.51.100.7', bytes=1024).status_code, 400)
+        self.assertEqual(self.requested, [32])
+
+    def test_disabled_keeps_default(self):
+        self.app._bandwidth = None
+        self._report('198.51.100.7', bytes=5 * MB, duration_ms=4000)
+        self.assertEqual(self._parse('198.51.100.7').get_json()['qn'], 64)
+        self.assertEqual(self.requested, [None])
+
+
+@patch('ass_player.bilibili.socket.getaddrinfo', return_value=[(None, None, None, None, ('93.184.216.34', 0))])
+class TestParserQuality(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('parser not available')
+
+    def test_qn_reaches_playurl_and_keys_cache(self, _dns):
+        parser = BiliBiliParser(api_base='https://api.bilibili.com', rate_limiter=AdaptiveTokenBucket(rate=0),
+                                playurl_strategies=('html5',))
+
+        def playurl(request, context):
+            return {'code': 0, 'data': {'durl': [{'url': _signed_url(request.qs['qn'][0])}]}}
+
+        with requests_mock.Mocker() as m:
+            m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'cid': 279786}})
+            calls = m.get('https://api.bilibili.com/x/player/playurl', json=playurl)
+            high = parser.get_real_url('BV1xx411c7mD', ctx=ResolveContext(qn=80))
+            default = parser.get_real_url('BV1xx411c7mD', ctx=ResolveContext())
+            again = parser.get_real_url('BV1xx411c7mD', ctx=ResolveContext(qn=80))
+        self.assertIn('/v-80.mp4', high)
+        self.assertIn('/v-64.mp4', default)
+        self.assertEqual(again, high)
+        self.assertEqual([r.qs['qn'] for r in calls.request_history], [['80'], ['64']])
+
+
+if __name__ == '__main__':
+    unittest.main()
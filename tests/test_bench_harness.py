@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""压测脚本冒烟测试：以极小规模运行，验证桩上游与 JSON 输出结构"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from tests_bench.bench_api import percentile, run_benchmark
+    from tests_bench.bench_danmaku import run_benchmark as run_danmaku_benchmark
+    from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream
+    from ass_player.bilibili import BiliBiliParser
+except Exception:
+    run_benchmark = None
+
+
+class TestBenchHarness(unittest.TestCase):
+    def setUp(self):
+        if run_benchmark is None:
+            self.skipTest('bench 依赖不可用')
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_parser_against_stub(self):
+        with StubBilibiliUpstream() as stub:
+            parser = BiliBiliParser(api_base=stub.base_url)
+            url = parser._get_720p_mp4('https://www.bilibili.com/video/BV1xx411c7mD')
+        self.assertIn('bilivideo.com', url)
+        self.assertEqual(stub.counts['view'], 1)
+        self.assertEqual(stub.counts['playurl'], 1)
+
+    def test_stub_error_distribution_is_seeded(self):
+        def run(seed):
+            with StubBilibiliUpstream(error_rate=0.5, seed=seed) as stub:
+                parser = BiliBiliParser(api_base=stub.base_url)
+                return [bool(parser._get_720p_mp4(f'BV1{i:09d}')) for i in range(8)]
+        self.assertEqual(run(7), run(7))
+
+    def test_run_benchmark_json_shape(self):
+        result = run_benchmark([2], 6, LatencyModel('fixed', 0))
+        json.dumps(result)
+        self.assertEqual(result['schema'], 1)
+        endpoints = [(r['endpoint'], r['concurrency']) for r in result['results']]
+        self.assertEqual(endpoints, [('/api/auto-parse', 2), ('/api/report-cdn', 2)])
+        for r in result['results']:
+            self.assertEqual(r['errors'], 0)
+            self.assertEqual(set(r['latency_ms']), {'p50', 'p95', 'p99', 'mean', 'max'})
+        self.assertEqual(result['upstream_counts']['view'], 6)
+
+    def test_danmaku_benchmark_json_shape(self):
+        result = run_danmaku_benchmark(2000, runs=1, duration=60.0)
+        json.dumps(result)
+        self.assertEqual(result['params']['comments'], 2000)
+        # 每 500 条含一条不支持的高级弹幕
+        self.assertEqual(result['layout']['parsed'], 1996)
+        layout = result['layout']
+        self.assertEqual(layout['scroll'] + layout['top'] + layout['bottom'] + layout['dropped'], 1996)
+        self.assertLess(result['parse_peak_kib']['iterparse'], result['parse_peak_kib']['dom'])
+
+
+if __name__ == '__main__':
+    unittest.main()
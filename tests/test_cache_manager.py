@@ -6,74 +6,469 @@
 
 import unittest
 import time
+import socket
+import socketserver
 import sys
 import os
+import tempfile
+import threading
+import fnmatch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from cache_manager import CacheManager
+from cache_manager import CacheManager, MemoryBudget, get_memory_budget
+from ass_player.cache_backends import (MemoryBackend, SQLiteBackend, RedisBackend, create_backend,
+                                       encode_value, decode_value)
+
+
+class FakeRedisServer:
+    """本地 Redis 替身：实现 RESP2 协议下的 PING/AUTH/SELECT/GET/SET(PX)/DEL/SCAN。"""
+
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.lock = threading.Lock()
+        self.commands = []
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                authed = server.password is None
+                while True:
+                    args = self._read_command()
+                    if args is None:
+                        return
+                    name = args[0].upper()
+                    server.commands.append(name)
+                    if name == b'AUTH':
+                        authed = args[1].decode() == server.password
+                        self._reply(b'+OK\r\n' if authed else b'-WRONGPASS invalid password\r\n')
+                    elif not authed:
+                        self._reply(b'-NOAUTH Authentication required.\r\n')
+                    else:
+                        self._reply(server.dispatch(name, args[1:]))
+
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int(self.rfile.readline()[1:-2])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def _reply(self, data):
+                self.wfile.write(data)
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @staticmethod
+    def _bulk(value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            entry = None
+        return entry
+
+    def dispatch(self, name, args):
+        with self.lock:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name == b'SELECT':
+                return b'+OK\r\n'
+            if name == b'GET':
+                entry = self._live(args[0])
+                return self._bulk(entry[0] if entry else None)
+            if name == b'SET':
+                expires = None
+                if len(args) >= 4 and args[2].upper() == b'PX':
+                    expires = time.time() + int(args[3]) / 1000.0
+                self.data[args[0]] = (args[1], expires)
+                return b'+OK\r\n'
+            if name == b'DEL':
+                return b':%d\r\n' % sum(1 for k in args if self.data.pop(k, None) is not None)
+            if name == b'SCAN':
+                pattern = args[args.index(b'MATCH') + 1].decode()
+                keys = [k for k in list(self.data) if self._live(k) and fnmatch.fnmatchcase(k.decode(), pattern)]
+                return b'*2\r\n' + self._bulk(b'0') + b'*%d\r\n' % len(keys) + b''.join(self._bulk(k) for k in keys)
+            return b'-ERR unknown command\r\n'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
 
 
 class TestCacheManager(unittest.TestCase):
     """CacheManager测试类"""
-    
+
     def setUp(self):
         """测试前置设置"""
-        # 缓存机制已被移除，CacheManager 保留接口但不存储数据
-        self.cache = CacheManager(enabled=True, ttl=1)  # ttl 保留但无实际作用
-    
+        self.cache = CacheManager(enabled=True, ttl=1)
+
     def test_cache_disabled(self):
         """测试缓存禁用"""
         cache = CacheManager(enabled=False)
-        
+
         cache.set("test_url", {"data": "test"})
         result = cache.get("test_url")
-        
+
         self.assertIsNone(result)
-    
+
     def test_cache_set_and_get(self):
         """测试缓存设置和获取"""
         test_data = {"video_url": "https://example.com/video.mp4", "quality": "720P"}
-        # 因为缓存已禁用，set 不会生效，get 始终返回 None
         self.cache.set("test_url", test_data)
         result = self.cache.get("test_url")
-        self.assertIsNone(result)
-    
+        self.assertEqual(result, test_data)
+
     def test_cache_expiration(self):
         """测试缓存过期"""
         test_data = {"video_url": "https://example.com/video.mp4"}
-        # 缓存被禁用，直接返回 None
-        self.cache.set("test_url", test_data)
-        result = self.cache.get("test_url")
-        self.assertIsNone(result)
-    
+        self.cache.set("test_url", test_data, ttl=0.05)
+        self.assertEqual(self.cache.get("test_url"), test_data)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("test_url"))
+
     def test_cache_key_generation(self):
         """测试缓存键生成"""
         url1 = "https://example.com/video1"
         url2 = "https://example.com/video2"
-        
+
         key1 = self.cache._generate_key(url1)
         key2 = self.cache._generate_key(url2)
-        
+
         self.assertNotEqual(key1, key2)
         self.assertEqual(len(key1), 32)  # MD5 hash长度
-    
+
+    def test_namespaces_isolated(self):
+        """测试命名空间隔离"""
+        other = CacheManager(backend=self.cache.backend, namespace='other')
+        self.cache.set("test_url", {"data": 1})
+        other.set("test_url", {"data": 2})
+        self.cache.set("test_url", {"data": 3}, namespace='resolve')
+        self.assertEqual(self.cache.get("test_url"), {"data": 1})
+        self.assertEqual(other.get("test_url"), {"data": 2})
+        self.assertEqual(self.cache.get("test_url", namespace='resolve'), {"data": 3})
+        other.clear()
+        self.assertIsNone(other.get("test_url"))
+        self.assertEqual(self.cache.get("test_url"), {"data": 1})
+
     def test_cache_clear(self):
         """测试缓存清空"""
-        # 清空是无害的调用（即便没有缓存）
         self.cache.set("test_url1", {"data": "test1"})
         self.cache.set("test_url2", {"data": "test2"})
         self.cache.clear()
-        self.assertEqual(len(self.cache._cache), 0)
-    
+        self.assertEqual(self.cache.get_stats()['size'], 0)
+
     def test_cache_stats(self):
         """测试缓存统计"""
+        self.cache.set("test_url", {"data": "test"})
+        self.cache.get("test_url")
+        self.cache.get("missing")
         stats = self.cache.get_stats()
-        # 目前缓存功能被禁用
-        self.assertEqual(stats['enabled'], False)
-        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['enabled'], True)
+        self.assertEqual(stats['size'], 1)
         self.assertEqual(stats['ttl'], 1)
+        self.assertEqual(stats['backend']['backend'], 'memory')
+        self.assertEqual(stats['backend']['hits'], 1)
+        self.assertEqual(stats['backend']['misses'], 1)
+
+
+class TestCacheBackends(unittest.TestCase):
+    """三种后端的公共行为"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.redis = FakeRedisServer().__enter__()
+
+    def tearDown(self):
+        self.redis.__exit__()
+        self.tmpdir.cleanup()
+
+    def backends(self):
+        return [
+            MemoryBackend(),
+            SQLiteBackend(os.path.join(self.tmpdir.name, 'cache.db')),
+            RedisBackend(port=self.redis.port),
+        ]
+
+    def test_roundtrip_ttl_and_stats(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                self.assertTrue(backend.set('ns:a', {'url': 'https://x/1.mp4', 'n': [1, 2]}, ttl=60))
+                backend.set('ns:short', 'v', ttl=0.05)
+                self.assertEqual(backend.get('ns:a'), {'url': 'https://x/1.mp4', 'n': [1, 2]})
+                time.sleep(0.1)
+                self.assertIsNone(backend.get('ns:short'))
+                self.assertTrue(backend.delete('ns:a'))
+                self.assertIsNone(backend.get('ns:a'))
+                stats = backend.stats('ns:')
+                self.assertEqual((stats['hits'], stats['misses'], stats['sets']), (1, 2, 2))
+                self.assertEqual(stats['size'], 0)
+                backend.close()
+
+    def test_clear_only_removes_prefix(self):
+        for backend in self.backends():
+            with self.subTest(backend=backend.name):
+                backend.set('a:1', 1)
+                backend.set('a:2', 2)
+                backend.set('b:1', 3)
+                self.assertEqual(backend.clear('a:'), 2)
+                self.assertEqual(backend.size(''), 1)
+                self.assertEqual(backend.get('b:1'), 3)
+                backend.close()
+
+    def test_memory_lru_eviction(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+        self.assertEqual(backend.stats()['evictions'], 1)
+
+    def test_sqlite_shared_between_instances(self):
+        path = os.path.join(self.tmpdir.name, 'shared.db')
+        writer, reader = SQLiteBackend(path), SQLiteBackend(path)
+        writer.set('k', {'v': 1}, ttl=60)
+        self.assertEqual(reader.get('k'), {'v': 1})
+        writer.set('old', 1, ttl=-1)
+        self.assertEqual(reader.purge_expired(), 1)
+        writer.close()
+        reader.close()
+
+    def test_sqlite_purges_expired_rows_while_writing(self):
+        path = os.path.join(self.tmpdir.name, 'purge.db')
+        backend = create_backend(f'sqlite:///{path}?purge_every=3')
+        self.assertEqual(backend.purge_every, 3)
+        backend.set('stale', 1, ttl=-1)
+        backend.set('fresh', 2, ttl=60)
+
+        def rows():
+            return backend._connection().execute('SELECT key FROM kv_cache ORDER BY key').fetchall()
+
+        # 过期行从未被读取，前两次写入后仍留在文件里；第三次写入时顺带清理
+        self.assertEqual(rows(), [('fresh',), ('stale',)])
+        backend.set('other', 3, ttl=60)
+        self.assertEqual(rows(), [('fresh',), ('other',)])
+        self.assertEqual(backend.stats()['evictions'], 1)
+        backend.close()
+
+    def test_redis_auth_and_reconnect(self):
+        with FakeRedisServer(password='secret') as server:
+            backend = create_backend(f'redis://:secret@127.0.0.1:{server.port}/0')
+            backend.set('k', 'v')
+            backend._sock.shutdown(socket.SHUT_RDWR)  # 模拟连接被断开
+            self.assertEqual(backend.get('k'), 'v')
+            self.assertEqual(server.commands.count(b'AUTH'), 2)
+            backend.close()
+
+    def test_redis_unavailable_fails_open(self):
+        with socketserver.TCPServer(('127.0.0.1', 0), socketserver.BaseRequestHandler) as probe:
+            port = probe.server_address[1]
+        backend = RedisBackend(port=port, socket_timeout=0.5)  # 无人监听的端口
+        self.assertFalse(backend.set('k', 'v'))
+        self.assertIsNone(backend.get('k'))
+        self.assertEqual(backend.stats()['errors'], 3)
+
+    def test_compact_encoding(self):
+        small = {'url': 'https://x/1.mp4'}
+        self.assertEqual(encode_value(small), b'j{"url":"https://x/1.mp4"}')
+        large = {'candidates': ['https://upos-sz-mirrorcos.bilivideo.com/upgcxcode/1.mp4'] * 50}
+        packed = encode_value(large)
+        self.assertTrue(packed.startswith(b'z'))
+        self.assertLess(len(packed), 200)
+        self.assertEqual(decode_value(packed), large)
+
+    def test_create_backend_specs(self):
+        self.assertIsInstance(create_backend('memory'), MemoryBackend)
+        self.assertEqual(create_backend('memory://?max_entries=5').max_entries, 5)
+        self.assertEqual(create_backend('sqlite:///tmp/x.db').path, '/tmp/x.db')
+        redis = create_backend('redis://:p%40ss@cache.internal:6380/2?timeout=2.5')
+        self.assertEqual((redis.host, redis.port, redis.db, redis.password, redis.socket_timeout),
+                         ('cache.internal', 6380, 2, 'p@ss', 2.5))
+        with self.assertRaises(ValueError):
+            create_backend('memcached://127.0.0.1')
+
+
+class TestSharedResolution(unittest.TestCase):
+    """解析器之间通过共享后端复用解析结果"""
+
+    def test_second_parser_reuses_shared_result(self):
+        from ass_player.bilibili import BiliBiliParser
+
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = SQLiteBackend(os.path.join(tmp, 'shared.db'))
+            deadline = int(time.time()) + 3600
+            final_url = f'https://upos-sz-mirrorcos.bilivideo.com/v.mp4?deadline={deadline}'
+            first = BiliBiliParser(shared_cache=CacheManager(backend=backend))
+            first._store_resolution('https://www.bilibili.com/video/BV1xx411c7mD', final_url, [{'url': final_url}])
+
+            second = BiliBiliParser(shared_cache=CacheManager(backend=SQLiteBackend(backend.path)))
+            second._get_720p_mp4 = lambda *a, **k: self.fail('不应请求上游')
+            self.assertEqual(second.get_real_url('BV1xx411c7mD'), final_url)
+            self.assertIn('https://www.bilibili.com/video/BV1xx411c7mD', second._resolve_cache)
+            backend.close()
+
+    def test_async_parser_reads_shared_backend_off_event_loop(self):
+        import asyncio
+        from ass_player.bilibili import BiliBiliParser
+        from ass_player.bilibili_async import AsyncBiliBiliParser
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'shared.db')
+            deadline = int(time.time()) + 3600
+            final_url = f'https://upos-sz-mirrorcos.bilivideo.com/v.mp4?deadline={deadline}'
+            BiliBiliParser(shared_cache=CacheManager(backend=SQLiteBackend(path)))._store_resolution(
+                'https://www.bilibili.com/video/BV1xx411c7mD', final_url, [{'url': final_url}])
+
+            backend = SQLiteBackend(path)
+            reads = []
+            original = backend._get_raw
+            backend._get_raw = lambda key: reads.append(threading.get_ident()) or original(key)
+            parser = BiliBiliParser(shared_cache=CacheManager(backend=backend))
+            aparser = AsyncBiliBiliParser(parser, client=object())
+
+            async def resolve():
+                loop_thread = threading.get_ident()
+                first = await aparser.get_real_url('BV1xx411c7mD')
+                # 第二次命中本进程缓存，不再读共享后端
+                second = await aparser.get_real_url('BV1xx411c7mD')
+                return loop_thread, first, second
+
+            loop_thread, first, second = asyncio.run(resolve())
+            self.assertEqual((first, second), (final_url, final_url))
+            self.assertEqual(len(reads), 1)
+            self.assertNotEqual(reads[0], loop_thread)
+            backend.close()
+
+
+class TestMemoryBudget(unittest.TestCase):
+    """全局内存预算"""
+
+    def test_evicts_lowest_priority_first_down_to_low_water(self):
+        budget = MemoryBudget(limit_bytes=10_000, low_water=0.8)
+        cheap, valuable = MemoryBackend(), MemoryBackend()
+        cheap.on_grow = budget.register('cheap', cheap.memory_usage, cheap.evict_bytes, priority=10)
+        valuable.on_grow = budget.register('valuable', valuable.memory_usage, valuable.evict_bytes, priority=30)
+        for i in range(10):
+            valuable.set(f'v{i}', 'x' * 300)
+        for i in range(40):
+            cheap.set(f'c{i}', 'x' * 300)
+        usage = budget.usage()
+        self.assertLessEqual(sum(usage.values()), 10_000)
+        self.assertEqual(valuable.size(), 10)
+        self.assertLess(cheap.size(), 40)
+        # 最早写入的条目最先被淘汰
+        self.assertIsNone(cheap.get('c0'))
+        self.assertIsNotNone(cheap.get('c39'))
+        stats = budget.stats()
+        self.assertGreater(stats['caches']['cheap']['evicted_bytes'], 0)
+        self.assertEqual(stats['caches']['valuable']['evicted_bytes'], 0)
+
+    def test_byte_accounting_tracks_deletes(self):
+        backend = MemoryBackend()
+        backend.set('a', 'x' * 1000)
+        backend.set('a', 'x' * 10)
+        backend.set('b', 'y')
+        backend.delete('b')
+        self.assertEqual(backend.memory_usage(), MemoryBackend._entry_bytes('a', backend._data['a'][0]))
+        backend.clear()
+        self.assertEqual(backend.memory_usage(), 0)
+
+    def test_parser_resolve_cache_registers(self):
+        from ass_player.bilibili import BiliBiliParser
+
+        parser = BiliBiliParser()
+        budget = MemoryBudget(limit_bytes=2_000, low_water=0.5)
+        parser.on_cache_grow = budget.register('resolve', parser.memory_usage, parser.evict_bytes)
+        deadline = int(time.time()) + 3600
+        for i in range(10):
+            parser._store_resolution(f'https://www.bilibili.com/video/BV{i:010d}', f'https://x/{i}.mp4?deadline={deadline}',
+                                     [{'url': f'https://x/{i}.mp4', 'host': 'x', 'source': 'primary'}])
+        self.assertLessEqual(parser.memory_usage(), 2_000)
+        self.assertIn('https://www.bilibili.com/video/BV0000000009', parser._resolve_cache)
+        self.assertEqual(parser.memory_usage(), sum(e['_bytes'] for e in parser._resolve_cache.values()))
+
+    def test_season_cache_registers(self):
+        from ass_player.seasons import Episode, Season, SeasonCache
+
+        seasons = SeasonCache()
+        budget = MemoryBudget(limit_bytes=20_000, low_water=0.5)
+        seasons.on_grow = budget.register('seasons', seasons.memory_usage, seasons.evict_bytes)
+        for season_id in range(5):
+            seasons.put(Season(season_id, '合集', [Episode(f'BV{season_id:02d}{i:08d}', i, title='第一集')
+                                                   for i in range(10)]))
+        self.assertLessEqual(seasons.memory_usage(), 20_000)
+        self.assertIsNone(seasons.season_for('BV0000000001'))
+        self.assertIsNotNone(seasons.season_for('BV0400000001'))
+        seasons.evict_bytes(10 ** 9)
+        self.assertEqual((seasons.memory_usage(), len(seasons)), (0, 0))
+        self.assertIsNone(seasons.cid_for('BV0400000001'))
+
+    def test_subtitle_cache_registers(self):
+        from ass_player.subtitles import SubtitleCache
+
+        subtitles = SubtitleCache()
+        budget = MemoryBudget(limit_bytes=30_000, low_water=0.5)
+        subtitles.on_grow = budget.register('subtitles', subtitles.memory_usage, subtitles.evict_bytes)
+        tracks = [{'lan': 'zh-CN', 'lan_doc': '中文', 'url': 'https://i0.hdslb.com/a.json'}]
+        for cid in range(4):
+            subtitles.put_tracks(f'BV{cid:010d}', cid, tracks)
+            subtitles.put_text(cid, 'zh-CN', 'ass', '字幕' * 2000)
+        self.assertLessEqual(subtitles.memory_usage(), 30_000)
+        self.assertIsNone(subtitles.tracks(0))
+        self.assertIsNotNone(subtitles.text(3, 'zh-CN', 'ass'))
+        subtitles.evict_bytes(10 ** 9)
+        self.assertEqual(subtitles.memory_usage(), 0)
+        self.assertIsNone(subtitles.cid_for('BV0000000003'))
+
+    def test_danmaku_cache_registers(self):
+        from ass_player.danmaku import DanmakuCache
+
+        danmaku = DanmakuCache()
+        budget = MemoryBudget(limit_bytes=50_000, low_water=0.5)
+        danmaku.on_grow = budget.register('danmaku', danmaku.memory_usage, danmaku.evict_bytes)
+        for cid in range(10):
+            danmaku.put(cid, '弹幕' * 2000)
+        self.assertLessEqual(danmaku.memory_usage(), 50_000)
+        self.assertIsNone(danmaku.get(0))
+        self.assertIsNotNone(danmaku.get(9))
+        danmaku.evict_bytes(10 ** 9)
+        self.assertEqual(danmaku.memory_usage(), 0)
+
+    def test_app_registers_content_caches(self):
+        from app import create_app, get_parser
+
+        get_parser(create_app('testing'))
+        self.assertTrue({'resolve', 'seasons', 'subtitles', 'danmaku'} <= set(get_memory_budget().usage()))
+
+    def test_get_stats_exposes_per_cache_bytes(self):
+        backend = MemoryBackend()
+        backend.on_grow = get_memory_budget().register('test_stats', backend.memory_usage, backend.evict_bytes)
+        try:
+            cache = CacheManager(backend=backend)
+            cache.set('u', {'v': 1})
+            memory = cache.get_stats()['memory']
+            self.assertEqual(memory['caches']['test_stats']['bytes'], backend.memory_usage())
+            self.assertGreaterEqual(memory['used_bytes'], backend.memory_usage())
+        finally:
+            get_memory_budget().unregister('test_stats')
 
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""CDN 主动探测测试：使用注入延迟的本地桩 HTTP 服务模拟不同速度的 upos 主机"""
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.bilibili import BiliBiliParser
+from ass_player.cdn_probe import CdnProber
+
+
+def _start_stub(delay: float, status: int = 206, body_size: int = 4096):
+    """启动一个本地桩服务：延迟 `delay` 秒后返回指定状态码与固定长度内容，并记录收到的 Range 头。"""
+    ranges = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ranges.append(self.headers.get('Range'))
+            time.sleep(delay)
+            body = b'\0' * body_size
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ranges
+
+
+class TestCdnProber(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+        self.parser = BiliBiliParser()
+        self.parser._recent_video_url = 'https://upos-sz-mirrorcos.bilivideo.com/upgcxcode/xx/video-192.mp4?deadline=1&os=cos'
+
+    def tearDown(self):
+        for s in self.servers:
+            s.shutdown()
+            s.server_close()
+
+    def _host(self, delay, status=206):
+        server, ranges = _start_stub(delay, status)
+        self.servers.append(server)
+        host = f'127.0.0.1:{server.server_address[1]}'
+        self.parser.mark_cdn_hostname(host, True)
+        return host, ranges
+
+    def _prober(self, **kwargs):
+        kwargs.setdefault('scheme', 'http')
+        kwargs.setdefault('host_filter', lambda h: True)
+        return CdnProber(self.parser, **kwargs)
+
+    @patch('ass_player.cdn_probe._is_private_host', return_value=False)
+    def test_probe_once_ranks_hosts_by_latency(self, _mock_private):
+        fast, fast_ranges = self._host(0.01)
+        slow, _ = self._host(0.3)
+        results = self._prober(concurrency=2, max_bytes=1024, timeout=2).probe_once()
+
+        self.assertEqual(set(results), {fast, slow})
+        self.assertLess(results[fast], results[slow])
+        # 结果已写入解析器统计，最快的国内主机成为最优候选
+        self.assertEqual(self.parser._cdn_stats[fast]['count'], 1)
+        self.assertEqual(self.parser._best_china_host, fast)
+        # 遵守字节预算
+        self.assertEqual(fast_ranges, ['bytes=0-1023'])
+
+    @patch('ass_player.cdn_probe._is_private_host', return_value=False)
+    def test_timeout_counts_as_timeout_value(self, _mock_private):
+        host, _ = self._host(1.0)
+        results = self._prober(timeout=0.2).probe_once()
+        self.assertAlmostEqual(results[host], 200.0)
+
+    @patch('ass_player.cdn_probe._is_private_host', return_value=False)
+    def test_client_error_not_recorded(self, _mock_private):
+        host, _ = self._host(0, status=403)
+        results = self._prober().probe_once()
+        self.assertEqual(results, {})
+        self.assertEqual(self.parser._cdn_stats[host]['count'], 0)
+
+    def test_private_hosts_are_skipped(self):
+        host, ranges = self._host(0)
+        results = self._prober().probe_once()
+        self.assertEqual(results, {})
+        self.assertEqual(ranges, [])
+
+    def test_default_filter_only_probes_upos_hosts(self):
+        self.parser.mark_cdn_hostname('cdn.example.cn', True)
+        self.parser.mark_cdn_hostname('upos-sz-estgcos.attacker.example', True)
+        prober = CdnProber(self.parser)
+        with patch.object(prober, 'probe_host', return_value=1.0) as mock_probe:
+            self.parser.mark_cdn_hostname('upos-sz-estgcos.bilivideo.com', True)
+            prober.probe_once()
+        probed = [c.args[0] for c in mock_probe.call_args_list]
+        self.assertEqual(probed, ['upos-sz-estgcos.bilivideo.com'])
+
+    def test_no_recent_url_skips_round(self):
+        self.parser._recent_video_url = None
+        self.assertEqual(self._prober().probe_once(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""B 站 API 熔断器：三态切换、熔断期间快速失败或返回缓存，以及 /api/auto-parse 的 503"""
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import create_app, get_parser, close_storage
+    from ass_player import metrics
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+    from ass_player.ratelimit import AdaptiveTokenBucket
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    CircuitBreaker = None
+
+BV = 'BV1xx411c7mD'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        if CircuitBreaker is None:
+            self.skipTest('circuit breaker not available')
+
+    def test_opens_after_threshold_and_half_open_allows_one_probe(self):
+        breaker = CircuitBreaker('/t', failure_threshold=3, reset_timeout=0.1)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        breaker.before_call()
+        breaker.record_success()
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError) as cm:
+            breaker.before_call()
+        self.assertGreater(cm.exception.retry_after, 0)
+
+        time.sleep(0.12)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        # 没有发出请求的探测归还名额
+        breaker.abandon()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        time.sleep(0.12)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(metrics.CIRCUIT_STATE.labels('/t').get(), 0)
+
+
+class TestParserBreaker(unittest.TestCase):
+    def setUp(self):
+        if CircuitBreaker is None:
+            self.skipTest('circuit breaker not available')
+
+    def _parser(self, api_base):
+        parser = BiliBiliParser(api_base=api_base, rate_limiter=AdaptiveTokenBucket(rate=0))
+        parser.BREAKER_FAILURE_THRESHOLD = 2
+        return parser
+
+    def test_open_breaker_fails_fast_without_calling_upstream(self):
+        with StubBilibiliUpstream(error_rate=1.0, error_status=500) as stub:
+            parser = self._parser(stub.base_url)
+            self.assertIsNone(parser.get_real_url(BV))
+            self.assertIsNone(parser.get_real_url(BV))
+            calls = stub.counts['errors']
+            ctx = ResolveContext()
+            start = time.perf_counter()
+            self.assertIsNone(parser.get_real_url(BV, ctx=ctx))
+            elapsed = time.perf_counter() - start
+            self.assertEqual(stub.counts['errors'], calls)
+        self.assertLess(elapsed, 0.05)
+        self.assertEqual(parser.breakers['/view'].state, OPEN)
+        self.assertGreaterEqual(ctx.retry_after, 1)
+
+    @patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+    def test_open_breaker_serves_nearly_expired_cache(self, _allowed):
+        with StubBilibiliUpstream() as stub:
+            parser = self._parser(stub.base_url)
+            resolved = parser.get_real_url(BV, ctx=ResolveContext())
+        self.assertIsNotNone(resolved)
+        url = parser._normalize_url(BV)
+        # 进入刷新窗口：正常情况下需要重新解析，但签名尚未过期
+        parser._resolve_cache[url]['expires_at'] = time.time() - 1
+        parser.breakers['/view'].record_failure()
+        parser.breakers['/view'].record_failure()
+        ctx = ResolveContext()
+        self.assertEqual(parser.get_real_url(BV, ctx=ctx), resolved)
+        self.assertIsNone(ctx.retry_after)
+        self.assertTrue(ctx.candidates)
+
+
+class TestAutoParseWhileOpen(unittest.TestCase):
+    def setUp(self):
+        if CircuitBreaker is None:
+            self.skipTest('circuit breaker not available')
+
+    def test_returns_503_with_retry_after_and_exports_state(self):
+        with StubBilibiliUpstream(error_rate=1.0, error_status=500) as stub:
+            flask_app = create_app('testing')
+            flask_app.config['BILIBILI_API_BASE'] = stub.base_url
+            parser = get_parser(flask_app)
+            parser.BREAKER_FAILURE_THRESHOLD = 2
+            client = flask_app.test_client()
+            self.assertEqual(client.get(f'/api/auto-parse?url={BV}').status_code, 502)
+            self.assertEqual(client.get(f'/api/auto-parse?url={BV}').status_code, 502)
+            calls = stub.counts['errors']
+            resp = client.get(f'/api/auto-parse?url={BV}')
+            self.assertEqual(stub.counts['errors'], calls)
+            exported = client.get('/metrics').get_data(as_text=True)
+            close_storage(flask_app)
+        self.assertEqual(resp.status_code, 503)
+        self.assertGreaterEqual(int(resp.headers['Retry-After']), 1)
+        self.assertEqual(resp.get_json()['retry_after'], int(resp.headers['Retry-After']))
+        self.assertIn('ass_circuit_state{endpoint="/view"} 1', exported)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""/api/auto-parse 的客户端缓存：按签名 deadline 计算 max-age、ETag 与 304，Flask 与 ASGI 入口一致"""
+import os
+import sys
+import time
+import unittest
+import unittest.mock as mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import SECURITY_HEADERS, _etag_matches, create_app
+except Exception:
+    create_app = None
+
+try:
+    from asgi import AssPlayerAsgi
+    from tests.test_asgi import AsgiTestClient
+except Exception:
+    AssPlayerAsgi = None
+
+PARSE = '/api/auto-parse?url=BV1xx411c7mD'
+
+
+def _signed_url(seconds_left):
+    return f'https://upos-sz-mirrorcos.bilivideo.com/v.mp4?deadline={int(time.time() + seconds_left)}'
+
+
+class TestClientCacheFlask(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.client = create_app('testing').test_client()
+
+    def _get(self, video_url, **kwargs):
+        with mock.patch('ass_player.bilibili.BiliBiliParser.get_real_url', return_value=video_url):
+            return self.client.get(PARSE, **kwargs)
+
+    def test_success_cacheable_until_deadline_minus_margin(self):
+        resp = self._get(_signed_url(7200))
+        self.assertEqual(resp.status_code, 200)
+        directive, max_age = resp.headers['Cache-Control'].split(', max-age=')
+        self.assertEqual(directive, 'private')
+        self.assertAlmostEqual(int(max_age), 7200 - 600, delta=5)
+        self.assertTrue(resp.headers['ETag'].startswith('W/"'))
+
+    def test_if_none_match_returns_304_with_security_headers(self):
+        url = _signed_url(7200)
+        first = self._get(url)
+        again = self._get(url, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+        self.assertEqual(again.headers['ETag'], first.headers['ETag'])
+        self.assertIn('max-age=', again.headers['Cache-Control'])
+        for name, value in SECURITY_HEADERS:
+            self.assertEqual(again.headers[name], value)
+        # timings=1 只改变正文中的 timings 字段，不影响 ETag
+        with mock.patch('ass_player.bilibili.BiliBiliParser.get_real_url', return_value=url):
+            timed = self.client.get(PARSE + '&timings=1', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(timed.status_code, 304)
+
+    def test_changed_result_and_failures_not_reused(self):
+        first = self._get(_signed_url(7200))
+        changed = self._get(_signed_url(3600), headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(self._get(None).headers['Cache-Control'], 'no-store')
+        # 即将过期或没有签名 deadline 的直链也不缓存
+        self.assertEqual(self._get(_signed_url(300)).headers['Cache-Control'], 'no-store')
+        self.assertEqual(self._get('https://test.com/video.mp4').headers['Cache-Control'], 'no-store')
+
+    def test_etag_matching(self):
+        self.assertTrue(_etag_matches('"abc"', 'W/"abc"'))
+        self.assertTrue(_etag_matches('W/"x", W/"abc"', 'W/"abc"'))
+        self.assertTrue(_etag_matches('*', 'W/"abc"'))
+        self.assertFalse(_etag_matches('W/"abd"', 'W/"abc"'))
+        self.assertFalse(_etag_matches(None, 'W/"abc"'))
+
+
+class TestClientCacheAsgi(unittest.TestCase):
+    def setUp(self):
+        if create_app is None or AssPlayerAsgi is None:
+            self.skipTest('ASGI 依赖不可用')
+        self.asgi = AssPlayerAsgi(create_app('testing'), wsgi_threads=2)
+        self.client = AsgiTestClient(self.asgi)
+
+    def tearDown(self):
+        self.client.close()
+        self.asgi.bridge.shutdown()
+
+    def test_if_none_match_returns_304(self):
+        url = _signed_url(7200)
+        with mock.patch('ass_player.bilibili_async.AsyncBiliBiliParser.get_real_url', new=mock.AsyncMock(return_value=url)):
+            first = self.client.get(PARSE)
+            again = self.client.get(PARSE, headers={'If-None-Match': first.headers['etag']})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.headers['cache-control'].startswith('private, max-age='))
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+        self.assertEqual(again.headers['x-frame-options'], 'DENY')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""弹幕转 ASS：流式解析、轨道布局不重叠、ASS 输出格式与按 cid 缓存的 /api/danmaku"""
+import io
+import os
+import re
+import sys
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.danmaku import Danmaku, DanmakuCache, DanmakuLayout, danmaku_to_ass, iter_danmaku
+from tests_bench.bench_danmaku import synthetic_xml
+
+try:
+    from app import close_storage, create_app, get_parser
+    from ass_player.ratelimit import AdaptiveTokenBucket
+except Exception:
+    create_app = None
+
+BV = 'BV1xx411c7mD'
+CID = 279786
+XML = ('<?xml version="1.0" encoding="UTF-8"?><i><chatserver>chat.bilibili.com</chatserver><chatid>279786</chatid>'
+       '<d p="12.5,1,25,16711680,1700000000,0,abc,1">第二条</d>'
+       '<d p="3.0,5,36,16777215,1700000000,0,abc,2">顶部 {大字}</d>'
+       '<d p="1.0,7,25,16777215,1700000000,0,abc,3">[0,0,"1-1",4.5,"高级弹幕"]</d>'
+       '<d p="2.0,1,25,16777215,1700000000,0,abc,4">   </d>'
+       '<d p="oops,1,25,16777215">坏数据</d>'
+       '<d p="0.5,4,18,65280,1700000000,0,abc,5">底部</d>'
+       '</i>').encode('utf-8')
+
+_DIALOGUE = re.compile(r'Dialogue: 2,(\d+):(\d\d):(\d\d)\.(\d\d),(\d+):(\d\d):(\d\d)\.(\d\d),(\w+),,0,0,0,,\{([^}]*)\}')
+
+
+def _seconds(h, m, s, cs):
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(cs) / 100
+
+
+def _events(ass):
+    for match in _DIALOGUE.finditer(ass):
+        g = match.groups()
+        yield _seconds(*g[0:4]), _seconds(*g[4:8]), g[8], g[9]
+
+
+class TestParse(unittest.TestCase):
+    def test_iterparse_skips_invalid_and_unsupported(self):
+        items = list(iter_danmaku(io.BytesIO(XML)))
+        self.assertEqual(items, [
+            Danmaku(12.5, 1, 25, 0xFF0000, '第二条'),
+            Danmaku(3.0, 5, 36, 0xFFFFFF, '顶部 {大字}'),
+            Danmaku(0.5, 4, 18, 0x00FF00, '底部'),
+        ])
+
+
+class TestLayout(unittest.TestCase):
+    def test_ass_output(self):
+        ass = danmaku_to_ass(iter_danmaku(io.BytesIO(XML)), title='测试')
+        self.assertIn('Title: 测试\nScriptType: v4.00+\n', ass)
+        self.assertIn('PlayResX: 1920\nPlayResY: 1080\n', ass)
+        dialogues = [line for line in ass.splitlines() if line.startswith('Dialogue:')]
+        # 按出现时间排序；颜色为单独的 BGR 标签块，花括号转为全角
+        self.assertEqual(dialogues, [
+            r'Dialogue: 2,0:00:00.50,0:00:04.50,DanmakuBottom,,0,0,0,,{\pos(960,1080)\fs36}{\c&H00FF00&}底部',
+            r'Dialogue: 2,0:00:03.00,0:00:07.00,DanmakuTop,,0,0,0,,{\pos(960,0)\fs72}顶部 ｛大字｝',
+            r'Dialogue: 2,0:00:12.50,0:00:20.50,DanmakuScroll,,0,0,0,,{\move(1920,0,-150,0)}{\c&H0000FF&}第二条',
+        ])
+
+    def test_full_screen_drops_instead_of_overlapping(self):
+        layout = DanmakuLayout(height=500, font_size=50)
+        items = [Danmaku(1.0, 5, 25, 0xFFFFFF, f'顶部{i}') for i in range(15)]
+        ass = danmaku_to_ass(items, layout=layout)
+        self.assertEqual(layout.stats, {'scroll': 0, 'top': 10, 'bottom': 0, 'dropped': 5})
+        # 显示结束后轨道释放
+        self.assertIsNotNone(layout.place(Danmaku(5.0, 5, 25, 0xFFFFFF, '之后')))
+        self.assertEqual(ass.count('DanmakuTop,,'), 10)
+
+    def test_no_overlap_in_dense_synthetic_stream(self):
+        layout = DanmakuLayout()
+        ass = danmaku_to_ass(iter_danmaku(io.BytesIO(synthetic_xml(4000, duration=120.0, seed=7))), layout=layout)
+        self.assertGreater(layout.stats['dropped'], 0)
+        by_track = {}
+        for start, end, style, tags in _events(ass):
+            if style == 'DanmakuScroll':
+                x1, y, x2, _ = map(int, re.match(r'\\move\((-?\d+),(\d+),(-?\d+),(\d+)\)', tags).groups())
+                by_track.setdefault(('scroll', y), []).append((start, end, -x2))
+            else:
+                by_track.setdefault((style, tags.split('\\fs')[0]), []).append((start, end, 0))
+        self.assertGreater(len(by_track), 20)
+        eps = 0.02
+        for (kind, _), events in by_track.items():
+            for (s1, e1, w1), (s2, e2, w2) in zip(events, events[1:]):
+                if kind != 'scroll':
+                    self.assertLessEqual(e1, s2 + eps)
+                    continue
+                # 前一条完全进入屏幕后才出现，且在追上之前已离开屏幕
+                v1, v2 = (1920 + w1) / (e1 - s1), (1920 + w2) / (e2 - s2)
+                self.assertGreaterEqual(s2 + eps, s1 + w1 / v1)
+                self.assertLessEqual(e1, s2 + 1920 / v2 + eps)
+
+
+class TestDanmakuCache(unittest.TestCase):
+    def test_evicts_by_total_size(self):
+        cache = DanmakuCache(max_chars=10)
+        cache.put(1, 'aaaa')
+        cache.put(2, 'bbbb')
+        cache.get(1)
+        cache.put(3, 'cccc')
+        self.assertEqual((cache.get(1), cache.get(2), cache.get(3)), ('aaaa', None, 'cccc'))
+        cache.put(4, 'x' * 11)
+        self.assertIsNone(cache.get(4))
+
+
+@patch('ass_player.bilibili.socket.getaddrinfo', return_value=[(None, None, None, None, ('93.184.216.34', 0))])
+class TestDanmakuRoute(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        self.app.config['BILIBILI_API_BASE'] = 'https://api.bilibili.com'
+        get_parser(self.app).rate_limiter = AdaptiveTokenBucket(rate=0)
+        self.client = self.app.test_client()
+        self.addCleanup(close_storage, self.app)
+
+    def test_converted_once_per_cid(self, _dns):
+        with requests_mock.Mocker() as m:
+            view = m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {
+                'bvid': BV, 'cid': CID, 'pages': [{'cid': CID}, {'cid': CID + 1}]}})
+            dm = m.get('https://api.bilibili.com/x/v1/dm/list.so', content=XML)
+            first = self.client.get(f'/api/danmaku/{BV}.ass')
+            again = self.client.get(f'/api/danmaku/{BV}/{CID}.ass')
+            second_page = self.client.get(f'/api/danmaku/{BV}/{CID + 1}.ass')
+            invalid = self.client.get('/api/danmaku/BV123.ass')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content_type, 'text/x-ssa; charset=utf-8')
+        self.assertIn('第二条', first.get_data(as_text=True))
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(second_page.status_code, 200)
+        self.assertEqual(invalid.status_code, 400)
+        # 第一次按 bvid 查 cid，第二 P 的 cid 再用 view 确认归属
+        self.assertEqual(view.call_count, 2)
+        self.assertEqual([r.qs['oid'] for r in dm.request_history], [[str(CID)], [str(CID + 1)]])
+
+    def test_validates_cid(self, _dns):
+        other_bv = 'BV1ab411c7XY'
+        with requests_mock.Mocker() as m:
+            m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'bvid': BV, 'cid': CID}})
+            dm = m.get('https://api.bilibili.com/x/v1/dm/list.so', content=XML)
+            foreign = self.client.get(f'/api/danmaku/{BV}/1001.ass')
+            self.assertEqual(dm.call_count, 0)
+            own = self.client.get(f'/api/danmaku/{BV}/{CID}.ass')
+            # 已缓存的 cid 换一个 bvid 请求：不返回带原 bvid 标题的缓存，也不覆盖缓存
+            mismatched = self.client.get(f'/api/danmaku/{other_bv}/{CID}.ass')
+        self.assertEqual(foreign.status_code, 404)
+        self.assertEqual(own.status_code, 200)
+        self.assertIn(f'Title: {BV} 弹幕', own.get_data(as_text=True))
+        self.assertEqual(mismatched.status_code, 404)
+        self.assertEqual(dm.call_count, 1)
+        self.assertEqual(get_parser(self.app).danmaku.bvid_for(CID), BV)
+
+    def test_download_uses_interactive_slot(self, _dns):
+        from ass_player.scheduler import INTERACTIVE
+        parser = get_parser(self.app)
+        with requests_mock.Mocker() as m, patch.object(parser.scheduler, 'slot', wraps=parser.scheduler.slot) as slot:
+            m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'bvid': BV, 'cid': CID}})
+            m.get('https://api.bilibili.com/x/v1/dm/list.so', content=XML)
+            resp = self.client.get(f'/api/danmaku/{BV}.ass')
+        self.assertEqual(resp.status_code, 200)
+        # 查 cid 与下载弹幕各占用一次交互优先级的槽位
+        self.assertEqual([c.args[0] for c in slot.call_args_list], [INTERACTIVE, INTERACTIVE])
+
+    def test_upstream_failure(self, _dns):
+        with requests_mock.Mocker() as m:
+            m.get('https://api.bilibili.com/x/v1/dm/list.so', status_code=500)
+            resp = self.client.get(f'/api/danmaku/{BV}/{CID}.ass')
+        self.assertEqual(resp.status_code, 502)
+
+
+if __name__ == '__main__':
+    unittest.main()
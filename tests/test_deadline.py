@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""解析截止时间与自适应超时：预算内放弃慢上游、预算不足时停止重试、/api/auto-parse 的 504"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import _resolve_budget, close_storage, create_app, get_parser
+    from ass_player import metrics
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.circuit import CLOSED
+    from ass_player.deadline import AdaptiveTimeout, Deadline
+    from ass_player.ratelimit import AdaptiveTokenBucket
+    from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream
+except Exception:
+    Deadline = None
+
+BV = 'BV1xx411c7mD'
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+    def setUp(self):
+        if Deadline is None:
+            self.skipTest('deadline not available')
+
+    def test_uses_ceiling_until_enough_samples_then_tracks_tail_latency(self):
+        adaptive = AdaptiveTimeout(10.0, floor=0.01, multiplier=2.0, min_samples=20, refresh_every=10)
+        for _ in range(10):
+            adaptive.observe(0.05)
+        self.assertEqual(adaptive.current(), 10.0)
+        for _ in range(10):
+            adaptive.observe(0.05)
+        self.assertAlmostEqual(adaptive.current(), 0.1)
+        # 分位数取尾部耗时，而不是平均值
+        for _ in range(10):
+            adaptive.observe(0.4)
+        self.assertAlmostEqual(adaptive.current(), 0.8)
+
+    def test_clamped_to_floor_and_ceiling(self):
+        adaptive = AdaptiveTimeout(1.0, floor=0.5, min_samples=1, refresh_every=1)
+        adaptive.observe(0.001)
+        self.assertEqual(adaptive.current(), 0.5)
+        adaptive = AdaptiveTimeout(1.0, floor=0.5, min_samples=1, refresh_every=1)
+        adaptive.observe(3.0)
+        self.assertEqual(adaptive.current(), 1.0)
+
+    def test_timeouts_raise_learned_timeout(self):
+        adaptive = AdaptiveTimeout(10.0, floor=1.0, min_samples=20, refresh_every=16)
+        for _ in range(32):
+            adaptive.observe(0.1)
+        self.assertEqual(adaptive.current(), 1.0)
+        # 上游变慢到 1.2 秒：超时的尝试没有耗时样本，但会提高超时，之后的样本重新计算时也不会退回 1 秒
+        adaptive.observe_timeout(1.0)
+        self.assertEqual(adaptive.current(), 2.0)
+        for _ in range(3):
+            adaptive.observe_timeout(2.0)
+        self.assertEqual(adaptive.current(), 10.0)
+        for _ in range(16):
+            adaptive.observe(1.2)
+        self.assertGreater(adaptive.current(), 1.2)
+
+    def test_client_hint_only_shortens_configured_budget(self):
+        self.assertEqual(_resolve_budget(15, None), 15)
+        self.assertEqual(_resolve_budget(15, '2000'), 2.0)
+        self.assertEqual(_resolve_budget(15, '60000'), 15)
+        self.assertEqual(_resolve_budget(15, 'soon'), 15)
+        self.assertIsNone(_resolve_budget(0, None))
+        self.assertEqual(_resolve_budget(0, '500'), 0.5)
+
+
+class TestParserDeadline(unittest.TestCase):
+    def setUp(self):
+        if Deadline is None:
+            self.skipTest('deadline not available')
+
+    def _parser(self, api_base):
+        return BiliBiliParser(api_base=api_base, rate_limiter=AdaptiveTokenBucket(rate=0))
+
+    def test_slow_upstream_abandoned_within_budget(self):
+        before = metrics.DEADLINE_EXCEEDED.labels('/view').get()
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 2000)) as stub:
+            parser = self._parser(stub.base_url)
+            ctx = ResolveContext(deadline=Deadline(0.3))
+            start = time.perf_counter()
+            self.assertIsNone(parser.get_real_url(BV, ctx=ctx))
+            elapsed = time.perf_counter() - start
+            stub.release.set()
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(metrics.DEADLINE_EXCEEDED.labels('/view').get() - before, 1)
+        # 因预算截断的超时不是上游故障，不计入熔断
+        self.assertEqual(parser.breakers['/view'].state, CLOSED)
+        self.assertEqual(parser.breakers['/view'].stats()['failures'], 0)
+
+    def test_retries_stop_when_budget_exhausted(self):
+        with StubBilibiliUpstream(error_rate=1.0, error_status=503) as stub:
+            parser = self._parser(stub.base_url)
+            ctx = ResolveContext(deadline=Deadline(1.0))
+            start = time.perf_counter()
+            self.assertIsNone(parser.get_real_url(BV, ctx=ctx))
+            elapsed = time.perf_counter() - start
+            calls = stub.counts['errors']
+        # 不限预算时 3 次重试的退避共 3.5 秒；1 秒预算只够退避一次
+        self.assertLess(elapsed, 1.2)
+        self.assertEqual(calls, 2)
+
+    def test_observed_latency_feeds_adaptive_timeout(self):
+        with StubBilibiliUpstream() as stub:
+            parser = self._parser(stub.base_url)
+            for i in range(24):
+                self.assertIsNotNone(parser.get_real_url(f'BV1{i:02d}x411c7m'))
+        self.assertEqual(parser.adaptive_timeouts['/view'].current(), parser.ADAPTIVE_TIMEOUT_FLOOR)
+
+    def test_upstream_slower_than_learned_timeout_recovers(self):
+        parser = self._parser(None)
+        with StubBilibiliUpstream() as stub:
+            parser.api_base = stub.base_url
+            for i in range(24):
+                self.assertIsNotNone(parser.get_real_url(f'BV1{i:02d}x411c7m'))
+        self.assertEqual(parser.adaptive_timeouts['/view'].current(), parser.ADAPTIVE_TIMEOUT_FLOOR)
+        # 上游稳定变慢到超过学到的超时（1 秒下限）：第一次尝试超时后提高超时，重试等到了响应
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 1200)) as stub:
+            parser.api_base = stub.base_url
+            self.assertIsNotNone(parser.get_real_url('BV1zz411c7mD'))
+        self.assertGreater(parser.adaptive_timeouts['/view'].current(), 1.2)
+        self.assertEqual(parser.breakers['/view'].state, CLOSED)
+
+
+class TestAutoParseDeadline(unittest.TestCase):
+    def setUp(self):
+        if Deadline is None:
+            self.skipTest('deadline not available')
+
+    def test_client_timeout_hint_returns_504(self):
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 2000)) as stub:
+            flask_app = create_app('testing')
+            flask_app.config['BILIBILI_API_BASE'] = stub.base_url
+            get_parser(flask_app).rate_limiter = AdaptiveTokenBucket(rate=0)
+            start = time.perf_counter()
+            resp = flask_app.test_client().get(f'/api/auto-parse?url={BV}', headers={'X-Timeout-Ms': '300'})
+            elapsed = time.perf_counter() - start
+            stub.release.set()
+            close_storage(flask_app)
+        self.assertEqual(resp.status_code, 504)
+        self.assertFalse(resp.get_json()['success'])
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""热点 key 统计：Count-Min Sketch 固定内存、top-K、老化、热点预热与 /admin/hotkeys"""
+import os
+import sys
+import time
+import unittest
+import unittest.mock as mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.hotkeys import CountMinSketch, HotKeys, HotKeyWarmer
+
+try:
+    from app import create_app
+except Exception:
+    create_app = None
+
+KEY = 'https://www.bilibili.com/video/BV1xx411c7mD'
+
+
+def _video(i):
+    return f'https://www.bilibili.com/video/BV1{i:09d}x'
+
+
+def _signed_url(seconds_left):
+    return f'https://upos-sz-mirrorcos.bilivideo.com/v.mp4?deadline={int(time.time() + seconds_left)}'
+
+
+class FakeParser:
+    """按 key 返回预设结果的解析器替身。"""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def get_real_url(self, url, ctx=None, use_cache=True, lane='interactive'):
+        self.calls.append((url, use_cache, lane))
+        return self.result
+
+
+class TestHotKeys(unittest.TestCase):
+    def test_memory_fixed_and_estimates_never_undercount(self):
+        sketch = CountMinSketch(width=256, depth=4)
+        size = sketch.memory_usage()
+        for i in range(5000):
+            sketch.add(_video(i))
+        sketch.add(KEY, 7)
+        self.assertEqual(sketch.memory_usage(), size)
+        self.assertGreaterEqual(sketch.estimate(KEY), 7)
+
+    def test_heavy_hitters_survive_long_tail(self):
+        hotkeys = HotKeys(top_k=8, width=1024, depth=4, decay_every=0)
+        hot = [_video(900000 + i) for i in range(5)]
+        for i in range(20000):
+            hotkeys.record(_video(i))
+            if i % 50 == 0:
+                for key in hot:
+                    hotkeys.record(key)
+        top = hotkeys.top()
+        self.assertEqual(len(top), 8)
+        self.assertEqual({key for key, _ in top[:5]}, set(hot))
+        self.assertGreaterEqual(top[0][1], 400)
+        self.assertEqual(hotkeys.record('x' * 1000), 0)
+
+    def test_decay_halves_counts(self):
+        hotkeys = HotKeys(top_k=4, decay_every=10)
+        for _ in range(9):
+            hotkeys.record(KEY)
+        self.assertEqual(hotkeys.top(), [(KEY, 9)])
+        hotkeys.record(KEY)
+        self.assertEqual(hotkeys.top(), [(KEY, 5)])
+        self.assertEqual(hotkeys.sketch.estimate(KEY), 5)
+
+
+class TestHotKeyWarmer(unittest.TestCase):
+    def test_warms_top_keys_and_refreshes_before_deadline(self):
+        hotkeys = HotKeys(top_k=4)
+        for _ in range(3):
+            hotkeys.record(KEY)
+        hotkeys.record(_video(1))
+        parser = FakeParser(_signed_url(3600))
+        warmer = HotKeyWarmer(parser, hotkeys, min_count=2, refresh_margin=300)
+
+        self.assertEqual(warmer.run_once(), 1)
+        # 首次预热允许命中缓存，均走后台通道；只出现一次的 key 不预热
+        self.assertEqual(parser.calls, [(KEY, True, 'background')])
+        self.assertAlmostEqual(warmer.status()[KEY]['refresh_in'], 3300, delta=5)
+        self.assertEqual(warmer.run_once(), 0)
+        # 到达 deadline - refresh_margin 后强制重新解析
+        self.assertEqual(warmer.run_once(now=time.time() + 3400), 1)
+        self.assertEqual(parser.calls[-1], (KEY, False, 'background'))
+
+    def test_failures_back_off_and_evicted_keys_dropped(self):
+        hotkeys = HotKeys(top_k=1)
+        hotkeys.record(KEY)
+        warmer = HotKeyWarmer(FakeParser(None), hotkeys, min_count=1, retry_interval=10)
+        warmer.run_once()
+        warmer.run_once(now=time.time() + 11)
+        status = warmer.status()[KEY]
+        self.assertEqual((status['state'], status['failures']), ('error', 2))
+        self.assertAlmostEqual(status['refresh_in'], 20, delta=2)
+        for _ in range(3):
+            hotkeys.record(_video(1))
+        warmer.run_once()
+        self.assertNotIn(KEY, warmer.status())
+
+
+class TestAdminHotkeys(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        self.app.config['ADMIN_TOKEN'] = 's3cret'
+        self.client = self.app.test_client()
+
+    def test_auto_parse_requests_show_up_in_top_k(self):
+        with mock.patch('ass_player.bilibili.BiliBiliParser.get_real_url', return_value=_signed_url(3600)):
+            for _ in range(3):
+                self.client.get('/api/auto-parse?url=BV1xx411c7mD')
+            self.client.get('/api/auto-parse?url=BV1yy411c7mD')
+        body = self.client.get('/admin/hotkeys', headers={'Authorization': 'Bearer s3cret'}).get_json()
+        self.assertTrue(body['enabled'])
+        self.assertEqual(body['top'][0], {'key': KEY, 'count': 3, 'warm': None})
+        self.assertEqual(len(body['top']), 2)
+        self.assertEqual(body['total'], 4)
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/admin/hotkeys').status_code, 403)
+        self.assertEqual(self.client.get('/admin/hotkeys', headers={'Authorization': 'Bearer nope'}).status_code, 403)
+        resp = self.client.get('/admin/hotkeys', headers={'Authorization': 'Bearer s3cret'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.8'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_localhost_fallback_is_opt_in(self):
+        # 反向代理之后所有请求都来自本机：未配置令牌时默认拒绝，显式开启后才允许本机访问
+        self.app.config['ADMIN_TOKEN'] = ''
+        self.assertEqual(self.client.get('/admin/hotkeys').status_code, 403)
+        self.app.config['ADMIN_ALLOW_LOCAL'] = True
+        self.assertEqual(self.client.get('/admin/hotkeys').status_code, 200)
+        self.assertEqual(self.client.get('/admin/hotkeys', environ_base={'REMOTE_ADDR': '10.0.0.8'}).status_code, 403)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""指标注册表与 /metrics 路由测试"""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player import metrics
+from ass_player.bilibili import BiliBiliParser
+
+try:
+    from app import app
+except Exception:
+    app = None
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_and_label_escaping(self):
+        c = self.registry.counter('t_total', '测试计数', ('path',))
+        c.labels('/a"b').inc()
+        c.labels('/a"b').inc(2)
+        text = self.registry.render()
+        self.assertIn('# TYPE t_total counter', text)
+        self.assertIn('t_total{path="/a\\"b"} 3', text)
+
+    def test_histogram_cumulative_buckets(self):
+        h = self.registry.histogram('t_seconds', '测试耗时', ('ep',), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 5.0):
+            h.labels('/view').observe(v)
+        text = self.registry.render()
+        self.assertIn('t_seconds_bucket{ep="/view",le="0.1"} 1', text)
+        self.assertIn('t_seconds_bucket{ep="/view",le="1"} 3', text)
+        self.assertIn('t_seconds_bucket{ep="/view",le="+Inf"} 4', text)
+        self.assertIn('t_seconds_count{ep="/view"} 4', text)
+        self.assertIn('t_seconds_sum{ep="/view"} 6.05', text)
+
+    def test_same_name_returns_same_metric(self):
+        a = self.registry.counter('dup_total', 'x')
+        self.assertIs(a, self.registry.counter('dup_total', 'x'))
+        with self.assertRaises(ValueError):
+            self.registry.gauge('dup_total', 'x')
+
+    def test_wrong_label_count_rejected(self):
+        c = self.registry.counter('lbl_total', 'x', ('a', 'b'))
+        with self.assertRaises(ValueError):
+            c.labels('only-one')
+
+    def test_cache_hit_ratio(self):
+        metrics.record_cache_lookup('unit-test', True)
+        metrics.record_cache_lookup('unit-test', False)
+        metrics.record_cache_lookup('unit-test', True)
+        ratio = metrics.CACHE_HIT_RATIO.labels('unit-test').get()
+        self.assertAlmostEqual(ratio, 2 / 3)
+
+
+class TestParserMetrics(unittest.TestCase):
+    def test_upstream_histograms_per_endpoint(self):
+        view = metrics.UPSTREAM_LATENCY.labels('/view')
+        playurl = metrics.UPSTREAM_LATENCY.labels('/playurl')
+        before = (view.snapshot()[2], playurl.snapshot()[2])
+        parser = BiliBiliParser()
+        with requests_mock.Mocker() as m, patch('ass_player.bilibili.socket.getaddrinfo',
+                                                return_value=[(None, None, None, None, ('8.8.8.8', 0))]):
+            m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'cid': 1}})
+            m.get('https://api.bilibili.com/x/player/playurl', json={'code': 0, 'data': {'durl': [{'url': 'https://upos-sz-estgcos.bilivideo.com/v.mp4'}]}})
+            self.assertIsNotNone(parser.get_real_url('BV1xx411c7mD'))
+        self.assertEqual(view.snapshot()[2], before[0] + 1)
+        self.assertEqual(playurl.snapshot()[2], before[1] + 1)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        if app is None:
+            self.skipTest('app not available')
+        self.client = app.test_client()
+
+    def test_metrics_exposes_route_and_report_counters(self):
+        self.client.get('/instructions')
+        self.client.post('/api/report-cdn', json={})
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith('text/plain'))
+        text = resp.get_data(as_text=True)
+        self.assertIn('ass_http_requests_total{route="/instructions",method="GET",status="200"}', text)
+        self.assertIn('ass_http_request_duration_seconds_bucket{route="/instructions",le="+Inf"}', text)
+        self.assertIn('ass_cdn_reports_total{outcome="rejected"}', text)
+        # 安全响应头不受影响
+        self.assertEqual(resp.headers.get('X-Frame-Options'), 'DENY')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""playurl 候选直链（primary / backup_url / CDN 替换）排序与 SSRF 检查测试"""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.bilibili import BiliBiliParser, ResolveContext
+
+try:
+    from app import app
+except Exception:
+    app = None
+
+BV = 'BV1xx411c7mD'
+PRIMARY = 'https://upos-hz-mirrorakam.akamaized.net/upgcxcode/v-192.mp4?deadline=1'
+BACKUP_1 = 'https://upos-sz-mirrorcos.bilivideo.com/upgcxcode/v-192.mp4?deadline=1'
+BACKUP_2 = 'https://cn-gdfs-ct-01-01.bilivideo.com/upgcxcode/v-192.mp4?deadline=1'
+
+
+def _public_dns(host, *args, **kwargs):
+    """把所有主机解析为公网地址，仅 evil.example 解析为内网地址。"""
+    ip = '10.0.0.8' if host == 'evil.example' else '93.184.216.34'
+    return [(None, None, None, None, (ip, 0))]
+
+
+class TestPlayurlCandidates(unittest.TestCase):
+    def setUp(self):
+        self.parser = BiliBiliParser()
+
+    def _mock_api(self, m, backups):
+        m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'cid': 123}})
+        m.get('https://api.bilibili.com/x/player/playurl', json={
+            'code': 0,
+            'data': {'durl': [{'url': PRIMARY, 'backup_url': backups}]},
+        })
+
+    @patch('ass_player.bilibili.socket.getaddrinfo', side_effect=_public_dns)
+    def test_candidates_include_rewrite_primary_and_backups(self, _dns):
+        ctx = ResolveContext()
+        with requests_mock.Mocker() as m:
+            self._mock_api(m, [BACKUP_1, BACKUP_2])
+            result = self.parser.get_real_url(BV, ctx=ctx)
+
+        urls = [c['url'] for c in ctx.candidates]
+        # 无统计数据时保持默认顺序：CDN 替换后的直链（即返回值）排第一
+        self.assertEqual(urls[0], result)
+        self.assertIn('upos-sz-estgcos.bilivideo.com', result)
+        self.assertEqual(urls[1:], [PRIMARY, BACKUP_1, BACKUP_2])
+        self.assertEqual([c['source'] for c in ctx.candidates], ['cdn_rewrite', 'primary', 'backup', 'backup'])
+
+    @patch('ass_player.bilibili.socket.getaddrinfo', side_effect=_public_dns)
+    def test_candidates_ranked_by_cdn_stats(self, _dns):
+        self.parser.mark_cdn_hostname('cn-gdfs-ct-01-01.bilivideo.com', True)
+        self.parser.record_cdn_load('cn-gdfs-ct-01-01.bilivideo.com', 100.0)
+        self.parser.mark_cdn_hostname('upos-sz-mirrorcos.bilivideo.com', True)
+        self.parser.record_cdn_load('upos-sz-mirrorcos.bilivideo.com', 900.0)
+        ctx = ResolveContext()
+        with requests_mock.Mocker() as m:
+            self._mock_api(m, [BACKUP_1, BACKUP_2])
+            self.parser.get_real_url(BV, ctx=ctx)
+
+        hosts = [c['host'] for c in ctx.candidates]
+        self.assertEqual(hosts[:2], ['cn-gdfs-ct-01-01.bilivideo.com', 'upos-sz-mirrorcos.bilivideo.com'])
+
+    @patch('ass_player.bilibili.socket.getaddrinfo', side_effect=_public_dns)
+    def test_private_backup_is_dropped(self, _dns):
+        ctx = ResolveContext()
+        with requests_mock.Mocker() as m:
+            self._mock_api(m, ['https://evil.example/internal', BACKUP_1])
+            self.parser.get_real_url(BV, ctx=ctx)
+        hosts = [c['host'] for c in ctx.candidates]
+        self.assertNotIn('evil.example', hosts)
+        self.assertIn('upos-sz-mirrorcos.bilivideo.com', hosts)
+
+    def test_get_real_url_without_ctx_unchanged(self):
+        with patch.object(BiliBiliParser, '_get_720p_mp4', return_value='https://example.com/video.mp4') as mock_get:
+            self.assertEqual(self.parser.get_real_url(BV), 'https://example.com/video.mp4')
+        mock_get.assert_called_once_with(f'https://www.bilibili.com/video/{BV}')
+
+
+class TestAutoParseCandidates(unittest.TestCase):
+    def setUp(self):
+        if app is None:
+            self.skipTest('app not available')
+        self.client = app.test_client()
+
+    def test_auto_parse_returns_fallback_candidate(self):
+        with patch('ass_player.bilibili.BiliBiliParser.get_real_url', return_value='https://test.com/video.mp4'):
+            resp = self.client.get(f'/api/auto-parse?url={BV}')
+        data = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(data['candidates'], [{'url': 'https://test.com/video.mp4', 'host': 'test.com', 'source': 'primary'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""B 站 API 共用令牌桶：AIMD 调速、排队时间记录，以及对限流桩上游的自适应"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from ass_player import metrics
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.ratelimit import AdaptiveTokenBucket, UpstreamRateLimited, get_upstream_bucket
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    BiliBiliParser = None
+
+
+class TestAdaptiveTokenBucket(unittest.TestCase):
+    def setUp(self):
+        if BiliBiliParser is None:
+            self.skipTest('parser not available')
+
+    def test_burst_then_requests_queue_in_order(self):
+        bucket = AdaptiveTokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        first = bucket.reserve()
+        second = bucket.reserve()
+        self.assertAlmostEqual(first, 0.1, delta=0.02)
+        self.assertAlmostEqual(second, 0.2, delta=0.02)
+
+    def test_throttle_halves_rate_once_per_cooldown_and_recovers_additively(self):
+        bucket = AdaptiveTokenBucket(rate=20, min_rate=2, cooldown=60)
+        bucket.on_throttled()
+        bucket.on_throttled()
+        self.assertEqual(bucket.rate, 10)
+        self.assertEqual(bucket.throttled, 2)
+        for _ in range(10):
+            bucket.on_success()
+        # 约一秒的成功请求（按当前速率折算）恢复约 1 请求/秒
+        self.assertAlmostEqual(bucket.rate, 11, delta=0.1)
+        for _ in range(1000):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 20)
+
+        bucket.cooldown = 0
+        for _ in range(10):
+            bucket.on_throttled()
+        self.assertEqual(bucket.rate, 2)
+
+    def test_wait_beyond_limit_rejected_and_zero_rate_disables(self):
+        bucket = AdaptiveTokenBucket(rate=1, burst=1, max_wait=0.5)
+        bucket.reserve()
+        with self.assertRaises(UpstreamRateLimited):
+            bucket.reserve()
+        unlimited = AdaptiveTokenBucket(rate=0)
+        self.assertTrue(all(unlimited.reserve() == 0.0 for _ in range(1000)))
+
+    def test_parsers_share_process_bucket_and_session_skips_429_retry(self):
+        self.assertIs(BiliBiliParser().rate_limiter, get_upstream_bucket())
+        self.assertIs(BiliBiliParser().rate_limiter, get_upstream_bucket())
+        retries = BiliBiliParser().session.get_adapter('https://api.bilibili.com').max_retries
+        self.assertNotIn(429, retries.status_forcelist)
+
+
+class TestThrottledUpstream(unittest.TestCase):
+    """桩上游每秒超过阈值即返回 429：令牌桶应降速，多数解析仍能成功"""
+
+    def setUp(self):
+        if BiliBiliParser is None:
+            self.skipTest('parser not available')
+
+    def _resolve_all(self, parser, ids, threads=6):
+        results = {}
+        lock = threading.Lock()
+        pending = iter(ids)
+
+        def worker():
+            while True:
+                with lock:
+                    i = next(pending, None)
+                if i is None:
+                    return
+                ctx = ResolveContext(timings=True)
+                url = parser.get_real_url(f'BV1{i:02d}x411c7m', ctx=ctx)
+                with lock:
+                    results[i] = (url, ctx.timings.as_dict())
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join(60)
+        return results
+
+    def _burst(self, bucket):
+        with StubBilibiliUpstream(throttle_rps=8, throttle_status=429) as stub:
+            parser = BiliBiliParser(api_base=stub.base_url, rate_limiter=bucket)
+            burst = self._resolve_all(parser, range(16))
+            throttled = stub.counts['throttled']
+            # 速率已降到上游阈值附近：后续请求基本不再被限流
+            steady = self._resolve_all(parser, range(50, 58))
+            steady_throttled = stub.counts['throttled'] - throttled
+        return burst, steady, throttled, steady_throttled
+
+    def test_bucket_adapts_to_429(self):
+        waits_before = metrics.UPSTREAM_QUEUE_WAIT.labels('/view').snapshot()[2]
+        bucket = AdaptiveTokenBucket(rate=40, burst=4, min_rate=2, cooldown=0.5)
+        burst, steady, throttled, steady_throttled = self._burst(bucket)
+        baseline, _, _, _ = self._burst(AdaptiveTokenBucket(rate=0))
+
+        self.assertGreater(throttled, 0)
+        self.assertLess(bucket.rate, 40)
+        succeeded = sum(1 for url, _ in burst.values() if url)
+        self.assertGreater(succeeded, sum(1 for url, _ in baseline.values() if url))
+        self.assertEqual(sum(1 for url, _ in steady.values() if url), 8)
+        self.assertLessEqual(steady_throttled, 2)
+        # 每个请求的排队时间都记入指标，排过队的解析在 Server-Timing 中带有 queue 阶段
+        self.assertGreaterEqual(metrics.UPSTREAM_QUEUE_WAIT.labels('/view').snapshot()[2] - waits_before, 24)
+        self.assertTrue(any('queue' in timings for _, timings in burst.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,7 @@ from unittest.mock import patch
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from app import app
+    from app import app, create_app, get_parser
 except Exception:
     app = None
 
@@ -24,16 +24,36 @@ class TestReportCdn(unittest.TestCase):
         resp = self.client.post('/api/report-cdn', json={})
         self.assertEqual(resp.status_code, 400)
 
-    @patch('app.app')
-    def test_valid_report(self, mock_app):
+    def test_valid_report(self):
         # mock parser methods
         mock_parser = type('P', (), {'mark_cdn_hostname': lambda *a, **k: None, 'record_cdn_load': lambda *a, **k: None})()
-        mock_app._parser = mock_parser
-        resp = self.client.post('/api/report-cdn', json={'hostname': 'example.com', 'load_ms': 123})
+        with patch.object(app, '_parser', mock_parser):
+            resp = self.client.post('/api/report-cdn', json={'hostname': 'upos-sz-mirrorcos.bilivideo.com', 'load_ms': 123})
         self.assertEqual(resp.status_code, 200)
         data = resp.get_json()
         self.assertTrue(data.get('success'))
 
+    def test_report_goes_to_factory_app_parser(self):
+        # create_app() 创建的应用应把上报计入自己的解析器，而不是模块级 app 的解析器
+        factory_app = create_app('testing')
+        module_parser = getattr(app, '_parser', None)
+        resp = factory_app.test_client().post('/api/report-cdn', json={
+            'hostname': 'upos-sz-mirrorcos.bilivideo.com', 'load_ms': 250, 'is_china': True})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIs(getattr(app, '_parser', None), module_parser)
+        parser = get_parser(factory_app)
+        self.assertIn('upos-sz-mirrorcos.bilivideo.com', parser._cdn_stats)
+        self.assertTrue(parser._cdn_stats['upos-sz-mirrorcos.bilivideo.com'].get('is_china'))
+
+    def test_rejects_non_bilibili_hostname(self):
+        factory_app = create_app('testing')
+        client = factory_app.test_client()
+        for hostname in ('upos-sz.attacker.example', 'example.com', 'upos-x.bilivideo.com.attacker.example',
+                         'upos-x.bilivideo.com:8443', ['upos-sz-mirrorcos.bilivideo.com']):
+            resp = client.post('/api/report-cdn', json={'hostname': hostname, 'load_ms': 100, 'is_china': True})
+            self.assertEqual(resp.status_code, 400, hostname)
+        self.assertIsNone(getattr(factory_app, '_parser', None))
+
 
 if __name__ == '__main__':
     unittest.main()
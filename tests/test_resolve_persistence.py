@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""解析结果写入 SQLite cache 表，重启后一次性恢复"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import create_app, close_storage
+    from ass_player.bilibili import BiliBiliParser
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    create_app = None
+
+
+class TestResolvePersistence(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _start_app(self, api_base):
+        flask_app = create_app('testing')
+        flask_app.config['DISK_CACHE_PATH'] = self.db_path
+        flask_app.config['BILIBILI_API_BASE'] = api_base
+        return flask_app
+
+    def test_restarted_app_answers_without_upstream_call(self):
+        with StubBilibiliUpstream() as stub:
+            first = self._start_app(stub.base_url)
+            resp = first.test_client().get('/api/auto-parse?url=BV1xx411c7mD')
+            self.assertEqual(resp.status_code, 200)
+            close_storage(first)
+            self.assertEqual(stub.counts['view'], 1)
+
+            restarted = self._start_app(stub.base_url)
+            again = restarted.test_client().get('/api/auto-parse?url=BV1xx411c7mD')
+            close_storage(restarted)
+
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.get_json()['video_url'], resp.get_json()['video_url'])
+        self.assertEqual(again.get_json()['candidates'], resp.get_json()['candidates'])
+        self.assertEqual(stub.counts['view'], 1)
+
+    def test_expired_rows_skipped_and_compacted_in_batches(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        parser = BiliBiliParser(disk_cache_conn=conn)
+        now = time.time()
+        rows = [(f'https://www.bilibili.com/video/BV{i:010d}', f'https://x/{i}.mp4', now, now - 10, None) for i in range(7)]
+        rows.append(('https://www.bilibili.com/video/BVlive000001', 'https://x/live.mp4', now, now + 3600, '[]'))
+        conn.executemany('INSERT INTO cache (key, url, ts, expires_at, candidates) VALUES (?, ?, ?, ?, ?)', rows)
+        conn.commit()
+
+        restored = BiliBiliParser(disk_cache_conn=conn)
+        self.assertEqual(list(restored._resolve_cache), ['https://www.bilibili.com/video/BVlive000001'])
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0], 1)
+
+        conn.execute('INSERT INTO cache (key, url, ts, expires_at) VALUES (?, ?, ?, ?)', ('old', 'https://x/old.mp4', now, now - 1))
+        conn.commit()
+        parser.DISK_COMPACT_BATCH = 1
+        self.assertEqual(parser.compact_disk_cache(), 1)
+        conn.close()
+
+    def test_legacy_table_is_migrated(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, url TEXT, ts REAL)')
+        conn.execute("INSERT INTO cache VALUES ('legacy', 'https://x/legacy.mp4', 0)")
+        conn.commit()
+        parser = BiliBiliParser(disk_cache_conn=conn)
+        deadline = int(time.time()) + 3600
+        parser._store_resolution('https://www.bilibili.com/video/BV1xx411c7mD', f'https://x/v.mp4?deadline={deadline}', [])
+        row = conn.execute('SELECT url, expires_at FROM cache WHERE key = ?', ('https://www.bilibili.com/video/BV1xx411c7mD',)).fetchone()
+        self.assertEqual(row[0], f'https://x/v.mp4?deadline={deadline}')
+        self.assertAlmostEqual(row[1], deadline - BiliBiliParser.RESOLVE_CACHE_MARGIN)
+        # 旧行没有 expires_at，视为已过期并在初始化时清理
+        self.assertIsNone(conn.execute("SELECT 1 FROM cache WHERE key = 'legacy'").fetchone())
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""解析调度器：交互请求的预留并发、优先于排队中的后台任务，以及按通道的排队时间"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from ass_player import metrics
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.ratelimit import AdaptiveTokenBucket
+    from ass_player.scheduler import BACKGROUND, INTERACTIVE, ResolveScheduler, SchedulerTimeout
+    from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream
+except Exception:
+    ResolveScheduler = None
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('等待条件超时')
+        time.sleep(0.01)
+
+
+class TestResolveScheduler(unittest.TestCase):
+    def setUp(self):
+        if ResolveScheduler is None:
+            self.skipTest('scheduler not available')
+        self.order = []
+        self.threads = []
+
+    def tearDown(self):
+        for t in self.threads:
+            t.join(5)
+
+    def _acquire_in_background(self, scheduler, lane, name, timeout=5):
+        def run():
+            try:
+                scheduler.acquire(lane, timeout)
+            except SchedulerTimeout:
+                self.order.append(f'{name}:timeout')
+                return
+            self.order.append(name)
+
+        t = threading.Thread(target=run)
+        t.start()
+        self.threads.append(t)
+
+    def test_background_limited_to_unreserved_share(self):
+        scheduler = ResolveScheduler(max_concurrency=3, interactive_reserved=1)
+        scheduler.acquire(BACKGROUND)
+        scheduler.acquire(BACKGROUND)
+        with self.assertRaises(SchedulerTimeout):
+            scheduler.acquire(BACKGROUND, timeout=0.05)
+        # 预留给交互请求的空位仍然可用
+        self.assertEqual(scheduler.acquire(INTERACTIVE, timeout=0.05), 0.0)
+        self.assertEqual(scheduler.stats()['in_flight'], {INTERACTIVE: 1, BACKGROUND: 2})
+        self.assertEqual(scheduler.stats()['queued'], {INTERACTIVE: 0, BACKGROUND: 0})
+
+    def test_interactive_jumps_queued_background(self):
+        scheduler = ResolveScheduler(max_concurrency=2, interactive_reserved=0)
+        scheduler.acquire(BACKGROUND)
+        scheduler.acquire(BACKGROUND)
+        self._acquire_in_background(scheduler, BACKGROUND, 'bg')
+        _wait_until(lambda: scheduler.stats()['queued'][BACKGROUND] == 1)
+        self._acquire_in_background(scheduler, INTERACTIVE, 'ui')
+        _wait_until(lambda: scheduler.stats()['queued'][INTERACTIVE] == 1)
+
+        scheduler.release(BACKGROUND)
+        _wait_until(lambda: self.order == ['ui'])
+        scheduler.release(BACKGROUND)
+        _wait_until(lambda: self.order == ['ui', 'bg'])
+
+    def test_timed_out_interactive_unblocks_background(self):
+        scheduler = ResolveScheduler(max_concurrency=2, interactive_reserved=1)
+        scheduler.acquire(INTERACTIVE)
+        scheduler.acquire(INTERACTIVE)
+        self._acquire_in_background(scheduler, INTERACTIVE, 'ui', timeout=0.1)
+        _wait_until(lambda: scheduler.stats()['queued'][INTERACTIVE] == 1)
+        self._acquire_in_background(scheduler, BACKGROUND, 'bg')
+        _wait_until(lambda: self.order == ['ui:timeout'])
+        scheduler.release(INTERACTIVE)
+        _wait_until(lambda: self.order == ['ui:timeout', 'bg'])
+
+    def test_async_waiter_granted_by_thread_release_and_wait_recorded_per_lane(self):
+        scheduler = ResolveScheduler(max_concurrency=1, interactive_reserved=0)
+        before = metrics.RESOLVE_QUEUE_WAIT.labels(INTERACTIVE).snapshot()
+        scheduler.acquire(BACKGROUND)
+        threading.Timer(0.1, scheduler.release, args=(BACKGROUND,)).start()
+
+        async def scenario():
+            async with scheduler.slot(INTERACTIVE, timeout=5) as waited:
+                return waited
+
+        waited = asyncio.run(scenario())
+        self.assertGreaterEqual(waited, 0.05)
+        after = metrics.RESOLVE_QUEUE_WAIT.labels(INTERACTIVE).snapshot()
+        self.assertEqual(after[2] - before[2], 1)
+        self.assertGreaterEqual(after[1] - before[1], 0.05)
+        self.assertEqual(scheduler.stats()['in_flight'], {INTERACTIVE: 0, BACKGROUND: 0})
+
+
+class TestParserLanes(unittest.TestCase):
+    def setUp(self):
+        if ResolveScheduler is None:
+            self.skipTest('scheduler not available')
+
+    def test_interactive_resolve_waits_behind_running_background(self):
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 150)) as stub:
+            parser = BiliBiliParser(api_base=stub.base_url, rate_limiter=AdaptiveTokenBucket(rate=0),
+                                    scheduler=ResolveScheduler(max_concurrency=1, interactive_reserved=0))
+            background = threading.Thread(target=parser.get_real_url, args=('BV1bg411c7mD',), kwargs={'lane': BACKGROUND})
+            background.start()
+            _wait_until(lambda: parser.scheduler.stats()['in_flight'][BACKGROUND] == 1)
+            ctx = ResolveContext(timings=True)
+            self.assertIsNotNone(parser.get_real_url('BV1ui411c7mD', ctx=ctx))
+            background.join(5)
+        self.assertGreater(ctx.timings.as_dict()['schedule'], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
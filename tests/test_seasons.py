@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""合集（ugc_season）：分集解析与缓存、同一合集的分集跳过 view，以及 /api/season"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import close_storage, create_app, get_parser
+    from ass_player.bilibili import BiliBiliParser
+    from ass_player.ratelimit import AdaptiveTokenBucket
+    from ass_player.seasons import Episode, Season, SeasonCache, parse_ugc_season
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    SeasonCache = None
+
+try:
+    from ass_player.bilibili_async import AsyncBiliBiliParser
+except Exception:
+    AsyncBiliBiliParser = None
+
+EPISODES = [f'BV1s{i}x411c7m' for i in range(1, 7)]
+
+
+def _view(sections):
+    return {'code': 0, 'data': {'cid': 1, 'ugc_season': {'id': 42, 'title': '合集', 'sections': sections}}}
+
+
+class TestSeasonCache(unittest.TestCase):
+    def setUp(self):
+        if SeasonCache is None:
+            self.skipTest('seasons not available')
+
+    def test_parse_orders_episodes_across_sections(self):
+        season = parse_ugc_season(_view([
+            {'episodes': [{'bvid': 'BV1', 'cid': 11, 'title': 'a'}, {'bvid': 'BV2', 'cid': 12, 'arc': {'title': 'b', 'duration': 30}}]},
+            {'episodes': [{'bvid': 'BV3', 'cid': 13}, {'bvid': 'BV4'}]},
+        ]))
+        self.assertEqual((season.id, season.title), (42, '合集'))
+        self.assertEqual([ep.bvid for ep in season.episodes], ['BV1', 'BV2', 'BV3'])
+        self.assertEqual(season.episodes[1].to_dict(), {'bvid': 'BV2', 'cid': 12, 'title': 'b', 'duration': 30})
+        self.assertEqual(season.index_of('BV3'), 2)
+        self.assertIsNone(parse_ugc_season({'code': 0, 'data': {'cid': 1}}))
+
+    def test_lru_and_ttl_drop_bvid_index(self):
+        cache = SeasonCache(ttl=60, max_seasons=1)
+        cache.put(Season(1, 'a', [Episode('BV1', 11)]))
+        self.assertEqual(cache.cid_for('BV1'), 11)
+        cache.put(Season(2, 'b', [Episode('BV2', 22)]))
+        self.assertIsNone(cache.cid_for('BV1'))
+        self.assertEqual(len(cache), 1)
+        with patch('ass_player.seasons.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.season_for('BV2'))
+        self.assertEqual(len(cache), 0)
+
+
+@patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+class TestSeasonResolution(unittest.TestCase):
+    def setUp(self):
+        if SeasonCache is None:
+            self.skipTest('seasons not available')
+
+    def test_later_episodes_need_only_playurl(self, _allowed):
+        with StubBilibiliUpstream(seasons={7: EPISODES}) as stub:
+            parser = BiliBiliParser(api_base=stub.base_url, rate_limiter=AdaptiveTokenBucket(rate=0), playurl_strategies=('html5',))
+            self.assertIsNotNone(parser.get_real_url(EPISODES[0]))
+            url = parser.get_real_url(EPISODES[3])
+            counts = dict(stub.counts)
+        self.assertIn(f'/{stub.cid_of(EPISODES[3])}/', url)
+        self.assertEqual((counts['view'], counts['playurl']), (1, 2))
+
+    def test_async_parser_uses_cached_season(self, _allowed):
+        if AsyncBiliBiliParser is None:
+            self.skipTest('async parser not available')
+
+        async def run(base_url):
+            aparser = AsyncBiliBiliParser(BiliBiliParser(api_base=base_url, rate_limiter=AdaptiveTokenBucket(rate=0),
+                                                         playurl_strategies=('html5',)))
+            try:
+                return [await aparser.get_real_url(bvid) for bvid in EPISODES[:3]]
+            finally:
+                await aparser.aclose()
+
+        with StubBilibiliUpstream(seasons={7: EPISODES}) as stub:
+            urls = asyncio.run(run(stub.base_url))
+        self.assertTrue(all(urls))
+        self.assertEqual((stub.counts['view'], stub.counts['playurl']), (1, 3))
+
+    def test_api_season_prefetches_from_current_episode(self, _allowed):
+        with StubBilibiliUpstream(seasons={7: EPISODES}) as stub:
+            flask_app = create_app('testing')
+            flask_app.config['BILIBILI_API_BASE'] = stub.base_url
+            get_parser(flask_app).rate_limiter = AdaptiveTokenBucket(rate=0)
+            client = flask_app.test_client()
+            resp = client.get(f'/api/season?url={EPISODES[1]}&prefetch=3')
+            after_season = dict(stub.counts)
+            later = client.get(f'/api/auto-parse?url={EPISODES[5]}')
+            missing = client.get('/api/season?url=BV1zz411c7mD')
+            counts = dict(stub.counts)
+            close_storage(flask_app)
+        body = resp.get_json()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(body['season'], {'id': 7, 'title': 'stub 合集 7', 'episode_count': 6})
+        self.assertEqual(body['current'], 1)
+        self.assertEqual([ep['bvid'] for ep in body['episodes']], EPISODES)
+        self.assertEqual([bool(ep['video_url']) for ep in body['episodes']], [False, True, True, True, False, False])
+        self.assertEqual(body['prefetched'], 3)
+        self.assertEqual((after_season['view'], after_season['playurl']), (1, 3))
+        # 合集元数据已缓存：后面的分集只需一次 playurl
+        self.assertEqual(later.status_code, 200)
+        self.assertEqual(counts['view'] - after_season['view'], 1)  # 只有不属于合集的 missing 调用了 view
+        self.assertEqual(missing.status_code, 404)
+
+    def test_api_season_rejects_url_without_bv(self, _allowed):
+        flask_app = create_app('testing')
+        resp = flask_app.test_client().get('/api/season?url=https://www.bilibili.com/bangumi/play/ep1')
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
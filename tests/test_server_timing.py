@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""解析分阶段计时与 Server-Timing 响应头测试"""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.bilibili import BiliBiliParser, ResolveContext
+from ass_player.timing import StageTimings, stage, _NULL_STAGE
+
+try:
+    from app import app
+except Exception:
+    app = None
+
+PUBLIC_DNS = [(None, None, None, None, ('8.8.8.8', 0))]
+
+
+def _mock_api(m):
+    m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'cid': 1}})
+    m.get('https://api.bilibili.com/x/player/playurl', json={'code': 0, 'data': {'durl': [{'url': 'https://upos-sz-estgcos.bilivideo.com/v.mp4'}]}})
+
+
+class TestStageTimings(unittest.TestCase):
+    def test_disabled_stage_is_shared_noop(self):
+        self.assertIs(stage(None, 'view'), _NULL_STAGE)
+
+    def test_stages_accumulate_and_format(self):
+        t = StageTimings()
+        t.add('view', 10.0)
+        t.add('playurl', 20.04)
+        t.add('view', 2.5)
+        self.assertEqual(t.as_dict(), {'view': 12.5, 'playurl': 20.04})
+        self.assertEqual(t.to_server_timing(), 'view;dur=12.5, playurl;dur=20.0')
+
+    @patch('ass_player.bilibili.socket.getaddrinfo', return_value=PUBLIC_DNS)
+    def test_parser_records_each_stage(self, _dns):
+        ctx = ResolveContext(timings=True)
+        with requests_mock.Mocker() as m:
+            _mock_api(m)
+            self.assertIsNotNone(BiliBiliParser().get_real_url('BV1xx411c7mD', ctx=ctx))
+        self.assertEqual(list(ctx.timings.as_dict()), ['view', 'playurl', 'ssrf', 'cdn', 'candidates'])
+
+    def test_context_without_timings(self):
+        self.assertIsNone(ResolveContext().timings)
+
+
+class TestAutoParseServerTiming(unittest.TestCase):
+    def setUp(self):
+        if app is None:
+            self.skipTest('app not available')
+        self.client = app.test_client()
+
+    @patch('ass_player.bilibili.socket.getaddrinfo', return_value=PUBLIC_DNS)
+    def test_header_and_optional_json_field(self, _dns):
+        with requests_mock.Mocker() as m:
+            _mock_api(m)
+            plain = self.client.get('/api/auto-parse?url=BV1xx411c7mD')
+            with_json = self.client.get('/api/auto-parse?url=BV1xx411c7mD&timings=1')
+
+        header = plain.headers.get('Server-Timing', '')
+        for name in ('view;dur=', 'playurl;dur=', 'ssrf;dur=', 'cdn;dur=', 'total;dur='):
+            self.assertIn(name, header)
+        self.assertNotIn('timings', plain.get_json())
+        self.assertIn('playurl', with_json.get_json()['timings'])
+
+    def test_report_cdn_accepts_server_timings(self):
+        resp = self.client.post('/api/report-cdn', json={'hostname': 'upos-sz-estgcos.bilivideo.com', 'load_ms': 800,
+                                                          'server_timings': {'view': 12.0, 'playurl': 30.0}})
+        self.assertEqual(resp.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""生产服务模式测试：只读资源预加载、预压缩静态文件与 fork 后的状态重置"""
+import gzip
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from app import create_app, get_parser, preload_assets, reinit_after_fork
+except Exception:
+    create_app = None
+
+
+class TestPreloadAssets(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+
+    def test_preload_summary(self):
+        summary = preload_assets(self.app)
+        self.assertGreater(summary['templates'], 0)
+        self.assertGreater(summary['static'], 0)
+        self.assertGreater(summary['ass_files'], 0)
+
+    def test_static_served_from_memory_with_gzip_and_etag(self):
+        with open(os.path.join(self.app.static_folder, 'js', 'main.js'), 'rb') as f:
+            raw = f.read()
+        preload_assets(self.app)
+        resp = self.client.get('/static/js/main.js', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get('Content-Encoding'), 'gzip')
+        self.assertEqual(gzip.decompress(resp.data), raw)
+
+        plain = self.client.get('/static/js/main.js')
+        self.assertIsNone(plain.headers.get('Content-Encoding'))
+        self.assertEqual(plain.data, raw)
+        cached = self.client.get('/static/js/main.js', headers={'If-None-Match': plain.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_static_without_preload_still_served(self):
+        resp = self.client.get('/static/js/main.js')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_ass_traversal_still_rejected_after_preload(self):
+        preload_assets(self.app)
+        self.assertEqual(self.client.get('/ass_files/nope.ass').status_code, 404)
+        self.assertIn(self.client.get('/ass_files/..%2Fapp.py').status_code, (400, 404))
+
+
+class TestReinitAfterFork(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+
+    def test_inherited_parser_dropped_and_rebuilt(self):
+        flask_app = create_app('testing')
+        inherited = get_parser(flask_app)
+        preload_assets(flask_app)
+        reinit_after_fork(flask_app)
+        self.assertIsNone(flask_app._parser)
+        self.assertIsNotNone(flask_app._static_assets)
+        self.assertIsNot(get_parser(flask_app), inherited)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""playurl 策略表：WBI 签名、按耗时与有效率排序 / 跳过，以及同步与异步解析器的错峰竞速"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from ass_player import metrics
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.ratelimit import AdaptiveTokenBucket
+    from ass_player.strategies import PlayurlStrategies, sign_wbi
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    PlayurlStrategies = None
+
+try:
+    from ass_player.bilibili_async import AsyncBiliBiliParser
+except Exception:
+    AsyncBiliBiliParser = None
+
+BV = 'BV1xx411c7mD'
+
+
+class TestPlayurlStrategies(unittest.TestCase):
+    def setUp(self):
+        if PlayurlStrategies is None:
+            self.skipTest('strategies not available')
+
+    def test_wbi_signature_matches_reference(self):
+        signed = sign_wbi({'foo': '114', 'bar': '514', 'zab': 1919810},
+                          '7cd084941338484aae1ad9425b84077c', '4932caff0ff746eab6f01bf08b70ac45', now=1702204169)
+        self.assertEqual(signed['wts'], '1702204169')
+        self.assertEqual(signed['w_rid'], '8f6f2b5b3d485fe1886cec6a0be8c5d4')
+
+    def test_slow_or_failing_strategies_move_back_and_are_skipped(self):
+        book = PlayurlStrategies(['html5', 'pc', 'wbi'], min_attempts=3, explore_every=5)
+        self.assertEqual([s.name for s in book.order()], ['html5', 'pc', 'wbi'])
+        for _ in range(8):
+            book.record('html5', 0.5, 'valid')
+            book.record('pc', 0.1, 'valid')
+            book.record('wbi', 0.05, 'error')
+        self.assertEqual([s.name for s in book.order()], ['pc', 'html5'])
+        # 每 explore_every 次解析把被跳过的策略排到末尾重新尝试
+        orders = [[s.name for s in book.order()] for _ in range(5)]
+        self.assertEqual(sum(o == ['pc', 'html5', 'wbi'] for o in orders), 1)
+        self.assertTrue(book.stats()['wbi']['skipped'])
+
+    def test_unknown_strategy_rejected(self):
+        with self.assertRaises(ValueError):
+            PlayurlStrategies(['html5', 'nope'])
+
+
+@patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+class TestParserRace(unittest.TestCase):
+    def setUp(self):
+        if PlayurlStrategies is None:
+            self.skipTest('strategies not available')
+
+    def _parser(self, stub, strategies=('html5', 'pc', 'wbi')):
+        return BiliBiliParser(api_base=stub.base_url, rate_limiter=AdaptiveTokenBucket(rate=0), playurl_strategies=strategies)
+
+    def test_staggered_strategy_wins_when_leader_is_slow(self, _allowed):
+        wins_before = metrics.PLAYURL_STRATEGY_WINS.labels('pc').get()
+        with StubBilibiliUpstream(strategy_latency={'html5': 2000}) as stub:
+            parser = self._parser(stub)
+            ctx = ResolveContext(timings=True)
+            start = time.perf_counter()
+            url = parser.get_real_url(BV, ctx=ctx)
+            elapsed = time.perf_counter() - start
+            stub.release.set()
+        self.assertIsNotNone(url)
+        # 错峰间隔（无样本时 0.5 秒）后发出的 pc 策略胜出，无需等满 html5 的 2 秒
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(metrics.PLAYURL_STRATEGY_WINS.labels('pc').get() - wins_before, 1)
+        self.assertEqual(stub.strategy_counts['wbi'], 0)
+        self.assertIn('playurl', ctx.timings.as_dict())
+
+    def test_failed_strategy_falls_through_immediately_and_wbi_keys_cached(self, _allowed):
+        with StubBilibiliUpstream(failing_strategies={'html5', 'pc'}) as stub:
+            parser = self._parser(stub)
+            start = time.perf_counter()
+            self.assertIsNotNone(parser.get_real_url(BV))
+            self.assertLess(time.perf_counter() - start, 0.5)
+            self.assertIsNotNone(parser.get_real_url('BV1yy411c7mD'))
+        self.assertEqual(stub.strategy_counts['wbi'], 2)
+        self.assertIsNotNone(parser.wbi_keys.get())
+        self.assertEqual(parser.playurl_strategies.stats()['wbi']['wins'], 2)
+
+    def test_single_strategy_runs_inline(self, _allowed):
+        with StubBilibiliUpstream() as stub:
+            parser = self._parser(stub, strategies=('html5',))
+            self.assertIsNotNone(parser.get_real_url(BV))
+        self.assertIsNone(parser._strategy_pool)
+        self.assertEqual(dict(stub.strategy_counts), {'html5': 1})
+
+
+@patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+class TestAsyncParserRace(unittest.TestCase):
+    def setUp(self):
+        if PlayurlStrategies is None or AsyncBiliBiliParser is None:
+            self.skipTest('async parser not available')
+
+    def test_staggered_strategy_wins_when_leader_is_slow(self, _allowed):
+        async def run(base_url):
+            aparser = AsyncBiliBiliParser(BiliBiliParser(api_base=base_url, rate_limiter=AdaptiveTokenBucket(rate=0),
+                                                         playurl_strategies=('html5', 'pc')))
+            try:
+                return await aparser.get_real_url(BV), aparser.parser.playurl_strategies.stats()
+            finally:
+                await aparser.aclose()
+
+        with StubBilibiliUpstream(strategy_latency={'html5': 2000}) as stub:
+            start = time.perf_counter()
+            url, stats = asyncio.run(run(stub.base_url))
+            elapsed = time.perf_counter() - start
+            stub.release.set()
+        self.assertIsNotNone(url)
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(stats['pc']['wins'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""B 站 CC 字幕：基于录制的接口响应测试列表解析、ASS / VTT 转换、与 playurl 并发获取及按 cid 缓存"""
+import asyncio
+import json
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.ratelimit import AdaptiveTokenBucket
+from ass_player.subtitles import bcc_to_ass, bcc_to_vtt, parse_subtitle_list
+
+try:
+    from app import close_storage, create_app, get_parser
+except Exception:
+    create_app = None
+
+try:
+    from ass_player.bilibili import BiliBiliParser, ResolveContext
+    from ass_player.bilibili_async import AsyncBiliBiliParser
+    from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream
+except Exception:
+    AsyncBiliBiliParser = None
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'bilibili')
+BV = 'BV1xx411c7mD'
+CID = 279786
+PUBLIC_DNS = [(None, None, None, None, ('93.184.216.34', 0))]
+SUBTITLE_URL = 'https://aisubtitle.hdslb.com/bfs/subtitle/4f2a4e0d8c5b7d9a1c3e5f7a9b1d3f5e7a9c1e3f.json'
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TestConversion(unittest.TestCase):
+    def test_subtitle_list_from_recorded_response(self):
+        tracks = parse_subtitle_list(_fixture('player_v2.json'))
+        # 没有正文地址的 AI 字幕被跳过，协议相对地址补全为 https
+        self.assertEqual([t['lan'] for t in tracks], ['zh-CN', 'en-US'])
+        self.assertEqual(tracks[0], {'lan': 'zh-CN', 'lan_doc': '中文（中国）', 'url': SUBTITLE_URL})
+        with self.assertRaises(ValueError):
+            parse_subtitle_list({'code': -400, 'message': '请求错误'})
+
+    def test_bcc_to_ass(self):
+        ass = bcc_to_ass(_fixture('subtitle_zh_cn.json'), title='测试')
+        self.assertIn('Title: 测试\n', ass)
+        self.assertIn('[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n', ass)
+        dialogues = [line for line in ass.splitlines() if line.startswith('Dialogue:')]
+        self.assertEqual(dialogues, [
+            'Dialogue: 0,0:00:00.50,0:00:02.13,Default,,0,0,0,,大家好，欢迎回来',
+            r'Dialogue: 0,0:00:02.13,0:00:04.80,Default,,0,0,0,,今天我们去找\N黑手党的坟墓',
+            r'Dialogue: 0,0:01:01.20,0:01:03.06,Default,,0,0,0,,{\an8}｛注意｝ <右上角>',
+        ])
+
+    def test_bcc_to_vtt(self):
+        vtt = bcc_to_vtt(_fixture('subtitle_zh_cn.json'))
+        self.assertTrue(vtt.startswith('WEBVTT\n\n00:00:00.500 --> 00:00:02.130\n大家好，欢迎回来\n'))
+        self.assertIn('00:01:01.200 --> 00:01:03.055 line:0\n{注意} &lt;右上角&gt;\n', vtt)
+        self.assertEqual(vtt.count(' --> '), 3)
+
+
+@patch('ass_player.bilibili.socket.getaddrinfo', return_value=PUBLIC_DNS)
+class TestAutoParseWithSubtitles(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        self.app.config['BILIBILI_API_BASE'] = 'https://api.bilibili.com'
+        get_parser(self.app).rate_limiter = AdaptiveTokenBucket(rate=0)
+        self.client = self.app.test_client()
+        self.addCleanup(close_storage, self.app)
+
+    def _mock(self, m, player_v2=None):
+        deadline = int(time.time()) + 7200
+        m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'bvid': BV, 'cid': CID}})
+        m.get('https://api.bilibili.com/x/player/playurl', json={'code': 0, 'data': {'durl': [
+            {'url': f'https://upos-sz-mirrorcos.bilivideo.com/v.mp4?deadline={deadline}'}]}})
+        if player_v2 is None:
+            m.get('https://api.bilibili.com/x/player/v2', json=_fixture('player_v2.json'))
+        else:
+            m.get('https://api.bilibili.com/x/player/v2', **player_v2)
+        m.get(SUBTITLE_URL, json=_fixture('subtitle_zh_cn.json'))
+
+    @staticmethod
+    def _calls(m, path):
+        return sum(1 for r in m.request_history if r.path == path)
+
+    def test_subtitle_list_cached_by_cid(self, _dns):
+        with requests_mock.Mocker() as m:
+            self._mock(m)
+            resp = self.client.get(f'/api/auto-parse?url={BV}&with_subtitles=1')
+            body = resp.get_json()
+            # 第二次请求命中解析结果缓存，字幕列表也从按 cid 的缓存返回
+            again = self.client.get(f'/api/auto-parse?url={BV}&with_subtitles=1').get_json()
+            plain = self.client.get(f'/api/auto-parse?url={BV}').get_json()
+            player_calls = self._calls(m, '/x/player/v2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(body['subtitles'], [
+            {'lan': 'zh-CN', 'lan_doc': '中文（中国）', 'ass_url': f'/api/subtitle/{BV}/{CID}/zh-CN.ass',
+             'vtt_url': f'/api/subtitle/{BV}/{CID}/zh-CN.vtt'},
+            {'lan': 'en-US', 'lan_doc': '英语（美国）', 'ass_url': f'/api/subtitle/{BV}/{CID}/en-US.ass',
+             'vtt_url': f'/api/subtitle/{BV}/{CID}/en-US.vtt'},
+        ])
+        self.assertEqual(again['subtitles'], body['subtitles'])
+        self.assertNotIn('subtitles', plain)
+        self.assertEqual(player_calls, 1)
+
+    def test_subtitle_files_converted_once(self, _dns):
+        with requests_mock.Mocker() as m:
+            self._mock(m)
+            links = self.client.get(f'/api/auto-parse?url={BV}&with_subtitles=1').get_json()['subtitles']
+            ass = self.client.get(links[0]['ass_url'])
+            ass_again = self.client.get(links[0]['ass_url'])
+            vtt = self.client.get(links[0]['vtt_url'])
+            missing = self.client.get(f'/api/subtitle/{BV}/{CID}/ja-JP.ass')
+            body_calls = self._calls(m, '/bfs/subtitle/4f2a4e0d8c5b7d9a1c3e5f7a9b1d3f5e7a9c1e3f.json')
+        self.assertEqual(ass.status_code, 200)
+        self.assertEqual(ass.content_type, 'text/x-ssa; charset=utf-8')
+        self.assertIn('Dialogue: 0,0:00:00.50,0:00:02.13,Default,,0,0,0,,大家好，欢迎回来', ass.get_data(as_text=True))
+        self.assertEqual(ass_again.data, ass.data)
+        self.assertTrue(vtt.get_data(as_text=True).startswith('WEBVTT'))
+        self.assertEqual(missing.status_code, 404)
+        # ASS 与 VTT 各下载一次正文，重复请求走缓存
+        self.assertEqual(body_calls, 2)
+
+    def test_subtitle_request_validates_cid(self, _dns):
+        other_bv = 'BV1ab411c7XY'
+        with requests_mock.Mocker() as m:
+            self._mock(m)
+            m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {
+                'bvid': BV, 'cid': CID, 'pages': [{'cid': CID}, {'cid': CID + 1}]}})
+            limiter = get_parser(self.app).rate_limiter
+            with patch.object(limiter, 'acquire', wraps=limiter.acquire) as acquire:
+                foreign = self.client.get(f'/api/subtitle/{BV}/123456/zh-CN.ass')
+                self.assertEqual(self._calls(m, '/x/player/v2'), 0)
+                # 分 P 视频的其他 cid 同样属于该视频；字幕正文的下载也经过令牌桶
+                second_page = self.client.get(f'/api/subtitle/{BV}/{CID + 1}/zh-CN.vtt')
+                self.assertEqual(acquire.call_count, 4)
+            mismatched = self.client.get(f'/api/subtitle/{other_bv}/{CID + 1}/zh-CN.vtt')
+        self.assertEqual(foreign.status_code, 404)
+        self.assertEqual(second_page.status_code, 200)
+        self.assertEqual(mismatched.status_code, 404)
+        subtitles = get_parser(self.app).subtitles
+        self.assertIsNone(subtitles.tracks(123456))
+        self.assertEqual(subtitles.bvid_for(CID + 1), BV)
+
+    def test_subtitle_failure_does_not_fail_resolve(self, _dns):
+        with requests_mock.Mocker() as m:
+            self._mock(m, player_v2={'status_code': 500, 'json': {'code': -500}})
+            resp = self.client.get(f'/api/auto-parse?url={BV}&with_subtitles=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['subtitles'], [])
+
+
+@patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+class TestConcurrentFetch(unittest.TestCase):
+    def setUp(self):
+        if AsyncBiliBiliParser is None:
+            self.skipTest('parser not available')
+        self.tracks = _fixture('player_v2.json')['data']['subtitle']['subtitles']
+
+    def _parser(self, base_url):
+        return BiliBiliParser(api_base=base_url, rate_limiter=AdaptiveTokenBucket(rate=0), playurl_strategies=('html5',))
+
+    def test_player_v2_runs_alongside_playurl(self, _allowed):
+        # 每个上游请求 300ms：view 之后 playurl 与 player/v2 并发，总耗时约两次而不是三次请求
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 300), subtitles=self.tracks) as stub:
+            ctx = ResolveContext(subtitles=True)
+            start = time.perf_counter()
+            url = self._parser(stub.base_url).get_real_url(BV, ctx=ctx)
+            elapsed = time.perf_counter() - start
+        self.assertIsNotNone(url)
+        self.assertLess(elapsed, 0.85)
+        self.assertEqual([s['lan'] for s in ctx.subtitles], ['zh-CN', 'en-US'])
+        self.assertEqual(stub.subtitle_requests, 1)
+
+    def test_async_parser_fetches_subtitles_with_playurl(self, _allowed):
+        async def run(base_url):
+            aparser = AsyncBiliBiliParser(self._parser(base_url))
+            ctx = ResolveContext(subtitles=True)
+            try:
+                return await aparser.get_real_url(BV, ctx=ctx), ctx
+            finally:
+                await aparser.aclose()
+
+        with StubBilibiliUpstream(subtitles=self.tracks) as stub:
+            url, ctx = asyncio.run(run(stub.base_url))
+        self.assertIsNotNone(url)
+        self.assertEqual([s['lan'] for s in ctx.subtitles], ['zh-CN', 'en-US'])
+        self.assertEqual(stub.subtitle_requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
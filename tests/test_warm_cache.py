@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""tools/warm_cache.py：批量解析写入磁盘缓存、失败汇总与断点续做"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+try:
+    import warm_cache
+    from ass_player.ratelimit import configure_upstream_bucket, get_upstream_bucket
+    from config import get_config
+    from tests_bench.stub_upstream import StubBilibiliUpstream
+except Exception:
+    warm_cache = None
+
+INPUT = """# 活动片单
+BV1aa411c7mD
+https://www.bilibili.com/video/BV1bb411c7mD
+BV1cc411c7mD
+
+BV1aa411c7mD
+https://example.com/video/BV1dd411c7mD
+"""
+
+
+@patch('ass_player.bilibili.BiliBiliParser._is_url_allowed', return_value=True)
+class TestWarmCacheCli(unittest.TestCase):
+    def setUp(self):
+        if warm_cache is None:
+            self.skipTest('warm_cache not available')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input = os.path.join(self.tmp.name, 'videos.txt')
+        with open(self.input, 'w', encoding='utf-8') as f:
+            f.write(INPUT)
+        self.db = os.path.join(self.tmp.name, 'cache.db')
+        # main 会按 --rate 重新设置进程级令牌桶，测试结束后恢复为服务的配置
+        cfg = get_config()
+        self.addCleanup(configure_upstream_bucket, cfg.UPSTREAM_RATE, cfg.UPSTREAM_BURST, cfg.UPSTREAM_RATE_MIN)
+
+    def _run(self, stub, *extra):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            code = warm_cache.main([self.input, '--db', self.db, '--api-base', stub.base_url, '--json', *extra])
+        return code, json.loads(out.getvalue())
+
+    def test_resolves_in_parallel_and_resumes_from_disk(self, _allowed):
+        with StubBilibiliUpstream() as stub:
+            code, first = self._run(stub, '--concurrency', '4')
+            upstream_calls = stub.counts['view']
+            _, second = self._run(stub)
+            self.assertEqual(stub.counts['view'], upstream_calls)
+        # 重复行去重；非 B 站地址计入失败并使退出码非零
+        self.assertEqual(code, 1)
+        self.assertEqual((first['total'], first['resolved'], first['cached'], first['failed']), (4, 3, 0, 1))
+        self.assertIn('https://example.com/video/BV1dd411c7mD', first['failures'])
+        self.assertEqual(upstream_calls, 3)
+        # 第二次运行从磁盘缓存恢复，只剩无效条目
+        self.assertEqual((second['cached'], second['resolved'], second['failed']), (3, 0, 1))
+
+    def test_upstream_failures_reported(self, _allowed):
+        with StubBilibiliUpstream(error_rate=1.0, error_status=404) as stub:
+            code, summary = self._run(stub, '--deadline', '2')
+        self.assertEqual(code, 1)
+        self.assertEqual(summary['failed'], 4)
+        self.assertEqual(summary['failures']['https://www.bilibili.com/video/BV1aa411c7mD'], '未返回有效直链')
+
+    def test_rate_defaults_to_share_of_upstream_rate(self, _allowed):
+        with StubBilibiliUpstream() as stub:
+            self._run(stub)
+            self.assertAlmostEqual(get_upstream_bucket().max_rate,
+                                   get_config().UPSTREAM_RATE * warm_cache.DEFAULT_RATE_SHARE)
+            self._run(stub, '--rate', '3', '--force')
+            self.assertEqual(get_upstream_bucket().max_rate, 3.0)
+
+    def test_format_summary(self, _allowed):
+        text = warm_cache.format_summary({'total': 2, 'cached': 1, 'resolved': 0, 'failed': 1, 'elapsed_s': 0.5,
+                                          'resolved_per_s': 0.0, 'failures': {'BVx': '解析超时'}})
+        self.assertIn('失败 1', text)
+        self.assertIn('BVx  解析超时', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
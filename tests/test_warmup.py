@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""解析结果缓存、启动预热与 /healthz 测试"""
+import gzip
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import requests_mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ass_player.bilibili import BiliBiliParser, ResolveContext
+from ass_player.warmup import Warmer
+
+try:
+    from app import create_app, start_background_tasks
+    from cache_manager import get_memory_budget
+except Exception:
+    create_app = None
+
+BV = 'BV1xx411c7mD'
+PUBLIC_DNS = [(None, None, None, None, ('93.184.216.34', 0))]
+ASS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ass_files')
+ASS_NAME = sorted(os.listdir(ASS_DIR))[0]
+
+
+def _mock_api(m, deadline):
+    m.get('https://api.bilibili.com/x/web-interface/view', json={'code': 0, 'data': {'cid': 1}})
+    m.get('https://api.bilibili.com/x/player/playurl', json={'code': 0, 'data': {'durl': [
+        {'url': f'https://upos-sz-estgcos.bilivideo.com/v.mp4?deadline={int(deadline)}'}]}})
+
+
+class FakeParser:
+    """按顺序返回预设结果的解析器替身。"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def get_real_url(self, url, ctx=None, use_cache=True, lane='interactive'):
+        self.calls.append((url, use_cache, lane))
+        return self.results.pop(0)
+
+
+@patch('ass_player.bilibili.socket.getaddrinfo', return_value=PUBLIC_DNS)
+class TestResolveCache(unittest.TestCase):
+    def test_hit_skips_upstream_and_restores_candidates(self, _dns):
+        parser = BiliBiliParser()
+        with requests_mock.Mocker() as m:
+            _mock_api(m, time.time() + 3600)
+            first = parser.get_real_url(BV, ctx=ResolveContext())
+            calls = m.call_count
+            ctx = ResolveContext(timings=True)
+            second = parser.get_real_url(BV, ctx=ctx)
+            self.assertEqual(m.call_count, calls)
+        self.assertEqual(first, second)
+        self.assertEqual(ctx.candidates[0]['url'], first)
+        self.assertIn('cache', ctx.timings.as_dict())
+
+    def test_near_deadline_is_not_cached(self, _dns):
+        parser = BiliBiliParser()
+        with requests_mock.Mocker() as m:
+            _mock_api(m, time.time() + parser.RESOLVE_CACHE_MARGIN - 5)
+            parser.get_real_url(BV)
+            parser.get_real_url(BV)
+            self.assertEqual(m.call_count, 4)
+
+    def test_use_cache_false_forces_refresh(self, _dns):
+        parser = BiliBiliParser()
+        with requests_mock.Mocker() as m:
+            _mock_api(m, time.time() + 3600)
+            parser.get_real_url(BV)
+            parser.get_real_url(BV, use_cache=False)
+            self.assertEqual(m.call_count, 4)
+
+
+class TestWarmer(unittest.TestCase):
+    def test_refresh_scheduled_before_deadline(self):
+        deadline = int(time.time()) + 3600
+        warmer = Warmer(FakeParser([f'https://upos-sz-estgcos.bilivideo.com/v.mp4?deadline={deadline}']), BV,
+                        refresh_margin=300)
+        delay = warmer.warm_video()
+        self.assertAlmostEqual(delay, deadline - 300 - time.time(), delta=2)
+        self.assertEqual(warmer.parser.calls, [(BV, False, 'background')])
+        self.assertEqual(warmer.health()['video']['state'], 'ok')
+
+    def test_failures_back_off_then_recover(self):
+        warmer = Warmer(FakeParser([None, None, None, 'https://example.com/v.mp4']), BV, retry_interval=10,
+                        max_retry_interval=25, fallback_refresh=1800)
+        self.assertEqual([warmer.warm_video() for _ in range(3)], [10, 20, 25])
+        self.assertEqual(warmer.warm_video(), 1800)
+
+    def test_run_once_marks_ready_even_on_failure(self):
+        warmer = Warmer(FakeParser([None]), BV, ASS_DIR, ASS_NAME)
+        self.assertFalse(warmer.ready)
+        warmer.run_once()
+        self.assertTrue(warmer.ready)
+        self.assertEqual(warmer.health()['subtitle']['state'], 'ok')
+
+    def test_asset_dropped_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'a.ass')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('[Script Info]\n' * 50)
+            warmer = Warmer(None, None, tmp, 'a.ass')
+            self.assertTrue(warmer.warm_subtitle())
+            asset = warmer.get_asset('a.ass')
+            self.assertEqual(gzip.decompress(asset.gzipped), asset.raw)
+            os.utime(path, (asset.mtime + 10, asset.mtime + 10))
+            self.assertIsNone(warmer.get_asset('a.ass'))
+
+
+class TestHealthAndAssets(unittest.TestCase):
+    def setUp(self):
+        if create_app is None:
+            self.skipTest('app not available')
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+
+    def test_healthz_without_warmup(self):
+        resp = self.client.get('/healthz')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.get_json()['ready'])
+
+    def test_healthz_reports_warmup_readiness(self):
+        self.app._warmer = Warmer(FakeParser([None]), BV, ASS_DIR, ASS_NAME)
+        self.assertEqual(self.client.get('/healthz').status_code, 503)
+        self.app._warmer.run_once()
+        resp = self.client.get('/healthz')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['warmup']['video']['state'], 'error')
+
+    def test_warmed_subtitle_served_gzipped(self):
+        self.app._warmer = Warmer(None, None, ASS_DIR, ASS_NAME)
+        self.app._warmer.run_once()
+        resp = self.client.get(f'/ass_files/{ASS_NAME}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers.get('Content-Encoding'), 'gzip')
+        with open(os.path.join(ASS_DIR, ASS_NAME), 'rb') as f:
+            self.assertEqual(gzip.decompress(resp.data), f.read())
+
+    def test_warmed_subtitle_registered_with_memory_budget(self):
+        cfg = type('Cfg', (), {'WARMUP_ENABLED': True, 'DEFAULT_VIDEO_URL': None, 'DEFAULT_ASS_NAME': ASS_NAME})
+        start_background_tasks(self.app, cfg)
+        warmer = self.app._warmer
+        self.addCleanup(get_memory_budget().unregister, 'warmup_assets')
+        self.addCleanup(warmer.stop, 5)
+        deadline = time.monotonic() + 5
+        while not warmer.ready and time.monotonic() < deadline:
+            time.sleep(0.01)
+        usage = get_memory_budget().usage()
+        self.assertGreater(usage['warmup_assets'], os.path.getsize(os.path.join(ASS_DIR, ASS_NAME)))
+        # 被预算淘汰后路由回退为读取磁盘文件
+        warmer.assets.evict_bytes(usage['warmup_assets'])
+        self.assertIsNone(warmer.get_asset(ASS_NAME))
+        self.assertEqual(self.client.get(f'/ass_files/{ASS_NAME}').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Flask API 压测脚本：在本地桩 B 站上游之上，以固定并发驱动 /api/auto-parse 与 /api/report-cdn。
+
+输出 JSON（键排序、数值统一保留三位小数），便于在不同提交之间直接 diff 或比较：
+
+    python tests_bench/bench_api.py --concurrency 1,8,32 --requests 400 --latency-ms 50 --output bench.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream  # noqa: E402
+
+# 输出格式版本：字段含义变化时递增，避免与旧结果误比较
+SCHEMA_VERSION = 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩（nearest-rank）百分位数；输入需已排序。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-pct * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+# 静态解析用的公网地址：SSRF 检查只关心地址类别，压测中不会真正连接视频 CDN
+_STATIC_PUBLIC_IP = '93.184.216.34'
+
+
+@contextlib.contextmanager
+def static_cdn_dns(suffixes=('.bilivideo.com', '.akamaized.net')):
+    """
+    把视频 CDN 主机名静态解析为公网地址（模拟本机 DNS 缓存）。
+
+    解析器会对每个候选直链做 SSRF 的 DNS 检查；若直接使用宿主机解析器，结果会受其超时与抖动
+    （例如 glibc 5 秒重试）支配，失去跨提交的可比性。其余主机名（如 127.0.0.1）仍走原始解析。
+    """
+    original = socket.getaddrinfo
+
+    def fake_getaddrinfo(host, *args, **kwargs):
+        if isinstance(host, str) and host.endswith(suffixes):
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (_STATIC_PUBLIC_IP, 0))]
+        return original(host, *args, **kwargs)
+
+    socket.getaddrinfo = fake_getaddrinfo
+    try:
+        yield
+    finally:
+        socket.getaddrinfo = original
+
+
+class AppServer:
+    """在后台线程中以多线程 WSGI 服务运行 Flask app，并让共享解析器指向桩上游。"""
+
+    def __init__(self, api_base: str):
+        import app as app_module
+        from ass_player.bilibili import BiliBiliParser
+        from ass_player.ratelimit import AdaptiveTokenBucket
+
+        self._app_module = app_module
+        self._orig_parser = getattr(app_module.app, '_parser', None)
+        # 压测衡量服务本身的开销，上游请求不经令牌桶限速
+        app_module.app._parser = BiliBiliParser(api_base=api_base, rate_limiter=AdaptiveTokenBucket(rate=0))
+        self._server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='bench-app', daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._app_module.app._parser = self._orig_parser
+        return False
+
+
+def run_level(name: str, concurrency: int, total: int, do_request: Callable[[requests.Session, int], bool]) -> Dict:
+    """以固定并发（闭环：每个工作线程完成一个再发下一个）执行 `total` 次请求并统计。"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok = do_request(session, i)
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for f in [pool.submit(worker) for _ in range(concurrency)]:
+            f.result()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'endpoint': name,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors[0],
+        'duration_s': round(wall, 3),
+        'throughput_rps': round(total / wall, 3) if wall > 0 else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+def run_benchmark(concurrency_levels: List[int], requests_per_level: int, latency: LatencyModel,
+                  error_rate: float = 0.0, seed: int = 1234, endpoints=('auto-parse', 'report-cdn'),
+                  real_dns: bool = False) -> Dict:
+    """启动桩上游与 app，按并发级别依次压测各端点，返回可序列化的结果字典。"""
+    results = []
+    dns_ctx = contextlib.nullcontext() if real_dns else static_cdn_dns()
+    with dns_ctx, StubBilibiliUpstream(latency=latency, error_rate=error_rate, seed=seed) as stub, AppServer(stub.base_url) as srv:
+        base = srv.base_url
+        # 跨并发级别全局递增的序号：每个请求都使用从未出现过的 BV 号
+        bv_seq = itertools.count()
+
+        def auto_parse(session, i):
+            # 每个请求使用不同的 BV 号，测量的是完整解析成本而非缓存命中
+            r = session.get(f'{base}/api/auto-parse', params={'url': f'BV1{next(bv_seq):09d}'}, timeout=60)
+            return r.status_code == 200
+
+        def report_cdn(session, i):
+            r = session.post(f'{base}/api/report-cdn', json={'hostname': f'upos-sz-bench{i % 8}.bilivideo.com', 'load_ms': 100 + i % 500}, timeout=60)
+            return r.status_code == 200
+
+        handlers = {'auto-parse': ('/api/auto-parse', auto_parse), 'report-cdn': ('/api/report-cdn', report_cdn)}
+        for ep in endpoints:
+            path, fn = handlers[ep]
+            for c in concurrency_levels:
+                results.append(run_level(path, c, requests_per_level, fn))
+        upstream_counts = dict(stub.counts)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'params': {
+            'concurrency': list(concurrency_levels),
+            'requests_per_level': requests_per_level,
+            'latency': latency.describe(),
+            'error_rate': error_rate,
+            'seed': seed,
+            'real_dns': real_dns,
+        },
+        'upstream_counts': upstream_counts,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='ASS Player API 压测（本地桩上游）')
+    ap.add_argument('--concurrency', default='1,8,32', help='逗号分隔的并发级别')
+    ap.add_argument('--requests', type=int, default=200, help='每个并发级别的请求数')
+    ap.add_argument('--latency-dist', default='fixed', choices=('fixed', 'uniform', 'lognormal'))
+    ap.add_argument('--latency-ms', type=float, default=50.0, help='上游延迟（fixed 值 / uniform 下限 / lognormal 中位数）')
+    ap.add_argument('--latency-spread', type=float, default=0.0, help='uniform 上限或 lognormal sigma')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='上游错误比例 0~1')
+    ap.add_argument('--seed', type=int, default=1234)
+    ap.add_argument('--endpoints', default='auto-parse,report-cdn')
+    ap.add_argument('--real-dns', action='store_true', help='SSRF 检查使用宿主机真实 DNS（默认静态解析 CDN 主机名）')
+    ap.add_argument('--output', help='结果 JSON 输出文件（默认打印到标准输出）')
+    args = ap.parse_args(argv)
+
+    import logging
+    logging.disable(logging.INFO)
+
+    result = run_benchmark(
+        [int(c) for c in args.concurrency.split(',') if c],
+        args.requests,
+        LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread),
+        error_rate=args.error_rate,
+        seed=args.seed,
+        endpoints=[e for e in args.endpoints.split(',') if e],
+        real_dns=args.real_dns,
+    )
+    text = json.dumps(result, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
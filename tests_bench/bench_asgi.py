@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+慢上游高并发压测：上游每次调用固定延迟（默认 1000ms），一次性发起上千个并发的
+/api/auto-parse 请求，比较 ASGI 模式（uvicorn asgi:app）与线程模式（run.py / gunicorn）
+能同时容纳多少进行中的解析。
+
+    python tests_bench/bench_asgi.py --modes uvicorn,run.py,gunicorn --concurrency 1000 --latency-ms 1000
+
+负载端使用 asyncio + httpx，每个并发槽位一个连接（开环突发：所有请求同时发出），
+统计完成时间分布、吞吐与错误数。httpcore 连接池的分配开销随“等待请求数 × 连接数”增长，
+负载端因此按每 CLIENT_SHARD 个连接一个客户端分片，避免压测端自身吃满 CPU。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests_bench.bench_api import SCHEMA_VERSION, git_commit, percentile  # noqa: E402
+from tests_bench.bench_serving import MODES, ServerProcess  # noqa: E402
+from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream  # noqa: E402
+
+CLIENT_SHARD = 4
+
+
+async def burst(base_url: str, concurrency: int, timeout: float, bv_offset: int) -> dict:
+    """同时发出 concurrency 个解析请求（每个使用不同的 BV 号），返回统计结果。"""
+    limits = httpx.Limits(max_connections=CLIENT_SHARD, max_keepalive_connections=CLIENT_SHARD)
+    ssl_context = httpx.create_ssl_context()
+    clients = [httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout, verify=ssl_context)
+               for _ in range(-(-concurrency // CLIENT_SHARD))]
+    latencies = []
+    errors = 0
+    try:
+        async def one(i):
+            start = time.perf_counter()
+            try:
+                r = await clients[i // CLIENT_SHARD].get('/api/auto-parse', params={'url': f'BV1{bv_offset + i:09d}'})
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            return (time.perf_counter() - start) * 1000.0, ok
+
+        wall_start = time.perf_counter()
+        for elapsed, ok in await asyncio.gather(*(one(i) for i in range(concurrency))):
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+        wall = time.perf_counter() - wall_start
+    finally:
+        for client in clients:
+            await client.aclose()
+
+    latencies.sort()
+    return {
+        'endpoint': '/api/auto-parse',
+        'concurrency': concurrency,
+        'requests': concurrency,
+        'errors': errors,
+        'duration_s': round(wall, 3),
+        'throughput_rps': round(concurrency / wall, 3) if wall > 0 else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'max': round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+def run_benchmark(modes, concurrency_levels, latency, timeout=120.0, workers=2, threads=8) -> dict:
+    results = []
+    offset = 0
+    with StubBilibiliUpstream(latency=latency) as stub:
+        for mode in modes:
+            with ServerProcess(mode, stub.base_url, workers, threads) as srv:
+                for c in concurrency_levels:
+                    row = asyncio.run(burst(srv.base_url, c, timeout, offset))
+                    offset += c
+                    row['mode'] = mode
+                    results.append(row)
+        upstream_counts = dict(stub.counts)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'cpu_count': os.cpu_count(),
+        'params': {
+            'modes': list(modes),
+            'concurrency': list(concurrency_levels),
+            'latency': latency.describe(),
+            'timeout_s': timeout,
+            'workers': workers,
+            'threads': threads,
+        },
+        'upstream_counts': upstream_counts,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='ASS Player 慢上游高并发压测（ASGI vs 线程模式）')
+    ap.add_argument('--modes', default='uvicorn,run.py,gunicorn', help='逗号分隔：' + ','.join(MODES))
+    ap.add_argument('--concurrency', default='1000', help='逗号分隔的并发突发规模')
+    ap.add_argument('--latency-ms', type=float, default=1000.0, help='上游固定延迟（毫秒）')
+    ap.add_argument('--timeout', type=float, default=120.0, help='单个请求的客户端超时（秒）')
+    ap.add_argument('--workers', type=int, default=2, help='gunicorn worker 进程数')
+    ap.add_argument('--threads', type=int, default=8, help='每个 gunicorn worker 的线程数')
+    ap.add_argument('--output', help='结果 JSON 输出文件（默认打印到标准输出）')
+    args = ap.parse_args(argv)
+
+    result = run_benchmark([m for m in args.modes.split(',') if m],
+                           [int(c) for c in args.concurrency.split(',') if c],
+                           LatencyModel('fixed', args.latency_ms), timeout=args.timeout,
+                           workers=args.workers, threads=args.threads)
+    text = json.dumps(result, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
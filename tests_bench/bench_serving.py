@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+服务模式对比压测：在同一桩上游与相同负载下，分别压测开发服务器（run.py）与生产模式
+（gunicorn 预派生多 worker，wsgi.py），输出与 bench_api.py 相同风格的 JSON。
+
+    python tests_bench/bench_serving.py --modes run.py,gunicorn --concurrency 8,32 --requests 400 --workers 4 --threads 8
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests_bench.bench_api import SCHEMA_VERSION, git_commit, run_level  # noqa: E402
+from tests_bench.stub_upstream import LatencyModel, StubBilibiliUpstream  # noqa: E402
+
+LAUNCHER = os.path.join(ROOT, 'tests_bench', 'launch.py')
+MODES = {
+    'run.py': ['run.py'],
+    'gunicorn': ['-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    'uvicorn': ['-m', 'uvicorn', 'asgi:app', '--no-access-log'],
+}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """以子进程启动指定服务模式，等待 /healthz 就绪。"""
+
+    def __init__(self, mode: str, api_base: str, workers: int, threads: int):
+        self.port = _free_port()
+        env = dict(os.environ, PORT=str(self.port), ASS_PLAYER_PORT=str(self.port), ASS_PLAYER_HOST='127.0.0.1',
+                   ASS_BILIBILI_API_BASE=api_base, ASS_WEB_WORKERS=str(workers), ASS_WEB_THREADS=str(threads),
+                   UVICORN_HOST='127.0.0.1', UVICORN_PORT=str(self.port), ASS_LOG_LEVEL='WARNING',
+                   ASS_UPSTREAM_RATE='0')
+        self._proc = subprocess.Popen([sys.executable, LAUNCHER] + MODES[mode], cwd=ROOT, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f'服务进程提前退出，退出码 {self._proc.returncode}')
+            try:
+                if requests.get(f'{self.base_url}/healthz', timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.05)
+        self.__exit__()
+        raise TimeoutError('服务在 30s 内未就绪')
+
+    def __exit__(self, *exc):
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+        return False
+
+
+def run_benchmark(modes, concurrency_levels, requests_per_level, latency, workers=4, threads=8, seed=1234) -> dict:
+    results = []
+    bv_seq = itertools.count()
+    with StubBilibiliUpstream(latency=latency, seed=seed) as stub:
+        for mode in modes:
+            with ServerProcess(mode, stub.base_url, workers, threads) as srv:
+                base = srv.base_url
+
+                def page(session, i):
+                    return session.get(f'{base}/?desktop=1', timeout=60).status_code == 200
+
+                def static(session, i):
+                    return session.get(f'{base}/static/js/ass-player.js', timeout=60).status_code == 200
+
+                def auto_parse(session, i):
+                    r = session.get(f'{base}/api/auto-parse', params={'url': f'BV1{next(bv_seq):09d}'}, timeout=60)
+                    return r.status_code == 200
+
+                def report_cdn(session, i):
+                    r = session.post(f'{base}/api/report-cdn', json={'hostname': f'upos-sz-bench{i % 8}.bilivideo.com',
+                                                                     'load_ms': 100 + i % 500}, timeout=60)
+                    return r.status_code == 200
+
+                for path, fn in (('/', page), ('/static/js/ass-player.js', static),
+                                 ('/api/auto-parse', auto_parse), ('/api/report-cdn', report_cdn)):
+                    for c in concurrency_levels:
+                        row = run_level(path, c, requests_per_level, fn)
+                        row['mode'] = mode
+                        results.append(row)
+        upstream_counts = dict(stub.counts)
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'cpu_count': os.cpu_count(),
+        'params': {
+            'modes': list(modes),
+            'concurrency': list(concurrency_levels),
+            'requests_per_level': requests_per_level,
+            'latency': latency.describe(),
+            'workers': workers,
+            'threads': threads,
+            'seed': seed,
+        },
+        'upstream_counts': upstream_counts,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='ASS Player 服务模式对比压测（run.py / gunicorn / uvicorn）')
+    ap.add_argument('--modes', default='run.py,gunicorn', help='逗号分隔：' + ','.join(MODES))
+    ap.add_argument('--concurrency', default='8,32', help='逗号分隔的并发级别')
+    ap.add_argument('--requests', type=int, default=400, help='每个并发级别的请求数')
+    ap.add_argument('--latency-ms', type=float, default=50.0, help='上游固定延迟（毫秒）')
+    ap.add_argument('--workers', type=int, default=4, help='gunicorn worker 进程数')
+    ap.add_argument('--threads', type=int, default=8, help='每个 gunicorn worker 的线程数')
+    ap.add_argument('--seed', type=int, default=1234)
+    ap.add_argument('--output', help='结果 JSON 输出文件（默认打印到标准输出）')
+    args = ap.parse_args(argv)
+
+    result = run_benchmark([m for m in args.modes.split(',') if m],
+                           [int(c) for c in args.concurrency.split(',') if c], args.requests,
+                           LatencyModel('fixed', args.latency_ms), workers=args.workers, threads=args.threads,
+                           seed=args.seed)
+    text = json.dumps(result, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+冷启动压测：反复以全新进程启动服务，测量从进程启动到 `/` 首次返回 200 的时间（time-to-first-200）。
+
+模拟 Zeabur 缩容到零后被请求唤醒的场景；同时记录 `import app` 的累计导入耗时（-X importtime）。
+输出 JSON 与 bench_api.py 一致（键排序、数值保留三位小数）：
+
+    python tests_bench/bench_startup.py --runs 10 --entry run.py --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests_bench.bench_api import SCHEMA_VERSION, git_commit, percentile  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def import_app_ms() -> float:
+    """在独立解释器中测量 `import app` 的累计导入耗时（毫秒）。"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == 'app':
+            return int(parts[1]) / 1000.0
+    return 0.0
+
+
+def time_to_first_200(entry: str, timeout: float = 30.0, poll_interval: float = 0.005) -> float:
+    """以全新进程启动 `entry`，轮询 `/` 直到返回 200，返回耗时（毫秒）。"""
+    port = _free_port()
+    env = dict(os.environ, ASS_PLAYER_HOST='127.0.0.1', ASS_PLAYER_PORT=str(port), PORT=str(port))
+    url = f'http://127.0.0.1:{port}/?desktop=1'
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, entry], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f'{entry} 提前退出，退出码 {proc.returncode}')
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000.0
+            except OSError:
+                pass
+            time.sleep(poll_interval)
+        raise TimeoutError(f'{entry} 在 {timeout}s 内未返回 200')
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run_benchmark(runs: int, entry: str) -> dict:
+    samples = sorted(time_to_first_200(entry) for _ in range(runs))
+    return {
+        'schema': SCHEMA_VERSION,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'params': {'runs': runs, 'entry': entry},
+        'import_app_ms': round(import_app_ms(), 3),
+        'time_to_first_200_ms': {
+            'p50': round(percentile(samples, 50), 3),
+            'p95': round(percentile(samples, 95), 3),
+            'min': round(samples[0], 3),
+            'max': round(samples[-1], 3),
+        },
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='ASS Player 冷启动压测（time-to-first-200）')
+    ap.add_argument('--runs', type=int, default=10, help='重复启动次数')
+    ap.add_argument('--entry', default='run.py', help='启动入口脚本（相对项目根目录）')
+    ap.add_argument('--output', help='结果 JSON 输出文件（默认打印到标准输出）')
+    args = ap.parse_args(argv)
+
+    result = run_benchmark(args.runs, args.entry)
+    text = json.dumps(result, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+在静态 CDN DNS 下启动服务入口，供跨进程压测使用（见 bench_serving.py）。
+
+    python tests_bench/launch.py run.py
+    python tests_bench/launch.py -m gunicorn -c gunicorn.conf.py wsgi:app
+
+与 bench_api.py 的 static_cdn_dns 相同：视频 CDN 主机名静态解析为公网地址，避免宿主机 DNS
+的超时抖动淹没结果。补丁在 fork 之前生效，gunicorn 的 worker 同样继承。
+"""
+import os
+import runpy
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tests_bench.bench_api import static_cdn_dns  # noqa: E402
+
+
+def main(argv):
+    if not argv:
+        raise SystemExit(__doc__)
+    os.chdir(ROOT)
+    with static_cdn_dns():
+        if argv[0] == '-m':
+            sys.argv = argv[1:]
+            runpy.run_module(argv[1], run_name='__main__', alter_sys=True)
+        else:
+            sys.argv = argv
+            runpy.run_path(argv[0], run_name='__main__')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
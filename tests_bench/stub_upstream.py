@@ -0,0 +1,233 @@
+"""
+本地 B 站 API 桩服务（压测与集成测试共用）。
+
+在 127.0.0.1 的随机端口上模拟 `api.bilibili.com` 的四个接口：
+- /x/web-interface/view   返回 cid（属于合集的视频同时返回 ugc_season 分集列表）
+- /x/player/v2            返回 CC 字幕列表
+- /x/web-interface/nav    返回 WBI 签名密钥（未登录，code 为 -101）
+- /x/player/playurl       返回 durl（含 backup_url）；/x/player/wbi/playurl 同样处理，缺少 w_rid 时返回风控错误
+
+延迟与错误分布可配置，且使用固定种子的随机数，保证多次运行（以及不同提交之间）结果可比。
+"""
+import collections
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class LatencyModel:
+    """
+    上游延迟分布。
+
+    :param kind: 'fixed' | 'uniform' | 'lognormal'
+    :param ms: fixed 时为固定延迟；uniform 时为下限；lognormal 时为中位数（毫秒）。
+    :param spread: uniform 时为上限；lognormal 时为 sigma（对数标准差）。
+    """
+
+    def __init__(self, kind: str = 'fixed', ms: float = 0.0, spread: float = 0.0):
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f'未知的延迟分布: {kind}')
+        self.kind = kind
+        self.ms = float(ms)
+        self.spread = float(spread)
+
+    def sample(self, rng: random.Random) -> float:
+        """返回一次延迟（秒）。"""
+        if self.kind == 'fixed':
+            ms = self.ms
+        elif self.kind == 'uniform':
+            ms = rng.uniform(self.ms, max(self.ms, self.spread))
+        else:
+            ms = self.ms * math.exp(rng.gauss(0.0, self.spread))
+        return max(0.0, ms) / 1000.0
+
+    def describe(self) -> dict:
+        return {'kind': self.kind, 'ms': self.ms, 'spread': self.spread}
+
+
+class StubBilibiliUpstream:
+    """
+    B 站 API 桩服务。
+
+    使用示例:
+        with StubBilibiliUpstream(latency=LatencyModel('fixed', 50), error_rate=0.01) as stub:
+            parser = BiliBiliParser(api_base=stub.base_url)
+            ...
+
+    :param latency: 每个请求的延迟分布。
+    :param error_rate: 返回错误的比例（0~1），错误按 error_status 返回。
+    :param error_status: 错误时的 HTTP 状态码；为 200 时返回业务错误码 code=-404。
+    :param seed: 随机种子。
+    :param video_host: durl 中视频直链使用的主机名。
+    :param throttle_rps: 若设置，则每秒超过该请求数时返回 412（模拟 B 站风控限流）。
+    :param strategy_latency: 按 playurl 策略额外增加的延迟（毫秒），键为 platform 参数或 'wbi'。
+    :param failing_strategies: 这些 playurl 策略只返回业务错误码（没有 durl）。
+    :param seasons: 合集 {合集 id: [bvid, ...]}，其中视频的 view 响应带 ugc_season。
+    :param subtitles: /x/player/v2 返回的字幕列表（data.subtitle.subtitles），默认没有字幕。
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, error_rate: float = 0.0, error_status: int = 500,
+                 seed: int = 1234, video_host: str = 'upos-sz-mirrorcos.bilivideo.com', throttle_rps: Optional[float] = None,
+                 throttle_status: int = 412, strategy_latency: Optional[dict] = None, failing_strategies=(),
+                 seasons: Optional[dict] = None, subtitles: Optional[list] = None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self.video_host = video_host
+        self.throttle_rps = throttle_rps
+        self.throttle_status = int(throttle_status)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        # 可由测试提前 set()，让仍在延迟中的请求立即返回（便于快速结束长延迟用例）
+        self.release = threading.Event()
+        self.counts = {'view': 0, 'playurl': 0, 'errors': 0, 'throttled': 0}
+        self.strategy_latency = dict(strategy_latency or {})
+        self.failing_strategies = set(failing_strategies)
+        self.seasons = {sid: list(bvids) for sid, bvids in (seasons or {}).items()}
+        self.subtitles = list(subtitles or [])
+        self.subtitle_requests = 0
+        # 按策略统计的 playurl 请求数（键同 strategy_latency）
+        self.strategy_counts = collections.Counter()
+        self._server = None
+        self._thread = None
+
+    @staticmethod
+    def cid_of(bvid: str) -> int:
+        return sum(ord(c) for c in bvid) * 1000
+
+    def season_of(self, bvid: str) -> Optional[dict]:
+        """按 view 响应的 ugc_season 结构返回 bvid 所属合集（不属于任何合集时为 None）。"""
+        for season_id, bvids in self.seasons.items():
+            if bvid in bvids:
+                episodes = [{'aid': i + 1, 'bvid': b, 'cid': self.cid_of(b), 'title': f'第 {i + 1} 集',
+                             'arc': {'duration': 60 * (i + 1)}} for i, b in enumerate(bvids)]
+                return {'id': season_id, 'title': f'stub 合集 {season_id}', 'sections': [{'episodes': episodes}]}
+        return None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _draw(self):
+        """在锁内抽取本次请求的延迟与是否出错，保证多线程下随机序列稳定。"""
+        with self._lock:
+            delay = self.latency.sample(self._rng)
+            is_error = self._rng.random() < self.error_rate
+            throttled = False
+            if self.throttle_rps is not None:
+                now = time.monotonic()
+                if now - self._window_start >= 1.0:
+                    self._window_start = now
+                    self._window_count = 0
+                self._window_count += 1
+                throttled = self._window_count > self.throttle_rps
+        return delay, is_error, throttled
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 头与正文合并写出并关闭 Nagle，避免与客户端延迟 ACK 叠加出 40ms 级的人为延迟
+            wbufsize = 65536
+            disable_nagle_algorithm = True
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                delay, is_error, throttled = stub._draw()
+                if delay:
+                    stub.release.wait(delay)
+
+                if throttled:
+                    stub._count('throttled')
+                    return self._send_json(stub.throttle_status, {'code': -412, 'message': '请求被拦截'})
+                if is_error:
+                    stub._count('errors')
+                    if stub.error_status == 200:
+                        return self._send_json(200, {'code': -404, 'message': '啥都木有'})
+                    return self._send_json(stub.error_status, {'code': -500, 'message': '服务器错误'})
+
+                bvid = query.get('bvid', 'BV1xx411c7mD')
+                if parsed.path == '/x/web-interface/view':
+                    stub._count('view')
+                    data = {'bvid': bvid, 'cid': stub.cid_of(bvid), 'title': f'stub {bvid}'}
+                    season = stub.season_of(bvid)
+                    if season is not None:
+                        data['ugc_season'] = season
+                    return self._send_json(200, {'code': 0, 'data': data})
+                if parsed.path == '/x/player/v2':
+                    with stub._lock:
+                        stub.subtitle_requests += 1
+                    return self._send_json(200, {'code': 0, 'data': {'bvid': bvid, 'cid': int(query.get('cid', 0)),
+                                                                      'subtitle': {'subtitles': stub.subtitles}}})
+                if parsed.path == '/x/web-interface/nav':
+                    # 未登录时 code 为 -101，但仍返回 WBI 签名密钥
+                    return self._send_json(200, {'code': -101, 'data': {'wbi_img': {
+                        'img_url': 'https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png',
+                        'sub_url': 'https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png'}}})
+                if parsed.path in ('/x/player/playurl', '/x/player/wbi/playurl'):
+                    strategy = 'wbi' if '/wbi/' in parsed.path else query.get('platform', '')
+                    with stub._lock:
+                        stub.strategy_counts[strategy] += 1
+                    extra = stub.strategy_latency.get(strategy)
+                    if extra:
+                        stub.release.wait(extra / 1000.0)
+                    if strategy in stub.failing_strategies or (strategy == 'wbi' and 'w_rid' not in query):
+                        return self._send_json(200, {'code': -352, 'message': '风控校验失败'})
+                    stub._count('playurl')
+                    deadline = int(time.time()) + 7200
+                    path = f"/upgcxcode/{query.get('cid', '0')}/{bvid}-{query.get('qn', '64')}.mp4"
+                    url = f'https://{stub.video_host}{path}?deadline={deadline}&os=cosbv'
+                    backup = f'https://upos-sz-mirrorali.bilivideo.com{path}?deadline={deadline}&os=alibv'
+                    return self._send_json(200, {'code': 0, 'data': {'quality': int(query.get('qn', 64)),
+                                                                      'durl': [{'url': url, 'backup_url': [backup]}]}})
+                return self._send_json(404, {'code': -404, 'message': 'not found'})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubBilibiliUpstream':
+        # 默认 listen backlog 仅为 5，高并发下会触发 SYN 重传（秒级长尾），压测时需放大
+        server_cls = type('StubServer', (ThreadingHTTPServer,), {'request_queue_size': 1024})
+        self._server = server_cls(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-bilibili', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.release.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+批量预热解析缓存：活动前把已知会被观看的视频提前解析进持久缓存。
+
+从文件（或标准输入）逐行读取 BV 号或视频 URL（空行与 # 开头的行忽略），经与服务相同的
+BiliBiliParser（同样的调度器与 SQLite / 共享缓存后端）以有限并发解析，每条结果解析成功后
+立即写入持久缓存。最后打印吞吐与失败汇总，有失败时退出码为 1。
+
+令牌桶是进程级的，本工具作为独立进程运行，与服务各有一个令牌桶，速率并不共享：两者同时
+访问上游时总速率是相加的。因此默认只用 ASS_UPSTREAM_RATE 的 1/4（--rate 可调整），在服务
+运行期间预热时给在线请求留出余量。
+
+重复运行可断点续做：仍在有效期内的条目直接从缓存恢复，不再访问上游，只解析剩余与失败的条目。
+
+    python tools/warm_cache.py event_videos.txt --concurrency 8
+    cat event_videos.txt | python tools/warm_cache.py - --json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import _validate_parse_url, close_storage, create_app, get_parser  # noqa: E402
+from ass_player.bilibili import ResolveContext  # noqa: E402
+from ass_player.deadline import Deadline  # noqa: E402
+from ass_player.ratelimit import configure_upstream_bucket  # noqa: E402
+from ass_player.storage import DEFAULT_DB_PATH  # noqa: E402
+from cache_manager import setup_cache  # noqa: E402
+from config import get_config  # noqa: E402
+
+# 未指定 --rate 时使用 UPSTREAM_RATE 的这一比例
+DEFAULT_RATE_SHARE = 0.25
+
+
+def read_keys(lines: Iterable[str]) -> List[str]:
+    """把输入行规范化为解析缓存使用的 key（与 /api/auto-parse 一致），去重并保持顺序；无效行原样保留以便报告。"""
+    keys = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        url, _ = _validate_parse_url(line)
+        keys.append(url or line)
+    return list(dict.fromkeys(keys))
+
+
+def warm(parser, keys: List[str], concurrency: int = 8, force: bool = False, deadline: Optional[float] = None,
+         progress: Optional[Callable[[str, str], None]] = None) -> dict:
+    """
+    以最多 concurrency 个并发解析 keys，返回汇总。
+
+    :param force: 为 True 时忽略已有缓存全部重新解析（结果同样写回缓存）。
+    :param deadline: 每条解析的预算（秒），None 表示不限。
+    :param progress: 每条完成时回调 (key, 结果)，结果为 cached / ok / failed。
+    """
+    started = time.perf_counter()
+    summary = {'total': len(keys), 'cached': 0, 'resolved': 0, 'failed': 0, 'failures': {}}
+    pending = []
+    for key in keys:
+        if _validate_parse_url(key)[1] is not None:
+            summary['failed'] += 1
+            summary['failures'][key] = '不是有效的 B 站视频地址'
+        elif not force and parser._get_cached_resolution(key) is not None:
+            summary['cached'] += 1
+            if progress:
+                progress(key, 'cached')
+        else:
+            pending.append(key)
+
+    def resolve(key):
+        ctx = ResolveContext(deadline=Deadline(deadline) if deadline else None)
+        try:
+            return parser.get_real_url(key, ctx=ctx, use_cache=not force), ctx
+        except Exception as ex:
+            return None, ex
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(resolve, key): key for key in pending}
+        for future in as_completed(futures):
+            key = futures[future]
+            final_url, detail = future.result()
+            if final_url:
+                summary['resolved'] += 1
+            else:
+                summary['failed'] += 1
+                summary['failures'][key] = _failure_reason(detail)
+            if progress:
+                progress(key, 'ok' if final_url else 'failed')
+
+    elapsed = time.perf_counter() - started
+    summary['elapsed_s'] = round(elapsed, 3)
+    # 吞吐只统计实际访问上游的条目
+    summary['resolved_per_s'] = round(summary['resolved'] / elapsed, 3) if elapsed > 0 else 0.0
+    return summary
+
+
+def _failure_reason(detail) -> str:
+    if isinstance(detail, Exception):
+        return f'{type(detail).__name__}: {detail}'
+    if isinstance(detail, ResolveContext):
+        if detail.retry_after is not None:
+            return f'上游熔断中，{detail.retry_after} 秒后重试'
+        if detail.deadline is not None and detail.deadline.expired:
+            return '解析超时'
+    return '未返回有效直链'
+
+
+def format_summary(summary: dict) -> str:
+    lines = [
+        f"共 {summary['total']} 条：缓存中已有 {summary['cached']}，新解析 {summary['resolved']}，失败 {summary['failed']}",
+        f"耗时 {summary['elapsed_s']:.1f} 秒，吞吐 {summary['resolved_per_s']:.2f} 条/秒",
+    ]
+    if summary['failures']:
+        lines.append('失败条目（重新运行即可只重试这些）：')
+        lines.extend(f'  {key}  {reason}' for key, reason in summary['failures'].items())
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='批量解析 BV 号 / 视频 URL 并写入持久缓存')
+    parser.add_argument('input', nargs='?', default='-', help='每行一个 BV 号或视频 URL 的文件，- 表示标准输入')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时进行的解析数（上游请求速率仍受 --rate 限制）')
+    parser.add_argument('--rate', type=float, default=None,
+                        help=f'本进程的上游请求速率上限（请求/秒），默认为 ASS_UPSTREAM_RATE 的 {DEFAULT_RATE_SHARE:g} 倍；'
+                             '与服务的令牌桶不共享，0 表示不限速')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='SQLite 磁盘缓存路径（与服务共用）')
+    parser.add_argument('--api-base', default=None, help='B 站 API 地址，默认取配置 BILIBILI_API_BASE')
+    parser.add_argument('--deadline', type=float, default=None, help='每条解析的预算（秒），默认取配置 RESOLVE_DEADLINE')
+    parser.add_argument('--force', action='store_true', help='忽略已有缓存，全部重新解析')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出汇总')
+    parser.add_argument('--quiet', action='store_true', help='不逐条打印进度')
+    parser.add_argument('--verbose', action='store_true', help='输出解析器的 INFO 日志')
+    args = parser.parse_args(argv)
+    # 解析器每条都会打 INFO 日志，批量运行时默认只保留警告
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    if args.input == '-':
+        keys = read_keys(sys.stdin)
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            keys = read_keys(f)
+
+    cfg = get_config()
+    # 与 run.py 一致：共享缓存后端（ASS_CACHE_BACKEND）与本地 SQLite 磁盘缓存都会写入
+    setup_cache(enabled=cfg.CACHE_ENABLED, ttl=cfg.CACHE_TTL, backend=cfg.CACHE_BACKEND,
+                memory_budget_bytes=cfg.MEMORY_BUDGET_MB * 1024 * 1024)
+    flask_app = create_app()
+    flask_app.config['DISK_CACHE_PATH'] = args.db
+    if args.api_base:
+        flask_app.config['BILIBILI_API_BASE'] = args.api_base
+    deadline = args.deadline if args.deadline is not None else (cfg.RESOLVE_DEADLINE or None)
+    rate = args.rate if args.rate is not None else cfg.UPSTREAM_RATE * DEFAULT_RATE_SHARE
+
+    done = [0]
+
+    def progress(key, result):
+        done[0] += 1
+        if not args.quiet:
+            print(f'[{done[0]}/{len(keys)}] {result:<6} {key}', file=sys.stderr, flush=True)
+
+    try:
+        resolver = get_parser(flask_app)
+        # get_parser 按服务的 UPSTREAM_RATE 设置令牌桶，这里改为本工具的速率
+        configure_upstream_bucket(rate, None, cfg.UPSTREAM_RATE_MIN)
+        summary = warm(resolver, keys, concurrency=args.concurrency, force=args.force,
+                       deadline=deadline, progress=progress)
+    finally:
+        close_storage(flask_app)
+
+    print(json.dumps(summary, ensure_ascii=False, indent=2, sort_keys=True) if args.json else format_summary(summary))
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
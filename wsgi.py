@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产环境 WSGI 入口（多进程预派生）：
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py 启用 preload_app：本模块在 master 进程中导入一次，只读资源（编译后的模板、
+字幕目录索引、预压缩的静态文件）在 fork 之前加载，各 worker 以写时复制的方式共享；
+解析器、HTTP 会话、SQLite 连接与后台任务则在每个 worker 中于 fork 之后重新创建（见 post_fork）。
+"""
+import gc
+import logging
+
+from app import app, configure_parse_limiter, preload_assets, reinit_after_fork, start_background_tasks
+from config import get_config
+from cache_manager import setup_cache
+from ass_player.storage import DEFAULT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+_cfg = get_config()
+# 缓存后端（ASS_CACHE_BACKEND）：SQLite / Redis 后端的连接在各 worker 中按进程号重新建立
+setup_cache(enabled=_cfg.CACHE_ENABLED, ttl=_cfg.CACHE_TTL, backend=_cfg.CACHE_BACKEND,
+            memory_budget_bytes=_cfg.MEMORY_BUDGET_MB * 1024 * 1024)
+# gthread 每个 worker 只有 WEB_THREADS 个线程，排队中的解析请求同样占线程：解析（含排队）最多使用
+# 除 RESERVED_THREADS 之外的线程，其中约三分之二用于进行中的解析，保证上游变慢时页面与静态文件仍有线程可用
+RESERVED_THREADS = 2
+_parse_threads = max(1, _cfg.WEB_THREADS - RESERVED_THREADS)
+_parse_in_flight = min(_cfg.PARSE_MAX_IN_FLIGHT, max(1, _parse_threads * 2 // 3))
+configure_parse_limiter(app, _parse_in_flight, min(_cfg.PARSE_QUEUE_SIZE, _parse_threads - _parse_in_flight),
+                        _cfg.PARSE_QUEUE_TIMEOUT)
+# 本地 SQLite 磁盘缓存：每个 worker 在首次创建解析器时打开自己的连接
+app.config['DISK_CACHE_PATH'] = DEFAULT_DB_PATH
+preload_assets(app)
+# 把预加载产生的对象移出 GC 追踪范围：GC 扫描时不会写入这些对象的头部，从而避免破坏写时复制共享
+gc.freeze()
+
+
+def post_fork():
+    """在每个 worker 进程 fork 之后调用：丢弃继承的可变状态并按配置启动本进程的后台任务。"""
+    reinit_after_fork(app)
+    start_background_tasks(app, _cfg)